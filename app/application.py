@@ -1,20 +1,24 @@
 import logging
-from typing import Any
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
 
 import uvicorn
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from starlette.requests import Request
-from starlette.responses import JSONResponse
 
 from app.config import get_config
-from app.container import setup_container
+from app.container import get_change_feed, get_export_service, setup_container
 from app.exceptions.fhir_exception import (
     OperationOutcome,
     OperationOutcomeDetail,
     OperationOutcomeIssue,
 )
+from app.routers.bulk_import import router as bulk_import_router
+from app.routers.bundle import router as bundle_router
+from app.routers.changes import router as changes_router
 from app.routers.default import router as default_router
 from app.routers.endpoints import router as endpoints_router
+from app.routers.export import router as export_router
 from app.routers.health import router as health_router
 from app.routers.healthcare_service import router as healthcare_service_router
 from app.routers.locations import router as locations_router
@@ -24,6 +28,7 @@ from app.routers.organization_affiliations import (
 from app.routers.organizations import router as organizations_router
 from app.routers.practitioner_roles import router as practitioner_roles_router
 from app.routers.practitioners import router as practitioners_router
+from app.routers.utils import FhirJsonResponse, pretty_output
 from app.stats import StatsdMiddleware, setup_stats
 from app.telemetry import setup_telemetry
 
@@ -82,17 +87,32 @@ def setup_logging() -> None:
     )
 
 
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    change_feed = get_change_feed()
+    await change_feed.start()
+    yield
+    await change_feed.stop()
+    get_export_service().stop()
+
+
 def setup_fastapi() -> FastAPI:
     config = get_config()
 
-    fastapi = (
-        FastAPI(docs_url=config.uvicorn.docs_url, redoc_url=config.uvicorn.redoc_url)
-        if config.uvicorn.swagger_enabled
-        else FastAPI(docs_url=None, redoc_url=None)
+    fastapi = FastAPI(
+        docs_url=config.uvicorn.docs_url if config.uvicorn.swagger_enabled else None,
+        redoc_url=config.uvicorn.redoc_url if config.uvicorn.swagger_enabled else None,
+        default_response_class=FhirJsonResponse,
+        dependencies=[Depends(pretty_output)],
+        lifespan=lifespan,
     )
 
     routers = [
         default_router,
+        bundle_router,
+        export_router,
+        bulk_import_router,
+        changes_router,
         health_router,
         organizations_router,
         endpoints_router,
@@ -113,7 +133,7 @@ def setup_fastapi() -> FastAPI:
     return fastapi
 
 
-def default_fhir_exception_handler(_: Request, exc: Exception) -> JSONResponse:
+def default_fhir_exception_handler(_: Request, exc: Exception) -> FhirJsonResponse:
     """
     Default handler to convert generic exceptions to FHIR exceptions
     """
@@ -127,4 +147,4 @@ def default_fhir_exception_handler(_: Request, exc: Exception) -> JSONResponse:
         ]
     )
 
-    return JSONResponse(status_code=500, content=outcome.model_dump())
+    return FhirJsonResponse(status_code=500, content=outcome.model_dump())
@@ -29,6 +29,8 @@ class ConfigDatabase(BaseModel):
     max_overflow: int = Field(default=10, ge=0, lt=100)
     pool_pre_ping: bool = Field(default=False)
     pool_recycle: int = Field(default=3600, ge=0)
+    cache_size: int = Field(default=10000, ge=0)
+    cache_ttl: float = Field(default=60, ge=0)
 
 
 class ConfigUvicorn(BaseModel):
@@ -60,12 +62,28 @@ class ConfigStats(BaseModel):
     module_name: str | None
 
 
+class ConfigExport(BaseModel):
+    directory: str = Field(default="exports")
+    workers: int = Field(default=2, gt=0)
+    max_jobs: int = Field(default=10, gt=0)
+    expiry_hours: int = Field(default=24, gt=0)
+
+
+class ConfigRetention(BaseModel):
+    history_days: int = Field(default=365, ge=0)
+    history_days_per_type: dict[str, int] = Field(default_factory=dict)
+    tombstone_days: int = Field(default=30, ge=0)
+    batch_size: int = Field(default=1000, gt=0)
+
+
 class Config(BaseModel):
     app: ConfigApp
     database: ConfigDatabase
     uvicorn: ConfigUvicorn
     telemetry: ConfigTelemetry
     stats: ConfigStats
+    export: ConfigExport = Field(default_factory=ConfigExport)
+    retention: ConfigRetention = Field(default_factory=ConfigRetention)
 
 
 def read_ini_file(path: str) -> Any:
@@ -109,6 +127,16 @@ def get_config(path: str | None = None) -> Config:
             # convert the string to a list of floats
             ini_data["database"]["retry_backoff"] = [float(i) for i in ini_data["database"]["retry_backoff"].split(",")]
 
+        # Convert retention.history_days_per_type ("Organization=730, Endpoint=90") to a dict
+        retention = ini_data.get("retention", {})
+        if isinstance(retention.get("history_days_per_type"), str):
+            retention["history_days_per_type"] = {
+                key.strip(): int(value)
+                for key, value in (
+                    item.split("=") for item in retention["history_days_per_type"].split(",") if item.strip()
+                )
+            }
+
         _CONFIG = Config(**ini_data)
     except ValidationError as e:
         raise e
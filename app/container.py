@@ -2,6 +2,8 @@ import inject
 
 from app.config import get_config
 from app.db.db import Database
+from app.services.bundle_service import BundleService
+from app.services.change_feed import ChangeFeed
 from app.services.entity_services.endpoint_service import EndpointService
 from app.services.entity_services.healthcare_service_service import HealthcareServiceService
 from app.services.entity_services.location_service import LocationService
@@ -9,7 +11,12 @@ from app.services.entity_services.organization_affiliation_service import Organi
 from app.services.entity_services.organization_service import OrganizationService
 from app.services.entity_services.practitioner import PractitionerService
 from app.services.entity_services.practitioner_role_service import PractitionerRoleService
+from app.services.export_service import ExportService
+from app.services.import_service import ImportService
+from app.services.include_service import IncludeService
 from app.services.matching_care_service import MatchingCareService
+from app.services.retention_service import RetentionService
+from app.services.version_service import VersionService
 
 
 def container_config(binder: inject.Binder) -> None:
@@ -39,9 +46,42 @@ def container_config(binder: inject.Binder) -> None:
     location_service = LocationService(db)
     binder.bind(LocationService, location_service)
 
-    matching_care_service = MatchingCareService(organization_service, endpoint_service)
+    include_service = IncludeService(db)
+    binder.bind(IncludeService, include_service)
+
+    matching_care_service = MatchingCareService(organization_service, endpoint_service, include_service)
     binder.bind(MatchingCareService, matching_care_service)
 
+    version_service = VersionService(db)
+    binder.bind(VersionService, version_service)
+
+    bundle_service = BundleService(
+        db,
+        {
+            "Organization": organization_service,
+            "Endpoint": endpoint_service,
+            "OrganizationAffiliation": organization_affiliation_service,
+            "HealthcareService": healthcare_service_service,
+            "Location": location_service,
+            "Practitioner": practitioner_service,
+            "PractitionerRole": practitioner_role_service,
+        },
+    )
+    binder.bind(BundleService, bundle_service)
+
+    export_service = ExportService(db, config.export)
+    binder.bind(ExportService, export_service)
+
+    import_service = ImportService(db)
+    binder.bind(ImportService, import_service)
+
+    retention_service = RetentionService(db, config.retention)
+    binder.bind(RetentionService, retention_service)
+
+    # Changes are only announced by Postgres
+    change_feed = ChangeFeed(config.database.dsn if db.async_engine is not None else None)
+    binder.bind(ChangeFeed, change_feed)
+
 
 def get_database() -> Database:
     return inject.instance(Database)
@@ -79,5 +119,29 @@ def get_location_service() -> LocationService:
     return inject.instance(LocationService)
 
 
+def get_include_service() -> IncludeService:
+    return inject.instance(IncludeService)
+
+
+def get_version_service() -> VersionService:
+    return inject.instance(VersionService)
+
+
+def get_bundle_service() -> BundleService:
+    return inject.instance(BundleService)
+
+
+def get_export_service() -> ExportService:
+    return inject.instance(ExportService)
+
+
+def get_import_service() -> ImportService:
+    return inject.instance(ImportService)
+
+
+def get_change_feed() -> ChangeFeed:
+    return inject.instance(ChangeFeed)
+
+
 def setup_container() -> None:
     inject.configure(container_config, once=True)
@@ -0,0 +1,3 @@
+from app.cron import main
+
+main()
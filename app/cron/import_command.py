@@ -0,0 +1,41 @@
+import argparse
+import logging
+from pathlib import Path
+from typing import Any
+
+import inject
+
+from app.services.import_service import IMPORT_BATCH_SIZE, ImportService
+
+logger = logging.getLogger(__name__)
+
+
+class ImportCommand:
+    """
+    Bulk import of NDJSON files, for instance the output of an $export. Files are imported in the order given,
+    so resources referenced by another file should come first.
+    """
+
+    @inject.autoparams()
+    def __init__(self, import_service: ImportService) -> None:
+        self.import_service = import_service
+
+    def init_arguments(self, subparser: Any) -> None:
+        parser = subparser.add_parser("import", help="import NDJSON files")
+        parser.add_argument("files", nargs="+", help="NDJSON files, the resource type defaults to the file name")
+        parser.add_argument("--type", help="resource type of all files (default: the file name without extension)")
+        parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="resources per transaction")
+
+    def run(self, args: argparse.Namespace) -> int:
+        failed = False
+        for file_name in args.files:
+            resource_type = args.type or Path(file_name).stem
+            with open(file_name, "r") as file:
+                result = self.import_service.import_ndjson(resource_type, file, args.batch_size)
+
+            for error in result.errors:
+                logger.error("%s %s", file_name, error)
+            logger.info("Imported %d %s resources from %s", result.imported, resource_type, file_name)
+            failed = failed or len(result.errors) > 0
+
+        return 1 if failed else 0
@@ -0,0 +1,49 @@
+import argparse
+import logging
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Any, ContextManager, TextIO
+
+import inject
+
+from app.db.entities.resource_types import RESOURCE_ENTITIES
+from app.services.retention_service import RetentionService
+
+logger = logging.getLogger(__name__)
+
+
+class PruneCommand:
+    """
+    Removes the versions that are older than the retention of their resource type, and the tombstones of deleted
+    resources after their grace period (see the [retention] section of the configuration). Meant to run daily.
+    """
+
+    @inject.autoparams()
+    def __init__(self, retention_service: RetentionService) -> None:
+        self.retention_service = retention_service
+
+    def init_arguments(self, subparser: Any) -> None:
+        parser = subparser.add_parser("prune", help="remove versions older than the retention period")
+        parser.add_argument(
+            "--type",
+            action="append",
+            choices=list(RESOURCE_ENTITIES.keys()),
+            help="resource type to prune, can be repeated (default: all types)",
+        )
+        parser.add_argument("--archive", help="directory where the removed versions are appended to <type>.ndjson")
+
+    def run(self, args: argparse.Namespace) -> int:
+        for resource_type in args.type or RESOURCE_ENTITIES.keys():
+            archive: ContextManager[TextIO | None] = nullcontext()
+            if args.archive is not None:
+                Path(args.archive).mkdir(parents=True, exist_ok=True)
+                archive = open(Path(args.archive) / f"{resource_type}.ndjson", "a")
+
+            with archive as file:
+                result = self.retention_service.prune(resource_type, file)
+
+            logger.info(
+                "Removed %d versions and %d tombstones of %s", result.versions, result.tombstones, resource_type
+            )
+
+        return 0
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import random
+from typing import Any, AsyncIterator, Awaitable, Callable, Protocol, Type, TypeVar
+
+from sqlalchemy.exc import DatabaseError, OperationalError, PendingRollbackError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import Session
+
+from app.config import get_config
+from app.db.cache import ResourceCache
+from app.db.entities.base import Base
+from app.db.repositories import repository_base
+from app.db.session import DbSession
+
+"""
+This module contains the AsyncDbSession class, the asyncio twin of DbSession. It wraps an AsyncSession and
+provides the same retry semantics, without blocking the event loop while waiting on the database.
+
+The repositories are written against the synchronous DbSession. Instead of maintaining a second implementation of
+every repository, they are run inside the async session through AsyncSession.run_sync, which drives the
+synchronous code from a greenlet while all I/O happens asynchronously.
+
+Usage:
+
+    async with AsyncDbSession(engine) as session:
+        entry = await session.run(MyModelRepository, lambda repo: repo.get_one(fhir_id=fhir_id))
+        async for entry in session.stream(MyModelRepository, latest=True):
+            ...
+"""
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R", bound=repository_base.RepositoryBase)
+
+
+class SearchableRepository(Protocol):
+    def find_statement(self, **conditions: Any) -> Any: ...
+
+
+class _RunSyncDbSession(DbSession):
+    """
+    DbSession around the synchronous session that AsyncSession.run_sync hands out. Retries are handled by the
+    AsyncDbSession around the whole call, as sleeping here would block the event loop.
+    """
+
+    def __init__(self, session: Session, cache: ResourceCache | None = None) -> None:
+        self.session = session
+        self.cache = cache
+
+    def _retry(self, f: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        return f(*args, **kwargs)
+
+
+class AsyncDbSession:
+    def __init__(self, engine: AsyncEngine, cache: ResourceCache | None = None) -> None:
+        self._engine = engine
+        self.cache = cache
+
+    async def __aenter__(self) -> "AsyncDbSession":
+        """
+        Create a new session when entering the context manager
+        """
+        self.session = AsyncSession(self._engine, expire_on_commit=False)
+        return self
+
+    async def __aexit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None:
+        """
+        Close the session when exiting the context manager
+        """
+        await self.session.close()
+
+    async def run(self, repository_class: Type[R], f: Callable[[R], T]) -> T:
+        """
+        Runs f with an instantiated (synchronous) repository inside this session
+        """
+        return await self.run_session(lambda session: f(session.get_repository(repository_class)))
+
+    async def run_session(self, f: Callable[[DbSession], T]) -> T:
+        """
+        Runs f with a synchronous DbSession view on this session, for code that needs more than one repository
+        """
+
+        def call(session: Session) -> T:
+            return f(_RunSyncDbSession(session, self.cache))
+
+        return await self._retry(self.session.run_sync, call)
+
+    async def stream(self, repository_class: Type[SearchableRepository], **conditions: Any) -> AsyncIterator[Any]:
+        """
+        Yields the rows matching the repository search conditions in batches from a server-side cursor
+        """
+        session = _RunSyncDbSession(self.session.sync_session, self.cache)
+        repository = repository_class(session)  # type: ignore[call-arg]
+        stmt = repository.find_statement(**conditions).execution_options(yield_per=repository_base.STREAM_BATCH_SIZE)
+
+        result = await self._retry(self.session.stream_scalars, stmt)
+        async for entry in result:
+            yield entry
+
+    async def add(self, entry: Base) -> None:
+        """
+        Add a resource to the session, so it will be inserted/updated in the database on the next commit
+        """
+        self.session.add(entry)
+
+    async def commit(self) -> None:
+        """
+        Commits any pending work in the session to the database
+        """
+        await self._retry(self.session.commit)
+
+    async def rollback(self) -> None:
+        """
+        Rollback the current transaction
+        """
+        await self._retry(self.session.rollback)
+
+    async def execute(self, stmt: Any) -> Any:
+        """
+        Execute a statement in the current session
+        """
+        return await self._retry(self.session.execute, stmt)
+
+    async def _retry(self, f: Callable[..., Awaitable[T]], *args: Any, **kwargs: Any) -> T:
+        """
+        Retry a coroutine in case of database errors
+        """
+        backoff = get_config().database.retry_backoff
+
+        while True:
+            try:
+                return await f(*args, **kwargs)
+            except PendingRollbackError as e:
+                logger.warning("Retrying operation due to PendingRollbackError: %s", e)
+                await self.session.rollback()
+            except OperationalError as e:
+                logger.warning("Retrying operation due to OperationalError: %s", e)
+            except DatabaseError as e:
+                logger.warning("Retrying operation due to DatabaseError: %s", e)
+                raise e
+            except Exception as e:
+                logger.warning("Generic Exception during operation: %s", e)
+                raise e
+
+            if len(backoff) == 0:
+                logger.error("Operation failed after all retries")
+                raise Exception("Operation failed after all retries")
+
+            logger.info("Retrying operation in %s seconds", backoff[0])
+            await asyncio.sleep(backoff[0] + random.uniform(0, 0.1))
+            backoff = backoff[1:]
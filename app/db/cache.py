@@ -0,0 +1,108 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Tuple, Type, TypeVar
+from uuid import UUID
+
+from sqlalchemy.orm import class_mapper
+
+from app.db.entities.mixin.common_mixin import CommonMixin
+from app.stats import get_stats
+
+"""
+In-process LRU cache for the current version of single resources, keyed by (resource type, fhir_id).
+
+Only snapshots of the column values are stored. Every hit returns a new, transient entity, so callers can never
+modify the cached version or attach it to a session. The repositories invalidate an entry whenever they write a
+new version of the resource. Invalidation leaves a marker with the new version number, so a read that started
+before the write cannot put the old version back. Entries expire after a ttl, which bounds how long other
+processes (which do not see our invalidations) can serve an outdated version.
+"""
+
+T = TypeVar("T", bound=CommonMixin)
+
+# Columns holding JSON documents, these are copied on every hit as callers are free to modify them
+_JSON_COLUMNS = ("data", "bundle_meta")
+
+
+@dataclass
+class _CacheEntry:
+    version: int
+    expires_at: float
+    values: Dict[str, Any] | None
+
+
+class ResourceCache:
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[Tuple[str, UUID], _CacheEntry] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 and self.ttl > 0
+
+    def get(self, entity_class: Type[T], fhir_id: UUID | str) -> T | None:
+        """
+        Returns a copy of the cached current version of the resource, or None when it is not cached
+        """
+        if not self.enabled:
+            return None
+
+        key = (entity_class.__name__, UUID(str(fhir_id)))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None or entry.values is None:
+                get_stats().inc("cache.miss")
+                return None
+            self._entries.move_to_end(key)
+            values = entry.values
+
+        get_stats().inc("cache.hit")
+        return entity_class(
+            **{name: copy.deepcopy(value) if name in _JSON_COLUMNS else value for name, value in values.items()}
+        )
+
+    def put(self, entity: CommonMixin) -> None:
+        """
+        Stores the current version of a resource, unless a newer version has been written in the meantime
+        """
+        if not self.enabled or entity.data is None:
+            return
+
+        key = (type(entity).__name__, entity.fhir_id)
+        values = {attr.key: getattr(entity, attr.key) for attr in class_mapper(type(entity)).column_attrs}
+        values = {name: copy.deepcopy(value) if name in _JSON_COLUMNS else value for name, value in values.items()}
+        with self._lock:
+            current = self._entries.get(key)
+            if current is not None and current.version > entity.version:
+                return
+            self._store(key, _CacheEntry(entity.version, time.monotonic() + self.ttl, values))
+
+    def invalidate(self, entity: CommonMixin) -> None:
+        """
+        Drops the cached resource after a new version (or a delete) of it has been written
+        """
+        if not self.enabled:
+            return
+
+        key = (type(entity).__name__, entity.fhir_id)
+        with self._lock:
+            self._store(key, _CacheEntry(entity.version, time.monotonic() + self.ttl, None))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _store(self, key: Tuple[str, UUID], entry: _CacheEntry) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            get_stats().inc("cache.eviction")
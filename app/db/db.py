@@ -1,11 +1,17 @@
 import logging
 import subprocess
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
 
 from sqlalchemy import StaticPool, create_engine, text
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 from sqlalchemy.orm import Session
 
 from app.config import ConfigDatabase
-from app.db.session import DbSession
+from app.db.async_session import AsyncDbSession
+from app.db.cache import ResourceCache
+from app.db.session import DbSession, TransactionDbSession
 
 logger = logging.getLogger(__name__)
 
@@ -14,6 +20,9 @@ class Database:
     _SQLITE_PREFIX = "sqlite://"
 
     def __init__(self, config: ConfigDatabase):
+        self.async_engine: AsyncEngine | None = None
+        self.cache = ResourceCache(max_size=config.cache_size, ttl=config.cache_ttl)
+        self._transaction: ContextVar[TransactionDbSession | None] = ContextVar(f"transaction_{id(self)}", default=None)
         try:
             if self._SQLITE_PREFIX in config.dsn:
                 self.engine = create_engine(
@@ -31,6 +40,15 @@ class Database:
                     pool_size=config.pool_size,
                     max_overflow=config.max_overflow,
                 )
+                # Same database through psycopg's asyncio support, used by the async request path
+                self.async_engine = create_async_engine(
+                    config.dsn,
+                    echo=False,
+                    pool_pre_ping=config.pool_pre_ping,
+                    pool_recycle=config.pool_recycle,
+                    pool_size=config.pool_size,
+                    max_overflow=config.max_overflow,
+                )
         except BaseException as e:
             logger.error("Error while connecting to database: %s", e)
             raise e
@@ -61,6 +79,8 @@ class Database:
             session.execute(text("TRUNCATE TABLE " + ", ".join(tables)))
             session.commit()
 
+        self.cache.clear()
+
     def is_healthy(self) -> bool:
         """
         Check if the database is healthy
@@ -76,4 +96,34 @@ class Database:
             return False
 
     def get_db_session(self) -> DbSession:
-        return DbSession(self.engine)
+        transaction = self._transaction.get()
+        if transaction is not None:
+            return transaction
+        return DbSession(self.engine, self.cache)
+
+    @contextmanager
+    def transaction(self) -> Iterator[TransactionDbSession]:
+        """
+        Runs everything inside the block in a single database transaction. Every get_db_session() call made in the
+        block (by any service) returns the same session, and nothing is committed until the block completes. Any
+        exception rolls back all writes of the block.
+        """
+        if self._transaction.get() is not None:
+            raise RuntimeError("Database transactions cannot be nested")
+
+        session = TransactionDbSession(self.engine, self.cache)
+        token = self._transaction.set(session)
+        try:
+            yield session
+            session.commit_transaction()
+        except BaseException:
+            session.rollback()
+            raise
+        finally:
+            self._transaction.reset(token)
+            session.close()
+
+    def get_async_db_session(self) -> AsyncDbSession:
+        if self.async_engine is None:
+            raise RuntimeError("Async database sessions are not supported for sqlite")
+        return AsyncDbSession(self.async_engine, self.cache)
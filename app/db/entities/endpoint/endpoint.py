@@ -1,4 +1,8 @@
-from sqlalchemy import PrimaryKeyConstraint
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import Computed, PrimaryKeyConstraint, String
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
 
 from app.db.entities.base import Base
 from app.db.entities.mixin.common_mixin import CommonMixin
@@ -7,3 +11,15 @@ from app.db.entities.mixin.common_mixin import CommonMixin
 class Endpoint(CommonMixin, Base):
     __tablename__ = "endpoints"
     __table_args__ = (PrimaryKeyConstraint("id"),)
+
+    # Search parameters, generated from the FHIR data (see sql/023-search-generated-columns.sql)
+    connection_type: Mapped[Optional[str]] = mapped_column(
+        "connection_type", String, Computed("data->'connectionType'->>'code'")
+    )
+    status: Mapped[Optional[str]] = mapped_column("status", String, Computed("data->>'status'"))
+    managing_organization_reference: Mapped[Optional[str]] = mapped_column(
+        "managing_organization_reference", String, Computed("data->'managingOrganization'->>'reference'")
+    )
+    identifiers: Mapped[Optional[List[Dict[str, Any]]]] = mapped_column(
+        "identifiers", JSONB, Computed("data->'identifier'")
+    )
@@ -1,4 +1,8 @@
-from sqlalchemy import PrimaryKeyConstraint
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import BOOLEAN, Computed, PrimaryKeyConstraint, String
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
 
 from app.db.entities.base import Base
 from app.db.entities.mixin.common_mixin import CommonMixin
@@ -7,3 +11,13 @@ from app.db.entities.mixin.common_mixin import CommonMixin
 class HealthcareService(CommonMixin, Base):
     __tablename__ = "healthcare_services"
     __table_args__ = (PrimaryKeyConstraint("id"),)
+
+    # Search parameters, generated from the FHIR data (see sql/023-search-generated-columns.sql)
+    active: Mapped[Optional[bool]] = mapped_column("active", BOOLEAN, Computed("(data->>'active')::BOOLEAN"))
+    provided_by_reference: Mapped[Optional[str]] = mapped_column(
+        "provided_by_reference", String, Computed("data->'providedBy'->>'reference'")
+    )
+    types: Mapped[Optional[List[Dict[str, Any]]]] = mapped_column("types", JSONB, Computed("data->'type'"))
+    location_references: Mapped[Optional[List[Dict[str, Any]]]] = mapped_column(
+        "location_references", JSONB, Computed("data->'location'")
+    )
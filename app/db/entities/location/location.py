@@ -1,4 +1,7 @@
-from sqlalchemy import PrimaryKeyConstraint
+from typing import Optional
+
+from sqlalchemy import Computed, PrimaryKeyConstraint, String
+from sqlalchemy.orm import Mapped, mapped_column
 
 from app.db.entities.base import Base
 from app.db.entities.mixin.common_mixin import CommonMixin
@@ -7,3 +10,14 @@ from app.db.entities.mixin.common_mixin import CommonMixin
 class Location(CommonMixin, Base):
     __tablename__ = "locations"
     __table_args__ = (PrimaryKeyConstraint("id"),)
+
+    # Search parameters, generated from the FHIR data (see sql/023-search-generated-columns.sql)
+    name: Mapped[Optional[str]] = mapped_column("name", String, Computed("data->>'name'"))
+    status: Mapped[Optional[str]] = mapped_column("status", String, Computed("data->>'status'"))
+    type: Mapped[Optional[str]] = mapped_column("type", String, Computed("data->>'type'"))
+    managing_organization_reference: Mapped[Optional[str]] = mapped_column(
+        "managing_organization_reference", String, Computed("data->'managingOrganization'->>'reference'")
+    )
+    part_of_reference: Mapped[Optional[str]] = mapped_column(
+        "part_of_reference", String, Computed("data->'partOf'->>'reference'")
+    )
@@ -2,8 +2,8 @@ from datetime import UTC, datetime
 from typing import Any, Dict, Optional
 from uuid import UUID, uuid4
 
-from sqlalchemy import BOOLEAN, INTEGER, TIMESTAMP, types
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy import BOOLEAN, INTEGER, TEXT, TIMESTAMP, Computed, types
+from sqlalchemy.dialects.postgresql import JSONB, TSTZRANGE, Range
 from sqlalchemy.orm import Mapped, mapped_column
 
 
@@ -36,3 +36,15 @@ class CommonMixin(BaseMixin):
     version: Mapped[int] = mapped_column("version", INTEGER, default=1)
     latest: Mapped[bool] = mapped_column("latest", BOOLEAN, nullable=False, default=True)
     deleted: Mapped[bool] = mapped_column("deleted", BOOLEAN, nullable=False, default=False)
+    # Generated from data.meta.lastUpdated (see sql/023-search-generated-columns.sql), used for _history and _since
+    last_updated: Mapped[Optional[datetime]] = mapped_column(
+        "last_updated",
+        TIMESTAMP(timezone=True),
+        Computed("fhir_instant(data->'meta'->>'lastUpdated')"),
+    )
+    # Compact JSON text of data (see update_resource_meta()), written to responses as is. None for deleted versions
+    data_json: Mapped[Optional[str]] = mapped_column("data_json", TEXT)
+    # Hash of the content of the version without meta (see update_resource_meta()), None for deleted versions
+    content_hash: Mapped[Optional[str]] = mapped_column("content_hash", TEXT)
+    # Period in which this was the current version (see sql/028-version-validity.sql), used for _at
+    valid: Mapped[Range[datetime]] = mapped_column("valid", TSTZRANGE, nullable=False)
@@ -1,4 +1,7 @@
-from sqlalchemy import PrimaryKeyConstraint, String
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import BOOLEAN, Computed, PrimaryKeyConstraint, String
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.db.entities.base import Base
@@ -13,3 +16,18 @@ class Organization(CommonMixin, Base):
     __tablename__ = "organizations"
     __table_args__ = (PrimaryKeyConstraint("id"),)
     ura_number: Mapped[str] = mapped_column("ura_number", String, unique=True)
+
+    # Search parameters, generated from the FHIR data (see sql/023-search-generated-columns.sql)
+    active: Mapped[Optional[bool]] = mapped_column("active", BOOLEAN, Computed("(data->>'active')::BOOLEAN"))
+    type: Mapped[Optional[str]] = mapped_column("type", String, Computed("data->>'type'"))
+    phonetic: Mapped[Optional[str]] = mapped_column("phonetic", String, Computed("data->'name'->>'phonetic'"))
+    part_of_reference: Mapped[Optional[str]] = mapped_column(
+        "part_of_reference", String, Computed("data->'partOf'->>'reference'")
+    )
+    identifiers: Mapped[Optional[List[Dict[str, Any]]]] = mapped_column(
+        "identifiers", JSONB, Computed("data->'identifier'")
+    )
+    addresses: Mapped[Optional[List[Dict[str, Any]]]] = mapped_column("addresses", JSONB, Computed("data->'address'"))
+    endpoint_references: Mapped[Optional[List[Dict[str, Any]]]] = mapped_column(
+        "endpoint_references", JSONB, Computed("data->'endpoint'")
+    )
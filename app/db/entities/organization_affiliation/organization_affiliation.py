@@ -1,4 +1,8 @@
-from sqlalchemy import PrimaryKeyConstraint
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import BOOLEAN, Computed, PrimaryKeyConstraint, String
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
 
 from app.db.entities.base import Base
 from app.db.entities.mixin.common_mixin import CommonMixin
@@ -7,3 +11,16 @@ from app.db.entities.mixin.common_mixin import CommonMixin
 class OrganizationAffiliation(CommonMixin, Base):
     __tablename__ = "organization_affiliations"
     __table_args__ = (PrimaryKeyConstraint("id"),)
+
+    # Search parameters, generated from the FHIR data (see sql/023-search-generated-columns.sql)
+    active: Mapped[Optional[bool]] = mapped_column("active", BOOLEAN, Computed("(data->>'active')::BOOLEAN"))
+    organization_reference: Mapped[Optional[str]] = mapped_column(
+        "organization_reference", String, Computed("data->'organization'->>'reference'")
+    )
+    participating_organization_reference: Mapped[Optional[str]] = mapped_column(
+        "participating_organization_reference", String, Computed("data->'participatingOrganization'->>'reference'")
+    )
+    codes: Mapped[Optional[List[Dict[str, Any]]]] = mapped_column("codes", JSONB, Computed("data->'code'"))
+    specialties: Mapped[Optional[List[Dict[str, Any]]]] = mapped_column(
+        "specialties", JSONB, Computed("data->'specialty'")
+    )
@@ -1,4 +1,7 @@
-from sqlalchemy import PrimaryKeyConstraint
+from typing import Optional
+
+from sqlalchemy import BOOLEAN, Computed, PrimaryKeyConstraint
+from sqlalchemy.orm import Mapped, mapped_column
 
 from app.db.entities.base import Base
 from app.db.entities.mixin.common_mixin import CommonMixin
@@ -7,3 +10,6 @@ from app.db.entities.mixin.common_mixin import CommonMixin
 class Practitioner(CommonMixin, Base):
     __tablename__ = "practitioners"
     __table_args__ = (PrimaryKeyConstraint("id"),)
+
+    # Search parameters, generated from the FHIR data (see sql/023-search-generated-columns.sql)
+    active: Mapped[Optional[bool]] = mapped_column("active", BOOLEAN, Computed("(data->>'active')::BOOLEAN"))
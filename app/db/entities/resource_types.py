@@ -0,0 +1,39 @@
+from typing import Any, Dict, Sequence, Type
+from uuid import UUID
+
+from sqlalchemy import String, Uuid, any_, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from app.db.entities.endpoint.endpoint import Endpoint
+from app.db.entities.healthcare_service.healthcare_service import HealthcareService
+from app.db.entities.location.location import Location
+from app.db.entities.organization.organization import Organization
+from app.db.entities.organization_affiliation.organization_affiliation import OrganizationAffiliation
+from app.db.entities.practitioner.practitioner import Practitioner
+from app.db.entities.practitioner_role.practitioner_role import PractitionerRole
+
+# FHIR resource type to the entity that stores it
+RESOURCE_ENTITIES: Dict[str, Type[Any]] = {
+    "Endpoint": Endpoint,
+    "HealthcareService": HealthcareService,
+    "Location": Location,
+    "Organization": Organization,
+    "OrganizationAffiliation": OrganizationAffiliation,
+    "Practitioner": Practitioner,
+    "PractitionerRole": PractitionerRole,
+}
+
+
+def fhir_id_in(column: Any, fhir_ids: Sequence[UUID]) -> Any:
+    """
+    `column = ANY(:fhir_ids)` with all ids bound as a single uuid[] parameter, so the statement (and its plan)
+    is the same no matter how many ids are looked up.
+    """
+    return column == any_(bindparam("fhir_ids", list(fhir_ids), type_=ARRAY(Uuid()), unique=True))
+
+
+def reference_in(column: Any, references: Sequence[str]) -> Any:
+    """
+    `column = ANY(:references)` for the generated reference columns, which hold `Type/fhir_id` strings
+    """
+    return column == any_(bindparam("references", list(references), type_=ARRAY(String()), unique=True))
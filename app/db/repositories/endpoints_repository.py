@@ -1,15 +1,15 @@
 import logging
 from datetime import datetime
-from typing import Any, Dict, Sequence
+from typing import Any, Dict, Iterator, Sequence
 from uuid import UUID
 
-from fastapi.encoders import jsonable_encoder
-from sqlalchemy import TIMESTAMP, cast, func, literal_column, or_, select
+from sqlalchemy import func, literal_column, or_, select
 from sqlalchemy.exc import DatabaseError
 
 from app.db.decorator import repository
 from app.db.entities.endpoint.endpoint import Endpoint
-from app.db.repositories.repository_base import RepositoryBase
+from app.db.repositories.repository_base import STREAM_BATCH_SIZE, RepositoryBase, current_at
+from app.params.pagination import Page
 from app.services.utils import update_resource_meta
 
 logger = logging.getLogger(__name__)
@@ -17,15 +17,11 @@ logger = logging.getLogger(__name__)
 
 @repository(Endpoint)
 class EndpointsRepository(RepositoryBase):
-    def get_one(self, **kwargs: bool | str | UUID | dict[str, str]) -> Endpoint | None:
-        stmt = (
-            select(Endpoint)
-            .where(
-                Endpoint.latest.__eq__(True),
-                Endpoint.deleted.__eq__(False),
-            )
-            .filter_by(**kwargs)
-        )
+    def get_one(self, at: datetime | None = None, **kwargs: bool | str | UUID | dict[str, str]) -> Endpoint | None:
+        """
+        Returns the current version, or with at the version that was current at that instant
+        """
+        stmt = select(Endpoint).where(*current_at(Endpoint, at)).filter_by(**kwargs)
         return self.db_session.session.execute(stmt).scalars().first()
 
     def get(self, **kwargs: bool | str | UUID | dict[str, str] | int) -> Endpoint | None:
@@ -39,34 +35,54 @@ class EndpointsRepository(RepositoryBase):
         stmt = select(Endpoint).filter_by(**kwargs)
         return self.db_session.session.execute(stmt).scalars().all()
 
-    def find(self, **conditions: bool | str | UUID | dict[str, Any] | datetime | None) -> Sequence[Endpoint]:
+    def find(
+        self, **conditions: bool | str | UUID | dict[str, Any] | datetime | Page | list[str] | None
+    ) -> Sequence[Endpoint]:
+        stmt = self.find_statement(**conditions)
+        elements = conditions.get("elements")
+        if not isinstance(elements, list):
+            elements = None
+
+        page = conditions.get("page")
+        if isinstance(page, Page):
+            stmt = page.apply(stmt, Endpoint.fhir_id)
+            return page.collect(self.fetch(stmt, Endpoint, elements))
+
+        return self.fetch(stmt, Endpoint, elements)
+
+    def stream(self, **conditions: bool | str | UUID | dict[str, Any] | datetime | Page | None) -> Iterator[Endpoint]:
+        """
+        Yields the matching rows in batches from a server-side cursor, so large (history) results never have
+        to be held in memory at once.
+        """
+        stmt = self.find_statement(**conditions).execution_options(yield_per=STREAM_BATCH_SIZE)
+        yield from self.db_session.session.execute(stmt).scalars()
+
+    def find_statement(
+        self, **conditions: bool | str | UUID | dict[str, Any] | datetime | Page | list[str] | None
+    ) -> Any:
         stmt = select(Endpoint)
         filter_conditions: list[Any] = []
 
-        if "latest" in conditions and conditions["latest"] is True:
-            filter_conditions.append(Endpoint.latest)
-            filter_conditions.append(Endpoint.deleted.__eq__(False))
+        if conditions.get("latest") is True or "at" in conditions:
+            # The current versions, or the versions that were current at the instant of _at
+            filter_conditions.extend(current_at(Endpoint, conditions.get("at")))
 
         if "id" in conditions:
             filter_conditions.append(Endpoint.fhir_id == conditions["id"])
 
         if "connectionType" in conditions:
-            filter_conditions.append(Endpoint.data["connectionType"]["code"].astext == conditions["connectionType"])
+            filter_conditions.append(Endpoint.connection_type == conditions["connectionType"])
 
         if "identifier" in conditions:
-            stmt = stmt.select_from(
-                Endpoint,
-                func.jsonb_array_elements(Endpoint.data["identifier"]).alias("identifier"),
-            ).where(literal_column("identifier->>'value'") == conditions["identifier"])
+            filter_conditions.append(Endpoint.identifiers.contains([{"value": conditions["identifier"]}]))
 
         if "name" in conditions:
             filter_conditions.append(Endpoint.data["name"].astext.like(f"%{conditions['name']}%"))
 
         if "managingOrganization" in conditions:
             ref_id = str(conditions["managingOrganization"])
-            filter_conditions.append(
-                Endpoint.data["managingOrganization"]["reference"].astext == f"Organization/{ref_id}"
-            )
+            filter_conditions.append(Endpoint.managing_organization_reference == f"Organization/{ref_id}")
 
         if "payloadType" in conditions:
             stmt = (
@@ -84,45 +100,32 @@ class EndpointsRepository(RepositoryBase):
             )
 
         if "status" in conditions:
-            filter_conditions.append(Endpoint.data["status"].astext == conditions["status"])
+            filter_conditions.append(Endpoint.status == conditions["status"])
 
         if "sort_history" in conditions and conditions["sort_history"] is True:
             # sorted with oldest versions last
-            stmt = stmt.order_by(
-                cast(
-                    Endpoint.data["meta"]["lastUpdated"].astext,
-                    TIMESTAMP(timezone=True),
-                ).desc(),
-                Endpoint.version.desc(),
-            )
+            stmt = stmt.order_by(Endpoint.last_updated.desc(), Endpoint.version.desc())
 
         if "since" in conditions:
-            filter_conditions.append(
-                cast(
-                    Endpoint.data["meta"]["lastUpdated"].astext,
-                    TIMESTAMP(timezone=True),
-                )
-                >= conditions["since"]
-            )
+            filter_conditions.append(Endpoint.last_updated >= conditions["since"])
 
-        stmt = stmt.where(*filter_conditions)
-
-        return self.db_session.session.execute(stmt).scalars().all()
+        return stmt.where(*filter_conditions)
 
     def create(self, endpoint: Endpoint) -> Endpoint:
         try:
             entry = update_resource_meta(endpoint, method="create")
             self.db_session.add(entry)
+            self.notify(entry)
             self.db_session.commit()
+            self.db_session.invalidate(entry)
             return entry
         except DatabaseError as e:
             self.db_session.rollback()
             logging.error(f"Failed to add Endpoint {endpoint.id}: {e}")
             raise e
 
-    def delete(self, endpoint: Endpoint) -> None:
+    def delete(self, endpoint: Endpoint, version: int | None = None) -> None:
         try:
-            self._update_entry_latest(endpoint)
             updated_endpoint = Endpoint(
                 fhir_id=endpoint.fhir_id,
                 version=endpoint.version,
@@ -130,34 +133,30 @@ class EndpointsRepository(RepositoryBase):
             )
             entry = update_resource_meta(updated_endpoint, method="delete")
 
-            self.db_session.add(entry)
+            entry = self.write_version(endpoint, entry, version)
             self.db_session.commit()
+
+            self.db_session.invalidate(entry)
         except DatabaseError as e:
             self.db_session.rollback()
             logging.error(f"Failed to delete Endpoint {endpoint.id}: {e}")
             raise e
 
-    def update(self, endpoint: Endpoint, fhir_data: Dict[str, Any]) -> Endpoint:
+    def update(self, endpoint: Endpoint, fhir_data: Dict[str, Any], version: int | None = None) -> Endpoint:
         try:
-            self._update_entry_latest(endpoint)
             updated_endpoint = Endpoint(
                 fhir_id=endpoint.fhir_id,
                 version=endpoint.version,
-                data=jsonable_encoder(fhir_data),
+                data=fhir_data,
             )
             entry = update_resource_meta(updated_endpoint, method="update")
 
-            self.db_session.add(entry)
+            entry = self.write_version(endpoint, entry, version)
             self.db_session.commit()
-            return updated_endpoint
+
+            self.db_session.invalidate(entry)
+            return entry
         except DatabaseError as e:
             self.db_session.rollback()
             logging.error(f"Failed to update Endpoint {endpoint.id}: {e}")
             raise e
-
-    def _update_entry_latest(self, endpoint: Endpoint) -> None:
-        (
-            self.db_session.query(Endpoint)
-            .filter(Endpoint.fhir_id == endpoint.fhir_id, Endpoint.latest)
-            .update({Endpoint.latest: False})
-        )
@@ -1,16 +1,15 @@
 import logging
-from datetime import UTC, datetime
-from typing import Any, Dict, Sequence
+from datetime import datetime
+from typing import Any, Dict, Iterator, Sequence
 from uuid import UUID
 
-from fastapi.encoders import jsonable_encoder
-from sqlalchemy import TIMESTAMP, Boolean, cast, func, select
-from sqlalchemy.dialects.postgresql import JSONPATH
+from sqlalchemy import select
 from sqlalchemy.exc import DatabaseError
 
 from app.db.decorator import repository
 from app.db.entities.healthcare_service.healthcare_service import HealthcareService
-from app.db.repositories.repository_base import RepositoryBase
+from app.db.repositories.repository_base import STREAM_BATCH_SIZE, RepositoryBase, current_at
+from app.params.pagination import Page
 from app.services.utils import update_resource_meta
 
 logger = logging.getLogger(__name__)
@@ -18,15 +17,13 @@ logger = logging.getLogger(__name__)
 
 @repository(HealthcareService)
 class HealthcareServiceRepository(RepositoryBase):
-    def get_one(self, **kwargs: bool | str | UUID | dict[str, str]) -> HealthcareService | None:
-        stmt = (
-            select(HealthcareService)
-            .where(
-                HealthcareService.latest.__eq__(True),
-                HealthcareService.deleted.__eq__(False),
-            )
-            .filter_by(**kwargs)
-        )
+    def get_one(
+        self, at: datetime | None = None, **kwargs: bool | str | UUID | dict[str, str]
+    ) -> HealthcareService | None:
+        """
+        Returns the current version, or with at the version that was current at that instant
+        """
+        stmt = select(HealthcareService).where(*current_at(HealthcareService, at)).filter_by(**kwargs)
         return self.db_session.session.execute(stmt).scalars().first()
 
     def get(self, **kwargs: bool | str | UUID | dict[str, str] | int) -> HealthcareService | None:
@@ -42,120 +39,125 @@ class HealthcareServiceRepository(RepositoryBase):
 
     def find(
         self,
-        **conditions: bool | str | UUID | dict[str, Any] | None,
+        **conditions: bool | str | UUID | dict[str, Any] | datetime | Page | list[str] | None,
     ) -> Sequence[HealthcareService]:
+        stmt = self.find_statement(**conditions)
+        elements = conditions.get("elements")
+        if not isinstance(elements, list):
+            elements = None
+
+        page = conditions.get("page")
+        if isinstance(page, Page):
+            stmt = page.apply(stmt, HealthcareService.fhir_id)
+            return page.collect(self.fetch(stmt, HealthcareService, elements))
+
+        return self.fetch(stmt, HealthcareService, elements)
+
+    def stream(
+        self,
+        **conditions: bool | str | UUID | dict[str, Any] | datetime | Page | None,
+    ) -> Iterator[HealthcareService]:
+        """
+        Yields the matching rows in batches from a server-side cursor, so large (history) results never have
+        to be held in memory at once.
+        """
+        stmt = self.find_statement(**conditions).execution_options(yield_per=STREAM_BATCH_SIZE)
+        yield from self.db_session.session.execute(stmt).scalars()
+
+    def find_statement(
+        self,
+        **conditions: bool | str | UUID | dict[str, Any] | datetime | Page | list[str] | None,
+    ) -> Any:
         stmt = select(HealthcareService)
         filter_conditions: list[Any] = []
 
         conditions = {k: v for k, v in conditions.items() if v is not None}
 
-        if "latest" in conditions and conditions["latest"] is True:
-            filter_conditions.append(HealthcareService.latest)
-            filter_conditions.append(HealthcareService.deleted.is_(False))
+        if conditions.get("latest") is True or "at" in conditions:
+            # The current versions, or the versions that were current at the instant of _at
+            filter_conditions.extend(current_at(HealthcareService, conditions.get("at")))
 
         if "id" in conditions:
             filter_conditions.append(HealthcareService.fhir_id == conditions["id"])
 
         if "active" in conditions:
-            filter_conditions.append(HealthcareService.data["active"].astext.cast(Boolean) == conditions["active"])
+            filter_conditions.append(HealthcareService.active == conditions["active"])
 
         if "organization" in conditions:
             filter_conditions.append(
-                HealthcareService.data["providedBy"]["reference"].astext
-                == "Organization/" + str(conditions["organization"])
+                HealthcareService.provided_by_reference == "Organization/" + str(conditions["organization"])
             )
 
         if "service_type" in conditions:
-            json_path = cast("$.type[*].coding[*] ? (@.code == $code)", JSONPATH)
-            vars = func.jsonb_build_object("code", conditions["service_type"])
-            filter_conditions.append(func.jsonb_path_exists(HealthcareService.data, json_path, vars))
+            filter_conditions.append(
+                HealthcareService.types.contains([{"coding": [{"code": conditions["service_type"]}]}])
+            )
 
         if "location" in conditions:
-            json_path = cast("$.location[*] ? (@.reference == $location_ref)", JSONPATH)
-            vars = func.jsonb_build_object("location_ref", "Location/" + str(conditions["location"]))
-            filter_conditions.append(func.jsonb_path_exists(HealthcareService.data, json_path, vars))
+            filter_conditions.append(
+                HealthcareService.location_references.contains(
+                    [{"reference": "Location/" + str(conditions["location"])}]
+                )
+            )
 
         if "name" in conditions:
             filter_conditions.append(HealthcareService.data["name"].astext.like(f"%{conditions['name']}%"))
 
         if "sort_history" in conditions and conditions["sort_history"] is True:
             # sorted with oldest versions last
-            stmt = stmt.order_by(
-                cast(
-                    HealthcareService.data["meta"]["lastUpdated"].astext,
-                    TIMESTAMP(timezone=True),
-                ).desc(),
-                HealthcareService.version.desc(),
-            )
+            stmt = stmt.order_by(HealthcareService.last_updated.desc(), HealthcareService.version.desc())
 
         if "since" in conditions:
-            filter_conditions.append(
-                cast(
-                    HealthcareService.data["meta"]["lastUpdated"].astext,
-                    TIMESTAMP(timezone=True),
-                )
-                >= conditions["since"]
-            )
+            filter_conditions.append(HealthcareService.last_updated >= conditions["since"])
 
-        stmt = stmt.where(*filter_conditions)
-        return self.db_session.session.execute(stmt).scalars().all()
+        return stmt.where(*filter_conditions)
 
     def create(self, healthcare_service: HealthcareService) -> HealthcareService:
         try:
             entry = update_resource_meta(healthcare_service, method="create")
             self.db_session.add(entry)
+            self.notify(entry)
             self.db_session.commit()
+            self.db_session.invalidate(entry)
         except DatabaseError as e:
             self.db_session.rollback()
             logging.error(f"Failed to add healthcare_service {healthcare_service.id}: {e}")
             raise e
         return healthcare_service
 
-    def delete(self, healthcare_service: HealthcareService) -> None:
+    def delete(self, healthcare_service: HealthcareService, version: int | None = None) -> None:
         try:
-            self._update_entry_latest(healthcare_service)
             updated_healthcare_service = HealthcareService(
                 fhir_id=healthcare_service.fhir_id,
                 data=None,
                 version=healthcare_service.version,
             )
             entry = update_resource_meta(updated_healthcare_service, method="delete")
-            self.db_session.add(entry)
+            entry = self.write_version(healthcare_service, entry, version)
             self.db_session.commit()
+            self.db_session.invalidate(entry)
         except DatabaseError as e:
             self.db_session.rollback()
             logging.error(f"Failed to delete healthcare_service {healthcare_service.id}: {e}")
             raise e
 
-    def update(self, healthcare_service: HealthcareService, fhir_data: Dict[str, Any]) -> HealthcareService:
+    def update(
+        self, healthcare_service: HealthcareService, fhir_data: Dict[str, Any], version: int | None = None
+    ) -> HealthcareService:
         try:
-            self._update_entry_latest(healthcare_service)
             entity = HealthcareService(
                 fhir_id=healthcare_service.fhir_id,
-                data=jsonable_encoder(fhir_data),
+                data=fhir_data,
                 version=healthcare_service.version,
             )
             entry = update_resource_meta(entity, method="update")
 
-            # Explicitly set the created_at / modified_at as transactions will use the same timestamp for all
-            # records within the same transaction
-            entry.created_at = datetime.now(UTC)
-            entry.modified_at = datetime.now(UTC)
-
-            self.db_session.add(entry)
+            entry = self.write_version(healthcare_service, entry, version)
             self.db_session.commit()
+
+            self.db_session.invalidate(entry)
             return entry
         except DatabaseError as e:
             self.db_session.rollback()
             logging.error(f"Failed to update healthcare_service {healthcare_service.id}: {e}")
             raise e
-
-    def _update_entry_latest(self, healthcare_service: HealthcareService) -> None:
-        (
-            self.db_session.query(HealthcareService)
-            .filter(
-                HealthcareService.fhir_id == healthcare_service.fhir_id,
-                HealthcareService.latest,
-            )
-            .update({HealthcareService.latest: False})
-        )
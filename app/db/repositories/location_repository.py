@@ -1,15 +1,15 @@
 import logging
-from datetime import UTC, datetime
-from typing import Any, Dict, Sequence
+from datetime import datetime
+from typing import Any, Dict, Iterator, Sequence
 from uuid import UUID
 
-from fastapi.encoders import jsonable_encoder
-from sqlalchemy import TIMESTAMP, cast, select
+from sqlalchemy import select
 from sqlalchemy.exc import DatabaseError
 
 from app.db.decorator import repository
 from app.db.entities.location.location import Location
-from app.db.repositories.repository_base import RepositoryBase
+from app.db.repositories.repository_base import STREAM_BATCH_SIZE, RepositoryBase, current_at
+from app.params.pagination import Page
 from app.services.utils import update_resource_meta
 
 logger = logging.getLogger(__name__)
@@ -17,8 +17,11 @@ logger = logging.getLogger(__name__)
 
 @repository(Location)
 class LocationRepository(RepositoryBase):
-    def get_one(self, **kwargs: bool | str | UUID | dict[str, str]) -> Location | None:
-        stmt = select(Location).where(Location.latest.__eq__(True), Location.deleted.__eq__(False)).filter_by(**kwargs)
+    def get_one(self, at: datetime | None = None, **kwargs: bool | str | UUID | dict[str, str]) -> Location | None:
+        """
+        Returns the current version, or with at the version that was current at that instant
+        """
+        stmt = select(Location).where(*current_at(Location, at)).filter_by(**kwargs)
         return self.db_session.session.execute(stmt).scalars().first()
 
     def get(self, **kwargs: bool | str | UUID | dict[str, str] | int) -> Location | None:
@@ -34,112 +37,121 @@ class LocationRepository(RepositoryBase):
 
     def find(
         self,
-        **conditions: bool | str | UUID | dict[str, Any] | datetime | None,
+        **conditions: bool | str | UUID | dict[str, Any] | datetime | Page | list[str] | None,
     ) -> Sequence[Location]:
+        stmt = self.find_statement(**conditions)
+        elements = conditions.get("elements")
+        if not isinstance(elements, list):
+            elements = None
+
+        page = conditions.get("page")
+        if isinstance(page, Page):
+            stmt = page.apply(stmt, Location.fhir_id)
+            return page.collect(self.fetch(stmt, Location, elements))
+
+        return self.fetch(stmt, Location, elements)
+
+    def stream(
+        self,
+        **conditions: bool | str | UUID | dict[str, Any] | datetime | Page | None,
+    ) -> Iterator[Location]:
+        """
+        Yields the matching rows in batches from a server-side cursor, so large (history) results never have
+        to be held in memory at once.
+        """
+        stmt = self.find_statement(**conditions).execution_options(yield_per=STREAM_BATCH_SIZE)
+        yield from self.db_session.session.execute(stmt).scalars()
+
+    def find_statement(
+        self,
+        **conditions: bool | str | UUID | dict[str, Any] | datetime | Page | list[str] | None,
+    ) -> Any:
         stmt = select(Location)
         filter_conditions: list[Any] = []
 
         conditions = {k: v for k, v in conditions.items() if v is not None}
 
-        if "latest" in conditions and conditions["latest"] is True:
-            filter_conditions.append(Location.latest)
-            filter_conditions.append(Location.deleted.is_(False))
+        if conditions.get("latest") is True or "at" in conditions:
+            # The current versions, or the versions that were current at the instant of _at
+            filter_conditions.extend(current_at(Location, conditions.get("at")))
 
         if "id" in conditions and conditions["id"] is not None:
             # Filter on our internal UUID id
             filter_conditions.append(Location.fhir_id == conditions["id"])
 
         if "name" in conditions and conditions["id"] is not None:
-            filter_conditions.append(Location.data["name"].astext == conditions["name"])
+            filter_conditions.append(Location.name == conditions["name"])
 
         if "managing_organization" in conditions and conditions["managing_organization"] is not None:
             filter_conditions.append(
-                Location.data["managingOrganization"]["reference"].astext
-                == "Organization/" + str(conditions["managing_organization"])
+                Location.managing_organization_reference == "Organization/" + str(conditions["managing_organization"])
             )
 
         if "part_of" in conditions and conditions["part_of"] is not None:
-            filter_conditions.append(
-                Location.data["partOf"]["reference"].astext == "Location/" + str(conditions["part_of"])
-            )
+            filter_conditions.append(Location.part_of_reference == "Location/" + str(conditions["part_of"]))
 
         if "status" in conditions and conditions["status"] is not None:
-            filter_conditions.append(Location.data["status"].astext == conditions["status"])
+            filter_conditions.append(Location.status == conditions["status"])
 
         if "type" in conditions and conditions["type"] is not None:
-            filter_conditions.append(Location.data["type"].astext == conditions["type"])
+            filter_conditions.append(Location.type == conditions["type"])
 
         if "date" in conditions and conditions["date"] is not None:
             filter_conditions.append(Location.created_at >= conditions["date"])
 
         if "sort_history" in conditions and conditions["sort_history"] is True:
             # sorted with oldest versions last
-            stmt = stmt.order_by(
-                cast(Location.data["meta"]["lastUpdated"].astext, TIMESTAMP(timezone=True)).desc(),
-                Location.version.desc(),
-            )
+            stmt = stmt.order_by(Location.last_updated.desc(), Location.version.desc())
 
         if "since" in conditions:
-            filter_conditions.append(
-                cast(Location.data["meta"]["lastUpdated"].astext, TIMESTAMP(timezone=True)) >= conditions["since"]
-            )
+            filter_conditions.append(Location.last_updated >= conditions["since"])
 
-        stmt = stmt.where(*filter_conditions)
-        return self.db_session.session.execute(stmt).scalars().all()
+        return stmt.where(*filter_conditions)
 
     def create(self, location: Location) -> Location:
         try:
             entry = update_resource_meta(location, method="create")
             self.db_session.add(entry)
+            self.notify(entry)
             self.db_session.commit()
+            self.db_session.invalidate(entry)
         except DatabaseError as e:
             self.db_session.rollback()
             logging.error(f"Failed to add location {location.id}: {e}")
             raise e
         return location
 
-    def delete(self, location: Location) -> None:
+    def delete(self, location: Location, version: int | None = None) -> None:
         try:
-            self._update_entry_latest(location)
             updated_location = Location(
                 fhir_id=location.fhir_id,
                 data=None,
                 version=location.version,
             )
             entry = update_resource_meta(updated_location, method="delete")
-            self.db_session.add(entry)
+            entry = self.write_version(location, entry, version)
             self.db_session.commit()
+            self.db_session.invalidate(entry)
         except DatabaseError as e:
             self.db_session.rollback()
             logging.error(f"Failed to delete location {location.id}: {e}")
             raise e
 
-    def update(self, location: Location, fhir_data: Dict[str, Any]) -> Location:
+    def update(self, location: Location, fhir_data: Dict[str, Any], version: int | None = None) -> Location:
         try:
-            self._update_entry_latest(location)
             entity = Location(
                 fhir_id=location.fhir_id,
-                data=jsonable_encoder(fhir_data),
+                data=fhir_data,
                 version=location.version,
             )
             entry = update_resource_meta(entity, method="update")
 
-            # Explicitly set the created_at / modified_at as transactions will use the same timestamp for all
-            # records within the same transaction
-            entry.created_at = datetime.now(UTC)
-            entry.modified_at = datetime.now(UTC)
-
-            self.db_session.add(entry)
+            entry = self.write_version(location, entry, version)
             self.db_session.commit()
+
+            self.db_session.invalidate(entry)
             return entry
         except DatabaseError as e:
             self.db_session.rollback()
             logging.error(f"Failed to update location {location.id}: {e}")
             raise e
-
-    def _update_entry_latest(self, location: Location) -> None:
-        (
-            self.db_session.query(Location)
-            .filter(Location.fhir_id == location.fhir_id, Location.latest)
-            .update({Location.latest: False})
-        )
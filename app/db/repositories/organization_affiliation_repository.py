@@ -1,17 +1,17 @@
 import logging
-from datetime import UTC, datetime
-from typing import Any, Dict, List, Sequence
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Sequence
 from uuid import UUID
 
-from fastapi.encoders import jsonable_encoder
-from sqlalchemy import TIMESTAMP, Boolean, cast, select
+from sqlalchemy import select
 from sqlalchemy.exc import DatabaseError
 
 from app.db.decorator import repository
 from app.db.entities.organization_affiliation.organization_affiliation import (
     OrganizationAffiliation,
 )
-from app.db.repositories.repository_base import RepositoryBase
+from app.db.repositories.repository_base import STREAM_BATCH_SIZE, RepositoryBase, current_at
+from app.params.pagination import Page
 from app.services.utils import update_resource_meta
 
 logger = logging.getLogger(__name__)
@@ -31,15 +31,13 @@ def convert_specialty_to_code(specialty: str) -> List[str] | None:
 
 @repository(OrganizationAffiliation)
 class OrganizationAffiliationRepository(RepositoryBase):
-    def get_one(self, **kwargs: bool | str | UUID | dict[str, str]) -> OrganizationAffiliation | None:
-        stmt = (
-            select(OrganizationAffiliation)
-            .where(
-                OrganizationAffiliation.latest.__eq__(True),
-                OrganizationAffiliation.deleted.__eq__(False),
-            )
-            .filter_by(**kwargs)
-        )
+    def get_one(
+        self, at: datetime | None = None, **kwargs: bool | str | UUID | dict[str, str]
+    ) -> OrganizationAffiliation | None:
+        """
+        Returns the current version, or with at the version that was current at that instant
+        """
+        stmt = select(OrganizationAffiliation).where(*current_at(OrganizationAffiliation, at)).filter_by(**kwargs)
         return self.db_session.session.execute(stmt).scalars().first()
 
     def get(self, **kwargs: bool | str | UUID | dict[str, str] | int) -> OrganizationAffiliation | None:
@@ -55,99 +53,113 @@ class OrganizationAffiliationRepository(RepositoryBase):
 
     def find(
         self,
-        **conditions: bool | str | UUID | dict[str, Any] | datetime | None,
+        **conditions: bool | str | UUID | dict[str, Any] | datetime | Page | list[str] | None,
     ) -> Sequence[OrganizationAffiliation]:
+        stmt = self.find_statement(**conditions)
+        elements = conditions.get("elements")
+        if not isinstance(elements, list):
+            elements = None
+
+        page = conditions.get("page")
+        if isinstance(page, Page):
+            stmt = page.apply(stmt, OrganizationAffiliation.fhir_id)
+            return page.collect(self.fetch(stmt, OrganizationAffiliation, elements))
+
+        return self.fetch(stmt, OrganizationAffiliation, elements)
+
+    def stream(
+        self,
+        **conditions: bool | str | UUID | dict[str, Any] | datetime | Page | None,
+    ) -> Iterator[OrganizationAffiliation]:
+        """
+        Yields the matching rows in batches from a server-side cursor, so large (history) results never have
+        to be held in memory at once.
+        """
+        stmt = self.find_statement(**conditions).execution_options(yield_per=STREAM_BATCH_SIZE)
+        yield from self.db_session.session.execute(stmt).scalars()
+
+    def find_statement(
+        self,
+        **conditions: bool | str | UUID | dict[str, Any] | datetime | Page | list[str] | None,
+    ) -> Any:
         stmt = select(OrganizationAffiliation)
         filter_conditions: list[Any] = []
 
         conditions = {k: v for k, v in conditions.items() if v is not None}
 
-        if "latest" in conditions and conditions["latest"] is True:
-            filter_conditions.append(OrganizationAffiliation.latest)
-            filter_conditions.append(OrganizationAffiliation.deleted.is_(False))
+        if conditions.get("latest") is True or "at" in conditions:
+            # The current versions, or the versions that were current at the instant of _at
+            filter_conditions.extend(current_at(OrganizationAffiliation, conditions.get("at")))
 
         if "id" in conditions and conditions["id"] is not None:
             # Filter on our internal UUID id
             filter_conditions.append(OrganizationAffiliation.fhir_id == conditions["id"])
 
         if "active" in conditions and conditions["active"] is not None:
-            filter_conditions.append(
-                OrganizationAffiliation.data["active"].astext.cast(Boolean) == conditions["active"]
-            )
+            filter_conditions.append(OrganizationAffiliation.active == conditions["active"])
 
         if "date" in conditions and conditions["date"] is not None:
             filter_conditions.append(OrganizationAffiliation.created_at >= conditions["date"])
 
         if "participating_organization" in conditions and conditions["participating_organization"] is not None:
             filter_conditions.append(
-                OrganizationAffiliation.data["participatingOrganization"]["reference"].astext
+                OrganizationAffiliation.participating_organization_reference
                 == "Organization/" + str(conditions["participating_organization"])
             )
 
         if "primary_organization" in conditions and conditions["primary_organization"] is not None:
             filter_conditions.append(
-                OrganizationAffiliation.data["organization"]["reference"].astext
+                OrganizationAffiliation.organization_reference
                 == "Organization/" + str(conditions["primary_organization"])
             )
 
         if "role" in conditions and conditions["role"] is not None:
             filter_conditions.append(
-                OrganizationAffiliation.data["code"].contains([{"coding": [{"code": conditions["role"]}]}])
+                OrganizationAffiliation.codes.contains([{"coding": [{"code": conditions["role"]}]}])
             )
 
         if "specialty" in conditions and conditions["specialty"] is not None:
             coding = convert_specialty_to_code(str(conditions["specialty"]))
             if coding:
                 filter_conditions.append(
-                    OrganizationAffiliation.data["specialty"].contains(
+                    OrganizationAffiliation.specialties.contains(
                         [{"coding": [{"system": coding[0]}, {"code": coding[1]}]}]
                     )
                 )
 
         if "sort_history" in conditions and conditions["sort_history"] is True:
             # sorted with oldest versions last
-            stmt = stmt.order_by(
-                cast(
-                    OrganizationAffiliation.data["meta"]["lastUpdated"].astext,
-                    TIMESTAMP(timezone=True),
-                ).desc(),
-                OrganizationAffiliation.version.desc(),
-            )
+            stmt = stmt.order_by(OrganizationAffiliation.last_updated.desc(), OrganizationAffiliation.version.desc())
 
         if "since" in conditions:
-            filter_conditions.append(
-                cast(
-                    OrganizationAffiliation.data["meta"]["lastUpdated"].astext,
-                    TIMESTAMP(timezone=True),
-                )
-                >= conditions["since"]
-            )
+            filter_conditions.append(OrganizationAffiliation.last_updated >= conditions["since"])
 
-        stmt = stmt.where(*filter_conditions)
-        return self.db_session.session.execute(stmt).scalars().all()
+        return stmt.where(*filter_conditions)
 
     def create(self, organization_affiliation: OrganizationAffiliation) -> OrganizationAffiliation:
         try:
             entry = update_resource_meta(organization_affiliation, method="create")
             self.db_session.add(entry)
+            self.notify(entry)
             self.db_session.commit()
+            self.db_session.invalidate(entry)
         except DatabaseError as e:
             self.db_session.rollback()
             logging.error(f"Failed to add organization_affiliation {organization_affiliation.id}: {e}")
             raise e
         return organization_affiliation
 
-    def delete(self, organization_affiliation: OrganizationAffiliation) -> None:
+    def delete(self, organization_affiliation: OrganizationAffiliation, version: int | None = None) -> None:
         try:
-            self._update_entry_latest(organization_affiliation)
             updated_organization_affiliation = OrganizationAffiliation(
                 fhir_id=organization_affiliation.fhir_id,
                 data=None,
                 version=organization_affiliation.version,
             )
             entry = update_resource_meta(updated_organization_affiliation, method="delete")
-            self.db_session.add(entry)
+            entry = self.write_version(organization_affiliation, entry, version)
             self.db_session.commit()
+            self.db_session.invalidate(entry)
         except DatabaseError as e:
             self.db_session.rollback()
             logging.error(f"Failed to delete organization_affiliation {organization_affiliation.id}: {e}")
@@ -157,35 +169,22 @@ class OrganizationAffiliationRepository(RepositoryBase):
         self,
         organization_affiliation: OrganizationAffiliation,
         fhir_data: Dict[str, Any],
+        version: int | None = None,
     ) -> OrganizationAffiliation:
         try:
-            self._update_entry_latest(organization_affiliation)
             entity = OrganizationAffiliation(
                 fhir_id=organization_affiliation.fhir_id,
-                data=jsonable_encoder(fhir_data),
+                data=fhir_data,
                 version=organization_affiliation.version,
             )
             entry = update_resource_meta(entity, method="update")
 
-            # Explicitly set the created_at / modified_at as transactions will use the same timestamp for all
-            # records within the same transaction
-            entry.created_at = datetime.now(UTC)
-            entry.modified_at = datetime.now(UTC)
-
-            self.db_session.add(entry)
+            entry = self.write_version(organization_affiliation, entry, version)
             self.db_session.commit()
+
+            self.db_session.invalidate(entry)
             return entry
         except DatabaseError as e:
             self.db_session.rollback()
             logging.error(f"Failed to update organization_affiliation {organization_affiliation.id}: {e}")
             raise e
-
-    def _update_entry_latest(self, organization_affiliation: OrganizationAffiliation) -> None:
-        (
-            self.db_session.query(OrganizationAffiliation)
-            .filter(
-                OrganizationAffiliation.fhir_id == organization_affiliation.fhir_id,
-                OrganizationAffiliation.latest,
-            )
-            .update({OrganizationAffiliation.latest: False})
-        )
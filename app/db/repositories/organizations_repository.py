@@ -1,15 +1,15 @@
 import logging
 from datetime import datetime
-from typing import Any, Dict, Sequence
+from typing import Any, Dict, Iterator, Sequence
 from uuid import UUID
 
-from fastapi.encoders import jsonable_encoder
-from sqlalchemy import TIMESTAMP, Boolean, cast, func, literal_column, or_, select
+from sqlalchemy import func, literal_column, or_, select
 from sqlalchemy.exc import DatabaseError
 
 from app.db.decorator import repository
 from app.db.entities.organization.organization import Organization
-from app.db.repositories.repository_base import RepositoryBase
+from app.db.repositories.repository_base import STREAM_BATCH_SIZE, RepositoryBase, current_at
+from app.params.pagination import Page
 from app.services.utils import update_resource_meta
 
 logger = logging.getLogger(__name__)
@@ -17,12 +17,11 @@ logger = logging.getLogger(__name__)
 
 @repository(Organization)
 class OrganizationsRepository(RepositoryBase):
-    def get_one(self, **kwargs: bool | str | UUID | dict[str, str]) -> Organization | None:
-        stmt = (
-            select(Organization)
-            .where(Organization.latest.__eq__(True), Organization.deleted.__eq__(False))
-            .filter_by(**kwargs)
-        )
+    def get_one(self, at: datetime | None = None, **kwargs: bool | str | UUID | dict[str, str]) -> Organization | None:
+        """
+        Returns the current version, or with at the version that was current at that instant
+        """
+        stmt = select(Organization).where(*current_at(Organization, at)).filter_by(**kwargs)
         return self.db_session.session.execute(stmt).scalars().first()
 
     def get(self, **kwargs: bool | str | UUID | dict[str, str] | int) -> Organization | None:
@@ -36,7 +35,34 @@ class OrganizationsRepository(RepositoryBase):
         stmt = select(Organization).filter_by(**kwargs)
         return self.db_session.session.execute(stmt).scalars().all()
 
-    def find(self, **conditions: bool | str | UUID | dict[str, Any] | None | datetime) -> Sequence[Organization]:
+    def find(
+        self, **conditions: bool | str | UUID | dict[str, Any] | Page | list[str] | None | datetime
+    ) -> Sequence[Organization]:
+        stmt = self.find_statement(**conditions)
+        elements = conditions.get("elements")
+        if not isinstance(elements, list):
+            elements = None
+
+        page = conditions.get("page")
+        if isinstance(page, Page):
+            stmt = page.apply(stmt, Organization.fhir_id)
+            return page.collect(self.fetch(stmt, Organization, elements))
+
+        return self.fetch(stmt, Organization, elements)
+
+    def stream(
+        self, **conditions: bool | str | UUID | dict[str, Any] | Page | None | datetime
+    ) -> Iterator[Organization]:
+        """
+        Yields the matching rows in batches from a server-side cursor, so large (history) results never have
+        to be held in memory at once.
+        """
+        stmt = self.find_statement(**conditions).execution_options(yield_per=STREAM_BATCH_SIZE)
+        yield from self.db_session.session.execute(stmt).scalars()
+
+    def find_statement(
+        self, **conditions: bool | str | UUID | dict[str, Any] | Page | list[str] | None | datetime
+    ) -> Any:
         stmt = select(Organization)
         filter_conditions: list[Any] = []
 
@@ -44,64 +70,48 @@ class OrganizationsRepository(RepositoryBase):
 
         stmt = self._add_address_filter_conditions(stmt, **conditions)
 
-        if "latest" in conditions and conditions["latest"] is True:
-            filter_conditions.append(Organization.latest)
-            filter_conditions.append(Organization.deleted.is_(False))
+        if conditions.get("latest") is True or "at" in conditions:
+            # The current versions, or the versions that were current at the instant of _at
+            filter_conditions.extend(current_at(Organization, conditions.get("at")))
 
         if "id" in conditions:
             filter_conditions.append(Organization.fhir_id == conditions["id"])
 
         if "active" in conditions:
-            filter_conditions.append(Organization.data["active"].astext.cast(Boolean) == conditions["active"])
+            filter_conditions.append(Organization.active == conditions["active"])
 
         if "endpoint" in conditions:
             ref_id = str(conditions["endpoint"])
-            filter_conditions.append(Organization.data["endpoint"].contains([{"reference": f"Endpoint/{ref_id}"}]))
+            filter_conditions.append(Organization.endpoint_references.contains([{"reference": f"Endpoint/{ref_id}"}]))
 
         if "identifier" in conditions:
-            stmt = stmt.select_from(
-                Organization,
-                func.jsonb_array_elements(Organization.data["identifier"]).alias("identifier"),
-            ).where(literal_column("identifier->>'value'") == conditions["identifier"])
+            filter_conditions.append(Organization.identifiers.contains([{"value": conditions["identifier"]}]))
 
         if "name" in conditions:
             filter_conditions.append(Organization.data["name"].astext.like(f"%{conditions['name']}%"))
 
         if "part_of" in conditions:
             ref_id = str(conditions["part_of"])
-            filter_conditions.append(Organization.data["partOf"]["reference"].astext == f"Organization/{ref_id}")
+            filter_conditions.append(Organization.part_of_reference == f"Organization/{ref_id}")
 
         if "phonetic" in conditions:
-            filter_conditions.append(Organization.data["name"]["phonetic"].astext == conditions["phonetic"])
+            filter_conditions.append(Organization.phonetic == conditions["phonetic"])
 
         if "type" in conditions:
-            filter_conditions.append(Organization.data["type"].astext == conditions["type"])
+            filter_conditions.append(Organization.type == conditions["type"])
 
         if "sort_history" in conditions and conditions["sort_history"] is True:
             # sorted with oldest versions last
-            stmt = stmt.order_by(
-                cast(
-                    Organization.data["meta"]["lastUpdated"].astext,
-                    TIMESTAMP(timezone=True),
-                ).desc(),
-                Organization.version.desc(),
-            )
+            stmt = stmt.order_by(Organization.last_updated.desc(), Organization.version.desc())
 
         if "since" in conditions:
-            filter_conditions.append(
-                cast(
-                    Organization.data["meta"]["lastUpdated"].astext,
-                    TIMESTAMP(timezone=True),
-                )
-                >= conditions["since"]
-            )
+            filter_conditions.append(Organization.last_updated >= conditions["since"])
 
-        stmt = stmt.where(*filter_conditions)
-        return self.db_session.session.execute(stmt).scalars().all()  # type: ignore
+        return stmt.where(*filter_conditions)
 
     @staticmethod
     def _add_address_filter_conditions(
-        stmt: Any, **conditions: bool | str | UUID | dict[str, Any] | datetime | None
+        stmt: Any, **conditions: bool | str | UUID | dict[str, Any] | Page | list[str] | datetime | None
     ) -> Any:
         if "address" in conditions:
             stmt = stmt.select_from(
@@ -120,50 +130,36 @@ class OrganizationsRepository(RepositoryBase):
             )
 
         if "address_city" in conditions:
-            stmt = stmt.select_from(
-                Organization,
-                func.jsonb_array_elements(Organization.data["address"]).alias("address"),
-            ).where(literal_column("address ->> 'city'") == conditions["address_city"])
+            stmt = stmt.where(Organization.addresses.contains([{"city": conditions["address_city"]}]))
 
         if "address_country" in conditions:
-            stmt = stmt.select_from(
-                Organization,
-                func.jsonb_array_elements(Organization.data["address"]).alias("address"),
-            ).where(literal_column("address ->> 'country'") == conditions["address_country"])
+            stmt = stmt.where(Organization.addresses.contains([{"country": conditions["address_country"]}]))
 
         if "address_postal_code" in conditions:
-            stmt = stmt.select_from(
-                Organization,
-                func.jsonb_array_elements(Organization.data["address"]).alias("address"),
-            ).where(literal_column("address ->> 'postalCode'") == conditions["address_postal_code"])
+            stmt = stmt.where(Organization.addresses.contains([{"postalCode": conditions["address_postal_code"]}]))
 
         if "address_state" in conditions:
-            stmt = stmt.select_from(
-                Organization,
-                func.jsonb_array_elements(Organization.data["address"]).alias("address"),
-            ).where(literal_column("address ->> 'state'") == conditions["address_state"])
+            stmt = stmt.where(Organization.addresses.contains([{"state": conditions["address_state"]}]))
 
         if "address_use" in conditions:
-            stmt = stmt.select_from(
-                Organization,
-                func.jsonb_array_elements(Organization.data["address"]).alias("address"),
-            ).where(literal_column("address ->> 'use'") == conditions["address_use"])
+            stmt = stmt.where(Organization.addresses.contains([{"use": conditions["address_use"]}]))
         return stmt
 
     def create(self, organization: Organization) -> Organization:
         try:
             entry = update_resource_meta(organization, method="create")
             self.db_session.add(entry)
+            self.notify(entry)
             self.db_session.commit()
+            self.db_session.invalidate(entry)
         except DatabaseError as e:
             self.db_session.rollback()
             logging.error(f"Failed to add organization {organization.id}: {e}")
             raise e
         return organization
 
-    def delete(self, organization: Organization) -> None:
+    def delete(self, organization: Organization, version: int | None = None) -> None:
         try:
-            self._update_entry_latest(organization)
             updated_organization = Organization(
                 fhir_id=organization.fhir_id,
                 ura_number=organization.ura_number,
@@ -171,34 +167,28 @@ class OrganizationsRepository(RepositoryBase):
                 version=organization.version,
             )
             entry = update_resource_meta(updated_organization, method="delete")
-            self.db_session.add(entry)
+            entry = self.write_version(organization, entry, version)
             self.db_session.commit()
+            self.db_session.invalidate(entry)
         except DatabaseError as e:
             self.db_session.rollback()
             logging.error(f"Failed to delete organization {organization.id}: {e}")
             raise e
 
-    def update(self, organization: Organization, fhir_data: Dict[str, Any]) -> Organization:
+    def update(self, organization: Organization, fhir_data: Dict[str, Any], version: int | None = None) -> Organization:
         try:
-            self._update_entry_latest(organization)
             target_org = Organization(
                 fhir_id=organization.fhir_id,
                 ura_number=organization.ura_number,
-                data=jsonable_encoder(fhir_data),
+                data=fhir_data,
                 version=organization.version,
             )
             entry = update_resource_meta(target_org, method="update")
-            self.db_session.add(entry)
+            entry = self.write_version(organization, entry, version)
             self.db_session.commit()
-            return target_org
+            self.db_session.invalidate(entry)
+            return entry
         except DatabaseError as e:
             self.db_session.rollback()
             logging.error(f"Failed to update organization {organization.id}: {e}")
             raise e
-
-    def _update_entry_latest(self, organization: Organization) -> None:
-        (
-            self.db_session.query(Organization)
-            .filter(Organization.fhir_id == organization.fhir_id, Organization.latest)
-            .update({Organization.latest: False})
-        )
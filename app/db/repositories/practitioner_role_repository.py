@@ -1,17 +1,17 @@
 import logging
-from datetime import UTC, datetime
-from typing import Any, Dict, Sequence
+from datetime import datetime
+from typing import Any, Dict, Iterator, Sequence
 from uuid import UUID
 
-from fastapi.encoders import jsonable_encoder
-from sqlalchemy import TIMESTAMP, Boolean, cast, select
+from sqlalchemy import select
 from sqlalchemy.exc import DatabaseError
 
 from app.db.decorator import repository
 from app.db.entities.practitioner_role.practitioner_role import (
     PractitionerRole,
 )
-from app.db.repositories.repository_base import RepositoryBase
+from app.db.repositories.repository_base import STREAM_BATCH_SIZE, RepositoryBase, current_at
+from app.params.pagination import Page
 from app.services.utils import update_resource_meta
 
 logger = logging.getLogger(__name__)
@@ -19,15 +19,13 @@ logger = logging.getLogger(__name__)
 
 @repository(PractitionerRole)
 class PractitionerRoleRepository(RepositoryBase):
-    def get_one(self, **kwargs: bool | str | UUID | dict[str, str]) -> PractitionerRole | None:
-        stmt = (
-            select(PractitionerRole)
-            .where(
-                PractitionerRole.latest.__eq__(True),
-                PractitionerRole.deleted.__eq__(False),
-            )
-            .filter_by(**kwargs)
-        )
+    def get_one(
+        self, at: datetime | None = None, **kwargs: bool | str | UUID | dict[str, str]
+    ) -> PractitionerRole | None:
+        """
+        Returns the current version, or with at the version that was current at that instant
+        """
+        stmt = select(PractitionerRole).where(*current_at(PractitionerRole, at)).filter_by(**kwargs)
         return self.db_session.session.execute(stmt).scalars().first()
 
     def get(self, **kwargs: bool | str | UUID | dict[str, str] | int) -> PractitionerRole | None:
@@ -43,104 +41,119 @@ class PractitionerRoleRepository(RepositoryBase):
 
     def find(
         self,
-        **conditions: bool | str | UUID | dict[str, Any] | datetime | None,
+        **conditions: bool | str | UUID | dict[str, Any] | datetime | Page | list[str] | None,
     ) -> Sequence[PractitionerRole]:
+        stmt = self.find_statement(**conditions)
+        elements = conditions.get("elements")
+        if not isinstance(elements, list):
+            elements = None
+
+        page = conditions.get("page")
+        if isinstance(page, Page):
+            stmt = page.apply(stmt, PractitionerRole.fhir_id)
+            return page.collect(self.fetch(stmt, PractitionerRole, elements))
+
+        return self.fetch(stmt, PractitionerRole, elements)
+
+    def stream(
+        self,
+        **conditions: bool | str | UUID | dict[str, Any] | datetime | Page | None,
+    ) -> Iterator[PractitionerRole]:
+        """
+        Yields the matching rows in batches from a server-side cursor, so large (history) results never have
+        to be held in memory at once.
+        """
+        stmt = self.find_statement(**conditions).execution_options(yield_per=STREAM_BATCH_SIZE)
+        yield from self.db_session.session.execute(stmt).scalars()
+
+    def find_statement(
+        self,
+        **conditions: bool | str | UUID | dict[str, Any] | datetime | Page | list[str] | None,
+    ) -> Any:
         stmt = select(PractitionerRole)
         filter_conditions: list[Any] = []
 
         conditions = {k: v for k, v in conditions.items() if v is not None}
 
-        if "latest" in conditions and conditions["latest"] is True:
-            filter_conditions.append(PractitionerRole.latest)
-            filter_conditions.append(PractitionerRole.deleted.is_(False))
+        if conditions.get("latest") is True or "at" in conditions:
+            # The current versions, or the versions that were current at the instant of _at
+            filter_conditions.extend(current_at(PractitionerRole, conditions.get("at")))
 
         if "id" in conditions and conditions["id"] is not None:
             # Filter on our internal UUID id
             filter_conditions.append(PractitionerRole.fhir_id == conditions["id"])
 
         if "active" in conditions and conditions["active"] is not None:
-            filter_conditions.append(PractitionerRole.data["active"].astext.cast(Boolean) == conditions["active"])
+            filter_conditions.append(PractitionerRole.active == conditions["active"])
 
         if "date" in conditions and conditions["date"] is not None:
             filter_conditions.append(PractitionerRole.created_at >= conditions["date"])
 
         if "location" in conditions and conditions["location"] is not None:
             filter_conditions.append(
-                PractitionerRole.data["location"]["reference"].astext == "Location/" + str(conditions["location"])
+                PractitionerRole.location_references.contains(
+                    [{"reference": "Location/" + str(conditions["location"])}]
+                )
             )
 
         if "practitioner" in conditions and conditions["practitioner"] is not None:
             filter_conditions.append(
-                PractitionerRole.data["practitioner"]["reference"].astext
-                == "Practitioner/" + str(conditions["practitioner"])
+                PractitionerRole.practitioner_reference == "Practitioner/" + str(conditions["practitioner"])
             )
 
         if "organization" in conditions and conditions["organization"] is not None:
             filter_conditions.append(
-                PractitionerRole.data["organization"]["reference"].astext
-                == "Organization/" + str(conditions["organization"])
+                PractitionerRole.organization_reference == "Organization/" + str(conditions["organization"])
             )
 
         if "role" in conditions and conditions["role"] is not None:
-            filter_conditions.append(
-                PractitionerRole.data["code"].contains([{"coding": [{"code": conditions["role"]}]}])
-            )
+            filter_conditions.append(PractitionerRole.codes.contains([{"coding": [{"code": conditions["role"]}]}]))
 
         if "service" in conditions and conditions["service"] is not None:
             filter_conditions.append(
-                PractitionerRole.data["service"]["reference"].astext
-                == "HealthcareService/" + str(conditions["service"])
+                PractitionerRole.service_references.contains(
+                    [{"reference": "HealthcareService/" + str(conditions["service"])}]
+                )
             )
 
         if "specialty" in conditions and conditions["specialty"] is not None:
             filter_conditions.append(
-                PractitionerRole.data["specialty"].contains([{"coding": [{"code": conditions["specialty"]}]}])
+                PractitionerRole.specialties.contains([{"coding": [{"code": conditions["specialty"]}]}])
             )
 
         if "sort_history" in conditions and conditions["sort_history"] is True:
             # sorted with oldest versions last
-            stmt = stmt.order_by(
-                cast(
-                    PractitionerRole.data["meta"]["lastUpdated"].astext,
-                    TIMESTAMP(timezone=True),
-                ).desc(),
-                PractitionerRole.version.desc(),
-            )
+            stmt = stmt.order_by(PractitionerRole.last_updated.desc(), PractitionerRole.version.desc())
 
         if "since" in conditions:
-            filter_conditions.append(
-                cast(
-                    PractitionerRole.data["meta"]["lastUpdated"].astext,
-                    TIMESTAMP(timezone=True),
-                )
-                >= conditions["since"]
-            )
+            filter_conditions.append(PractitionerRole.last_updated >= conditions["since"])
 
-        stmt = stmt.where(*filter_conditions)
-        return self.db_session.session.execute(stmt).scalars().all()
+        return stmt.where(*filter_conditions)
 
     def create(self, practitioner_role: PractitionerRole) -> PractitionerRole:
         try:
             entry = update_resource_meta(practitioner_role, method="create")
             self.db_session.add(entry)
+            self.notify(entry)
             self.db_session.commit()
+            self.db_session.invalidate(entry)
         except DatabaseError as e:
             self.db_session.rollback()
             logging.error(f"Failed to add practitioner_role {practitioner_role.id}: {e}")
             raise e
         return practitioner_role
 
-    def delete(self, practitioner_role: PractitionerRole) -> None:
+    def delete(self, practitioner_role: PractitionerRole, version: int | None = None) -> None:
         try:
-            self._update_entry_latest(practitioner_role)
             updated_practitioner_role = PractitionerRole(
                 fhir_id=practitioner_role.fhir_id,
                 data=None,
                 version=practitioner_role.version,
             )
             entry = update_resource_meta(updated_practitioner_role, method="delete")
-            self.db_session.add(entry)
+            entry = self.write_version(practitioner_role, entry, version)
             self.db_session.commit()
+            self.db_session.invalidate(entry)
         except DatabaseError as e:
             self.db_session.rollback()
             logging.error(f"Failed to delete practitioner_role {practitioner_role.id}: {e}")
@@ -150,35 +163,22 @@ class PractitionerRoleRepository(RepositoryBase):
         self,
         practitioner_role: PractitionerRole,
         fhir_data: Dict[str, Any],
+        version: int | None = None,
     ) -> PractitionerRole:
         try:
-            self._update_entry_latest(practitioner_role)
             entity = PractitionerRole(
                 fhir_id=practitioner_role.fhir_id,
-                data=jsonable_encoder(fhir_data),
+                data=fhir_data,
                 version=practitioner_role.version,
             )
             entry = update_resource_meta(entity, method="update")
 
-            # Explicitly set the created_at / modified_at as transactions will use the same timestamp for all
-            # records within the same transaction
-            entry.created_at = datetime.now(UTC)
-            entry.modified_at = datetime.now(UTC)
-
-            self.db_session.add(entry)
+            entry = self.write_version(practitioner_role, entry, version)
             self.db_session.commit()
+
+            self.db_session.invalidate(entry)
             return entry
         except DatabaseError as e:
             self.db_session.rollback()
             logging.error(f"Failed to update practitioner_role {practitioner_role.id}: {e}")
             raise e
-
-    def _update_entry_latest(self, practitioner_role: PractitionerRole) -> None:
-        (
-            self.db_session.query(PractitionerRole)
-            .filter(
-                PractitionerRole.fhir_id == practitioner_role.fhir_id,
-                PractitionerRole.latest,
-            )
-            .update({PractitionerRole.latest: False})
-        )
@@ -1,17 +1,17 @@
 import logging
-from datetime import UTC, datetime
-from typing import Any, Dict, Sequence
+from datetime import datetime
+from typing import Any, Dict, Iterator, Sequence
 from uuid import UUID
 
-from fastapi.encoders import jsonable_encoder
-from sqlalchemy import TIMESTAMP, Boolean, String, cast, select, text
+from sqlalchemy import String, cast, select, text
 from sqlalchemy.exc import DatabaseError
 
 from app.db.decorator import repository
 from app.db.entities.practitioner.practitioner import (
     Practitioner,
 )
-from app.db.repositories.repository_base import RepositoryBase
+from app.db.repositories.repository_base import STREAM_BATCH_SIZE, RepositoryBase, current_at
+from app.params.pagination import Page
 from app.services.utils import update_resource_meta
 
 logger = logging.getLogger(__name__)
@@ -19,15 +19,11 @@ logger = logging.getLogger(__name__)
 
 @repository(Practitioner)
 class PractitionerRepository(RepositoryBase):
-    def get_one(self, **kwargs: bool | str | UUID | dict[str, str]) -> Practitioner | None:
-        stmt = (
-            select(Practitioner)
-            .where(
-                Practitioner.latest.__eq__(True),
-                Practitioner.deleted.__eq__(False),
-            )
-            .filter_by(**kwargs)
-        )
+    def get_one(self, at: datetime | None = None, **kwargs: bool | str | UUID | dict[str, str]) -> Practitioner | None:
+        """
+        Returns the current version, or with at the version that was current at that instant
+        """
+        stmt = select(Practitioner).where(*current_at(Practitioner, at)).filter_by(**kwargs)
         return self.db_session.session.execute(stmt).scalars().first()
 
     def get(self, **kwargs: bool | str | UUID | dict[str, str] | int) -> Practitioner | None:
@@ -43,23 +39,50 @@ class PractitionerRepository(RepositoryBase):
 
     def find(
         self,
-        **conditions: bool | str | UUID | dict[str, Any] | datetime | None,
+        **conditions: bool | str | UUID | dict[str, Any] | datetime | Page | list[str] | None,
     ) -> Sequence[Practitioner]:
+        stmt = self.find_statement(**conditions)
+        elements = conditions.get("elements")
+        if not isinstance(elements, list):
+            elements = None
+
+        page = conditions.get("page")
+        if isinstance(page, Page):
+            stmt = page.apply(stmt, Practitioner.fhir_id)
+            return page.collect(self.fetch(stmt, Practitioner, elements))
+
+        return self.fetch(stmt, Practitioner, elements)
+
+    def stream(
+        self,
+        **conditions: bool | str | UUID | dict[str, Any] | datetime | Page | None,
+    ) -> Iterator[Practitioner]:
+        """
+        Yields the matching rows in batches from a server-side cursor, so large (history) results never have
+        to be held in memory at once.
+        """
+        stmt = self.find_statement(**conditions).execution_options(yield_per=STREAM_BATCH_SIZE)
+        yield from self.db_session.session.execute(stmt).scalars()
+
+    def find_statement(
+        self,
+        **conditions: bool | str | UUID | dict[str, Any] | datetime | Page | list[str] | None,
+    ) -> Any:
         stmt = select(Practitioner)
         filter_conditions: list[Any] = []
 
         conditions = {k: v for k, v in conditions.items() if v is not None}
 
-        if "latest" in conditions and conditions["latest"] is True:
-            filter_conditions.append(Practitioner.latest)
-            filter_conditions.append(Practitioner.deleted.is_(False))
+        if conditions.get("latest") is True or "at" in conditions:
+            # The current versions, or the versions that were current at the instant of _at
+            filter_conditions.extend(current_at(Practitioner, conditions.get("at")))
 
         if "id" in conditions and conditions["id"] is not None:
             # Filter on our internal UUID id
             filter_conditions.append(Practitioner.fhir_id == conditions["id"])
 
         if "active" in conditions and conditions["active"] is not None:
-            filter_conditions.append(Practitioner.data["active"].astext.cast(Boolean) == conditions["active"])
+            filter_conditions.append(Practitioner.active == conditions["active"])
 
         if "name" in conditions and conditions["name"] is not None:
             term = conditions["name"]
@@ -96,48 +119,37 @@ class PractitionerRepository(RepositoryBase):
 
         if "sort_history" in conditions and conditions["sort_history"] is True:
             # sorted with oldest versions last
-            stmt = stmt.order_by(
-                cast(
-                    Practitioner.data["meta"]["lastUpdated"].astext,
-                    TIMESTAMP(timezone=True),
-                ).desc(),
-                Practitioner.version.desc(),
-            )
+            stmt = stmt.order_by(Practitioner.last_updated.desc(), Practitioner.version.desc())
 
         if "since" in conditions:
-            filter_conditions.append(
-                cast(
-                    Practitioner.data["meta"]["lastUpdated"].astext,
-                    TIMESTAMP(timezone=True),
-                )
-                >= conditions["since"]
-            )
+            filter_conditions.append(Practitioner.last_updated >= conditions["since"])
 
-        stmt = stmt.where(*filter_conditions)
-        return self.db_session.session.execute(stmt).scalars().all()
+        return stmt.where(*filter_conditions)
 
     def create(self, practitioner: Practitioner) -> Practitioner:
         try:
             entry = update_resource_meta(practitioner, method="create")
             self.db_session.add(entry)
+            self.notify(entry)
             self.db_session.commit()
+            self.db_session.invalidate(entry)
         except DatabaseError as e:
             self.db_session.rollback()
             logging.error(f"Failed to add practitioner {practitioner.id}: {e}")
             raise e
         return practitioner
 
-    def delete(self, practitioner: Practitioner) -> None:
+    def delete(self, practitioner: Practitioner, version: int | None = None) -> None:
         try:
-            self._update_entry_latest(practitioner)
             updated_practitioner = Practitioner(
                 fhir_id=practitioner.fhir_id,
                 data=None,
                 version=practitioner.version,
             )
             entry = update_resource_meta(updated_practitioner, method="delete")
-            self.db_session.add(entry)
+            entry = self.write_version(practitioner, entry, version)
             self.db_session.commit()
+            self.db_session.invalidate(entry)
         except DatabaseError as e:
             self.db_session.rollback()
             logging.error(f"Failed to delete practitioner {practitioner.id}: {e}")
@@ -147,35 +159,22 @@ class PractitionerRepository(RepositoryBase):
         self,
         practitioner: Practitioner,
         fhir_data: Dict[str, Any],
+        version: int | None = None,
     ) -> Practitioner:
         try:
-            self._update_entry_latest(practitioner)
             entity = Practitioner(
                 fhir_id=practitioner.fhir_id,
-                data=jsonable_encoder(fhir_data),
+                data=fhir_data,
                 version=practitioner.version,
             )
             entry = update_resource_meta(entity, method="update")
 
-            # Explicitly set the created_at / modified_at as transactions will use the same timestamp for all
-            # records within the same transaction
-            entry.created_at = datetime.now(UTC)
-            entry.modified_at = datetime.now(UTC)
-
-            self.db_session.add(entry)
+            entry = self.write_version(practitioner, entry, version)
             self.db_session.commit()
+
+            self.db_session.invalidate(entry)
             return entry
         except DatabaseError as e:
             self.db_session.rollback()
             logging.error(f"Failed to update practitioner {practitioner.id}: {e}")
             raise e
-
-    def _update_entry_latest(self, practitioner: Practitioner) -> None:
-        (
-            self.db_session.query(Practitioner)
-            .filter(
-                Practitioner.fhir_id == practitioner.fhir_id,
-                Practitioner.latest,
-            )
-            .update({Practitioner.latest: False})
-        )
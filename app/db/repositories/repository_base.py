@@ -1,11 +1,224 @@
-from typing import TypeVar
+from datetime import UTC, datetime
+from typing import Any, List, Sequence, Tuple, TypeVar
+from uuid import UUID, uuid4
+
+from sqlalchemy import TIMESTAMP, cast, func, insert, literal, select, text, update
+from sqlalchemy.dialects.postgresql import JSONB, Range
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session, attributes, class_mapper, defer
+from sqlalchemy.sql.base import Executable
+from sqlalchemy.sql.elements import ClauseElement
 
 from app.db import session
+from app.db.entities.mixin.common_mixin import CommonMixin
+from app.exceptions.service_exceptions import PreconditionFailedException, ResourceVersionConflictException
+
+# Number of rows fetched per round trip when streaming results from a server-side cursor
+STREAM_BATCH_SIZE = 500
+
+# Added to meta.tag of resources that are returned without some of their elements
+SUBSETTED_TAG = {"system": "http://terminology.hl7.org/CodeSystem/v3-ObservationValue", "code": "SUBSETTED"}
+
+TEntity = TypeVar("TEntity", bound=CommonMixin)
+
+# Notification channel on which every stored version is announced
+CHANGES_CHANNEL = "resource_changes"
+
+# SQLSTATE of an update that conflicts with a concurrent update of the same row
+SERIALIZATION_FAILURE = "40001"
+
+# jsonb_build_object takes at most 100 arguments, larger projections are built from several objects
+MAX_PROJECTION_PAIRS = 50
 
 
 class RepositoryBase:
     def __init__(self, db_session: session.DbSession):
         self.db_session = db_session
 
+    def fetch(self, stmt: Any, entity: Any, elements: Sequence[str] | None = None) -> Sequence[Any]:
+        """
+        Executes a search statement for the given entity. With elements, only those top level elements of the
+        resource data are read from the database (see project()), and the entities hold the projected data.
+        """
+        if elements is None:
+            return self.db_session.session.execute(stmt).scalars().all()
+
+        stmt = stmt.options(defer(entity.data), defer(entity.data_json)).add_columns(project(entity.data, elements))
+
+        entries = []
+        for entry, data in self.db_session.session.execute(stmt).all():
+            # Sets the loaded value without marking the entity as modified
+            attributes.set_committed_value(entry, "data", data)
+            entries.append(entry)
+        return entries
+
+    def count(self, stmt: Any, estimate: bool = False) -> int:
+        """
+        Counts the rows of a search statement with count(*). With estimate the row estimate of the Postgres query
+        planner is returned instead, which does not read the matching rows at all. Other databases always count.
+        """
+        stmt = stmt.order_by(None)
+
+        if estimate and self.db_session.session.get_bind().dialect.name == "postgresql":
+            plan = self.db_session.session.execute(_Explain(stmt)).scalar_one()
+            return int(plan[0]["Plan"]["Plan Rows"])
+
+        return int(self.db_session.session.execute(select(func.count()).select_from(stmt.subquery())).scalar_one())
+
+    def write_version(self, current: CommonMixin, entry: TEntity, version: int | None = None) -> TEntity:
+        """
+        Stores the next version of a resource with a single statement: a CTE clears latest on the current version
+        and ends its validity period where that of the new version starts, and the new version is only inserted
+        when that row was still the current one. When another request stored a version since current was read,
+        nothing is written and PreconditionFailedException is raised for a conditional write (version is the
+        version of its If-Match header), or ResourceVersionConflictException for an unconditional one. Concurrent
+        writers are serialized by the row lock on the current version, there is never more than one latest version:
+        the waiting writer fails with a serialization failure once the row moved to the history partition, which is
+        raised as the same conflict. The stored version is announced with notify(). Returns it, with its generated
+        columns.
+        """
+        entity = type(entry)
+        now = datetime.now(UTC)
+        entry.valid = entry.valid or Range(now, None)
+
+        # The current version stays valid until the new one is, never before it started (clock skew between hosts)
+        valid_to = func.greatest(func.lower(entity.valid), literal(entry.valid.lower, type_=TIMESTAMP(timezone=True)))
+        previous = (
+            update(entity)
+            .where(entity.fhir_id == current.fhir_id, entity.latest, entity.version == current.version)
+            .values(latest=False, valid=func.tstzrange(func.lower(entity.valid), valid_to))
+            .returning(entity.fhir_id)
+            .cte("previous")
+        )
+
+        entry.id = entry.id or uuid4()
+        entry.latest = True
+        entry.deleted = bool(entry.deleted)
+        entry.created_at = entry.modified_at = now
+
+        columns = [attr for attr in class_mapper(entity).column_attrs if attr.columns[0].computed is None]
+        values = select(*[literal(getattr(entry, attr.key), type_=attr.columns[0].type) for attr in columns])
+        stmt = (
+            insert(entity)
+            .from_select([attr.columns[0].name for attr in columns], values.select_from(previous))
+            .returning(entity)
+        )
+
+        try:
+            # Not retried: the failed statement aborted the transaction
+            written: TEntity | None = self.db_session.session.execute(stmt).scalars().first()
+        except OperationalError as e:
+            # A writer that waited for the row lock finds the row moved to the history partition (see migration 027)
+            if getattr(e.orig, "sqlstate", None) != SERIALIZATION_FAILURE:
+                raise
+            written = None
+
+        if written is None and version is not None:
+            raise PreconditionFailedException(
+                f"Version {version} of {current.fhir_id} is no longer the current version"
+            )
+        if written is None:
+            raise ResourceVersionConflictException(
+                f"{entity.__name__} {current.fhir_id} was changed since version {current.version} was read"
+            )
+
+        self.notify(written)
+        return written
+
+    def notify(self, *entries: CommonMixin) -> None:
+        """
+        Announces stored versions on the CHANGES_CHANNEL, see notify_changes()
+        """
+        if len(entries) == 0:
+            return
+        notify_changes(
+            self.db_session.session,
+            type(entries[0]).__name__,
+            [(entry.fhir_id, entry.version) for entry in entries],
+        )
+
+
+def notify_changes(session: Session, resource_type: str, versions: Sequence[Tuple[UUID, int]]) -> None:
+    """
+    Sends a notification on the CHANGES_CHANNEL for every (fhir_id, version) of the resource type, numbered from
+    the resource_changes_seq sequence (see ChangeFeed). Postgres delivers notifications when the transaction
+    commits, in commit order, and drops them when it rolls back. Other databases have no notifications.
+    """
+    if session.get_bind().dialect.name != "postgresql":
+        return
+
+    session.execute(
+        text(
+            "SELECT pg_notify(:channel, json_build_object("
+            "'seq', nextval('resource_changes_seq'), 'type', CAST(:type AS TEXT), "
+            "'id', c.id, 'version', c.version)::text) "
+            "FROM unnest(CAST(:ids AS TEXT[]), CAST(:versions AS INTEGER[])) AS c(id, version)"
+        ),
+        {
+            "channel": CHANGES_CHANNEL,
+            "type": resource_type,
+            "ids": [str(fhir_id) for fhir_id, _ in versions],
+            "versions": [version for _, version in versions],
+        },
+    )
+
+
+def current_at(entity: Any, at: Any = None) -> List[Any]:
+    """
+    Conditions that select the current version of every resource that is not deleted, or with at the version that
+    was current at that instant: the version whose validity period contains it.
+    """
+    if at is None:
+        return [entity.latest, entity.deleted.is_(False)]
+    return [entity.valid.contains(at), entity.deleted.is_(False)]
+
+
+def project(column: Any, elements: Sequence[str]) -> Any:
+    """
+    Builds the resource data from only the given top level elements of the JSONB column, with SUBSETTED added to
+    meta.tag. Elements that are not present in a resource are left out.
+    """
+    values: List[Any] = []
+    for element in elements:
+        value = column[element]
+        if element == "meta":
+            tags = func.coalesce(value["tag"], cast(literal("[]"), JSONB)).op("||", return_type=JSONB)(
+                func.jsonb_build_array(
+                    func.jsonb_build_object("system", SUBSETTED_TAG["system"], "code", SUBSETTED_TAG["code"])
+                )
+            )
+            value = func.coalesce(value, cast(literal("{}"), JSONB)).op("||", return_type=JSONB)(
+                func.jsonb_build_object("tag", tags)
+            )
+        values.append((element, value))
+
+    objects = [
+        func.jsonb_build_object(*[item for pair in values[i : i + MAX_PROJECTION_PAIRS] for item in pair])
+        for i in range(0, len(values), MAX_PROJECTION_PAIRS)
+    ]
+    projection: Any = objects[0]
+    for other in objects[1:]:
+        projection = projection.op("||", return_type=JSONB)(other)
+
+    # jsonb_build_object keeps missing elements as null. Resource data holds no nulls, so stripping is safe.
+    return func.jsonb_strip_nulls(projection, type_=JSONB)
+
+
+class _Explain(Executable, ClauseElement):
+    """
+    EXPLAIN (FORMAT JSON) of a statement, compiled with the bound parameters of the statement itself
+    """
+
+    inherit_cache = False
+
+    def __init__(self, stmt: Any) -> None:
+        self.stmt = stmt
+
+
+@compiles(_Explain, "postgresql")
+def _compile_explain(element: _Explain, compiler: Any, **kwargs: Any) -> str:
+    return "EXPLAIN (FORMAT JSON) " + str(compiler.process(element.stmt, **kwargs))
+
 
 TRepositoryBase = TypeVar("TRepositoryBase", bound=RepositoryBase, covariant=True)
@@ -1,14 +1,17 @@
 import logging
 import random
 from time import sleep
-from typing import Any, Callable, Type, TypeVar
+from typing import Any, Callable, List, Set, Tuple, Type, TypeVar
+from uuid import UUID
 
 from sqlalchemy import Engine
 from sqlalchemy.exc import DatabaseError, OperationalError, PendingRollbackError
 from sqlalchemy.orm import Session
 
 from app.config import get_config
+from app.db.cache import ResourceCache
 from app.db.entities.base import Base
+from app.db.entities.mixin.common_mixin import CommonMixin
 from app.db.repositories import repository_base
 
 """
@@ -32,8 +35,9 @@ T = TypeVar("T")
 
 
 class DbSession:
-    def __init__(self, engine: Engine) -> None:
+    def __init__(self, engine: Engine, cache: ResourceCache | None = None) -> None:
         self._engine = engine
+        self.cache = cache
 
     def __enter__(self) -> "DbSession":
         """
@@ -85,6 +89,26 @@ class DbSession:
         """
         self._retry(self.session.commit)
 
+    def invalidate(self, entry: CommonMixin) -> None:
+        """
+        Drops the resource from the read cache, call this after committing a new version of it
+
+        :param entry:
+        :return:
+        """
+        if self.cache is not None:
+            self.cache.invalidate(entry)
+
+    def is_resolved(self, reference_type: str, reference_id: UUID) -> bool:
+        """
+        Returns True when the reference is already known to resolve, so it does not need to be looked up again
+
+        :param reference_type:
+        :param reference_id:
+        :return:
+        """
+        return False
+
     def rollback(self) -> None:
         """
         Rollback the current transaction
@@ -153,3 +177,45 @@ class DbSession:
         Execute a statement and return a scalar result
         """
         return self.session.scalars(stmt, execution_options=execution_options)
+
+
+class TransactionDbSession(DbSession):
+    """
+    DbSession shared by all work inside Database.transaction(). The repositories commit after every write, here
+    that only flushes: the transaction is committed (or rolled back) once by Database.transaction(), after which the
+    cache is invalidated for every written resource. Operations are not retried, as a retry after a failed statement
+    would continue in a new transaction without the earlier writes.
+    """
+
+    def __init__(self, engine: Engine, cache: ResourceCache | None = None) -> None:
+        super().__init__(engine, cache)
+        self.session = Session(self._engine, expire_on_commit=False)
+        self.resolved_references: Set[Tuple[str, UUID]] = set()
+        self._written: List[CommonMixin] = []
+
+    def __enter__(self) -> "DbSession":
+        return self
+
+    def __exit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None:
+        pass
+
+    def commit(self) -> None:
+        self.session.flush()
+
+    def invalidate(self, entry: CommonMixin) -> None:
+        self._written.append(entry)
+
+    def is_resolved(self, reference_type: str, reference_id: UUID) -> bool:
+        return (reference_type, reference_id) in self.resolved_references
+
+    def commit_transaction(self) -> None:
+        self.session.commit()
+        for entry in self._written:
+            super().invalidate(entry)
+        self._written = []
+
+    def close(self) -> None:
+        self.session.close()
+
+    def _retry(self, f: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        return f(*args, **kwargs)
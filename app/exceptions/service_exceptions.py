@@ -19,3 +19,23 @@ class ResourceNotDeletedException(FHIRException):
 class InvalidResourceException(FHIRException):
     def __init__(self, detail: str = "Invalid resource") -> None:
         super().__init__(status_code=422, severity="error", code="bad-request", msg=detail)
+
+
+class ResourceVersionConflictException(FHIRException):
+    def __init__(self, detail: str = "Resource was changed by another request") -> None:
+        super().__init__(status_code=409, severity="error", code="conflict", msg=detail)
+
+
+class PreconditionFailedException(FHIRException):
+    def __init__(self, detail: str = "Resource version does not match") -> None:
+        super().__init__(status_code=412, severity="error", code="conflict", msg=detail)
+
+
+class TooManyRequestsException(FHIRException):
+    def __init__(self, detail: str = "Too many requests") -> None:
+        super().__init__(status_code=429, severity="error", code="throttled", msg=detail)
+
+
+class ChangesExpiredException(FHIRException):
+    def __init__(self, detail: str = "Changes are no longer available") -> None:
+        super().__init__(status_code=410, severity="error", code="not-found", msg=detail)
@@ -1,37 +1,78 @@
 from enum import Enum
-from typing import Sequence
-
-from fhir.resources.R4B.bundle import Bundle, BundleEntry
+from typing import Any, Sequence
 
 from app.db.entities.mixin.common_mixin import CommonMixin
 from app.exceptions.service_exceptions import ResourceNotFoundException
+from app.params.pagination import Page
 
 
 class BundleType(str, Enum):
     SEARCHSET = "searchset"
     HISTORY = "history"
+    TRANSACTION_RESPONSE = "transaction-response"
+    BATCH_RESPONSE = "batch-response"
+
+
+def create_fhir_bundle(
+    bundled_entries: list[dict[str, Any]] | None,
+    bundle_type: BundleType = BundleType.SEARCHSET,
+    page: Page | None = None,
+    total: int | None = None,
+) -> dict[str, Any]:
+    """
+    Builds a Bundle as a plain dict, with the elements in the order of the FHIR Bundle model. The entries are used
+    as is, nothing is validated or copied. Without entries (None) the bundle has no entry element, so the entries
+    can be written separately (see FhirBundleResponse).
+    """
+    bundle: dict[str, Any] = {"resourceType": "Bundle", "type": bundle_type.value}
+
+    count = bundle_total(len(bundled_entries or []), total, page)
+    if count is not None:
+        bundle["total"] = count
+    if page is not None:
+        bundle["link"] = page.links()
+    if bundled_entries is not None:
+        bundle["entry"] = bundled_entries
+
+    return bundle
+
+
+def bundle_total(entry_count: int, total: int | None = None, page: Page | None = None) -> int | None:
+    """
+    Returns the counted total, or else the number of entries when they are the whole result set. For a page that
+    holds only part of the result set the total is unknown without counting.
+    """
+    if total is not None:
+        return total
+    if page is None or page.is_complete:
+        return entry_count
+    return None
+
+
+def create_count_bundle(total: int) -> dict[str, Any]:
+    """
+    The searchset for _summary=count: only the number of matches, without entries
+    """
+    return {"resourceType": "Bundle", "type": BundleType.SEARCHSET.value, "total": total}
+
+
+def create_bundle_entry(entry: CommonMixin, with_req_resp: bool = False) -> dict[str, Any]:
+    if entry.bundle_meta is None:
+        raise ResourceNotFoundException(f"Entry {entry.fhir_id} bundle meta not found")
 
+    params = {
+        "fullUrl": f"{entry.fhir_id}/_history/{entry.version}",
+        "resource": entry.data,
+    }
+    if with_req_resp:
+        params["request"] = entry.bundle_meta.get("request")
+        params["response"] = entry.bundle_meta.get("response")
 
-def create_fhir_bundle(bundled_entries: list[BundleEntry], bundle_type: BundleType = BundleType.SEARCHSET) -> Bundle:
-    return Bundle.construct(type=bundle_type, entry=bundled_entries, total=len(bundled_entries))
+    return params
 
 
 def create_bundle_entries(
     entries: Sequence[CommonMixin],
     with_req_resp: bool = False,
-) -> list[BundleEntry]:
-    listing = []
-    for entry in entries:
-        if entry.bundle_meta is None:
-            raise ResourceNotFoundException(f"Entry {entry.fhir_id} bundle meta not found")
-
-        params = {
-            "fullUrl": f"{entry.fhir_id}/_history/{entry.version}",
-            "resource": entry.data,
-        }
-        if with_req_resp:
-            params["request"] = entry.bundle_meta.get("request")
-            params["response"] = entry.bundle_meta.get("response")
-
-        listing.append(BundleEntry.construct(**params))
-    return listing
+) -> list[dict[str, Any]]:
+    return [create_bundle_entry(entry, with_req_resp) for entry in entries]
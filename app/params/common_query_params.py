@@ -1,3 +1,4 @@
+from datetime import datetime
 from uuid import UUID
 
 from pydantic import AliasChoices, BaseModel, Field
@@ -10,3 +11,5 @@ class CommonQueryParams(BaseModel):
         default=None,
         validation_alias=AliasChoices("updated_at", "_lastUpdated"),
     )
+    # Searches the resources as they were at this instant, instead of their current versions
+    at: datetime | None = Field(alias="_at", default=None, validation_alias=AliasChoices("at", "_at"))
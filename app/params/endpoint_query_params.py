@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic import AliasChoices, Field
 
 from app.params.common_query_params import CommonQueryParams
@@ -14,3 +16,8 @@ class EndpointQueryParams(CommonQueryParams):
         validation_alias=AliasChoices("payload_type", "payload_type"),
     )
     status: str | None = None
+    include: Literal["Endpoint:organization", None] = Field(
+        alias="_include",
+        validation_alias=AliasChoices("include", "_include"),
+        default=None,
+    )
@@ -1,3 +1,7 @@
+from typing import Literal
+
+from pydantic import AliasChoices, Field
+
 from app.params.common_query_params import CommonQueryParams
 
 
@@ -8,3 +12,14 @@ class HealthcareServiceQueryParams(CommonQueryParams):
     name: str | None = None
     organization: str | None = None
     service_type: str | None = None
+    include: Literal[
+        "HealthcareService:organization",
+        "HealthcareService:location",
+        "HealthcareService:coverage-area",
+        "HealthcareService:endpoint",
+        None,
+    ] = Field(
+        alias="_include",
+        validation_alias=AliasChoices("include", "_include"),
+        default=None,
+    )
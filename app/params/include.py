@@ -0,0 +1,154 @@
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Sequence
+from uuid import UUID
+
+from starlette.requests import Request
+
+from app.exceptions.service_exceptions import InvalidResourceException
+from app.services.utils import split_reference
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class IncludeParam:
+    """
+    A reference search parameter that can be followed with _include: the `element` of a `source` resource
+    points to resources of the `target` type. When the reference is also stored in an indexed (generated) `column`
+    of the source entity, the parameter can be followed backwards with _revinclude.
+    """
+
+    source: str
+    name: str
+    element: str
+    target: str
+    column: str | None = None
+
+    def references(self, data: Dict[str, Any]) -> List[UUID]:
+        """
+        Returns the ids of the target resources referenced by the given resource data
+        """
+        value = data.get(self.element)
+        if value is None:
+            return []
+
+        fhir_ids = []
+        for reference in value if isinstance(value, list) else [value]:
+            if not isinstance(reference, dict) or "reference" not in reference:
+                continue
+            try:
+                (reference_type, reference_id) = split_reference(reference["reference"])
+            except ValueError:
+                logger.warning("Skipping unresolvable reference %s in %s", reference["reference"], self.source)
+                continue
+            if reference_type == self.target:
+                fhir_ids.append(reference_id)
+
+        return fhir_ids
+
+
+# https://hl7.org/fhir/R4B/searchparameter-registry.html, limited to the references between resources we store
+INCLUDE_PARAMS: List[IncludeParam] = [
+    IncludeParam("Organization", "endpoint", "endpoint", "Endpoint"),
+    IncludeParam("Organization", "partof", "partOf", "Organization", "part_of_reference"),
+    IncludeParam("Endpoint", "organization", "managingOrganization", "Organization", "managing_organization_reference"),
+    IncludeParam("Location", "organization", "managingOrganization", "Organization", "managing_organization_reference"),
+    IncludeParam("Location", "partof", "partOf", "Location", "part_of_reference"),
+    IncludeParam("Location", "endpoint", "endpoint", "Endpoint"),
+    IncludeParam("HealthcareService", "organization", "providedBy", "Organization", "provided_by_reference"),
+    IncludeParam("HealthcareService", "location", "location", "Location"),
+    IncludeParam("HealthcareService", "coverage-area", "coverageArea", "Location"),
+    IncludeParam("HealthcareService", "endpoint", "endpoint", "Endpoint"),
+    IncludeParam("PractitionerRole", "practitioner", "practitioner", "Practitioner", "practitioner_reference"),
+    IncludeParam("PractitionerRole", "organization", "organization", "Organization", "organization_reference"),
+    IncludeParam("PractitionerRole", "location", "location", "Location"),
+    IncludeParam("PractitionerRole", "service", "healthcareService", "HealthcareService"),
+    IncludeParam("PractitionerRole", "endpoint", "endpoint", "Endpoint"),
+    IncludeParam(
+        "OrganizationAffiliation", "primary-organization", "organization", "Organization", "organization_reference"
+    ),
+    IncludeParam(
+        "OrganizationAffiliation",
+        "participating-organization",
+        "participatingOrganization",
+        "Organization",
+        "participating_organization_reference",
+    ),
+    IncludeParam("OrganizationAffiliation", "location", "location", "Location"),
+    IncludeParam("OrganizationAffiliation", "service", "healthcareService", "HealthcareService"),
+    IncludeParam("OrganizationAffiliation", "network", "network", "Organization"),
+    IncludeParam("OrganizationAffiliation", "endpoint", "endpoint", "Endpoint"),
+]
+
+
+@dataclass
+class Includes:
+    """
+    The _include, _include:iterate and _revinclude parameters of a search. Plain includes are followed from the
+    matches only, iterate includes are followed again from every resource that was included. Reverse includes add
+    the resources that reference one of the matches.
+    """
+
+    params: List[IncludeParam] = field(default_factory=list)
+    iterate: List[IncludeParam] = field(default_factory=list)
+    rev: List[IncludeParam] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return len(self.params) > 0 or len(self.iterate) > 0 or len(self.rev) > 0
+
+    @staticmethod
+    def parse(
+        resource_type: str,
+        include: Sequence[str],
+        iterate: Sequence[str] = (),
+        revinclude: Sequence[str] = (),
+    ) -> "Includes":
+        includes = Includes()
+        for value in include:
+            param = Includes._lookup(value, "_include")
+            if param.source != resource_type:
+                raise InvalidResourceException(f"Invalid _include {value}, can only include from {resource_type}")
+            includes.params.append(param)
+        for value in iterate:
+            includes.iterate.append(Includes._lookup(value, "_include"))
+        for value in revinclude:
+            param = Includes._lookup(value, "_revinclude")
+            if param.target != resource_type:
+                raise InvalidResourceException(f"Invalid _revinclude {value}, does not reference {resource_type}")
+            if param.column is None:
+                raise InvalidResourceException(f"Invalid _revinclude {value}, not supported")
+            includes.rev.append(param)
+
+        return includes
+
+    @staticmethod
+    def _lookup(value: str, parameter: str) -> IncludeParam:
+        """
+        Finds the include parameter for `Source:name` or `Source:name:Target`. `Source.name` is accepted as well,
+        as that is how OrganizationAffiliation.endpoint has always been written.
+        """
+        parts = value.replace(".", ":", 1).split(":")
+        if len(parts) in (2, 3):
+            for param in INCLUDE_PARAMS:
+                if param.source == parts[0] and param.name == parts[1] and parts[2:] in ([], [param.target]):
+                    return param
+
+        raise InvalidResourceException(f"Invalid {parameter} {value}")
+
+
+def get_includes(resource_type: str) -> Callable[[Request], Includes]:
+    """
+    Returns a dependency that reads all _include, _include:iterate and _revinclude values of the request. The
+    _revInclude spelling is accepted as well, as the Organization search has always documented it that way.
+    """
+
+    def dependency(request: Request) -> Includes:
+        return Includes.parse(
+            resource_type,
+            request.query_params.getlist("_include"),
+            request.query_params.getlist("_include:iterate"),
+            request.query_params.getlist("_revinclude") + request.query_params.getlist("_revInclude"),
+        )
+
+    return dependency
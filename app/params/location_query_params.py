@@ -11,7 +11,7 @@ class LocationQueryParams(CommonQueryParams):
     part_of: str | None = None
     status: str | None = None
     type: str | None = None
-    include: Literal["Location:organization", None] = Field(
+    include: Literal["Location:organization", "Location:partof", "Location:endpoint", None] = Field(
         alias="_include",
         validation_alias=AliasChoices("include", "_include"),
         default=None,
@@ -28,7 +28,16 @@ class OrganizationAffiliationQueryParams(CommonQueryParams):
         "member",
         None,
     ] = None
-    include: Literal["OrganizationAffiliation.endpoint", None] = Field(
+    include: Literal[
+        "OrganizationAffiliation.endpoint",
+        "OrganizationAffiliation:endpoint",
+        "OrganizationAffiliation:primary-organization",
+        "OrganizationAffiliation:participating-organization",
+        "OrganizationAffiliation:location",
+        "OrganizationAffiliation:service",
+        "OrganizationAffiliation:network",
+        None,
+    ] = Field(
         alias="_include",
         validation_alias=AliasChoices("include", "_include"),
         default=None,
@@ -0,0 +1,136 @@
+import base64
+import binascii
+from dataclasses import dataclass, field
+from typing import Any, List, Literal, Sequence, TypeVar
+from uuid import UUID
+
+from fastapi import Query
+from starlette.datastructures import URL
+from starlette.requests import Request
+
+from app.db.entities.mixin.common_mixin import CommonMixin
+from app.exceptions.service_exceptions import InvalidResourceException
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+
+T = TypeVar("T", bound=CommonMixin)
+
+Direction = Literal["next", "previous"]
+
+
+@dataclass
+class PageCursor:
+    """
+    Opaque position in a keyset paginated result. Pages are sorted on fhir_id, so the cursor only needs
+    to remember the last (or first) fhir_id it has seen and in which direction the client is moving.
+    """
+
+    fhir_id: UUID
+    direction: Direction
+
+    def encode(self) -> str:
+        raw = f"{self.direction}:{self.fhir_id}".encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+    @staticmethod
+    def decode(token: str) -> "PageCursor":
+        try:
+            raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode("utf-8")
+            direction, fhir_id = raw.split(":", 1)
+            return PageCursor(fhir_id=UUID(fhir_id), direction=_direction(direction))
+        except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+            raise InvalidResourceException(f"Invalid page cursor {token}: {e}")
+
+
+def _direction(value: str) -> Direction:
+    if value == "next":
+        return "next"
+    if value == "previous":
+        return "previous"
+    raise ValueError(f"unknown direction {value}")
+
+
+@dataclass
+class Page:
+    """
+    Keyset (seek) pagination over the fhir_id of the current resource versions. The repository applies the
+    page to its search statement and collects the rows, after which the page knows its boundaries and can
+    render the Bundle.link entries.
+    """
+
+    count: int = DEFAULT_PAGE_SIZE
+    cursor: PageCursor | None = None
+    url: str | None = None
+    first_id: UUID | None = field(default=None, init=False)
+    last_id: UUID | None = field(default=None, init=False)
+    has_next: bool = field(default=False, init=False)
+    has_previous: bool = field(default=False, init=False)
+
+    @property
+    def is_complete(self) -> bool:
+        """
+        True when the page holds the whole result set
+        """
+        return not self.has_next and not self.has_previous
+
+    def apply(self, stmt: Any, column: Any) -> Any:
+        """
+        Seek past the cursor on the given (indexed) column and fetch one row more than needed, so we know
+        whether there is another page without counting the result set.
+        """
+        if self.cursor is not None and self.cursor.direction == "previous":
+            stmt = stmt.where(column < self.cursor.fhir_id).order_by(column.desc())
+        elif self.cursor is not None:
+            stmt = stmt.where(column > self.cursor.fhir_id).order_by(column.asc())
+        else:
+            stmt = stmt.order_by(column.asc())
+
+        return stmt.limit(self.count + 1)
+
+    def collect(self, rows: Sequence[T]) -> List[T]:
+        entries = list(rows)
+        has_more = len(entries) > self.count
+        entries = entries[: self.count]
+
+        if self.cursor is not None and self.cursor.direction == "previous":
+            # Rows were fetched in descending order, flip them back
+            entries.reverse()
+            self.has_previous = has_more
+            self.has_next = True
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None
+
+        if len(entries) > 0:
+            self.first_id = entries[0].fhir_id
+            self.last_id = entries[-1].fhir_id
+
+        return entries
+
+    def links(self) -> list[dict[str, str]]:
+        if self.url is None:
+            return []
+
+        links = [{"relation": "self", "url": self.url}]
+        if self.has_next and self.last_id is not None:
+            links.append({"relation": "next", "url": self._url_for(PageCursor(self.last_id, "next"))})
+        if self.has_previous and self.first_id is not None:
+            links.append({"relation": "previous", "url": self._url_for(PageCursor(self.first_id, "previous"))})
+
+        return links
+
+    def _url_for(self, cursor: PageCursor) -> str:
+        return str(URL(self.url or "").include_query_params(_count=self.count, _cursor=cursor.encode()))
+
+
+def get_page(
+    request: Request,
+    count: int = Query(alias="_count", default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = Query(alias="_cursor", default=None),
+) -> Page:
+    return Page(
+        count=count,
+        cursor=PageCursor.decode(cursor) if cursor is not None else None,
+        url=str(request.url),
+    )
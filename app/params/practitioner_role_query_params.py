@@ -18,7 +18,14 @@ class PractitionerRoleQueryParams(CommonQueryParams):
     role: str | None = None
     service: str | None = None
     specialty: str | None = None
-    include: Literal["PractitionerRole:practitioner", None] = Field(
+    include: Literal[
+        "PractitionerRole:practitioner",
+        "PractitionerRole:organization",
+        "PractitionerRole:location",
+        "PractitionerRole:service",
+        "PractitionerRole:endpoint",
+        None,
+    ] = Field(
         alias="_include",
         validation_alias=AliasChoices("include", "_include"),
         default=None,
@@ -0,0 +1,141 @@
+from dataclasses import dataclass
+from enum import Enum
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+
+from fastapi import Query
+from fhir.resources.R4B import get_fhir_model_class
+
+from app.exceptions.service_exceptions import InvalidResourceException
+from app.params.pagination import Page
+
+# Elements that are part of every projection, see https://hl7.org/fhir/R4B/search.html#elements
+BASE_ELEMENTS = ["resourceType", "id", "meta"]
+
+
+class SummaryMode(str, Enum):
+    """
+    https://hl7.org/fhir/R4B/search.html#summary
+    """
+
+    TRUE = "true"
+    TEXT = "text"
+    DATA = "data"
+    COUNT = "count"
+    FALSE = "false"
+
+
+class TotalMode(str, Enum):
+    """
+    https://hl7.org/fhir/R4B/search.html#total
+    """
+
+    NONE = "none"
+    ESTIMATE = "estimate"
+    ACCURATE = "accurate"
+
+
+@dataclass
+class Summary:
+    """
+    The _summary, _elements and _total parameters of a search. With _summary=count only the number of matches is
+    returned, counted with a single count(*) query, or estimated by the query planner with _total=estimate. The
+    other _summary modes and _elements select the top level elements that are read from the database.
+    """
+
+    mode: SummaryMode = SummaryMode.FALSE
+    total: TotalMode | None = None
+    elements: List[str] | None = None
+
+    @property
+    def count(self) -> bool:
+        return self.mode == SummaryMode.COUNT
+
+    def count_mode(self, page: Page | None = None) -> TotalMode | None:
+        """
+        Returns how the matches should be counted, or None when no count query is needed. That is the case when
+        the client does not ask for a total, or when the page already holds all matches.
+        """
+        if self.count:
+            return TotalMode.ESTIMATE if self.total == TotalMode.ESTIMATE else TotalMode.ACCURATE
+
+        if self.total is None or self.total == TotalMode.NONE:
+            return None
+        if page is None or page.is_complete:
+            return None
+
+        return self.total
+
+    def projection(self, resource_type: str) -> List[str] | None:
+        """
+        Returns the top level elements of the resource to return, or None for the whole resource. Mandatory
+        elements are always part of the projection, as are the extensions of primitive elements (`_name`).
+        """
+        (all_elements, summary_elements, mandatory_elements) = _resource_elements(resource_type)
+
+        if self.elements is not None:
+            unknown = [element for element in self.elements if element not in all_elements]
+            if len(unknown) > 0:
+                raise InvalidResourceException(f"Unknown _elements {', '.join(unknown)} for {resource_type}")
+            wanted = BASE_ELEMENTS + list(mandatory_elements) + self.elements
+        elif self.mode == SummaryMode.TRUE:
+            wanted = BASE_ELEMENTS + list(mandatory_elements) + list(summary_elements)
+        elif self.mode == SummaryMode.TEXT:
+            wanted = BASE_ELEMENTS + list(mandatory_elements) + ["text"]
+        elif self.mode == SummaryMode.DATA:
+            wanted = BASE_ELEMENTS + [element for element in all_elements if element != "text"]
+        else:
+            return None
+
+        projection: List[str] = []
+        for element in wanted:
+            for name in (element, f"_{element}"):
+                if name not in projection and (name in all_elements or name in BASE_ELEMENTS):
+                    projection.append(name)
+
+        return projection
+
+
+@lru_cache
+def _resource_elements(resource_type: str) -> Tuple[Tuple[str, ...], Tuple[str, ...], Tuple[str, ...]]:
+    """
+    Returns all, the summary and the mandatory top level elements of a resource type, from its FHIR model
+    """
+    all_elements: List[str] = []
+    summary_elements: List[str] = []
+    mandatory_elements: List[str] = []
+
+    for field in get_fhir_model_class(resource_type).model_fields.values():
+        extra: Dict[str, Any] = field.json_schema_extra if isinstance(field.json_schema_extra, dict) else {}
+        if field.alias is None or (not extra.get("element_property") and not field.alias.startswith("_")):
+            continue
+
+        all_elements.append(field.alias)
+        if extra.get("summary_element_property"):
+            summary_elements.append(field.alias)
+        if extra.get("element_required") or field.is_required():
+            mandatory_elements.append(field.alias)
+
+    return tuple(all_elements), tuple(summary_elements), tuple(mandatory_elements)
+
+
+def get_summary(
+    summary: str | None = Query(alias="_summary", default=None),
+    elements: str | None = Query(alias="_elements", default=None),
+    total: str | None = Query(alias="_total", default=None),
+) -> Summary:
+    try:
+        summary_mode = SummaryMode(summary) if summary is not None else SummaryMode.FALSE
+    except ValueError:
+        raise InvalidResourceException(f"Unsupported _summary {summary}, expected true, text, data, count or false")
+
+    try:
+        total_mode = TotalMode(total) if total is not None else None
+    except ValueError:
+        raise InvalidResourceException(f"Unsupported _total {total}, expected none, estimate or accurate")
+
+    return Summary(
+        mode=summary_mode,
+        total=total_mode,
+        elements=[element.strip() for element in elements.split(",") if element.strip()] if elements else None,
+    )
@@ -0,0 +1,72 @@
+import logging
+from typing import AsyncIterator, Iterator
+
+import anyio.from_thread
+from fastapi import APIRouter, Depends
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.container import get_import_service
+from app.routers.utils import FhirJsonResponse
+from app.services.import_service import ImportService
+
+logger = logging.getLogger(__name__)
+router = APIRouter(
+    tags=["Import"],
+)
+
+# Maximum number of error issues returned, the remaining errors are only counted
+MAX_ERROR_ISSUES = 100
+
+
+@router.post("/$import", summary="Bulk import of NDJSON resources of a single type")
+async def bulk_import(
+    request: Request,
+    _type: str,
+    service: ImportService = Depends(get_import_service),
+) -> Response:
+    result = await run_in_threadpool(service.import_ndjson, _type, _lines(request.stream()))
+
+    issues = [
+        {
+            "severity": "information",
+            "code": "informational",
+            "details": {"text": f"Imported {result.imported} {result.resource_type} resources"},
+        }
+    ]
+    issues += [
+        {"severity": "error", "code": "invalid", "details": {"text": error}}
+        for error in result.errors[:MAX_ERROR_ISSUES]
+    ]
+    if len(result.errors) > MAX_ERROR_ISSUES:
+        issues.append(
+            {
+                "severity": "error",
+                "code": "too-costly",
+                "details": {"text": f"{len(result.errors) - MAX_ERROR_ISSUES} more lines were not imported"},
+            }
+        )
+
+    return FhirJsonResponse({"resourceType": "OperationOutcome", "issue": issues})
+
+
+def _lines(chunks: AsyncIterator[bytes]) -> Iterator[bytes]:
+    """
+    The lines of the request body as it is received, for the import that runs in a worker thread. Only the chunk
+    that is being split is kept in memory.
+    """
+
+    async def next_chunk() -> bytes | None:
+        try:
+            return await chunks.__anext__()
+        except StopAsyncIteration:
+            return None
+
+    rest = b""
+    while (chunk := anyio.from_thread.run(next_chunk)) is not None:
+        *lines, rest = (rest + chunk).split(b"\n")
+        yield from lines
+
+    if rest:
+        yield rest
@@ -0,0 +1,22 @@
+import logging
+from typing import Annotated, Any, Dict
+
+from fastapi import APIRouter, Body, Depends
+from starlette.responses import Response
+
+from app.container import get_bundle_service
+from app.routers.utils import FhirBundleResponse
+from app.services.bundle_service import BundleService
+
+logger = logging.getLogger(__name__)
+router = APIRouter(
+    tags=["Bundle"],
+)
+
+
+@router.post("/", summary="Process a transaction or batch bundle")
+def process_bundle(
+    data: Annotated[Dict[str, Any], Body()],
+    service: BundleService = Depends(get_bundle_service),
+) -> Response:
+    return FhirBundleResponse(service.process(data))
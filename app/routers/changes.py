@@ -0,0 +1,42 @@
+import logging
+
+from fastapi import APIRouter, Depends, Query
+from starlette.responses import Response
+
+from app.container import get_change_feed
+from app.routers.utils import FhirJsonResponse
+from app.services.change_feed import ChangeFeed
+
+logger = logging.getLogger(__name__)
+router = APIRouter(
+    tags=["Changes"],
+)
+
+# Seconds a request waits for changes by default, and at most
+DEFAULT_WAIT = 30
+MAX_WAIT = 60
+
+
+@router.get("/$changes", summary="Long-poll for resources that were created, updated or deleted")
+async def changes(
+    since: int | None = None,
+    wait: float = Query(alias="_wait", default=DEFAULT_WAIT, ge=0, le=MAX_WAIT),
+    feed: ChangeFeed = Depends(get_change_feed),
+) -> Response:
+    """
+    Returns the changes after the change since, as soon as there is one, or an empty list after waiting. Pass the
+    returned next as since of the next request. Without since, only changes stored while waiting are returned.
+    A since that is too old for the buffered changes returns 410 Gone. The changes are buffered by this process, the
+    feed needs the app to run as a single process (see ChangeFeed).
+    """
+    found = await feed.wait(since, wait)
+
+    cursor = found[-1].seq if len(found) > 0 else since
+    if cursor is None:
+        cursor = feed.latest()
+
+    return FhirJsonResponse(
+        {"changes": [change.to_dict() for change in found], "next": cursor},
+        # The feed is not a FHIR resource
+        media_type="application/json",
+    )
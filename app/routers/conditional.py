@@ -0,0 +1,118 @@
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable
+from uuid import UUID
+
+from fastapi import Depends, Header, HTTPException
+from starlette.requests import Request
+
+from app.container import get_version_service
+from app.exceptions.service_exceptions import InvalidResourceException
+from app.routers.utils import http_date
+from app.services.utils import etag_version
+from app.services.version_service import ResourceVersion, VersionService
+
+"""
+Conditional reads (https://hl7.org/fhir/R4B/http.html#cread). The dependencies below answer a read with
+304 Not Modified when the If-None-Match or If-Modified-Since header of the request still matches the stored
+version. Only the version and modification time are looked up, the resource itself is never loaded. When the
+resource does not exist (or the headers do not match) the route runs as usual.
+
+Version aware updates and deletes (https://hl7.org/fhir/R4B/http.html#concurrency) pass the version of the
+If-Match header to the service, which answers 412 Precondition Failed when it is not the current version.
+"""
+
+
+def not_modified(resource_type: str) -> Callable[..., Awaitable[None]]:
+    """
+    Returns a dependency for the read route (/{_id}) of the given resource type
+    """
+
+    async def dependency(
+        _id: UUID,
+        request: Request,
+        service: VersionService = Depends(get_version_service),
+    ) -> None:
+        # A read with _at returns an earlier version, which the headers are not compared with
+        if _is_conditional(request) and "_at" not in request.query_params:
+            _check(request, await service.get_current_async(resource_type, _id))
+
+    return dependency
+
+
+def not_modified_version(resource_type: str) -> Callable[..., Awaitable[None]]:
+    """
+    Returns a dependency for the vread route (/{_id}/_history/{version_id}) of the given resource type
+    """
+
+    async def dependency(
+        _id: UUID,
+        version_id: int,
+        request: Request,
+        service: VersionService = Depends(get_version_service),
+    ) -> None:
+        if _is_conditional(request):
+            _check(request, await service.get_version_async(resource_type, _id, version_id))
+
+    return dependency
+
+
+def if_match(if_match: str | None = Header(default=None)) -> int | None:
+    """
+    Returns the version of the If-Match header (W/"1" or "1"), or None without the header
+    """
+    if if_match is None:
+        return None
+
+    try:
+        return etag_version(if_match)
+    except ValueError:
+        raise InvalidResourceException(f'Invalid If-Match header {if_match}, expected W/"<version>"')
+
+
+def _is_conditional(request: Request) -> bool:
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+def _check(request: Request, current: ResourceVersion | None) -> None:
+    if current is None:
+        return
+
+    # If-None-Match takes precedence over If-Modified-Since (RFC 9110, section 13.2.2)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        unchanged = _etag_matches(if_none_match, current.version)
+    else:
+        unchanged = _not_modified_since(request.headers["if-modified-since"], current.last_modified)
+
+    if unchanged:
+        raise HTTPException(
+            status_code=304,
+            headers={
+                "ETag": f'W/"{current.version}"',
+                "Last-Modified": http_date(current.last_modified),
+            },
+        )
+
+
+def _etag_matches(if_none_match: str, version: int) -> bool:
+    """
+    Weak comparison, as our ETags are weak: W/"1" and "1" both match version 1
+    """
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == f'"{version}"':
+            return True
+    return False
+
+
+def _not_modified_since(if_modified_since: str, last_modified: datetime) -> bool:
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        return False
+
+    # HTTP dates have a one second resolution
+    return last_modified.replace(microsecond=0) <= since
@@ -1,14 +1,27 @@
 import logging
+from datetime import datetime
 from typing import Any, Dict
 from uuid import UUID
 
 from fastapi import APIRouter, Depends
 from fhir.resources.R4B.endpoint import Endpoint as FhirEndpoint
+from starlette.responses import Response
 
 from app.container import get_endpoint_service, get_matching_care_service
 from app.exceptions.service_exceptions import InvalidResourceException
+from app.mappers.fhir_mapper import BundleType
 from app.params.endpoint_query_params import EndpointQueryParams
 from app.params.history_query_params import HistoryRequest
+from app.params.include import Includes, get_includes
+from app.params.pagination import Page, get_page
+from app.params.summary import Summary, get_summary
+from app.routers.conditional import if_match, not_modified, not_modified_version
+from app.routers.utils import (
+    FhirBundleResponse,
+    FhirBundleStreamingResponse,
+    FhirEntityResponse,
+    FhirJsonResponse,
+)
 from app.services.entity_services.endpoint_service import EndpointService
 from app.services.matching_care_service import MatchingCareService
 
@@ -20,36 +33,40 @@ router = APIRouter(
 
 
 @router.post("")
-def create(data: Dict[str, Any], service: EndpointService = Depends(get_endpoint_service)) -> Dict[str, Any] | None:
+def create(data: Dict[str, Any], service: EndpointService = Depends(get_endpoint_service)) -> Response:
     fhir_data = FhirEndpoint(**data)
     if fhir_data.id is not None:
         logging.error("Endpoint ID cannot be in the resource")
         raise InvalidResourceException("Endpoint ID cannot be in the organization resource")
     new_endpoint = service.add_one(fhir_data)
-    return new_endpoint.data
+    return FhirEntityResponse(new_endpoint)
 
 
 @router.get("/_search/{_id}")
 @router.get(
     "/_search",
 )
-def find_endpoints(
+async def find_endpoints(
     _id: UUID | None = None,
     query_params: EndpointQueryParams = Depends(),
+    page: Page = Depends(get_page),
+    summary: Summary = Depends(get_summary),
+    includes: Includes = Depends(get_includes("Endpoint")),
     service: MatchingCareService = Depends(get_matching_care_service),
-) -> Dict[str, Any]:
+) -> Response:
     if _id:
         query_params.id = _id
-    bundle = service.find_endpoints(query_params)
-    return bundle.dict()  # type:ignore
+    result = await service.find_endpoints_async(query_params, page=page, includes=includes, summary=summary)
+    return FhirBundleResponse(result.bundle, entries=result.entries, included=result.included)
 
 
 @router.put("/{_id}")
 def update_endpoint(
     _id: UUID,
     data: Dict[str, Any],
+    version: int | None = Depends(if_match),
     service: EndpointService = Depends(get_endpoint_service),
-) -> Dict[str, Any] | None:
+) -> Response:
     fhir_data = FhirEndpoint(**data)
     if fhir_data.id is None:
         logging.error("Endpoint ID not found in endpoint resource")
@@ -60,42 +77,47 @@ def update_endpoint(
         raise InvalidResourceException(
             f"Endpoint ID {str(fhir_data.id)} in the resource does not match the URL {str(_id)}"
         )
-    return service.update_one(_id, fhir_data).data
+    return FhirEntityResponse(service.update_one(_id, fhir_data, version=version))
 
 
 @router.delete("/{_id}")
 def delete_endpoint(
     _id: UUID,
+    version: int | None = Depends(if_match),
     service: EndpointService = Depends(get_endpoint_service),
 ) -> None:
-    return service.delete_one(_id)
+    return service.delete_one(_id, version=version)
 
 
-@router.get("/{_id}/_history/{version_id}")
-def get_endpoint_version(
+@router.get("/{_id}/_history/{version_id}", dependencies=[Depends(not_modified_version("Endpoint"))])
+async def get_endpoint_version(
     _id: UUID,
     version_id: int,
     service: EndpointService = Depends(get_endpoint_service),
-) -> Dict[str, Any]:
-    version = service.get_one_version(resource_id=_id, version_id=version_id)
-    return version.data if version.data is not None else version.bundle_meta
+) -> Response:
+    version = await service.get_one_version_async(resource_id=_id, version_id=version_id)
+    return FhirEntityResponse(version) if version.data is not None else FhirJsonResponse(version.bundle_meta)
 
 
 @router.get("/{_id}/_history")
 @router.get("/_history")
-def get_endpoint_history(
+async def get_endpoint_history(
     _id: UUID | None = None,
     _since: HistoryRequest = Depends(),
-    service: MatchingCareService = Depends(get_matching_care_service),
-) -> Dict[str, Any]:
-    history = service.find_endpoint_history(endpoint_id=_id, since=_since.since)
-    return history
+    service: EndpointService = Depends(get_endpoint_service),
+) -> Response:
+    return FhirBundleStreamingResponse(
+        service.stream_history_async(id=_id, since=_since.since),
+        bundle_type=BundleType.HISTORY,
+        with_req_resp=True,
+    )
 
 
-@router.get("/{_id}")
-def get_endpoint(
+@router.get("/{_id}", dependencies=[Depends(not_modified("Endpoint"))])
+async def get_endpoint(
     _id: UUID,
+    _at: datetime | None = None,
     service: EndpointService = Depends(get_endpoint_service),
-) -> Dict[str, Any] | None:
-    endpoint = service.get_one(_id)
-    return endpoint.data
+) -> Response:
+    endpoint = await service.get_one_async(_id, at=_at)
+    return FhirEntityResponse(endpoint)
@@ -0,0 +1,103 @@
+import logging
+from uuid import UUID
+
+from fastapi import APIRouter, Depends
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response
+
+from app.container import get_export_service
+from app.db.entities.resource_types import RESOURCE_ENTITIES
+from app.exceptions.service_exceptions import InvalidResourceException
+from app.params.history_query_params import HistoryRequest
+from app.routers.utils import FhirJsonResponse
+from app.services.export_service import ExportService, ExportStatus
+
+logger = logging.getLogger(__name__)
+router = APIRouter(
+    tags=["Export"],
+)
+
+# Output formats accepted for _outputFormat, see https://hl7.org/fhir/uv/bulkdata/export.html#query-parameters
+OUTPUT_FORMATS = ["application/fhir+ndjson", "application/ndjson", "ndjson"]
+
+
+@router.get("/$export", summary="Start a bulk export of all current resources")
+def kick_off(
+    request: Request,
+    _type: str | None = None,
+    _outputFormat: str | None = None,
+    _since: HistoryRequest = Depends(),
+    service: ExportService = Depends(get_export_service),
+) -> Response:
+    if _outputFormat is not None and _outputFormat not in OUTPUT_FORMATS:
+        raise InvalidResourceException(f"Unsupported _outputFormat {_outputFormat}")
+
+    types = [resource_type.strip() for resource_type in _type.split(",")] if _type else []
+    for resource_type in types:
+        if resource_type not in RESOURCE_ENTITIES:
+            raise InvalidResourceException(f"Unsupported _type {resource_type}")
+
+    job = service.start(str(request.url), types, _since.since)
+    return Response(
+        status_code=202,
+        headers={"Content-Location": str(request.url_for("export_status", job_id=job.id))},
+    )
+
+
+@router.get("/$export-status/{job_id}", name="export_status", summary="Status of a bulk export")
+def status(
+    job_id: UUID,
+    request: Request,
+    service: ExportService = Depends(get_export_service),
+) -> Response:
+    job = service.get_job(job_id)
+
+    if job.status == ExportStatus.IN_PROGRESS:
+        return Response(status_code=202, headers={"X-Progress": f"{job.exported} resources exported"})
+
+    if job.status == ExportStatus.FAILED:
+        return FhirJsonResponse(
+            status_code=500,
+            content={
+                "resourceType": "OperationOutcome",
+                "issue": [{"severity": "error", "code": "exception", "details": {"text": job.error}}],
+            },
+        )
+
+    return FhirJsonResponse(
+        {
+            "transactionTime": job.transaction_time.isoformat(),
+            "request": job.request,
+            "requiresAccessToken": False,
+            "output": [
+                {
+                    "type": file.type,
+                    "url": str(request.url_for("export_file", job_id=job.id, file_name=file.file_name)),
+                    "count": file.count,
+                }
+                for file in job.output
+            ],
+            "error": [],
+        },
+        # The manifest is not a FHIR resource, see
+        # https://hl7.org/fhir/uv/bulkdata/export.html#response---complete-status
+        media_type="application/json",
+    )
+
+
+@router.delete("/$export-status/{job_id}", summary="Cancel a bulk export or remove its files")
+def delete(
+    job_id: UUID,
+    service: ExportService = Depends(get_export_service),
+) -> Response:
+    service.delete(job_id)
+    return Response(status_code=202)
+
+
+@router.get("/$export-files/{job_id}/{file_name}", name="export_file", summary="Download a bulk export file")
+def download(
+    job_id: UUID,
+    file_name: str,
+    service: ExportService = Depends(get_export_service),
+) -> Response:
+    return FileResponse(service.get_file(job_id, file_name), media_type="application/fhir+ndjson")
@@ -1,18 +1,25 @@
 import logging
-from typing import Annotated, Any, Dict
+from datetime import datetime
+from typing import Annotated, Any, Dict, List
 from uuid import UUID
 
 from fastapi import APIRouter, Body, Depends
 from fhir.resources.R4B.location import Location as FhirLocation
 from starlette.responses import Response
 
-from app.container import get_location_service
+from app.container import get_include_service, get_location_service
+from app.db.entities.mixin.common_mixin import CommonMixin
 from app.exceptions.service_exceptions import InvalidResourceException, ResourceNotFoundException
-from app.mappers.fhir_mapper import BundleType, create_bundle_entries, create_fhir_bundle
+from app.mappers.fhir_mapper import BundleType, bundle_total, create_count_bundle, create_fhir_bundle
 from app.params.history_query_params import HistoryRequest
+from app.params.include import Includes, get_includes
 from app.params.location_query_params import LocationQueryParams
-from app.routers.utils import FhirBundleResponse, FhirEntityResponse
+from app.params.pagination import Page, get_page
+from app.params.summary import Summary, TotalMode, get_summary
+from app.routers.conditional import if_match, not_modified, not_modified_version
+from app.routers.utils import FhirBundleResponse, FhirBundleStreamingResponse, FhirEntityResponse
 from app.services.entity_services.location_service import LocationService
+from app.services.include_service import IncludeService
 
 logger = logging.getLogger(__name__)
 router = APIRouter(
@@ -22,7 +29,7 @@ router = APIRouter(
 
 
 @router.post("")
-async def create(
+def create(
     data: Annotated[Dict[str, Any], Body()],
     service: LocationService = Depends(get_location_service),
 ) -> Response:
@@ -41,28 +48,42 @@ async def create(
 
 
 @router.get("/_search")
-def find(
+async def find(
     query_params: LocationQueryParams = Depends(),
+    page: Page = Depends(get_page),
+    summary: Summary = Depends(get_summary),
+    includes: Includes = Depends(get_includes("Location")),
+    include_service: IncludeService = Depends(get_include_service),
     service: LocationService = Depends(get_location_service),
 ) -> Response:
-    entries = list(service.find(query_params.model_dump()))
+    params = query_params.model_dump()
+    if summary.count:
+        count = await service.count_async(params, summary.count_mode() == TotalMode.ESTIMATE)
+        return FhirBundleResponse(create_count_bundle(count))
 
-    if query_params.include is not None and query_params.include == "Location:organization":
-        org_entities = service.get_organizations(entries)
-        entries.extend(org_entities)  # type: ignore
+    entries: List[CommonMixin] = list(
+        await service.find_async(params, page=page, elements=summary.projection("Location"))
+    )
+    mode = summary.count_mode(page)
+    total = await service.count_async(params, mode == TotalMode.ESTIMATE) if mode is not None else None
+
+    entries.extend(await include_service.include_async(entries, includes, at=query_params.at))
 
     bundle = create_fhir_bundle(
-        bundled_entries=create_bundle_entries(entries, with_req_resp=False),
+        bundled_entries=None,
         bundle_type=BundleType.SEARCHSET,
-    ).dict()
+        page=page,
+        total=bundle_total(len(entries), total, page),
+    )
 
-    return FhirBundleResponse(bundle)
+    return FhirBundleResponse(bundle, entries=entries)
 
 
 @router.put("/{_id}")
 def update(
     _id: UUID,
     data: Dict[str, Any],
+    version: int | None = Depends(if_match),
     service: LocationService = Depends(get_location_service),
 ) -> Response:
     fhir_data = FhirLocation(**data)
@@ -74,20 +95,21 @@ def update(
         logging.error(f"Location ID not found in resource: {_id}")
         raise InvalidResourceException("Location ID not found in resource")
 
-    entry = service.update_one(_id, fhir_data)
+    entry = service.update_one(_id, fhir_data, version=version)
     return FhirEntityResponse(entry)
 
 
 @router.delete("/{_id}")
 def delete(
     _id: UUID,
+    version: int | None = Depends(if_match),
     service: LocationService = Depends(get_location_service),
 ) -> Response:
     if not service.get_one(_id):
         logger.error(f"Location resource is invalid: {_id}")
         raise ResourceNotFoundException("Location resource is invalid")
 
-    service.delete_one(_id)
+    service.delete_one(_id, version=version)
 
     return Response(
         content="",
@@ -98,13 +120,14 @@ def delete(
 @router.get(
     "/{_id}/_history/{version_id}",
     summary="Find a specific history version for the given resource",
+    dependencies=[Depends(not_modified_version("Location"))],
 )
-def get_history_version(
+async def get_history_version(
     _id: UUID,
     version_id: int,
     service: LocationService = Depends(get_location_service),
 ) -> Response:
-    entry = service.get_one_version(resource_id=_id, version_id=version_id)
+    entry = await service.get_one_version_async(resource_id=_id, version_id=version_id)
     if entry is None:
         logger.error("Location resource is invalid")
         raise ResourceNotFoundException("Location resource is invalid")
@@ -120,32 +143,25 @@ def get_history_version(
     "/_history",
     summary="Find all versions for the all resources",
 )
-def get_history(
+async def get_history(
     _id: UUID | None = None,
     _since: HistoryRequest = Depends(),
     service: LocationService = Depends(get_location_service),
 ) -> Response:
-    if _id is None:
-        # Fetch all history entries
-        entries = service.find_history(since=_since.since)
-    else:
-        # Fetch history for specific version
-        entries = service.find_history(id=_id, since=_since.since)
-
-    bundle = create_fhir_bundle(
-        bundled_entries=create_bundle_entries(entries, with_req_resp=True),
+    return FhirBundleStreamingResponse(
+        service.stream_history_async(id=_id, since=_since.since),
         bundle_type=BundleType.HISTORY,
-    ).dict()
-
-    return FhirBundleResponse(bundle)
+        with_req_resp=True,
+    )
 
 
-@router.get("/{_id}")
-def get(
+@router.get("/{_id}", dependencies=[Depends(not_modified("Location"))])
+async def get(
     _id: UUID,
+    _at: datetime | None = None,
     service: LocationService = Depends(get_location_service),
 ) -> Response:
-    entry = service.get_one(_id)
+    entry = await service.get_one_async(_id, at=_at)
     if entry is None:
         logger.error("Location resource is invalid")
         raise ResourceNotFoundException("Location resource is invalid")
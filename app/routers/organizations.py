@@ -1,14 +1,27 @@
 import logging
+from datetime import datetime
 from typing import Any, Dict
 from uuid import UUID
 
 from fastapi import APIRouter, Depends
 from fhir.resources.R4B.organization import Organization as FhirOrganization
+from starlette.responses import Response
 
 from app.container import get_matching_care_service, get_organization_service
 from app.exceptions.service_exceptions import InvalidResourceException
+from app.mappers.fhir_mapper import BundleType
 from app.params.history_query_params import HistoryRequest
+from app.params.include import Includes, get_includes
 from app.params.organization_query_params import OrganizationQueryParams
+from app.params.pagination import Page, get_page
+from app.params.summary import Summary, get_summary
+from app.routers.conditional import if_match, not_modified, not_modified_version
+from app.routers.utils import (
+    FhirBundleResponse,
+    FhirBundleStreamingResponse,
+    FhirEntityResponse,
+    FhirJsonResponse,
+)
 from app.services.entity_services.organization_service import OrganizationService
 from app.services.matching_care_service import MatchingCareService
 
@@ -22,36 +35,40 @@ router = APIRouter(
 def create_organization(
     data: Dict[str, Any],
     service: OrganizationService = Depends(get_organization_service),
-) -> dict[str, Any] | None:
+) -> Response:
     fhir_data = FhirOrganization(**data)
     if fhir_data.id is not None:
         logging.error("Organization ID cannot be in the resource")
         raise InvalidResourceException("Organization ID cannot be in the organization resource")
 
-    return service.add_one(fhir_data).data
+    return FhirEntityResponse(service.add_one(fhir_data))
 
 
 @router.get("/_search/{_id}")
 @router.get(
     "/_search",
 )
-def find_organization(
+async def find_organization(
     _id: UUID | None = None,
     query_params: OrganizationQueryParams = Depends(),
+    page: Page = Depends(get_page),
+    summary: Summary = Depends(get_summary),
+    includes: Includes = Depends(get_includes("Organization")),
     service: MatchingCareService = Depends(get_matching_care_service),
-) -> dict[str, Any]:
+) -> Response:
     if _id:
         query_params.id = _id
-    bundle = service.find_organizations(query_params)
-    return bundle.dict()  # type:ignore
+    result = await service.find_organizations_async(query_params, page=page, includes=includes, summary=summary)
+    return FhirBundleResponse(result.bundle, entries=result.entries, with_req_resp=True, included=result.included)
 
 
 @router.put("/{_id}")
 def update_organization(
     _id: UUID,
     data: Dict[str, Any],
+    version: int | None = Depends(if_match),
     service: OrganizationService = Depends(get_organization_service),
-) -> dict[str, Any] | None:
+) -> Response:
     fhir_data = FhirOrganization(**data)
     if fhir_data.id is None:
         logging.error("Organization ID not found in organization resource")
@@ -63,41 +80,47 @@ def update_organization(
             f"Organization ID {str(fhir_data.id)} in the resource does not match the URL {str(_id)}"
         )
 
-    return service.update_one(_id, fhir_data).data
+    return FhirEntityResponse(service.update_one(_id, fhir_data, version=version))
 
 
 @router.delete("/{_id}")
 def delete_organization(
     _id: UUID,
+    version: int | None = Depends(if_match),
     service: OrganizationService = Depends(get_organization_service),
 ) -> None:
-    return service.delete_one(_id)
+    return service.delete_one(_id, version=version)
 
 
-@router.get("/{_id}/_history/{version_id}")
-def get_organization_version(
+@router.get("/{_id}/_history/{version_id}", dependencies=[Depends(not_modified_version("Organization"))])
+async def get_organization_version(
     _id: UUID,
     version_id: int,
     service: OrganizationService = Depends(get_organization_service),
-) -> Dict[str, Any]:
-    results = service.get_one_version(resource_id=_id, version_id=version_id)
-    return results.data if results.data is not None else results.bundle_meta
+) -> Response:
+    results = await service.get_one_version_async(resource_id=_id, version_id=version_id)
+    return FhirEntityResponse(results) if results.data is not None else FhirJsonResponse(results.bundle_meta)
 
 
 @router.get("/{_id}/_history")
 @router.get("/_history")
-def find_organization_history(
+async def find_organization_history(
     _id: UUID | None = None,
     _since: HistoryRequest = Depends(),
-    service: MatchingCareService = Depends(get_matching_care_service),
-) -> dict[str, Any]:
-    return service.find_organizations_history(organization_id=_id, since=_since.since)
+    service: OrganizationService = Depends(get_organization_service),
+) -> Response:
+    return FhirBundleStreamingResponse(
+        service.stream_history_async(id=_id, since=_since.since),
+        bundle_type=BundleType.HISTORY,
+        with_req_resp=True,
+    )
 
 
-@router.get("/{_id}")
-def get_organization(
+@router.get("/{_id}", dependencies=[Depends(not_modified("Organization"))])
+async def get_organization(
     _id: UUID,
+    _at: datetime | None = None,
     service: OrganizationService = Depends(get_organization_service),
-) -> Dict[str, Any] | None:
-    org = service.get_one(_id)
-    return org.data
+) -> Response:
+    org = await service.get_one_async(_id, at=_at)
+    return FhirEntityResponse(org)
@@ -1,18 +1,128 @@
-import json
-from datetime import date, datetime
-from typing import Any, Dict, Optional
+from contextvars import ContextVar
+from datetime import UTC, date, datetime
+from decimal import Decimal
+from email.utils import format_datetime
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Optional, Sequence
 
-from starlette.responses import Response
+import orjson
+from fastapi import Query
+from starlette.responses import Response, StreamingResponse
 
 from app.db.entities.mixin.common_mixin import CommonMixin
+from app.mappers.fhir_mapper import BundleType, create_bundle_entry
 
+# Size (in bytes) of the chunks that are written to the client while streaming a bundle
+STREAM_CHUNK_SIZE = 64 * 1024
 
-def json_serial(obj: Any) -> str:
+# Whether the response of the current request is indented, set by the _pretty parameter
+_pretty: ContextVar[bool] = ContextVar("pretty", default=False)
+
+
+def json_serial(obj: Any) -> Any:
     if isinstance(obj, (datetime, date)):
         return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return float(obj)
     return str(obj)
 
 
+async def pretty_output(pretty: bool = Query(alias="_pretty", default=False)) -> None:
+    """
+    Application wide dependency for the _pretty parameter. Responses are compact, unless the client asks for
+    indented JSON with _pretty=true. This is an async dependency so the value is set in the context of the request
+    itself, and not in the thread a sync dependency runs in.
+    """
+    _pretty.set(pretty)
+
+
+def is_pretty() -> bool:
+    return _pretty.get()
+
+
+def dumps(value: Any, pretty: bool | None = None) -> bytes:
+    """
+    Encodes a value as compact JSON, or indented when pretty (which defaults to the _pretty parameter of the
+    request). orjson handles UUIDs, datetimes and dataclasses natively.
+    """
+    pretty = is_pretty() if pretty is None else pretty
+    return orjson.dumps(value, default=json_serial, option=orjson.OPT_INDENT_2 if pretty else 0)
+
+
+def http_date(value: datetime) -> str:
+    return format_datetime(value.astimezone(UTC), usegmt=True)
+
+
+def last_modified(entry: CommonMixin) -> datetime:
+    """
+    Returns meta.lastUpdated of the entry, which is also what the generated last_updated column holds
+    """
+    meta = (entry.data or {}).get("meta") or {}
+    try:
+        return datetime.fromisoformat(meta["lastUpdated"])
+    except (KeyError, TypeError, ValueError):
+        return entry.created_at
+
+
+def resource_json(entry: CommonMixin) -> bytes:
+    """
+    Returns the JSON text of the resource data. The compact text stored with the version is used as is, the data is
+    only encoded for entries that do not have it, such as projected search results, or for pretty output. Both give
+    the same bytes (see data_json()).
+    """
+    # Read from the instance dict, so an unloaded (deferred or expired) column is never loaded here
+    data_json = entry.__dict__.get("data_json")
+    if entry.data is not None and data_json is not None and not is_pretty():
+        return str(data_json).encode()
+    return dumps(entry.data)
+
+
+def bundle_entry_json(entry: CommonMixin, with_req_resp: bool = False) -> bytes:
+    """
+    create_bundle_entry() as JSON text, written directly as bytes with the stored JSON text of the resource spliced
+    in. The output is the same as that of dumps(create_bundle_entry()).
+    """
+    if is_pretty() or entry.bundle_meta is None:
+        return dumps(create_bundle_entry(entry, with_req_resp))
+
+    content = b'{"fullUrl":"' + f"{entry.fhir_id}/_history/{entry.version}".encode() + b'","resource":'
+    content += resource_json(entry)
+    if with_req_resp:
+        content += b',"request":' + dumps(entry.bundle_meta.get("request"))
+        content += b',"response":' + dumps(entry.bundle_meta.get("response"))
+    return content + b"}"
+
+
+def bundle_json(
+    bundle: Dict[str, Any],
+    entries: Sequence[CommonMixin],
+    with_req_resp: bool = False,
+    included: Sequence[CommonMixin] = (),
+) -> bytes:
+    """
+    Writes a Bundle (without entries) and appends the given entries, see bundle_entry_json(). The included entries
+    are appended after them, without request and response.
+    """
+    if is_pretty():
+        bundled = [create_bundle_entry(entry, with_req_resp) for entry in entries]
+        return dumps({**bundle, "entry": bundled + [create_bundle_entry(entry) for entry in included]})
+
+    content = dumps({key: value for key, value in bundle.items() if key != "entry"})
+    written = [bundle_entry_json(entry, with_req_resp) for entry in entries]
+    written += [bundle_entry_json(entry) for entry in included]
+    return content[:-1] + b',"entry":[' + b",".join(written) + b"]}"
+
+
+class FhirJsonResponse(Response):
+    """
+    JSON response with the FHIR media type, compact unless the client asks for _pretty=true
+    """
+
+    media_type = "application/fhir+json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
 class FhirEntityResponse(Response):
     def __init__(
         self,
@@ -21,27 +131,79 @@ class FhirEntityResponse(Response):
         headers: Optional[Dict[str, str]] = None,
     ):
         super().__init__(
-            content=json.dumps(entry.data, indent=2, default=json_serial),
+            content=resource_json(entry),
             media_type="application/fhir+json",
             status_code=status_code,
             headers={
                 "ETag": f'W/"{entry.version}"',
-                "Last-Modified": entry.created_at.isoformat(),
+                "Last-Modified": http_date(last_modified(entry)),
                 **(headers or {}),
             },
         )
 
 
 class FhirBundleResponse(Response):
+    """
+    Writes a bundle. When the entries are given, the bundle itself holds no entries and the entries (followed by the
+    included entries) are written with the stored JSON text of their resources.
+    """
+
     def __init__(
         self,
         bundle: Any,
         status_code: int = 200,
         headers: Optional[Dict[str, str]] = None,
+        entries: Sequence[CommonMixin] | None = None,
+        with_req_resp: bool = False,
+        included: Sequence[CommonMixin] = (),
     ):
         super().__init__(
-            content=json.dumps(bundle, indent=2, default=json_serial),
+            content=bundle_json(bundle, entries, with_req_resp, included) if entries is not None else dumps(bundle),
             media_type="application/fhir+json",
             status_code=status_code,
             headers=headers,
         )
+
+
+class FhirBundleStreamingResponse(StreamingResponse):
+    """
+    Writes a bundle to the client while its entries are still being fetched, so the complete bundle is never
+    held in memory. The total is only known once all entries are written, so it is emitted as the last key.
+    """
+
+    def __init__(
+        self,
+        entries: AsyncIterable[CommonMixin],
+        bundle_type: BundleType,
+        with_req_resp: bool = False,
+        status_code: int = 200,
+        headers: Optional[Dict[str, str]] = None,
+    ):
+        super().__init__(
+            content=self._generate(entries, bundle_type, with_req_resp),
+            media_type="application/fhir+json",
+            status_code=status_code,
+            headers=headers,
+        )
+
+    @staticmethod
+    async def _generate(
+        entries: AsyncIterable[CommonMixin], bundle_type: BundleType, with_req_resp: bool
+    ) -> AsyncIterator[bytes]:
+        chunk = [dumps({"resourceType": "Bundle", "type": bundle_type.value}, pretty=False)[:-1] + b',"entry":[']
+        chunk_size = 0
+        total = 0
+
+        async for entry in entries:
+            content = bundle_entry_json(entry, with_req_resp)
+            chunk.append(content if total == 0 else b"," + content)
+            chunk_size += len(content)
+            total += 1
+
+            if chunk_size >= STREAM_CHUNK_SIZE:
+                yield b"".join(chunk)
+                chunk = []
+                chunk_size = 0
+
+        chunk.append(b'],"total":' + str(total).encode() + b"}")
+        yield b"".join(chunk)
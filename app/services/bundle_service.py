@@ -0,0 +1,249 @@
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Protocol, Set, Tuple
+from uuid import UUID, uuid4
+
+from fhir.resources.R4B import get_fhir_model_class
+from pydantic import ValidationError
+
+from app.db.db import Database
+from app.db.entities.mixin.common_mixin import CommonMixin
+from app.db.entities.resource_types import RESOURCE_ENTITIES
+from app.db.session import TransactionDbSession
+from app.exceptions.fhir_exception import FHIRException
+from app.exceptions.service_exceptions import InvalidResourceException
+from app.mappers.fhir_mapper import BundleType
+from app.services.reference_validator import ReferenceValidator
+from app.services.utils import etag_version, find_references, split_reference
+
+logger = logging.getLogger(__name__)
+
+# https://hl7.org/fhir/R4B/http.html#trules: deletes first, then creates and updates. Reads are not supported, they
+# could be served from the read cache while the transaction still holds newer (uncommitted) versions.
+METHOD_ORDER = ["DELETE", "POST", "PUT"]
+
+URN_UUID_PREFIX = "urn:uuid:"
+
+
+class ResourceService(Protocol):
+    def add_one(self, fhir_entity: Any, /, id: UUID | None = None) -> CommonMixin: ...
+
+    def update_one(self, resource_id: UUID, fhir_entity: Any, /, version: int | None = None) -> CommonMixin: ...
+
+    def delete_one(self, resource_id: UUID, /, version: int | None = None) -> None: ...
+
+
+@dataclass
+class BundleRequest:
+    """
+    A single entry of a transaction or batch bundle
+    """
+
+    index: int
+    method: str
+    resource_type: str
+    resource_id: UUID
+    resource: Dict[str, Any] | None
+    # The version of request.ifMatch, updates and deletes fail with 412 when it is not the current version
+    version: int | None = None
+
+
+class BundleService:
+    """
+    Processes transaction and batch bundles (https://hl7.org/fhir/R4B/http.html#transaction).
+
+    A transaction runs all entries through the regular entity services inside a single database transaction, so
+    either every entry is stored or none is. Created resources get their id up front, which lets `urn:uuid`
+    references between entries be rewritten before anything is written. All references to stored resources are
+    then validated with one query per resource type, and the services do not look them up again.
+
+    A batch runs every entry in a transaction of its own and reports failures per entry.
+    """
+
+    def __init__(self, database: Database, services: Dict[str, ResourceService]) -> None:
+        self.database = database
+        self.services = services
+
+    def process(self, bundle: Dict[str, Any]) -> Dict[str, Any]:
+        if bundle.get("resourceType") != "Bundle":
+            raise InvalidResourceException("Expected a Bundle resource")
+
+        bundle_type = bundle.get("type")
+        if bundle_type == "transaction":
+            return self._transaction(bundle.get("entry") or [])
+        if bundle_type == "batch":
+            return self._batch(bundle.get("entry") or [])
+
+        raise InvalidResourceException(f"Bundle type {bundle_type} is not supported, expected transaction or batch")
+
+    def _transaction(self, entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+        (requests, created) = self._parse(entries)
+
+        responses: Dict[int, Dict[str, Any]] = {}
+        with self.database.transaction() as session:
+            session.resolved_references.update(created)
+            self._validate_references(session, requests, created)
+
+            for request in sorted(requests, key=lambda r: METHOD_ORDER.index(r.method)):
+                try:
+                    responses[request.index] = self._execute(request)
+                except FHIRException:
+                    logger.warning(
+                        "Transaction failed on entry %d (%s %s)", request.index, request.method, request.resource_type
+                    )
+                    raise
+
+        return self._response(BundleType.TRANSACTION_RESPONSE, [responses[i] for i in range(len(requests))])
+
+    def _batch(self, entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+        responses: List[Dict[str, Any]] = []
+        for index, entry in enumerate(entries):
+            # Earlier entries are already committed, every failure has to end up in the response of its entry
+            try:
+                (requests, _) = self._parse([entry])
+                with self.database.transaction():
+                    responses.append(self._execute(requests[0]))
+            except FHIRException as e:
+                responses.append(self._error(e))
+            except ValueError as e:
+                # Invalid references (of a type the element does not allow, for example) and invalid resource data
+                responses.append(self._error(InvalidResourceException(f"Entry {index} is invalid: {e}")))
+            except Exception as e:
+                logger.exception("Batch entry %d failed", index)
+                responses.append(self._error(FHIRException(500, severity="error", code="exception", msg=f"{e}")))
+
+        return self._response(BundleType.BATCH_RESPONSE, responses)
+
+    def _parse(self, entries: List[Dict[str, Any]]) -> Tuple[List[BundleRequest], Set[Tuple[str, UUID]]]:
+        """
+        Parses the entries and assigns an id to every resource that is created. References to the `urn:uuid`
+        fullUrl of a created resource are replaced by a reference to its new id.
+        """
+        requests: List[BundleRequest] = []
+        urn_references: Dict[str, str] = {}
+        created: Set[Tuple[str, UUID]] = set()
+
+        for index, entry in enumerate(entries):
+            request = entry.get("request") or {}
+            method = str(request.get("method", "")).upper()
+            if method not in METHOD_ORDER:
+                raise InvalidResourceException(f"Entry {index} has an unsupported request method {method}")
+
+            (resource_type, url_id) = self._parse_url(index, str(request.get("url", "")))
+            if resource_type not in self.services:
+                raise InvalidResourceException(f"Entry {index} has an unsupported resource type {resource_type}")
+
+            if method == "POST":
+                if url_id is not None:
+                    raise InvalidResourceException(f"Entry {index} cannot POST to a resource id, use PUT to update")
+                resource_id = uuid4()
+                created.add((resource_type, resource_id))
+                full_url = str(entry.get("fullUrl", ""))
+                if full_url.startswith(URN_UUID_PREFIX):
+                    urn_references[full_url] = f"{resource_type}/{resource_id}"
+            elif url_id is None:
+                raise InvalidResourceException(f"Entry {index} needs a resource id for {method}")
+            else:
+                resource_id = url_id
+
+            resource = entry.get("resource")
+            if method != "DELETE" and not isinstance(resource, dict):
+                raise InvalidResourceException(f"Entry {index} has no resource")
+            if resource is not None and resource.get("resourceType") != resource_type:
+                raise InvalidResourceException(f"Entry {index} does not hold a {resource_type} resource")
+
+            version = None
+            if request.get("ifMatch") is not None and method != "POST":
+                try:
+                    version = etag_version(str(request["ifMatch"]))
+                except ValueError:
+                    raise InvalidResourceException(f"Entry {index} has an invalid ifMatch {request['ifMatch']}")
+
+            requests.append(BundleRequest(index, method, resource_type, resource_id, resource, version))
+
+        for request in requests:
+            for reference in find_references(request.resource):
+                if reference["reference"] in urn_references:
+                    reference["reference"] = urn_references[reference["reference"]]
+                elif reference["reference"].startswith(URN_UUID_PREFIX):
+                    raise InvalidResourceException(
+                        f"Entry {request.index} has an unresolvable reference {reference['reference']}"
+                    )
+
+        return requests, created
+
+    @staticmethod
+    def _parse_url(index: int, url: str) -> Tuple[str, UUID | None]:
+        parts = url.split("?")[0].strip("/").split("/")
+        if len(parts) == 1:
+            return parts[0], None
+
+        try:
+            return parts[-2], UUID(parts[-1])
+        except ValueError:
+            raise InvalidResourceException(f"Entry {index} has an invalid request url {url}")
+
+    @staticmethod
+    def _validate_references(
+        session: TransactionDbSession, requests: List[BundleRequest], created: Set[Tuple[str, UUID]]
+    ) -> None:
+        """
+        Looks up every reference to a stored resource at once, so the services can skip their own lookups
+        """
+        deleted = {(r.resource_type, r.resource_id) for r in requests if r.method == "DELETE"}
+
+        validator = ReferenceValidator()
+        resolved: Set[Tuple[str, UUID]] = set()
+        for request in requests:
+            for reference in find_references(request.resource):
+                try:
+                    key = split_reference(reference["reference"])
+                except ValueError:
+                    continue
+                if key[0] not in RESOURCE_ENTITIES or key in created or key in deleted:
+                    continue
+                validator.add_reference(reference["reference"])
+                resolved.add(key)
+
+        validator.validate(session)
+        session.resolved_references.update(resolved)
+
+    def _execute(self, request: BundleRequest) -> Dict[str, Any]:
+        service = self.services[request.resource_type]
+
+        if request.method == "DELETE":
+            service.delete_one(request.resource_id, version=request.version)
+            return {"response": {"status": "204 No Content"}}
+
+        try:
+            fhir_entity = get_fhir_model_class(request.resource_type)(**(request.resource or {}))
+        except ValidationError as e:
+            raise InvalidResourceException(f"Entry {request.index} holds an invalid {request.resource_type}: {e}")
+
+        if request.method == "POST":
+            return self._entry(service.add_one(fhir_entity, id=request.resource_id), "201 Created")
+
+        if str((request.resource or {}).get("id")) != str(request.resource_id):
+            raise InvalidResourceException(f"Entry {request.index} has a resource id that does not match the url")
+        return self._entry(service.update_one(request.resource_id, fhir_entity, version=request.version), "200 OK")
+
+    @staticmethod
+    def _entry(entity: CommonMixin, status: str) -> Dict[str, Any]:
+        resource_type = entity.data.get("resourceType") if entity.data is not None else None
+        return {
+            "fullUrl": f"{resource_type}/{entity.fhir_id}",
+            "resource": entity.data,
+            "response": {
+                "status": status,
+                "location": f"{resource_type}/{entity.fhir_id}/_history/{entity.version}",
+                "etag": f'W/"{entity.version}"',
+            },
+        }
+
+    @staticmethod
+    def _error(e: FHIRException) -> Dict[str, Any]:
+        return {"response": {"status": str(e.status_code), "outcome": e.detail}}
+
+    @staticmethod
+    def _response(bundle_type: BundleType, entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {"resourceType": "Bundle", "type": bundle_type.value, "entry": entries}
@@ -0,0 +1,151 @@
+import asyncio
+import json
+import logging
+from collections import deque
+from dataclasses import asdict, dataclass
+from itertools import islice
+from typing import Any, Dict, List
+
+import psycopg
+from sqlalchemy import make_url
+
+from app.db.repositories.repository_base import CHANGES_CHANNEL
+from app.exceptions.service_exceptions import ChangesExpiredException
+
+logger = logging.getLogger(__name__)
+
+# Number of most recent changes kept for consumers that poll with since
+CHANGE_BUFFER_SIZE = 10000
+
+# Seconds before the subscriber connects again after its connection failed
+RECONNECT_DELAY = 1.0
+
+
+@dataclass(frozen=True)
+class Change:
+    seq: int
+    type: str
+    id: str
+    version: int
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class ChangeFeed:
+    """
+    Follows the notifications that the repositories send for every stored version (see notify_changes()) and keeps
+    the most recent ones for GET /$changes. Postgres delivers notifications in commit order.
+
+    The buffer lives in the memory of the process, so the feed requires a single app process (uvicorn without
+    workers, and one instance behind the load balancer). Another process has a buffer of its own that starts when
+    the process does, a cursor handed out by one process may be unknown to the next and every poll could expire.
+
+    A cursor (since) is the seq of the last change a consumer received, the changes after it are the ones that
+    arrived after it. Sequence numbers are taken before commit, a later change can have a lower seq. A cursor that is
+    no longer buffered (or never was, in this process) raises ChangesExpiredException: the consumer has to catch up
+    with _history. The buffer is cleared when the subscriber reconnects, as notifications sent while it was
+    disconnected are lost.
+    """
+
+    def __init__(self, dsn: str | None, buffer_size: int = CHANGE_BUFFER_SIZE) -> None:
+        self.dsn = dsn
+        self._changes: deque[Change] = deque(maxlen=buffer_size)
+        self._arrived = asyncio.Event()
+        self._task: asyncio.Task[None] | None = None
+
+    def publish(self, change: Change) -> None:
+        self._changes.append(change)
+        # Wakes up every waiting consumer, later waiters wait for the next change
+        self._arrived.set()
+        self._arrived = asyncio.Event()
+
+    def changes_after(self, since: int | None) -> List[Change]:
+        """
+        Returns the changes that arrived after the change with seq since, or all buffered changes without since
+        """
+        if since is None:
+            return list(self._changes)
+
+        for index, change in enumerate(self._changes):
+            if change.seq == since:
+                return list(islice(self._changes, index + 1, None))
+        raise ChangesExpiredException(f"Change {since} is no longer available, catch up with _history")
+
+    def latest(self) -> int | None:
+        return self._changes[-1].seq if len(self._changes) > 0 else None
+
+    async def wait(self, since: int | None, timeout: float) -> List[Change]:
+        """
+        Returns the changes after since, waiting at most timeout seconds for one to arrive when there are none yet.
+        Without since, only the changes that arrive while waiting are returned.
+        """
+        if since is None:
+            since = self.latest()
+            if since is None:
+                # Nothing buffered yet, everything that arrives is new
+                await self._wait_for_change(timeout)
+                return self.changes_after(None)
+
+        changes = self.changes_after(since)
+        if len(changes) == 0 and await self._wait_for_change(timeout):
+            changes = self.changes_after(since)
+        return changes
+
+    async def _wait_for_change(self, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(self._arrived.wait(), timeout)
+            return True
+        except TimeoutError:
+            return False
+
+    async def start(self) -> None:
+        """
+        Starts the subscriber. The first connection is made before returning, so that changes stored once the app
+        accepts requests are not missed. Without a Postgres database there are no changes to follow.
+        """
+        if self.dsn is None:
+            return
+
+        conninfo = make_url(self.dsn).set(drivername="postgresql").render_as_string(hide_password=False)
+        connection = None
+        try:
+            connection = await self._listen(conninfo)
+        except psycopg.Error as e:
+            logger.error("Cannot subscribe to changes, retrying in the background: %s", e)
+        self._task = asyncio.create_task(self._run(conninfo, connection))
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    @staticmethod
+    async def _listen(conninfo: str) -> psycopg.AsyncConnection[Any]:
+        connection = await psycopg.AsyncConnection.connect(conninfo, autocommit=True)
+        await connection.execute(f"LISTEN {CHANGES_CHANNEL}")
+        return connection
+
+    async def _run(self, conninfo: str, connection: psycopg.AsyncConnection[Any] | None) -> None:
+        while True:
+            try:
+                if connection is None:
+                    connection = await self._listen(conninfo)
+                    # Changes sent while disconnected are lost, cursors into the buffer would skip them
+                    self._changes.clear()
+                    logger.info("Subscribed to changes again")
+
+                async for notify in connection.notifies():
+                    self.publish(Change(**json.loads(notify.payload)))
+            except psycopg.Error as e:
+                logger.error("Lost the subscription to changes: %s", e)
+            finally:
+                if connection is not None:
+                    await connection.close()
+                connection = None
+            await asyncio.sleep(RECONNECT_DELAY)
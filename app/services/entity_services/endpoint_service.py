@@ -1,9 +1,8 @@
 import logging
 from datetime import datetime
-from typing import Sequence
+from typing import Any, AsyncIterator, Iterator, List, Sequence
 from uuid import UUID, uuid4
 
-from fastapi.encoders import jsonable_encoder
 from fhir.resources.R4B.endpoint import Endpoint as FhirEndpoint
 
 from app.db.db import Database
@@ -14,7 +13,9 @@ from app.exceptions.service_exceptions import (
     ResourceNotDeletedException,
     ResourceNotFoundException,
 )
+from app.params.pagination import Page
 from app.services.reference_validator import ReferenceValidator
+from app.services.utils import check_version, is_unchanged, resource_data
 
 
 class EndpointService:
@@ -24,8 +25,26 @@ class EndpointService:
     ):
         self.database = database
 
-    def find(
-        self,
+    def find(self, **kwargs: Any) -> Sequence[Endpoint]:
+        filtered_params = self._find_conditions(**kwargs)
+        with self.database.get_db_session() as session:
+            endpoints_repository = session.get_repository(EndpointsRepository)
+            return endpoints_repository.find(**filtered_params)
+
+    async def find_async(self, **kwargs: Any) -> Sequence[Endpoint]:
+        filtered_params = self._find_conditions(**kwargs)
+        async with self.database.get_async_db_session() as session:
+            return await session.run(EndpointsRepository, lambda repo: repo.find(**filtered_params))
+
+    async def count_async(self, estimate: bool = False, **kwargs: Any) -> int:
+        filtered_params = self._find_conditions(**kwargs)
+        async with self.database.get_async_db_session() as session:
+            return await session.run(
+                EndpointsRepository, lambda repo: repo.count(repo.find_statement(**filtered_params), estimate)
+            )
+
+    @staticmethod
+    def _find_conditions(
         id: UUID | None = None,
         updated_at: str | None = None,
         connection_type: str | None = None,
@@ -35,9 +54,12 @@ class EndpointService:
         payload_type: str | None = None,
         status: str | None = None,
         latest_version: bool | None = None,
+        at: datetime | None = None,
         sort_history: bool | None = None,
         since: datetime | None = None,
-    ) -> Sequence[Endpoint]:
+        page: Page | None = None,
+        elements: List[str] | None = None,
+    ) -> dict[str, Any]:
         params = {
             "id": id,
             "updated_at": updated_at,
@@ -48,33 +70,87 @@ class EndpointService:
             "payloadType": payload_type,
             "status": status,
             "latest": latest_version,
+            "at": at,
             "sort_history": sort_history,
             "since": since,
+            "page": page,
+            "elements": elements,
+        }
+        return {k: v for k, v in params.items() if v is not None}
+
+    def stream_history(self, id: UUID | None = None, since: datetime | None = None) -> Iterator[Endpoint]:
+        params = {
+            "id": id,
+            "sort_history": True,
+            "since": since,
         }
         filtered_params = {k: v for k, v in params.items() if v is not None}
         with self.database.get_db_session() as session:
             endpoints_repository = session.get_repository(EndpointsRepository)
-            return endpoints_repository.find(**filtered_params)
+            yield from endpoints_repository.stream(**filtered_params)
+
+    async def get_one_async(self, endpoint_id: UUID, at: datetime | None = None) -> Endpoint:
+        # The cache only holds current versions
+        cached = self.database.cache.get(Endpoint, endpoint_id) if at is None else None
+        if cached is not None:
+            return cached
+
+        async with self.database.get_async_db_session() as session:
+            endpoint = await session.run(EndpointsRepository, lambda repo: repo.get_one(at=at, fhir_id=endpoint_id))
+            if endpoint is None:
+                logging.warning("Endpoint not found for %s", endpoint_id)
+                raise ResourceNotFoundException(f"Endpoint not found for {endpoint_id}")
+            if at is None:
+                self.database.cache.put(endpoint)
+            return endpoint
+
+    async def get_one_version_async(self, resource_id: UUID, version_id: int) -> Endpoint:
+        async with self.database.get_async_db_session() as session:
+            version = await session.run(
+                EndpointsRepository, lambda repo: repo.get(fhir_id=resource_id, version=version_id)
+            )
+            if version is None:
+                logging.warning(f"Version not found for {str(resource_id)}")
+                raise ResourceNotFoundException(f"Version not found for {str(resource_id)}")
+
+            return version
+
+    async def stream_history_async(
+        self, id: UUID | None = None, since: datetime | None = None
+    ) -> AsyncIterator[Endpoint]:
+        params = {
+            "id": id,
+            "sort_history": True,
+            "since": since,
+        }
+        filtered_params = {k: v for k, v in params.items() if v is not None}
+        async with self.database.get_async_db_session() as session:
+            async for entity in session.stream(EndpointsRepository, **filtered_params):
+                yield entity
 
     def get_one(self, endpoint_id: UUID) -> Endpoint:
+        cached = self.database.cache.get(Endpoint, endpoint_id)
+        if cached is not None:
+            return cached
+
         with self.database.get_db_session() as session:
             endpoint_repo = session.get_repository(EndpointsRepository)
             endpoint = endpoint_repo.get_one(fhir_id=endpoint_id)
             if endpoint is None:
                 logging.warning("Endpoint not found for %s", endpoint_id)
                 raise ResourceNotFoundException(f"Endpoint not found for {endpoint_id}")
+            self.database.cache.put(endpoint)
             return endpoint
 
     def add_one(
         self,
         endpoint_fhir: FhirEndpoint,
+        id: UUID | None = None,
     ) -> Endpoint:
         with self.database.get_db_session() as session:
             endpoint_repo = session.get_repository(EndpointsRepository)
 
-            endpoint_fhir.meta = None
-
-            resource_id = uuid4()
+            resource_id = id if id is not None else uuid4()
             endpoint_fhir.id = str(resource_id)
 
             self._check_references(endpoint_fhir)
@@ -82,14 +158,14 @@ class EndpointService:
             endpoint = Endpoint(
                 version=1,
                 fhir_id=resource_id,
-                data=jsonable_encoder(endpoint_fhir.dict()),
+                data=resource_data(endpoint_fhir),
                 latest=True,
             )
             new_endpoint = endpoint_repo.create(endpoint)
 
             return new_endpoint
 
-    def delete_one(self, endpoint_id: UUID) -> None:
+    def delete_one(self, endpoint_id: UUID, version: int | None = None) -> None:
         with self.database.get_db_session() as session:
             endpoint_repo = session.get_repository(EndpointsRepository)
 
@@ -98,34 +174,34 @@ class EndpointService:
                 logging.warning("Endpoint not found for %s", endpoint_id)
                 raise ResourceNotFoundException(f"Endpoint not found for {endpoint_id}")
 
-            self._check_references(FhirEndpoint(**endpoint.data), delete=True)
+            check_version(endpoint, version)
+            self._check_not_referenced(endpoint.fhir_id)
 
-            endpoint_repo.delete(endpoint)
+            endpoint_repo.delete(endpoint, version)
 
     def update_one(
         self,
         endpoint_id: UUID,
         endpoint_fhir: FhirEndpoint,
+        version: int | None = None,
     ) -> Endpoint:
         with self.database.get_db_session() as session:
             endpoint_repo = session.get_repository(EndpointsRepository)
 
-            endpoint_fhir.meta = None
-
             update_endpoint = endpoint_repo.get_one(fhir_id=endpoint_id)
             if update_endpoint is None or update_endpoint.data is None:
                 logging.warning("Endpoint not found for %s", endpoint_id)
                 raise ResourceNotFoundException(f"Endpoint not found for {endpoint_id}")
 
-            meta_copy = update_endpoint.data.pop("meta")
-            if jsonable_encoder(update_endpoint.data) == jsonable_encoder(endpoint_fhir.dict()):
+            check_version(update_endpoint, version)
+            data = resource_data(endpoint_fhir)
+            if is_unchanged(update_endpoint, data):
                 # They are the same, no need to update
-                update_endpoint.data["meta"] = meta_copy
                 return update_endpoint
 
             self._check_references(endpoint_fhir)
 
-            updated_endpoint = endpoint_repo.update(update_endpoint, endpoint_fhir.dict())
+            updated_endpoint = endpoint_repo.update(update_endpoint, data, version)
 
             return updated_endpoint
 
@@ -139,21 +215,23 @@ class EndpointService:
 
             return version
 
-    def _check_references(self, data: FhirEndpoint, delete: bool = False) -> None:
+    def _check_not_referenced(self, endpoint_id: UUID) -> None:
         with self.database.get_db_session() as session:
             org_repo = session.get_repository(OrganizationsRepository)
-            if delete:
-                orgs_with_ref_to_endpoint = org_repo.find(latest=True, endpoint=str(data.id))
-                if len(orgs_with_ref_to_endpoint) > 0:
-                    logging.warning(
-                        "Cannot delete, Organization %s has active reference to this resource",
-                        orgs_with_ref_to_endpoint[0].fhir_id,
-                    )
-                    raise ResourceNotDeletedException(
-                        f"Cannot delete, Organization {orgs_with_ref_to_endpoint[0].fhir_id} has active reference to this resource"
-                    )
-                return
-
+            orgs_with_ref_to_endpoint = org_repo.find(latest=True, endpoint=str(endpoint_id))
+            if len(orgs_with_ref_to_endpoint) > 0:
+                logging.warning(
+                    "Cannot delete, Organization %s has active reference to this resource",
+                    orgs_with_ref_to_endpoint[0].fhir_id,
+                )
+                raise ResourceNotDeletedException(
+                    f"Cannot delete, Organization {orgs_with_ref_to_endpoint[0].fhir_id} "
+                    "has active reference to this resource"
+                )
+
+    def _check_references(self, data: FhirEndpoint) -> None:
+        with self.database.get_db_session() as session:
             if data.managingOrganization is not None:
                 reference_validator = ReferenceValidator()
-                reference_validator.validate_reference(session, data.managingOrganization, match_on="Organization")
+                reference_validator.add(data.managingOrganization, match_on="Organization")
+                reference_validator.validate(session)
@@ -1,8 +1,8 @@
 import logging
-from typing import Any, Sequence
+from datetime import datetime
+from typing import Any, AsyncIterator, Iterator, List, Sequence
 from uuid import UUID, uuid4
 
-from fastapi.encoders import jsonable_encoder
 from fhir.resources.R4B.healthcareservice import (
     HealthcareService as FhirHealthcareService,
 )
@@ -13,7 +13,9 @@ from app.db.repositories.healthcare_service_repository import (
     HealthcareServiceRepository,
 )
 from app.exceptions.service_exceptions import ResourceNotFoundException
+from app.params.pagination import Page
 from app.services.entity_services.abstraction import EntityService
+from app.services.utils import check_version, is_unchanged, resource_data
 
 
 class HealthcareServiceService(EntityService):
@@ -23,18 +25,18 @@ class HealthcareServiceService(EntityService):
     def find(
         self,
         params: dict[str, Any],
+        page: Page | None = None,
     ) -> Sequence[HealthcareService]:
         with self.database.get_db_session() as session:
             params["latest"] = True
 
             repo = session.get_repository(HealthcareServiceRepository)
-            return repo.find(**params)
+            return repo.find(**params, page=page)
 
     def add_one(self, fhir_entity: FhirHealthcareService, id: UUID | None = None) -> HealthcareService:
         with self.database.get_db_session() as session:
             repo = session.get_repository(HealthcareServiceRepository)
 
-            fhir_entity.meta = None
             if id is None:
                 id = uuid4()
             fhir_entity.id = str(id)
@@ -42,11 +44,11 @@ class HealthcareServiceService(EntityService):
             instance = HealthcareService(
                 version=1,
                 fhir_id=id,
-                data=jsonable_encoder(fhir_entity.dict()),
+                data=resource_data(fhir_entity),
             )
             return repo.create(instance)
 
-    def delete_one(self, resource_id: UUID) -> None:
+    def delete_one(self, resource_id: UUID, version: int | None = None) -> None:
         with self.database.get_db_session() as session:
             repo = session.get_repository(HealthcareServiceRepository)
             entity = repo.get_one(fhir_id=str(resource_id))
@@ -55,9 +57,14 @@ class HealthcareServiceService(EntityService):
                 logging.warning(f"HealthcareService not found for {str(resource_id)}")
                 raise ResourceNotFoundException(f"HealthcareService not found for {str(resource_id)}")
 
-            repo.delete(entity)
+            check_version(entity, version)
+            repo.delete(entity, version)
 
     def get_one(self, resource_id: UUID) -> HealthcareService:
+        cached = self.database.cache.get(HealthcareService, resource_id)
+        if cached is not None:
+            return cached
+
         with self.database.get_db_session() as session:
             repo = session.get_repository(HealthcareServiceRepository)
             entity = repo.get_one(fhir_id=str(resource_id))
@@ -66,6 +73,8 @@ class HealthcareServiceService(EntityService):
                 logging.warning(f"HealthcareService not found for {str(resource_id)}")
                 raise ResourceNotFoundException(f"HealthcareService not found for {str(resource_id)}")
 
+            self.database.cache.put(entity)
+
             return entity
 
     def get_one_version(self, resource_id: UUID, version_id: int) -> HealthcareService:
@@ -79,11 +88,10 @@ class HealthcareServiceService(EntityService):
 
             return entity
 
-    def update_one(self, resource_id: UUID, fhir_entity: FhirHealthcareService) -> HealthcareService:
+    def update_one(
+        self, resource_id: UUID, fhir_entity: FhirHealthcareService, version: int | None = None
+    ) -> HealthcareService:
         with self.database.get_db_session() as session:
-            # Remove metadata, as it will be added by the repository
-            fhir_entity.meta = None
-
             repo = session.get_repository(HealthcareServiceRepository)
             entity = repo.get_one(fhir_id=resource_id)
 
@@ -91,13 +99,12 @@ class HealthcareServiceService(EntityService):
                 logging.warning(f"HealthcareService not found for {str(resource_id)}")
                 raise ResourceNotFoundException(f"HealthcareService not found for {str(resource_id)}")
 
-            # Remove metadata temporary in order to compare the data
-            meta = entity.data.pop("meta")
-            if jsonable_encoder(entity.data) == jsonable_encoder(fhir_entity.dict()):
-                entity.data["meta"] = meta
+            check_version(entity, version)
+            data = resource_data(fhir_entity)
+            if is_unchanged(entity, data):
                 return entity  # The old and the new are the same, no need to create a new version for this
 
-            return repo.update(entity, fhir_entity.dict())
+            return repo.update(entity, data, version)
 
     def find_history(self, id: UUID | None = None) -> Sequence[HealthcareService]:
         params = {
@@ -109,3 +116,82 @@ class HealthcareServiceService(EntityService):
         with self.database.get_db_session() as session:
             repo = session.get_repository(HealthcareServiceRepository)
             return repo.find(**params)
+
+    def stream_history(self, id: UUID | None = None, since: datetime | None = None) -> Iterator[HealthcareService]:
+        params = {
+            "latest": False,
+            "sort_history": True,
+            "id": id,
+            "since": since,
+        }
+
+        with self.database.get_db_session() as session:
+            repo = session.get_repository(HealthcareServiceRepository)
+            yield from repo.stream(**params)
+
+    async def find_async(
+        self,
+        params: dict[str, Any],
+        page: Page | None = None,
+        elements: List[str] | None = None,
+    ) -> Sequence[HealthcareService]:
+        async with self.database.get_async_db_session() as session:
+            params["latest"] = True
+
+            return await session.run(
+                HealthcareServiceRepository, lambda repo: repo.find(**params, page=page, elements=elements)
+            )
+
+    async def count_async(self, params: dict[str, Any], estimate: bool = False) -> int:
+        async with self.database.get_async_db_session() as session:
+            params["latest"] = True
+
+            return await session.run(
+                HealthcareServiceRepository, lambda repo: repo.count(repo.find_statement(**params), estimate)
+            )
+
+    async def get_one_async(self, resource_id: UUID, at: datetime | None = None) -> HealthcareService:
+        # The cache only holds current versions
+        cached = self.database.cache.get(HealthcareService, resource_id) if at is None else None
+        if cached is not None:
+            return cached
+
+        async with self.database.get_async_db_session() as session:
+            entity = await session.run(
+                HealthcareServiceRepository, lambda repo: repo.get_one(at=at, fhir_id=str(resource_id))
+            )
+
+            if entity is None or entity.data is None:
+                logging.warning(f"HealthcareService not found for {str(resource_id)}")
+                raise ResourceNotFoundException(f"HealthcareService not found for {str(resource_id)}")
+
+            if at is None:
+                self.database.cache.put(entity)
+
+            return entity
+
+    async def get_one_version_async(self, resource_id: UUID, version_id: int) -> HealthcareService:
+        async with self.database.get_async_db_session() as session:
+            entity = await session.run(
+                HealthcareServiceRepository, lambda repo: repo.get(fhir_id=str(resource_id), version=version_id)
+            )
+
+            if entity is None:
+                logging.warning(f"Version not found for {str(resource_id)}")
+                raise ResourceNotFoundException(f"Version not found for {str(resource_id)}")
+
+            return entity
+
+    async def stream_history_async(
+        self, id: UUID | None = None, since: datetime | None = None
+    ) -> AsyncIterator[HealthcareService]:
+        params = {
+            "latest": False,
+            "sort_history": True,
+            "id": id,
+            "since": since,
+        }
+
+        async with self.database.get_async_db_session() as session:
+            async for entity in session.stream(HealthcareServiceRepository, **params):
+                yield entity
@@ -1,20 +1,18 @@
 import logging
 from datetime import datetime
-from typing import Any, Sequence
+from typing import Any, AsyncIterator, Iterator, List, Sequence
 from uuid import UUID, uuid4
 
-from fastapi.encoders import jsonable_encoder
 from fhir.resources.R4B.location import Location as FhirLocation
 
 from app.db.db import Database
 from app.db.entities.location.location import Location
-from app.db.entities.organization.organization import Organization
 from app.db.repositories.location_repository import LocationRepository
-from app.db.repositories.organizations_repository import OrganizationsRepository
 from app.db.session import DbSession
 from app.exceptions.service_exceptions import ResourceNotFoundException
+from app.params.pagination import Page
 from app.services.reference_validator import ReferenceValidator
-from app.services.utils import split_reference
+from app.services.utils import check_version, is_unchanged, resource_data
 
 
 class LocationService:
@@ -24,31 +22,32 @@ class LocationService:
     def find(
         self,
         params: dict[str, Any],
+        page: Page | None = None,
     ) -> Sequence[Location]:
         with self.database.get_db_session() as session:
             params["latest"] = True
 
             repo = session.get_repository(LocationRepository)
-            return repo.find(**params)
+            return repo.find(**params, page=page)
 
-    def add_one(self, fhir_entity: FhirLocation) -> Location:
+    def add_one(self, fhir_entity: FhirLocation, id: UUID | None = None) -> Location:
         with self.database.get_db_session() as session:
             repo = session.get_repository(LocationRepository)
 
             self._check_references(session, fhir_entity)
 
-            fhir_entity.meta = None
-            id = uuid4()
+            if id is None:
+                id = uuid4()
             fhir_entity.id = str(id)
 
             instance = Location(
                 version=1,
                 fhir_id=id,
-                data=jsonable_encoder(fhir_entity.dict()),
+                data=resource_data(fhir_entity),
             )
             return repo.create(instance)
 
-    def delete_one(self, resource_id: UUID) -> None:
+    def delete_one(self, resource_id: UUID, version: int | None = None) -> None:
         with self.database.get_db_session() as session:
             repo = session.get_repository(LocationRepository)
             entity = repo.get_one(fhir_id=str(resource_id))
@@ -57,9 +56,14 @@ class LocationService:
                 logging.warning(f"Location not found for {str(resource_id)}")
                 raise ResourceNotFoundException(f"Location not found for {str(resource_id)}")
 
-            repo.delete(entity)
+            check_version(entity, version)
+            repo.delete(entity, version)
 
     def get_one(self, resource_id: UUID) -> Location:
+        cached = self.database.cache.get(Location, resource_id)
+        if cached is not None:
+            return cached
+
         with self.database.get_db_session() as session:
             repo = session.get_repository(LocationRepository)
             entity = repo.get_one(fhir_id=str(resource_id))
@@ -68,6 +72,8 @@ class LocationService:
                 logging.warning(f"Location not found for {str(resource_id)}")
                 raise ResourceNotFoundException(f"Location not found for {str(resource_id)}")
 
+            self.database.cache.put(entity)
+
             return entity
 
     def get_one_version(self, resource_id: UUID, version_id: int) -> Location:
@@ -81,11 +87,8 @@ class LocationService:
 
             return entity
 
-    def update_one(self, resource_id: UUID, fhir_entity: FhirLocation) -> Location:
+    def update_one(self, resource_id: UUID, fhir_entity: FhirLocation, version: int | None = None) -> Location:
         with self.database.get_db_session() as session:
-            # Remove metadata, as it will be added by the repository
-            fhir_entity.meta = None
-
             repo = session.get_repository(LocationRepository)
             entity = repo.get_one(fhir_id=resource_id)
 
@@ -93,15 +96,14 @@ class LocationService:
                 logging.warning(f"Location not found for {str(resource_id)}")
                 raise ResourceNotFoundException(f"Location not found for {str(resource_id)}")
 
-            self._check_references(session, fhir_entity)
-
-            # Remove metadata temporary in order to compare the data
-            meta = entity.data.pop("meta")
-            if jsonable_encoder(entity.data) == jsonable_encoder(fhir_entity.dict()):
-                entity.data["meta"] = meta
+            check_version(entity, version)
+            data = resource_data(fhir_entity)
+            if is_unchanged(entity, data):
                 return entity  # The old and the new are the same, no need to create a new version for this
 
-            return repo.update(entity, fhir_entity.dict())
+            self._check_references(session, fhir_entity)
+
+            return repo.update(entity, data, version)
 
     def find_history(self, id: UUID | None = None, since: datetime | None = None) -> Sequence[Location]:
         params = {
@@ -115,37 +117,89 @@ class LocationService:
             repo = session.get_repository(LocationRepository)
             return repo.find(**params)
 
-    @staticmethod
-    def _check_references(session: DbSession, fhir_entity: FhirLocation) -> None:
-        reference_validator = ReferenceValidator()
+    def stream_history(self, id: UUID | None = None, since: datetime | None = None) -> Iterator[Location]:
+        params = {
+            "latest": False,
+            "sort_history": True,
+            "id": id,
+            "since": since,
+        }
 
-        if fhir_entity.managingOrganization is not None:
-            reference_validator.validate_reference(session, fhir_entity.managingOrganization, match_on="Organization")
+        with self.database.get_db_session() as session:
+            repo = session.get_repository(LocationRepository)
+            yield from repo.stream(**params)
 
-        if fhir_entity.partOf is not None:
-            reference_validator.validate_reference(session, fhir_entity.partOf, match_on="Location")
+    async def find_async(
+        self,
+        params: dict[str, Any],
+        page: Page | None = None,
+        elements: List[str] | None = None,
+    ) -> Sequence[Location]:
+        async with self.database.get_async_db_session() as session:
+            params["latest"] = True
 
-    def get_organizations(self, entries: list[Location]) -> list[Organization]:
-        """
-        Fetches the organizations for the given locations
-        """
-        organization_entities = []
+            return await session.run(LocationRepository, lambda repo: repo.find(**params, page=page, elements=elements))
 
-        with self.database.get_db_session() as session:
-            repo = session.get_repository(OrganizationsRepository)
+    async def count_async(self, params: dict[str, Any], estimate: bool = False) -> int:
+        async with self.database.get_async_db_session() as session:
+            params["latest"] = True
+
+            return await session.run(
+                LocationRepository, lambda repo: repo.count(repo.find_statement(**params), estimate)
+            )
 
-            for location in entries:
-                if "managingOrganization" not in location.data:  # type: ignore
-                    continue
+    async def get_one_async(self, resource_id: UUID, at: datetime | None = None) -> Location:
+        # The cache only holds current versions
+        cached = self.database.cache.get(Location, resource_id) if at is None else None
+        if cached is not None:
+            return cached
 
-                for organization in location.data["managingOrganization"]:  # type: ignore
-                    (ref_type, ref_id) = split_reference(organization["reference"])
+        async with self.database.get_async_db_session() as session:
+            entity = await session.run(LocationRepository, lambda repo: repo.get_one(at=at, fhir_id=str(resource_id)))
 
-                    organization_entity = repo.get_one(fhir_id=ref_id)
-                    if organization_entity is None:
-                        logging.warning(f"Organization {ref_id} not found for {location.fhir_id}")
-                        continue
+            if entity is None or entity.data is None:
+                logging.warning(f"Location not found for {str(resource_id)}")
+                raise ResourceNotFoundException(f"Location not found for {str(resource_id)}")
+
+            if at is None:
+                self.database.cache.put(entity)
+
+            return entity
+
+    async def get_one_version_async(self, resource_id: UUID, version_id: int) -> Location:
+        async with self.database.get_async_db_session() as session:
+            entity = await session.run(
+                LocationRepository, lambda repo: repo.get(fhir_id=str(resource_id), version=version_id)
+            )
 
-                    organization_entities.append(organization_entity)
+            if entity is None:
+                logging.warning(f"Version not found for {str(resource_id)}")
+                raise ResourceNotFoundException(f"Version not found for {str(resource_id)}")
+
+            return entity
+
+    async def stream_history_async(
+        self, id: UUID | None = None, since: datetime | None = None
+    ) -> AsyncIterator[Location]:
+        params = {
+            "latest": False,
+            "sort_history": True,
+            "id": id,
+            "since": since,
+        }
+
+        async with self.database.get_async_db_session() as session:
+            async for entity in session.stream(LocationRepository, **params):
+                yield entity
+
+    @staticmethod
+    def _check_references(session: DbSession, fhir_entity: FhirLocation) -> None:
+        reference_validator = ReferenceValidator()
+
+        if fhir_entity.managingOrganization is not None:
+            reference_validator.add(fhir_entity.managingOrganization, match_on="Organization")
+
+        if fhir_entity.partOf is not None:
+            reference_validator.add(fhir_entity.partOf, match_on="Location")
 
-        return organization_entities
+        reference_validator.validate(session)
@@ -1,26 +1,24 @@
 import logging
 from datetime import datetime
-from typing import Any, Sequence
+from typing import Any, AsyncIterator, Iterator, List, Sequence
 from uuid import UUID, uuid4
 
-from fastapi.encoders import jsonable_encoder
 from fhir.resources.R4B.organizationaffiliation import (
     OrganizationAffiliation as FhirOrganizationAffiliation,
 )
 
 from app.db.db import Database
-from app.db.entities.endpoint.endpoint import Endpoint
 from app.db.entities.organization_affiliation.organization_affiliation import (
     OrganizationAffiliation,
 )
-from app.db.repositories.endpoints_repository import EndpointsRepository
 from app.db.repositories.organization_affiliation_repository import (
     OrganizationAffiliationRepository,
 )
 from app.db.session import DbSession
 from app.exceptions.service_exceptions import ResourceNotFoundException
+from app.params.pagination import Page
 from app.services.reference_validator import ReferenceValidator
-from app.services.utils import split_reference
+from app.services.utils import check_version, is_unchanged, resource_data
 
 
 class OrganizationAffiliationService:
@@ -30,31 +28,32 @@ class OrganizationAffiliationService:
     def find(
         self,
         params: dict[str, Any],
+        page: Page | None = None,
     ) -> Sequence[OrganizationAffiliation]:
         with self.database.get_db_session() as session:
             params["latest"] = True
 
             repo = session.get_repository(OrganizationAffiliationRepository)
-            return repo.find(**params)
+            return repo.find(**params, page=page)
 
-    def add_one(self, fhir_entity: FhirOrganizationAffiliation) -> OrganizationAffiliation:
+    def add_one(self, fhir_entity: FhirOrganizationAffiliation, id: UUID | None = None) -> OrganizationAffiliation:
         with self.database.get_db_session() as session:
             repo = session.get_repository(OrganizationAffiliationRepository)
 
             self._check_references(session, fhir_entity)
 
-            fhir_entity.meta = None
-            id = uuid4()
+            if id is None:
+                id = uuid4()
             fhir_entity.id = str(id)
 
             instance = OrganizationAffiliation(
                 version=1,
                 fhir_id=id,
-                data=jsonable_encoder(fhir_entity.dict()),
+                data=resource_data(fhir_entity),
             )
             return repo.create(instance)
 
-    def delete_one(self, resource_id: UUID) -> None:
+    def delete_one(self, resource_id: UUID, version: int | None = None) -> None:
         with self.database.get_db_session() as session:
             repo = session.get_repository(OrganizationAffiliationRepository)
             entity = repo.get_one(fhir_id=str(resource_id))
@@ -63,9 +62,14 @@ class OrganizationAffiliationService:
                 logging.warning(f"OrganizationAffiliation not found for {str(resource_id)}")
                 raise ResourceNotFoundException(f"OrganizationAffiliation not found for {str(resource_id)}")
 
-            repo.delete(entity)
+            check_version(entity, version)
+            repo.delete(entity, version)
 
     def get_one(self, resource_id: UUID) -> OrganizationAffiliation:
+        cached = self.database.cache.get(OrganizationAffiliation, resource_id)
+        if cached is not None:
+            return cached
+
         with self.database.get_db_session() as session:
             repo = session.get_repository(OrganizationAffiliationRepository)
             entity = repo.get_one(fhir_id=str(resource_id))
@@ -74,6 +78,8 @@ class OrganizationAffiliationService:
                 logging.warning(f"OrganizationAffiliation not found for {str(resource_id)}")
                 raise ResourceNotFoundException(f"OrganizationAffiliation not found for {str(resource_id)}")
 
+            self.database.cache.put(entity)
+
             return entity
 
     def get_one_version(self, resource_id: UUID, version_id: int) -> OrganizationAffiliation:
@@ -87,11 +93,10 @@ class OrganizationAffiliationService:
 
             return entity
 
-    def update_one(self, resource_id: UUID, fhir_entity: FhirOrganizationAffiliation) -> OrganizationAffiliation:
+    def update_one(
+        self, resource_id: UUID, fhir_entity: FhirOrganizationAffiliation, version: int | None = None
+    ) -> OrganizationAffiliation:
         with self.database.get_db_session() as session:
-            # Remove metadata, as it will be added by the repository
-            fhir_entity.meta = None
-
             repo = session.get_repository(OrganizationAffiliationRepository)
             entity = repo.get_one(fhir_id=resource_id)
 
@@ -99,15 +104,14 @@ class OrganizationAffiliationService:
                 logging.warning(f"OrganizationAffiliation not found for {str(resource_id)}")
                 raise ResourceNotFoundException(f"OrganizationAffiliation not found for {str(resource_id)}")
 
-            self._check_references(session, fhir_entity)
-
-            # Remove metadata temporary in order to compare the data
-            meta = entity.data.pop("meta")
-            if jsonable_encoder(entity.data) == jsonable_encoder(fhir_entity.dict()):
-                entity.data["meta"] = meta
+            check_version(entity, version)
+            data = resource_data(fhir_entity)
+            if is_unchanged(entity, data):
                 return entity  # The old and the new are the same, no need to create a new version for this
 
-            return repo.update(entity, fhir_entity.dict())
+            self._check_references(session, fhir_entity)
+
+            return repo.update(entity, data, version)
 
     def find_history(self, id: UUID | None = None, since: datetime | None = None) -> Sequence[OrganizationAffiliation]:
         params = {
@@ -121,44 +125,100 @@ class OrganizationAffiliationService:
             repo = session.get_repository(OrganizationAffiliationRepository)
             return repo.find(**params)
 
-    @staticmethod
-    def _check_references(session: DbSession, fhir_entity: FhirOrganizationAffiliation) -> None:
-        reference_validator = ReferenceValidator()
+    def stream_history(
+        self, id: UUID | None = None, since: datetime | None = None
+    ) -> Iterator[OrganizationAffiliation]:
+        params = {
+            "latest": False,
+            "sort_history": True,
+            "id": id,
+            "since": since,
+        }
 
-        if fhir_entity.healthcareService is not None:
-            reference_validator.validate_list(session, fhir_entity.healthcareService, match_on="HealthcareService")
+        with self.database.get_db_session() as session:
+            repo = session.get_repository(OrganizationAffiliationRepository)
+            yield from repo.stream(**params)
 
-        if fhir_entity.organization is not None:
-            reference_validator.validate_reference(session, fhir_entity.organization, match_on="Organization")
+    async def find_async(
+        self,
+        params: dict[str, Any],
+        page: Page | None = None,
+        elements: List[str] | None = None,
+    ) -> Sequence[OrganizationAffiliation]:
+        async with self.database.get_async_db_session() as session:
+            params["latest"] = True
 
-        if fhir_entity.participatingOrganization is not None:
-            reference_validator.validate_reference(
-                session, fhir_entity.participatingOrganization, match_on="Organization"
+            return await session.run(
+                OrganizationAffiliationRepository, lambda repo: repo.find(**params, page=page, elements=elements)
             )
-        if fhir_entity.network is not None and len(fhir_entity.network) > 0:
-            reference_validator.validate_list(session, fhir_entity.network, match_on="Organization")
 
-    def get_endpoints(self, entries: list[OrganizationAffiliation]) -> list[Endpoint]:
-        """
-        Fetches the endpoints for the given organization affiliations
-        """
-        endpoint_entities = []
+    async def count_async(self, params: dict[str, Any], estimate: bool = False) -> int:
+        async with self.database.get_async_db_session() as session:
+            params["latest"] = True
 
-        with self.database.get_db_session() as session:
-            repo = session.get_repository(EndpointsRepository)
+            return await session.run(
+                OrganizationAffiliationRepository, lambda repo: repo.count(repo.find_statement(**params), estimate)
+            )
 
-            for affiliation in entries:
-                if "endpoint" not in affiliation.data:  # type: ignore
-                    continue
+    async def get_one_async(self, resource_id: UUID, at: datetime | None = None) -> OrganizationAffiliation:
+        # The cache only holds current versions
+        cached = self.database.cache.get(OrganizationAffiliation, resource_id) if at is None else None
+        if cached is not None:
+            return cached
 
-                for endpoint in affiliation.data["endpoint"]:  # type: ignore
-                    (ref_type, ref_id) = split_reference(endpoint["reference"])
+        async with self.database.get_async_db_session() as session:
+            entity = await session.run(
+                OrganizationAffiliationRepository, lambda repo: repo.get_one(at=at, fhir_id=str(resource_id))
+            )
 
-                    endpoint_entity = repo.get_one(fhir_id=ref_id)
-                    if endpoint_entity is None:
-                        logging.warning(f"Endpoint {ref_id} not found for {affiliation.fhir_id}")
-                        continue
+            if entity is None or entity.data is None:
+                logging.warning(f"OrganizationAffiliation not found for {str(resource_id)}")
+                raise ResourceNotFoundException(f"OrganizationAffiliation not found for {str(resource_id)}")
+
+            if at is None:
+                self.database.cache.put(entity)
+
+            return entity
+
+    async def get_one_version_async(self, resource_id: UUID, version_id: int) -> OrganizationAffiliation:
+        async with self.database.get_async_db_session() as session:
+            entity = await session.run(
+                OrganizationAffiliationRepository, lambda repo: repo.get(fhir_id=str(resource_id), version=version_id)
+            )
+
+            if entity is None:
+                logging.warning(f"Version not found for {str(resource_id)}")
+                raise ResourceNotFoundException(f"Version not found for {str(resource_id)}")
+
+            return entity
 
-                    endpoint_entities.append(endpoint_entity)
+    async def stream_history_async(
+        self, id: UUID | None = None, since: datetime | None = None
+    ) -> AsyncIterator[OrganizationAffiliation]:
+        params = {
+            "latest": False,
+            "sort_history": True,
+            "id": id,
+            "since": since,
+        }
+
+        async with self.database.get_async_db_session() as session:
+            async for entity in session.stream(OrganizationAffiliationRepository, **params):
+                yield entity
+
+    @staticmethod
+    def _check_references(session: DbSession, fhir_entity: FhirOrganizationAffiliation) -> None:
+        reference_validator = ReferenceValidator()
+
+        if fhir_entity.healthcareService is not None:
+            reference_validator.add_list(fhir_entity.healthcareService, match_on="HealthcareService")
+
+        if fhir_entity.organization is not None:
+            reference_validator.add(fhir_entity.organization, match_on="Organization")
+
+        if fhir_entity.participatingOrganization is not None:
+            reference_validator.add(fhir_entity.participatingOrganization, match_on="Organization")
+        if fhir_entity.network is not None and len(fhir_entity.network) > 0:
+            reference_validator.add_list(fhir_entity.network, match_on="Organization")
 
-        return endpoint_entities
+        reference_validator.validate(session)
@@ -1,9 +1,8 @@
 import logging
 from datetime import datetime
-from typing import Sequence
+from typing import Any, AsyncIterator, Iterator, List, Sequence
 from uuid import UUID, uuid4
 
-from fastapi.encoders import jsonable_encoder
 from fhir.resources.R4B.identifier import Identifier
 from fhir.resources.R4B.organization import Organization as FhirOrganization
 
@@ -17,16 +16,36 @@ from app.exceptions.service_exceptions import (
     ResourceNotDeletedException,
     ResourceNotFoundException,
 )
+from app.params.pagination import Page
 from app.services.entity_services.abstraction import EntityService
 from app.services.reference_validator import ReferenceValidator
+from app.services.utils import check_version, is_unchanged, resource_data
 
 
 class OrganizationService(EntityService):
     def __init__(self, database: Database):
         super().__init__(database)
 
-    def find(
-        self,
+    def find(self, **kwargs: Any) -> Sequence[Organization]:
+        filtered_params = self._find_conditions(**kwargs)
+        with self.database.get_db_session() as session:
+            organization_repository = session.get_repository(OrganizationsRepository)
+            return organization_repository.find(**filtered_params)
+
+    async def find_async(self, **kwargs: Any) -> Sequence[Organization]:
+        filtered_params = self._find_conditions(**kwargs)
+        async with self.database.get_async_db_session() as session:
+            return await session.run(OrganizationsRepository, lambda repo: repo.find(**filtered_params))
+
+    async def count_async(self, estimate: bool = False, **kwargs: Any) -> int:
+        filtered_params = self._find_conditions(**kwargs)
+        async with self.database.get_async_db_session() as session:
+            return await session.run(
+                OrganizationsRepository, lambda repo: repo.count(repo.find_statement(**filtered_params), estimate)
+            )
+
+    @staticmethod
+    def _find_conditions(
         id: UUID | None = None,
         updated_at: str | None = None,
         active: bool | None = None,
@@ -43,9 +62,12 @@ class OrganizationService(EntityService):
         phonetic: str | None = None,
         type: str | None = None,
         latest_version: bool | None = None,
+        at: datetime | None = None,
         sort_history: bool = False,
         since: datetime | None = None,
-    ) -> Sequence[Organization]:
+        page: Page | None = None,
+        elements: List[str] | None = None,
+    ) -> dict[str, Any]:
         params = {
             "id": id,
             "updated_at": updated_at,
@@ -63,14 +85,68 @@ class OrganizationService(EntityService):
             "phonetic": phonetic,
             "type": type,
             "latest": latest_version,
+            "at": at,
             "sort_history": sort_history,
             "since": since,
+            "page": page,
+            "elements": elements,
         }
 
+        return {k: v for k, v in params.items() if v is not None}
+
+    def stream_history(self, id: UUID | None = None, since: datetime | None = None) -> Iterator[Organization]:
+        params = {
+            "id": id,
+            "sort_history": True,
+            "since": since,
+        }
         filtered_params = {k: v for k, v in params.items() if v is not None}
         with self.database.get_db_session() as session:
             organization_repository = session.get_repository(OrganizationsRepository)
-            return organization_repository.find(**filtered_params)
+            yield from organization_repository.stream(**filtered_params)
+
+    async def get_one_async(self, resource_id: UUID, at: datetime | None = None) -> Organization:
+        # The cache only holds current versions
+        cached = self.database.cache.get(Organization, resource_id) if at is None else None
+        if cached is not None:
+            return cached
+
+        async with self.database.get_async_db_session() as session:
+            organization = await session.run(
+                OrganizationsRepository, lambda repo: repo.get_one(at=at, fhir_id=str(resource_id))
+            )
+            if organization is None or organization.data is None:
+                logging.warning(f"Organization not found for {str(resource_id)}")
+                raise ResourceNotFoundException(f"Organization not found for {str(resource_id)}")
+
+            if at is None:
+                self.database.cache.put(organization)
+
+            return organization
+
+    async def get_one_version_async(self, resource_id: UUID, version_id: int) -> Organization:
+        async with self.database.get_async_db_session() as session:
+            version = await session.run(
+                OrganizationsRepository, lambda repo: repo.get(fhir_id=resource_id, version=version_id)
+            )
+            if version is None:
+                logging.warning(f"Version not found for {str(resource_id)}")
+                raise ResourceNotFoundException(f"Version not found for {str(resource_id)}")
+
+            return version
+
+    async def stream_history_async(
+        self, id: UUID | None = None, since: datetime | None = None
+    ) -> AsyncIterator[Organization]:
+        params = {
+            "id": id,
+            "sort_history": True,
+            "since": since,
+        }
+        filtered_params = {k: v for k, v in params.items() if v is not None}
+        async with self.database.get_async_db_session() as session:
+            async for entity in session.stream(OrganizationsRepository, **filtered_params):
+                yield entity
 
     @staticmethod
     def is_valid_identifier(identifier: Identifier) -> bool:
@@ -115,18 +191,16 @@ class OrganizationService(EntityService):
 
         raise InvalidResourceException("URA number not found in organization resource")
 
-    def add_one(self, organization_fhir: FhirOrganization) -> Organization:
+    def add_one(self, organization_fhir: FhirOrganization, id: UUID | None = None) -> Organization:
         with self.database.get_db_session() as session:
             org_repo = session.get_repository(OrganizationsRepository)
 
-            organization_fhir.meta = None
-
             ura_number = self.validate_ura_number_in_fhir_resource(organization_fhir, False, org_repo)
             org = org_repo.get_one(ura_number=str(ura_number))
             if org is not None:
                 raise InvalidResourceException("Ura number already exists")
 
-            organization_id = uuid4()
+            organization_id = id if id is not None else uuid4()
             organization_fhir.id = str(organization_id)
 
             self._check_references(organization_fhir)
@@ -135,13 +209,17 @@ class OrganizationService(EntityService):
                 version=1,
                 fhir_id=organization_id,
                 ura_number=str(ura_number),
-                data=jsonable_encoder(organization_fhir.dict()),
+                data=resource_data(organization_fhir),
             )
             created_org = org_repo.create(organization_instance)
 
             return created_org
 
     def get_one(self, resource_id: UUID) -> Organization:
+        cached = self.database.cache.get(Organization, resource_id)
+        if cached is not None:
+            return cached
+
         with self.database.get_db_session() as session:
             repository = session.get_repository(OrganizationsRepository)
             organization = repository.get_one(fhir_id=str(resource_id))
@@ -149,6 +227,8 @@ class OrganizationService(EntityService):
                 logging.warning(f"Organization not found for {str(resource_id)}")
                 raise ResourceNotFoundException(f"Organization not found for {str(resource_id)}")
 
+            self.database.cache.put(organization)
+
             return organization
 
     def get_one_version(self, resource_id: UUID, version_id: int) -> Organization:
@@ -165,29 +245,27 @@ class OrganizationService(EntityService):
         self,
         resource_id: UUID,
         organization_fhir: FhirOrganization,
+        version: int | None = None,
     ) -> Organization:
         with self.database.get_db_session() as session:
             org_repo = session.get_repository(OrganizationsRepository)
 
-            organization_fhir.meta = None
-
-            self.validate_ura_number_in_fhir_resource(organization_fhir, True, org_repo)
-
             update_organization = org_repo.get_one(fhir_id=resource_id)
             if update_organization is None or update_organization.data is None:
                 logging.warning(f"Organization not found for {str(resource_id)}")
                 raise ResourceNotFoundException(f"Organization not found for {str(resource_id)}")
-            meta_copy = update_organization.data.pop("meta")
-            if jsonable_encoder(update_organization.data) == jsonable_encoder(organization_fhir.dict()):
-                update_organization.data["meta"] = meta_copy
+            check_version(update_organization, version)
+            data = resource_data(organization_fhir)
+            if is_unchanged(update_organization, data):
                 return update_organization  # The old and the new are the same, no need to create a new version for this
 
+            self.validate_ura_number_in_fhir_resource(organization_fhir, True, org_repo)
             self._check_references(organization_fhir)
 
-            updated_org = org_repo.update(update_organization, organization_fhir.dict())
+            updated_org = org_repo.update(update_organization, data, version)
             return updated_org
 
-    def delete_one(self, resource_id: UUID) -> None:
+    def delete_one(self, resource_id: UUID, version: int | None = None) -> None:
         with self.database.get_db_session() as session:
             org_repo = session.get_repository(OrganizationsRepository)
             organization = org_repo.get_one(fhir_id=str(resource_id))
@@ -196,41 +274,42 @@ class OrganizationService(EntityService):
                 logging.warning(f"Organization not found for {str(resource_id)}")
                 raise ResourceNotFoundException(f"Organization not found for {str(resource_id)}")
 
-            self._check_references(FhirOrganization(**organization.data), delete=True)
+            check_version(organization, version)
+            self._check_not_referenced(organization.fhir_id)
 
-            org_repo.delete(organization)
+            org_repo.delete(organization, version)
 
-    def _check_references(self, organization: FhirOrganization, delete: bool = False) -> None:
+    def _check_not_referenced(self, organization_id: UUID) -> None:
         with self.database.get_db_session() as session:
             endpoint_repo = session.get_repository(EndpointsRepository)
             org_repo = session.get_repository(OrganizationsRepository)
-            if delete:
-                endpoints_with_org = endpoint_repo.find(latest=True, managingOrganization=str(organization.id))
-                if len(endpoints_with_org) > 0:
-                    logging.warning(
-                        "Cannot delete, Endpoint %s has active reference to this resource",
-                        endpoints_with_org[0].fhir_id,
-                    )
-                    raise ResourceNotDeletedException(
-                        f"Cannot delete, Endpoint {endpoints_with_org[0].fhir_id} has active reference to this resource"
-                    )
-                orgs_part_of = org_repo.find(latest=True, part_of=str(organization.id))
-                if len(orgs_part_of) > 0:
-                    logging.warning(
-                        "Cannot delete, Organization %s has active reference to this resource",
-                        orgs_part_of[0].fhir_id,
-                    )
-                    raise ResourceNotDeletedException(
-                        f"Cannot delete, Organization {orgs_part_of[0].fhir_id} has active reference to this resource"
-                    )
-                return
+            endpoints_with_org = endpoint_repo.find(latest=True, managingOrganization=str(organization_id))
+            if len(endpoints_with_org) > 0:
+                logging.warning(
+                    "Cannot delete, Endpoint %s has active reference to this resource",
+                    endpoints_with_org[0].fhir_id,
+                )
+                raise ResourceNotDeletedException(
+                    f"Cannot delete, Endpoint {endpoints_with_org[0].fhir_id} has active reference to this resource"
+                )
+            orgs_part_of = org_repo.find(latest=True, part_of=str(organization_id))
+            if len(orgs_part_of) > 0:
+                logging.warning(
+                    "Cannot delete, Organization %s has active reference to this resource",
+                    orgs_part_of[0].fhir_id,
+                )
+                raise ResourceNotDeletedException(
+                    f"Cannot delete, Organization {orgs_part_of[0].fhir_id} has active reference to this resource"
+                )
 
+    def _check_references(self, organization: FhirOrganization) -> None:
+        with self.database.get_db_session() as session:
             reference_validator = ReferenceValidator()
             if organization.endpoint is not None:
-                reference_validator.validate_list(
-                    session,
+                reference_validator.add_list(
                     [endpoint for endpoint in organization.endpoint],
                     match_on="Endpoint",
                 )
             if organization.partOf is not None:
-                reference_validator.validate_reference(session, organization.partOf, match_on="Organization")
+                reference_validator.add(organization.partOf, match_on="Organization")
+            reference_validator.validate(session)
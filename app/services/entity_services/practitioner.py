@@ -1,9 +1,8 @@
 import logging
 from datetime import datetime
-from typing import Any, Sequence
+from typing import Any, AsyncIterator, Iterator, List, Sequence
 from uuid import UUID, uuid4
 
-from fastapi.encoders import jsonable_encoder
 from fhir.resources.R4B.practitioner import (
     Practitioner as FhirPractitioner,
 )
@@ -18,7 +17,9 @@ from app.db.repositories.practitioners_repository import (
 )
 from app.db.session import DbSession
 from app.exceptions.service_exceptions import ResourceNotFoundException
+from app.params.pagination import Page
 from app.services.reference_validator import ReferenceValidator
+from app.services.utils import check_version, is_unchanged, resource_data
 
 
 class PractitionerService:
@@ -28,12 +29,13 @@ class PractitionerService:
     def find(
         self,
         params: dict[str, Any],
+        page: Page | None = None,
     ) -> Sequence[Practitioner]:
         with self.database.get_db_session() as session:
             params["latest"] = True
 
             repo = session.get_repository(PractitionerRepository)
-            return repo.find(**params)
+            return repo.find(**params, page=page)
 
     def add_one(self, fhir_entity: FhirPractitioner, id: UUID | None = None) -> Practitioner:
         with self.database.get_db_session() as session:
@@ -41,7 +43,6 @@ class PractitionerService:
 
             self._check_references(session, fhir_entity)
 
-            fhir_entity.meta = None
             if id is None:
                 id = uuid4()
             fhir_entity.id = str(id)
@@ -49,11 +50,11 @@ class PractitionerService:
             instance = Practitioner(
                 version=1,
                 fhir_id=id,
-                data=jsonable_encoder(fhir_entity.dict()),
+                data=resource_data(fhir_entity),
             )
             return repo.create(instance)
 
-    def delete_one(self, resource_id: UUID) -> None:
+    def delete_one(self, resource_id: UUID, version: int | None = None) -> None:
         with self.database.get_db_session() as session:
             repo = session.get_repository(PractitionerRepository)
             entity = repo.get_one(fhir_id=str(resource_id))
@@ -62,9 +63,14 @@ class PractitionerService:
                 logging.warning(f"Practitioner not found for {str(resource_id)}")
                 raise ResourceNotFoundException(f"Practitioner not found for {str(resource_id)}")
 
-            repo.delete(entity)
+            check_version(entity, version)
+            repo.delete(entity, version)
 
     def get_one(self, resource_id: UUID) -> Practitioner:
+        cached = self.database.cache.get(Practitioner, resource_id)
+        if cached is not None:
+            return cached
+
         with self.database.get_db_session() as session:
             repo = session.get_repository(PractitionerRepository)
             entity = repo.get_one(fhir_id=str(resource_id))
@@ -73,6 +79,8 @@ class PractitionerService:
                 logging.warning(f"Practitioner not found for {str(resource_id)}")
                 raise ResourceNotFoundException(f"Practitioner not found for {str(resource_id)}")
 
+            self.database.cache.put(entity)
+
             return entity
 
     def get_one_version(self, resource_id: UUID, version_id: int) -> Practitioner:
@@ -86,11 +94,8 @@ class PractitionerService:
 
             return entity
 
-    def update_one(self, resource_id: UUID, fhir_entity: FhirPractitioner) -> Practitioner:
+    def update_one(self, resource_id: UUID, fhir_entity: FhirPractitioner, version: int | None = None) -> Practitioner:
         with self.database.get_db_session() as session:
-            # Remove metadata, as it will be added by the repository
-            fhir_entity.meta = None
-
             repo = session.get_repository(PractitionerRepository)
             entity = repo.get_one(fhir_id=resource_id)
 
@@ -98,15 +103,14 @@ class PractitionerService:
                 logging.warning(f"Practitioner not found for {str(resource_id)}")
                 raise ResourceNotFoundException(f"Practitioner not found for {str(resource_id)}")
 
-            self._check_references(session, fhir_entity)
-
-            # Remove metadata temporary in order to compare the data
-            meta = entity.data.pop("meta")
-            if jsonable_encoder(entity.data) == jsonable_encoder(fhir_entity.dict()):
-                entity.data["meta"] = meta
+            check_version(entity, version)
+            data = resource_data(fhir_entity)
+            if is_unchanged(entity, data):
                 return entity  # The old and the new are the same, no need to create a new version for this
 
-            return repo.update(entity, fhir_entity.dict())
+            self._check_references(session, fhir_entity)
+
+            return repo.update(entity, data, version)
 
     def find_history(self, id: UUID | None = None, since: datetime | None = None) -> Sequence[Practitioner]:
         params = {
@@ -120,6 +124,85 @@ class PractitionerService:
             repo = session.get_repository(PractitionerRepository)
             return repo.find(**params)
 
+    def stream_history(self, id: UUID | None = None, since: datetime | None = None) -> Iterator[Practitioner]:
+        params = {
+            "latest": False,
+            "sort_history": True,
+            "id": id,
+            "since": since,
+        }
+
+        with self.database.get_db_session() as session:
+            repo = session.get_repository(PractitionerRepository)
+            yield from repo.stream(**params)
+
+    async def find_async(
+        self,
+        params: dict[str, Any],
+        page: Page | None = None,
+        elements: List[str] | None = None,
+    ) -> Sequence[Practitioner]:
+        async with self.database.get_async_db_session() as session:
+            params["latest"] = True
+
+            return await session.run(
+                PractitionerRepository, lambda repo: repo.find(**params, page=page, elements=elements)
+            )
+
+    async def count_async(self, params: dict[str, Any], estimate: bool = False) -> int:
+        async with self.database.get_async_db_session() as session:
+            params["latest"] = True
+
+            return await session.run(
+                PractitionerRepository, lambda repo: repo.count(repo.find_statement(**params), estimate)
+            )
+
+    async def get_one_async(self, resource_id: UUID, at: datetime | None = None) -> Practitioner:
+        # The cache only holds current versions
+        cached = self.database.cache.get(Practitioner, resource_id) if at is None else None
+        if cached is not None:
+            return cached
+
+        async with self.database.get_async_db_session() as session:
+            entity = await session.run(
+                PractitionerRepository, lambda repo: repo.get_one(at=at, fhir_id=str(resource_id))
+            )
+
+            if entity is None or entity.data is None:
+                logging.warning(f"Practitioner not found for {str(resource_id)}")
+                raise ResourceNotFoundException(f"Practitioner not found for {str(resource_id)}")
+
+            if at is None:
+                self.database.cache.put(entity)
+
+            return entity
+
+    async def get_one_version_async(self, resource_id: UUID, version_id: int) -> Practitioner:
+        async with self.database.get_async_db_session() as session:
+            entity = await session.run(
+                PractitionerRepository, lambda repo: repo.get(fhir_id=str(resource_id), version=version_id)
+            )
+
+            if entity is None:
+                logging.warning(f"Version not found for {str(resource_id)}")
+                raise ResourceNotFoundException(f"Version not found for {str(resource_id)}")
+
+            return entity
+
+    async def stream_history_async(
+        self, id: UUID | None = None, since: datetime | None = None
+    ) -> AsyncIterator[Practitioner]:
+        params = {
+            "latest": False,
+            "sort_history": True,
+            "id": id,
+            "since": since,
+        }
+
+        async with self.database.get_async_db_session() as session:
+            async for entity in session.stream(PractitionerRepository, **params):
+                yield entity
+
     @staticmethod
     def _check_references(session: DbSession, fhir_entity: FhirPractitioner) -> None:
         reference_validator = ReferenceValidator()
@@ -129,4 +212,6 @@ class PractitionerService:
                 if not isinstance(qualification, PractitionerQualification):
                     raise TypeError(f"Expected `PractitionerQualification` but received {type(qualification)}")
                 if qualification.issuer is not None:
-                    reference_validator.validate_reference(session, qualification.issuer, match_on="Organization")
+                    reference_validator.add(qualification.issuer, match_on="Organization")
+
+        reference_validator.validate(session)
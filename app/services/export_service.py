@@ -0,0 +1,245 @@
+import json
+import logging
+import shutil
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any, Dict, List
+from uuid import UUID, uuid4
+
+from sqlalchemy import select
+
+from app.config import ConfigExport
+from app.db.db import Database
+from app.db.entities.resource_types import RESOURCE_ENTITIES
+from app.db.repositories.repository_base import STREAM_BATCH_SIZE
+from app.exceptions.service_exceptions import ResourceNotFoundException, TooManyRequestsException
+
+logger = logging.getLogger(__name__)
+
+# The job file is rewritten after this many exported resources, so the status endpoint can report progress
+PROGRESS_INTERVAL = 10000
+
+JOB_FILE = "job.json"
+
+
+class ExportStatus:
+    IN_PROGRESS = "in-progress"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+@dataclass
+class ExportFile:
+    type: str
+    file_name: str
+    count: int = 0
+
+
+@dataclass
+class ExportJob:
+    id: UUID
+    request: str
+    types: List[str]
+    since: datetime | None
+    transaction_time: datetime
+    status: str = ExportStatus.IN_PROGRESS
+    output: List[ExportFile] = field(default_factory=list)
+    error: str | None = None
+
+    @property
+    def exported(self) -> int:
+        return sum(file.count for file in self.output)
+
+    def to_json(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["id"] = str(self.id)
+        data["since"] = self.since.isoformat() if self.since is not None else None
+        data["transaction_time"] = self.transaction_time.isoformat()
+        return data
+
+    @staticmethod
+    def from_json(data: Dict[str, Any]) -> "ExportJob":
+        return ExportJob(
+            id=UUID(data["id"]),
+            request=data["request"],
+            types=data["types"],
+            since=datetime.fromisoformat(data["since"]) if data["since"] is not None else None,
+            transaction_time=datetime.fromisoformat(data["transaction_time"]),
+            status=data["status"],
+            output=[ExportFile(**file) for file in data["output"]],
+            error=data["error"],
+        )
+
+
+class ExportService:
+    """
+    Bulk export (https://hl7.org/fhir/uv/bulkdata/export.html) of the current version of every resource to one
+    NDJSON file per resource type.
+
+    Jobs run on a pool of config.workers threads, at most config.max_jobs jobs can be running or waiting for a
+    thread. Every type is read in batches from a server-side cursor within one repeatable read transaction, so the
+    files hold a consistent snapshot and only a batch is in memory at a time. The stored JSON text of every version
+    is written as is. The state of a job is kept in a job file next to its NDJSON files, so every worker sharing the
+    export directory can report on it. Jobs whose job file was not written for config.expiry_hours are removed when
+    the next job starts.
+    """
+
+    def __init__(self, database: Database, config: ConfigExport) -> None:
+        self.database = database
+        self.config = config
+        self.directory = Path(config.directory)
+        self._executor = ThreadPoolExecutor(max_workers=config.workers, thread_name_prefix="export")
+        self._jobs: Dict[UUID, Future[None]] = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def start(self, request: str, types: List[str] | None = None, since: datetime | None = None) -> ExportJob:
+        with self._lock:
+            self._jobs = {job_id: future for job_id, future in self._jobs.items() if not future.done()}
+            if len(self._jobs) >= self.config.max_jobs:
+                raise TooManyRequestsException(f"{len(self._jobs)} exports are in progress, try again later")
+
+            self.remove_expired()
+            job = self._create(request, types, since)
+            self._jobs[job.id] = self._executor.submit(self.run, job)
+
+        return job
+
+    def stop(self) -> None:
+        """
+        Stops the running jobs and drops the waiting ones, their job files are left in progress until they expire
+        """
+        self._stopping.set()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def remove_expired(self) -> None:
+        """
+        Removes the jobs of every worker sharing the export directory whose job file has not been written for
+        config.expiry_hours, except the ones running here. Running jobs write their job file at least every
+        PROGRESS_INTERVAL resources.
+        """
+        if not self.directory.exists():
+            return
+
+        running = {str(job_id) for job_id in self._jobs}
+        expired_before = time.time() - self.config.expiry_hours * 3600
+        for job_directory in self.directory.iterdir():
+            if not job_directory.is_dir() or job_directory.name in running:
+                continue
+
+            job_file = job_directory / JOB_FILE
+            try:
+                modified = (job_file if job_file.exists() else job_directory).stat().st_mtime
+            except FileNotFoundError:
+                continue
+            if modified < expired_before:
+                logger.info("Removing expired export %s", job_directory.name)
+                shutil.rmtree(job_directory, ignore_errors=True)
+
+    def _create(self, request: str, types: List[str] | None, since: datetime | None) -> ExportJob:
+        job = ExportJob(
+            id=uuid4(),
+            request=request,
+            types=types if types else list(RESOURCE_ENTITIES.keys()),
+            since=since,
+            transaction_time=datetime.now(UTC),
+        )
+        self._job_directory(job.id).mkdir(parents=True)
+        self._save(job)
+        return job
+
+    def run(self, job: ExportJob) -> None:
+        try:
+            with self.database.get_db_session() as session:
+                session.session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+                for resource_type in job.types:
+                    self._export_type(session.session, job, resource_type)
+                    self._save(job)
+            job.status = ExportStatus.COMPLETED
+            logger.info("Export %s completed with %d resources", job.id, job.exported)
+        except _Cancelled:
+            logger.info("Export %s was removed or stopped before it finished", job.id)
+            return
+        except Exception as e:
+            logger.error("Export %s failed: %s", job.id, e)
+            job.status = ExportStatus.FAILED
+            job.error = str(e)
+
+        try:
+            self._save(job)
+        except _Cancelled:
+            logger.info("Export %s was removed before it finished", job.id)
+
+    def get_job(self, job_id: UUID) -> ExportJob:
+        path = self._job_directory(job_id) / JOB_FILE
+        try:
+            with open(path, "r") as file:
+                return ExportJob.from_json(json.load(file))
+        except FileNotFoundError:
+            raise ResourceNotFoundException(f"Export {job_id} not found")
+
+    def get_file(self, job_id: UUID, file_name: str) -> Path:
+        job = self.get_job(job_id)
+        if job.status != ExportStatus.COMPLETED or file_name not in [file.file_name for file in job.output]:
+            raise ResourceNotFoundException(f"Export file {file_name} not found")
+
+        return self._job_directory(job_id) / file_name
+
+    def delete(self, job_id: UUID) -> None:
+        """
+        Removes the job and its files. A running job notices that its directory is gone and stops.
+        """
+        self.get_job(job_id)
+        shutil.rmtree(self._job_directory(job_id), ignore_errors=True)
+
+    def _export_type(self, session: Any, job: ExportJob, resource_type: str) -> None:
+        entity = RESOURCE_ENTITIES[resource_type]
+        stmt = select(entity.data_json).where(entity.latest).where(entity.deleted.is_(False))
+        if job.since is not None:
+            stmt = stmt.where(entity.last_updated >= job.since)
+
+        export_file = ExportFile(type=resource_type, file_name=f"{resource_type}.ndjson")
+        job.output.append(export_file)
+
+        try:
+            file = open(self._job_directory(job.id) / export_file.file_name, "w")
+        except FileNotFoundError:
+            raise _Cancelled()
+
+        with file:
+            for data_json in session.execute(stmt.execution_options(yield_per=STREAM_BATCH_SIZE)).scalars():
+                if self._stopping.is_set():
+                    raise _Cancelled()
+
+                file.write(data_json)
+                file.write("\n")
+                export_file.count += 1
+
+                if export_file.count % PROGRESS_INTERVAL == 0:
+                    self._save(job)
+
+    def _save(self, job: ExportJob) -> None:
+        """
+        Replaces the job file atomically, so a status request never reads a partially written file
+        """
+        path = self._job_directory(job.id) / JOB_FILE
+        temp_path = path.with_suffix(".tmp")
+        try:
+            with open(temp_path, "w") as file:
+                json.dump(job.to_json(), file)
+            temp_path.replace(path)
+        except FileNotFoundError:
+            raise _Cancelled()
+
+    def _job_directory(self, job_id: UUID) -> Path:
+        return self.directory / str(job_id)
+
+
+class _Cancelled(Exception):
+    """
+    Raised when the directory of a running job has been removed, or the service is stopping
+    """
@@ -0,0 +1,274 @@
+import json
+import logging
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Set, Tuple, cast
+from uuid import UUID, uuid4
+
+from fhir.resources.R4B import get_fhir_model_class
+from fhir.resources.R4B.organization import Organization as FhirOrganization
+from fhir.resources.R4B.resource import Resource
+from sqlalchemy import String, any_, bindparam, select
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from app.db.db import Database
+from app.db.entities.mixin.common_mixin import CommonMixin
+from app.db.entities.organization.organization import Organization
+from app.db.entities.resource_types import RESOURCE_ENTITIES, fhir_id_in
+from app.db.repositories.repository_base import notify_changes
+from app.db.session import DbSession
+from app.exceptions.fhir_exception import FHIRException
+from app.exceptions.service_exceptions import InvalidResourceException
+from app.routers.utils import dumps
+from app.services.entity_services.organization_service import OrganizationService
+from app.services.reference_validator import ReferenceValidator
+from app.services.utils import find_references, resource_data, split_reference, update_resource_meta
+from app.stats import get_stats
+
+logger = logging.getLogger(__name__)
+
+# Number of resources validated, resolved and copied into the database per transaction
+IMPORT_BATCH_SIZE = 5000
+
+# Columns written by COPY, the search columns are generated by the database
+COPY_COLUMNS = [
+    "id",
+    "fhir_id",
+    "version",
+    "latest",
+    "deleted",
+    "data",
+    "bundle_meta",
+    "content_hash",
+    "data_json",
+    "valid",
+    "created_at",
+    "modified_at",
+]
+
+
+@dataclass
+class ImportResult:
+    resource_type: str
+    imported: int = 0
+    errors: List[str] = field(default_factory=list)
+
+
+@dataclass
+class _ImportRow:
+    line: int
+    fhir_id: UUID
+    data: Dict[str, Any]
+    ura_number: str | None = None
+
+
+class ImportService:
+    """
+    Bulk import of NDJSON files, one resource type at a time.
+
+    Lines are handled in batches: every resource is validated against its FHIR model and stored as the same data
+    that a create stores (see resource_data()), after which the id, URA number and reference checks of the whole
+    batch are done with one query per kind. meta and the bundle meta are
+    computed here and the batch is written with a single COPY in its own transaction. Invalid lines are skipped
+    and reported, they do not stop the import.
+
+    Resources keep the id they have in the file (so an $export can be imported elsewhere), or get a new one.
+    References may point to stored resources or to resources in an earlier line of the same import, so files
+    should be imported in dependency order (for instance Organization before Endpoint).
+    """
+
+    def __init__(self, database: Database) -> None:
+        self.database = database
+
+    def import_ndjson(
+        self, resource_type: str, lines: Iterable[str | bytes], batch_size: int = IMPORT_BATCH_SIZE
+    ) -> ImportResult:
+        if resource_type not in RESOURCE_ENTITIES:
+            raise InvalidResourceException(f"Cannot import resource type {resource_type}")
+
+        result = ImportResult(resource_type)
+        imported: Set[Tuple[str, UUID]] = set()
+        ura_numbers: Set[str] = set()
+
+        numbered = ((number, line) for number, line in enumerate(lines, 1) if line.strip())
+        for batch in _batches(numbered, batch_size):
+            rows = [row for row in (self._parse(resource_type, number, line, result) for number, line in batch) if row]
+            if len(rows) == 0:
+                continue
+
+            with self.database.get_db_session() as session:
+                rows = self._check_ids(session, resource_type, rows, result)
+                if resource_type == "Organization":
+                    rows = self._check_ura_numbers(session, rows, ura_numbers, result)
+                rows = self._check_references(session, rows, imported, result)
+
+                self._copy(session, resource_type, rows)
+                session.commit()
+
+            imported.update((resource_type, row.fhir_id) for row in rows)
+            result.imported += len(rows)
+            get_stats().inc(f"import.{resource_type}", len(rows))
+            logger.info("Imported %d %s resources", result.imported, resource_type)
+
+        return result
+
+    @staticmethod
+    def _parse(resource_type: str, number: int, line: str | bytes, result: ImportResult) -> _ImportRow | None:
+        try:
+            data = json.loads(line)
+            if not isinstance(data, dict) or data.get("resourceType") != resource_type:
+                raise ValueError(f"expected a {resource_type} resource")
+
+            data.pop("meta", None)
+            fhir_id = UUID(data.pop("id")) if "id" in data else uuid4()
+
+            # Every importable type is a resource
+            fhir_entity = cast(Resource, get_fhir_model_class(resource_type)(**data))
+            data = resource_data(fhir_entity, fhir_id)
+
+            ura_number = None
+            if isinstance(fhir_entity, FhirOrganization):
+                ura_number = str(_ura_number(fhir_entity))
+        except FHIRException as e:
+            outcome = cast(Dict[str, Any], e.detail)
+            result.errors.append(f"line {number}: {outcome['issue'][0]['details']['text']}")
+            return None
+        except (TypeError, ValueError) as e:
+            # Also catches the pydantic ValidationError of the FHIR model
+            result.errors.append(f"line {number}: {e}")
+            return None
+
+        return _ImportRow(number, fhir_id, data, ura_number)
+
+    @staticmethod
+    def _check_ids(
+        session: DbSession, resource_type: str, rows: List[_ImportRow], result: ImportResult
+    ) -> List[_ImportRow]:
+        entity = RESOURCE_ENTITIES[resource_type]
+        existing = set(
+            session.execute(select(entity.fhir_id).where(fhir_id_in(entity.fhir_id, [row.fhir_id for row in rows])))
+            .scalars()
+            .all()
+        )
+
+        seen: Set[UUID] = set()
+        accepted = []
+        for row in rows:
+            if row.fhir_id in existing or row.fhir_id in seen:
+                result.errors.append(f"line {row.line}: {resource_type}/{row.fhir_id} already exists")
+                continue
+            seen.add(row.fhir_id)
+            accepted.append(row)
+
+        return accepted
+
+    @staticmethod
+    def _check_ura_numbers(
+        session: DbSession, rows: List[_ImportRow], ura_numbers: Set[str], result: ImportResult
+    ) -> List[_ImportRow]:
+        existing = set(
+            session.execute(
+                select(Organization.ura_number)
+                .where(
+                    Organization.ura_number
+                    == any_(bindparam("ura_numbers", [row.ura_number for row in rows], type_=ARRAY(String())))
+                )
+                .where(Organization.latest)
+                .where(Organization.deleted.is_(False))
+            )
+            .scalars()
+            .all()
+        )
+
+        accepted = []
+        for row in rows:
+            if row.ura_number in existing or row.ura_number in ura_numbers:
+                result.errors.append(f"line {row.line}: URA number {row.ura_number} already present")
+                continue
+            ura_numbers.add(str(row.ura_number))
+            accepted.append(row)
+
+        return accepted
+
+    @staticmethod
+    def _check_references(
+        session: DbSession, rows: List[_ImportRow], imported: Set[Tuple[str, UUID]], result: ImportResult
+    ) -> List[_ImportRow]:
+        known = imported | {(str(row.data["resourceType"]), row.fhir_id) for row in rows}
+
+        validator = ReferenceValidator()
+        for row in rows:
+            for reference in find_references(row.data):
+                try:
+                    key = split_reference(reference["reference"])
+                except ValueError:
+                    continue
+                if key[0] in RESOURCE_ENTITIES and key not in known:
+                    validator.add_reference(reference["reference"])
+        unresolvable = set(validator.unresolvable(session))
+
+        accepted = []
+        for row in rows:
+            missing = [r["reference"] for r in find_references(row.data) if r["reference"] in unresolvable]
+            if len(missing) > 0:
+                result.errors.append(f"line {row.line}: references {', '.join(missing)} are not resolvable")
+                continue
+            accepted.append(row)
+
+        return accepted
+
+    @staticmethod
+    def _copy(session: DbSession, resource_type: str, rows: List[_ImportRow]) -> None:
+        if len(rows) == 0:
+            return
+
+        entity_class = RESOURCE_ENTITIES[resource_type]
+        columns = COPY_COLUMNS + (["ura_number"] if resource_type == "Organization" else [])
+        now = datetime.now(UTC)
+
+        connection = session.session.connection().connection.driver_connection
+        if connection is None:
+            raise RuntimeError("No database connection available for COPY")
+        with connection.cursor() as cursor:
+            with cursor.copy(f"COPY {entity_class.__tablename__} ({', '.join(columns)}) FROM STDIN") as copy:
+                for row in rows:
+                    entity: CommonMixin = update_resource_meta(
+                        entity_class(fhir_id=row.fhir_id, data=row.data, version=1), method="create"
+                    )
+                    values = [
+                        uuid4(),
+                        row.fhir_id,
+                        1,
+                        True,
+                        False,
+                        entity.data_json,
+                        dumps(entity.bundle_meta, pretty=False).decode(),
+                        entity.content_hash,
+                        entity.data_json,
+                        # Valid from meta.lastUpdated, as set by update_resource_meta()
+                        f"[{row.data['meta']['lastUpdated']},)",
+                        now,
+                        now,
+                    ]
+                    if resource_type == "Organization":
+                        values.append(row.ura_number)
+                    copy.write_row(values)
+
+        notify_changes(session.session, resource_type, [(row.fhir_id, 1) for row in rows])
+
+
+def _ura_number(fhir_entity: FhirOrganization) -> Any:
+    for identifier in fhir_entity.identifier or []:
+        if OrganizationService.is_valid_identifier(identifier):
+            return OrganizationService.get_ura_number(identifier)
+
+    raise InvalidResourceException("URA number not found in organization resource")
+
+
+def _batches(items: Iterator[Tuple[int, str | bytes]], size: int) -> Iterator[List[Tuple[int, str | bytes]]]:
+    while True:
+        batch = list(islice(items, size))
+        if len(batch) == 0:
+            return
+        yield batch
@@ -0,0 +1,145 @@
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Sequence, Set, Tuple
+from uuid import UUID
+
+from sqlalchemy import or_, select
+
+from app.db.db import Database
+from app.db.entities.mixin.common_mixin import CommonMixin
+from app.db.entities.resource_types import RESOURCE_ENTITIES, fhir_id_in, reference_in
+from app.db.repositories.repository_base import current_at
+from app.db.session import DbSession
+from app.params.include import IncludeParam, Includes
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on the number of _include:iterate rounds, so a long partOf chain cannot keep a search busy
+MAX_INCLUDE_ITERATIONS = 10
+
+
+class IncludeService:
+    """
+    Resolves the _include and _revinclude parameters of a search. All references of the current set of resources
+    are collected first and each target type is then fetched with a single query. Reverse includes are looked up on
+    the indexed reference columns with one query per referencing type. Resources are included at most once and
+    never when they are already part of the matches. With at, the resources are included as they were at that
+    instant.
+    """
+
+    def __init__(self, database: Database) -> None:
+        self.database = database
+
+    def include(
+        self, entries: Sequence[CommonMixin], includes: Includes, at: datetime | None = None
+    ) -> List[CommonMixin]:
+        if not includes:
+            return []
+
+        with self.database.get_db_session() as session:
+            return self._include(session, entries, includes, at)
+
+    async def include_async(
+        self, entries: Sequence[CommonMixin], includes: Includes, at: datetime | None = None
+    ) -> List[CommonMixin]:
+        if not includes:
+            return []
+
+        async with self.database.get_async_db_session() as session:
+            return await session.run_session(lambda sync_session: self._include(sync_session, entries, includes, at))
+
+    def _include(
+        self, session: DbSession, entries: Sequence[CommonMixin], includes: Includes, at: datetime | None
+    ) -> List[CommonMixin]:
+        seen: Set[Tuple[str, UUID]] = {(self._resource_type(entry), entry.fhir_id) for entry in entries}
+
+        included = self._follow(session, entries, includes, seen, at)
+        included.extend(self._follow_back(session, entries, includes.rev, seen, at))
+
+        return included
+
+    @staticmethod
+    def _follow(
+        session: DbSession,
+        entries: Sequence[CommonMixin],
+        includes: Includes,
+        seen: Set[Tuple[str, UUID]],
+        at: datetime | None,
+    ) -> List[CommonMixin]:
+        included: List[CommonMixin] = []
+
+        resources = list(entries)
+        params = includes.params + includes.iterate
+        for _ in range(MAX_INCLUDE_ITERATIONS):
+            wanted: Dict[str, List[UUID]] = {}
+            for resource in resources:
+                if resource.data is None:
+                    continue
+                for param in params:
+                    if param.source != resource.data.get("resourceType"):
+                        continue
+                    for fhir_id in param.references(resource.data):
+                        if (param.target, fhir_id) not in seen:
+                            seen.add((param.target, fhir_id))
+                            wanted.setdefault(param.target, []).append(fhir_id)
+
+            if len(wanted) == 0:
+                break
+
+            resources = []
+            for resource_type, fhir_ids in wanted.items():
+                entity = RESOURCE_ENTITIES[resource_type]
+                resources.extend(
+                    session.execute(select(entity).where(fhir_id_in(entity.fhir_id, fhir_ids), *current_at(entity, at)))
+                    .scalars()
+                    .all()
+                )
+            included.extend(resources)
+
+            params = includes.iterate
+            if len(params) == 0:
+                break
+        else:
+            logger.warning("Stopped following _include:iterate after %d rounds", MAX_INCLUDE_ITERATIONS)
+
+        return included
+
+    @staticmethod
+    def _follow_back(
+        session: DbSession,
+        entries: Sequence[CommonMixin],
+        params: List[IncludeParam],
+        seen: Set[Tuple[str, UUID]],
+        at: datetime | None,
+    ) -> List[CommonMixin]:
+        by_source: Dict[str, List[IncludeParam]] = {}
+        for param in params:
+            by_source.setdefault(param.source, []).append(param)
+
+        included: List[CommonMixin] = []
+        for source, source_params in by_source.items():
+            entity = RESOURCE_ENTITIES[source]
+            conditions: List[Any] = []
+            for param in source_params:
+                references = [
+                    f"{param.target}/{entry.fhir_id}"
+                    for entry in entries
+                    if IncludeService._resource_type(entry) == param.target
+                ]
+                if len(references) > 0:
+                    conditions.append(reference_in(getattr(entity, str(param.column)), references))
+            if len(conditions) == 0:
+                continue
+
+            # Reverse references from the same type are combined, so each referencing type costs a single query
+            rows = session.execute(select(entity).where(or_(*conditions), *current_at(entity, at))).scalars().all()
+            for row in rows:
+                if (source, row.fhir_id) not in seen:
+                    seen.add((source, row.fhir_id))
+                    included.append(row)
+
+        return included
+
+    @staticmethod
+    def _resource_type(entry: CommonMixin) -> str:
+        return entry.data.get("resourceType", "") if entry.data is not None else ""
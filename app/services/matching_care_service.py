@@ -1,22 +1,28 @@
-from datetime import datetime
-from typing import Any, List, Sequence
-from uuid import UUID
-
-from fhir.resources.R4B.bundle import Bundle, BundleEntry
-from fhir.resources.R4B.organization import Organization as FhirOrganization
-from fhir.resources.R4B.reference import Reference
-
-from app.db.entities.organization.organization import Organization
-from app.exceptions.service_exceptions import ResourceNotFoundException
-from app.mappers.fhir_mapper import (
-    BundleType,
-    create_bundle_entries,
-    create_fhir_bundle,
-)
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+
+from app.db.entities.mixin.common_mixin import CommonMixin
+from app.mappers.fhir_mapper import BundleType, bundle_total, create_count_bundle, create_fhir_bundle
 from app.params.endpoint_query_params import EndpointQueryParams
+from app.params.include import Includes
 from app.params.organization_query_params import OrganizationQueryParams
+from app.params.pagination import Page
+from app.params.summary import Summary, TotalMode
 from app.services.entity_services.endpoint_service import EndpointService
 from app.services.entity_services.organization_service import OrganizationService
+from app.services.include_service import IncludeService
+
+
+@dataclass
+class SearchResult:
+    """
+    A searchset bundle without entries, and the matches and included resources to write in it (see
+    FhirBundleResponse). There are no entries for _summary=count.
+    """
+
+    bundle: Dict[str, Any]
+    entries: List[CommonMixin] | None = None
+    included: List[CommonMixin] = field(default_factory=list)
 
 
 class MatchingCareService:
@@ -24,65 +30,98 @@ class MatchingCareService:
         self,
         organization_service: OrganizationService,
         endpoint_service: EndpointService,
+        include_service: IncludeService,
     ) -> None:
         self._organization_service = organization_service
         self._endpoint_service = endpoint_service
+        self._include_service = include_service
+
+    async def find_organizations_async(
+        self,
+        org_query_request: OrganizationQueryParams,
+        page: Page | None = None,
+        includes: Includes | None = None,
+        summary: Summary | None = None,
+    ) -> SearchResult:
+        conditions = org_query_request.model_dump(exclude={"include", "rev_include", "updated_at"})
+        summary = summary or Summary()
+
+        if summary.count:
+            return SearchResult(create_count_bundle(await self._count_organizations(conditions, summary.count_mode())))
+
+        organizations: List[CommonMixin] = list(
+            await self._organization_service.find_async(
+                latest_version=True, page=page, elements=summary.projection("Organization"), **conditions
+            )
+        )
 
-    def find_organizations_history(
-        self, organization_id: UUID | None = None, since: datetime | None = None
-    ) -> dict[str, Any]:
-        organization_entries = self._organization_service.find(id=organization_id, sort_history=True, since=since)
+        included = await self._include_service.include_async(
+            organizations, self._includes(org_query_request, includes), at=org_query_request.at
+        )
 
-        return create_fhir_bundle(  # type: ignore
-            bundled_entries=create_bundle_entries(organization_entries, with_req_resp=True),
-            bundle_type=BundleType.HISTORY,
-        ).dict()
+        mode = summary.count_mode(page)
+        total = await self._count_organizations(conditions, mode) if mode is not None else None
+        return SearchResult(self._bundle(organizations, included, page, total), organizations, included)
 
-    def find_organizations(self, org_query_request: OrganizationQueryParams) -> Bundle:
-        organizations = self._organization_service.find(
-            latest_version=True,
-            **org_query_request.model_dump(exclude={"include", "rev_include", "updated_at"}),
+    async def find_endpoints_async(
+        self,
+        endpoints_req_params: EndpointQueryParams,
+        page: Page | None = None,
+        includes: Includes | None = None,
+        summary: Summary | None = None,
+    ) -> SearchResult:
+        conditions = endpoints_req_params.model_dump(exclude={"include"})
+        summary = summary or Summary()
+
+        if summary.count:
+            return SearchResult(create_count_bundle(await self._count_endpoints(conditions, summary.count_mode())))
+
+        endpoints: List[CommonMixin] = list(
+            await self._endpoint_service.find_async(
+                latest_version=True, page=page, elements=summary.projection("Endpoint"), **conditions
+            )
         )
 
-        bundled_resources = create_bundle_entries(organizations, with_req_resp=True)
+        included = await self._include_service.include_async(
+            endpoints, self._includes(endpoints_req_params, includes), at=endpoints_req_params.at
+        )
 
-        include_endpoints = True if org_query_request.include is not None else False
-        if include_endpoints:
-            bundled_resources = self._include_endpoints(bundled_resources, organizations)
+        mode = summary.count_mode(page)
+        total = await self._count_endpoints(conditions, mode) if mode is not None else None
+        return SearchResult(self._bundle(endpoints, included, page, total), endpoints, included)
 
-        return create_fhir_bundle(bundled_entries=bundled_resources, bundle_type=BundleType.SEARCHSET)
+    async def _count_organizations(self, conditions: Dict[str, Any], mode: TotalMode | None) -> int:
+        return await self._organization_service.count_async(
+            estimate=mode == TotalMode.ESTIMATE, latest_version=True, **conditions
+        )
 
-    def find_endpoints(self, endpoints_req_params: EndpointQueryParams) -> Bundle:
-        endpoints = self._endpoint_service.find(latest_version=True, **endpoints_req_params.model_dump())
+    async def _count_endpoints(self, conditions: Dict[str, Any], mode: TotalMode | None) -> int:
+        return await self._endpoint_service.count_async(
+            estimate=mode == TotalMode.ESTIMATE, latest_version=True, **conditions
+        )
 
+    @staticmethod
+    def _bundle(
+        entries: List[CommonMixin], included: List[CommonMixin], page: Page | None, total: int | None
+    ) -> Dict[str, Any]:
         return create_fhir_bundle(
-            bundled_entries=create_bundle_entries(endpoints, with_req_resp=False),
+            bundled_entries=None,
             bundle_type=BundleType.SEARCHSET,
+            page=page,
+            total=bundle_total(len(entries) + len(included), total, page),
         )
 
-    def find_endpoint_history(self, endpoint_id: UUID | None = None, since: datetime | None = None) -> dict[str, Any]:
-        endpoints = self._endpoint_service.find(id=endpoint_id, sort_history=True, since=since)
-
-        return create_fhir_bundle(  # type: ignore
-            bundled_entries=create_bundle_entries(endpoints, with_req_resp=True),
-            bundle_type=BundleType.HISTORY,
-        ).dict()
-
-    def _include_endpoints(
-        self, bundled_resources: List[BundleEntry], orgs: Sequence[Organization]
-    ) -> List[BundleEntry]:
-        for org in orgs:
-            if org.data is None:
-                raise ResourceNotFoundException("Data not found in resource")
-            fhir_org = FhirOrganization(**org.data)
-            if fhir_org.endpoint is None:
-                continue
-
-            for ref in fhir_org.endpoint:
-                if not isinstance(ref, Reference):
-                    raise TypeError("reference not correct type")
-                endpoint_id = ref.reference.replace("Endpoint/", "")
-                endpoint = self._endpoint_service.get_one(UUID(endpoint_id))
-                bundled_resources.append(BundleEntry.construct(resource=endpoint.data))
-
-        return bundled_resources
+    @staticmethod
+    def _includes(query: OrganizationQueryParams | EndpointQueryParams, includes: Includes | None) -> Includes:
+        """
+        The routers pass every _include of the request, other callers only have the single _include of the query
+        """
+        if includes is not None:
+            return includes
+
+        include = [query.include] if query.include is not None else []
+        if isinstance(query, OrganizationQueryParams):
+            revinclude = [query.rev_include] if query.rev_include is not None else []
+            return Includes.parse("Organization", include, revinclude=revinclude)
+
+        return Includes.parse("Endpoint", include)
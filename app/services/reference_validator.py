@@ -1,70 +1,51 @@
 import logging
-from typing import List
+from typing import Dict, List, Tuple
+from uuid import UUID
 
 from fhir.resources.R4B.fhirtypes import ReferenceType
 from fhir.resources.R4B.reference import Reference
 from sqlalchemy import false, select
 
-from app.db.entities.endpoint.endpoint import Endpoint
-from app.db.entities.healthcare_service.healthcare_service import HealthcareService
-from app.db.entities.location.location import Location
-from app.db.entities.organization.organization import Organization
-from app.db.entities.organization_affiliation.organization_affiliation import OrganizationAffiliation
-from app.db.entities.practitioner.practitioner import Practitioner
+from app.db.entities.resource_types import RESOURCE_ENTITIES, fhir_id_in
 from app.db.session import DbSession
 from app.exceptions.service_exceptions import ResourceNotFoundException
 from app.services.utils import split_reference
 
 
 class ReferenceValidator:
+    """
+    Checks that references in a resource point to existing resources.
+
+    References are collected with add() and add_list() and resolved together with validate(), which runs a single
+    query per referenced resource type and reports all unresolvable references at once.
+    """
+
+    def __init__(self) -> None:
+        self._pending: Dict[str, Dict[UUID, str]] = {}
+
     @staticmethod
-    def validate_reference(session: DbSession, data: ReferenceType | Reference, match_on: str) -> None:
+    def _split(data: ReferenceType | Reference, match_on: str) -> Tuple[str, UUID]:
         if not isinstance(data, Reference):
             raise ValueError(f"Invalid reference {data}")
 
         (reference_type, reference_id) = split_reference(data.reference)
         if reference_type != match_on:
             raise ValueError(f"Invalid reference {data.reference}, expected {match_on}")
+        if reference_type not in RESOURCE_ENTITIES:
+            raise ValueError(f"Invalid reference type {reference_type}")
 
-        match reference_type:
-            case "HealthcareService":
-                found = session.execute(
-                    select(HealthcareService)
-                    .where(HealthcareService.fhir_id == reference_id)
-                    .where(HealthcareService.deleted == false())
-                    .limit(1)
-                ).first()
-            case "OrganizationAffiliation":
-                found = session.execute(
-                    select(OrganizationAffiliation)
-                    .where(OrganizationAffiliation.fhir_id == reference_id)
-                    .where(OrganizationAffiliation.deleted == false())
-                    .limit(1)
-                ).first()
-            case "Organization":
-                found = session.execute(
-                    select(Organization)
-                    .where(Organization.fhir_id == reference_id)
-                    .where(Organization.deleted == false())
-                    .limit(1)
-                ).first()
-            case "Endpoint":
-                found = session.execute(
-                    select(Endpoint).where(Endpoint.fhir_id == reference_id).where(Endpoint.deleted == false()).limit(1)
-                ).first()
-            case "Location":
-                found = session.execute(
-                    select(Location).where(Location.fhir_id == reference_id).where(Location.deleted == false()).limit(1)
-                ).first()
-            case "Practitioner":
-                found = session.execute(
-                    select(Practitioner)
-                    .where(Practitioner.fhir_id == reference_id)
-                    .where(Practitioner.deleted == false())
-                    .limit(1)
-                ).first()
-            case _:
-                raise ValueError(f"Invalid reference type {reference_type}")
+        return reference_type, reference_id
+
+    @staticmethod
+    def validate_reference(session: DbSession, data: ReferenceType | Reference, match_on: str) -> None:
+        (reference_type, reference_id) = ReferenceValidator._split(data, match_on)
+        if session.is_resolved(reference_type, reference_id):
+            return
+
+        entity = RESOURCE_ENTITIES[reference_type]
+        found = session.execute(
+            select(entity).where(entity.fhir_id == reference_id).where(entity.deleted == false()).limit(1)
+        ).first()
 
         if found is None:
             logging.warning("Invalid resource, reference %s is not resolvable", data.reference)
@@ -76,5 +57,76 @@ class ReferenceValidator:
         data: List[ReferenceType] | List[Reference],
         match_on: str,
     ) -> None:
+        batch = ReferenceValidator()
+        batch.add_list(data, match_on=match_on)
+        batch.validate(session)
+
+    def add(self, data: ReferenceType | Reference, match_on: str) -> None:
+        """
+        Queue a reference for the next validate() call. Invalid or mismatching references raise a ValueError
+        right away.
+        """
+        (reference_type, reference_id) = self._split(data, match_on)
+        self._pending.setdefault(reference_type, {})[reference_id] = str(data.reference)
+
+    def add_list(self, data: List[ReferenceType] | List[Reference], match_on: str) -> None:
         for reference_data in data:
-            self.validate_reference(session, reference_data, match_on=match_on)
+            self.add(reference_data, match_on=match_on)
+
+    def add_reference(self, reference: str) -> None:
+        """
+        Queue a plain `Type/id` reference string, of any type we store
+        """
+        (reference_type, reference_id) = split_reference(reference)
+        if reference_type not in RESOURCE_ENTITIES:
+            raise ValueError(f"Invalid reference type {reference_type}")
+
+        self._pending.setdefault(reference_type, {})[reference_id] = reference
+
+    def validate(self, session: DbSession) -> None:
+        """
+        Resolve all queued references with one `fhir_id = ANY(:ids)` query per resource type. References the session
+        already knows to resolve are skipped. Raises a ResourceNotFoundException naming every reference that could
+        not be resolved.
+        """
+        unresolvable = self.unresolvable(session)
+
+        if len(unresolvable) == 1:
+            logging.warning("Invalid resource, reference %s is not resolvable", unresolvable[0])
+            raise ResourceNotFoundException(f"Invalid resource, reference {unresolvable[0]} is not resolvable")
+        if len(unresolvable) > 1:
+            logging.warning("Invalid resource, references %s are not resolvable", ", ".join(unresolvable))
+            raise ResourceNotFoundException(
+                f"Invalid resource, references {', '.join(unresolvable)} are not resolvable"
+            )
+
+    def unresolvable(self, session: DbSession) -> List[str]:
+        """
+        Like validate(), but returns the references that could not be resolved instead of raising
+        """
+        unresolvable: List[str] = []
+        for reference_type, pending in self._pending.items():
+            references = {
+                fhir_id: reference
+                for fhir_id, reference in pending.items()
+                if not session.is_resolved(reference_type, fhir_id)
+            }
+            if len(references) == 0:
+                continue
+
+            entity = RESOURCE_ENTITIES[reference_type]
+            found = set(
+                session.execute(
+                    select(entity.fhir_id)
+                    .where(fhir_id_in(entity.fhir_id, list(references.keys())))
+                    .where(entity.deleted == false())
+                    .distinct()
+                )
+                .scalars()
+                .all()
+            )
+            unresolvable.extend(reference for fhir_id, reference in references.items() if fhir_id not in found)
+
+        self._pending = {}
+
+        return unresolvable
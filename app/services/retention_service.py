@@ -0,0 +1,102 @@
+import json
+import logging
+from dataclasses import dataclass
+from datetime import UTC, datetime, timedelta
+from typing import Any, List, TextIO
+
+from sqlalchemy import delete, func, select, text
+
+from app.config import ConfigRetention
+from app.db.db import Database
+from app.db.entities.resource_types import RESOURCE_ENTITIES
+from app.exceptions.service_exceptions import InvalidResourceException
+from app.mappers.fhir_mapper import create_bundle_entry
+from app.stats import get_stats
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PruneResult:
+    resource_type: str
+    versions: int = 0
+    tombstones: int = 0
+
+
+class RetentionService:
+    """
+    Removes superseded versions once they have been out of date for longer than the retention of their resource
+    type, and the tombstones of deleted resources after a grace period. The current version of a resource that is
+    not deleted is never removed.
+
+    Rows are deleted in batches, each in its own transaction. Rows that are locked by a writer are skipped and
+    removed by a next run, so pruning never waits for (or blocks) writes. The removed versions can be archived as
+    NDJSON, one history bundle entry per line. Tables that lost rows are analyzed afterwards.
+    """
+
+    def __init__(self, database: Database, config: ConfigRetention) -> None:
+        self.database = database
+        self.config = config
+
+    def retention(self, resource_type: str) -> timedelta:
+        return timedelta(days=self.config.history_days_per_type.get(resource_type, self.config.history_days))
+
+    def prune(self, resource_type: str, archive: TextIO | None = None, now: datetime | None = None) -> PruneResult:
+        if resource_type not in RESOURCE_ENTITIES:
+            raise InvalidResourceException(f"Cannot prune resource type {resource_type}")
+
+        entity = RESOURCE_ENTITIES[resource_type]
+        now = now or datetime.now(UTC)
+        result = PruneResult(resource_type)
+
+        # Superseded versions (in the history partition) that stopped being current before the retention period
+        result.versions = self._delete(
+            entity,
+            [entity.latest.is_(False), func.upper(entity.valid) < now - self.retention(resource_type)],
+            archive,
+        )
+        # The deleted version is the current version of a deleted resource
+        result.tombstones = self._delete(
+            entity,
+            [
+                entity.latest,
+                entity.deleted,
+                func.lower(entity.valid) < now - timedelta(days=self.config.tombstone_days),
+            ],
+            archive,
+        )
+
+        removed = result.versions + result.tombstones
+        if removed > 0:
+            with self.database.get_db_session() as session:
+                session.execute(text(f"ANALYZE {entity.__tablename__}"))
+                session.commit()
+            get_stats().inc(f"prune.{resource_type}", removed)
+
+        return result
+
+    def _delete(self, entity: Any, conditions: List[Any], archive: TextIO | None) -> int:
+        batch = select(entity.id).where(*conditions).limit(self.config.batch_size).with_for_update(skip_locked=True)
+        stmt = (
+            delete(entity)
+            .where(*conditions, entity.id.in_(batch))
+            .returning(entity)
+            .execution_options(synchronize_session=False)
+        )
+
+        removed = 0
+        while True:
+            with self.database.get_db_session() as session:
+                rows = session.execute(stmt).scalars().all()
+                if archive is not None:
+                    for row in rows:
+                        archive.write(json.dumps(create_bundle_entry(row, with_req_resp=True), separators=(",", ":")))
+                        archive.write("\n")
+                    # Written before the delete is committed, a version is never removed without its archive line
+                    archive.flush()
+                session.commit()
+
+            removed += len(rows)
+            if len(rows) < self.config.batch_size:
+                return removed
+            logger.info("Removed %d %s versions", removed, entity.__name__)
@@ -1,25 +1,37 @@
+import hashlib
+import json
 from datetime import datetime
-from typing import Literal, Tuple, TypeVar
+from typing import Any, Dict, Iterator, Literal, Tuple, TypeVar
 from uuid import UUID
 from zoneinfo import ZoneInfo
 
+import orjson
+from fhir.resources.R4B.resource import Resource
+from sqlalchemy.dialects.postgresql import Range
+
 from app.db.entities.mixin.common_mixin import CommonMixin
+from app.exceptions.service_exceptions import PreconditionFailedException
 
 T = TypeVar("T", bound=CommonMixin)
 
 
 def update_resource_meta(res: T, method: Literal["create", "update", "delete"]) -> T:
     res.version = res.version + 1 if method != "create" else 1
+    res.content_hash = content_hash(res.data)
+    now = datetime.now(ZoneInfo("UTC"))
+    # Valid until the next version is written, see RepositoryBase.write_version()
+    res.valid = Range(now, None)
     if isinstance(res.data, dict):
         res.data.update(
             {
                 "meta": {
                     "versionId": str(res.version),
-                    "lastUpdated": datetime.now(ZoneInfo("UTC")).isoformat(),
+                    "lastUpdated": now.isoformat(),
                     "source": f"{res.__class__.__name__}/{res.fhir_id}",
                 }
             }
         )
+    res.data_json = data_json(res.data)
 
     if method == "create":
         request_method = "POST"
@@ -43,13 +55,89 @@ def update_resource_meta(res: T, method: Literal["create", "update", "delete"])
     return res
 
 
+def resource_data(fhir_entity: Resource, fhir_id: UUID | None = None) -> Dict[str, Any]:
+    """
+    The JSON data of a validated resource, without meta (which is set by update_resource_meta()). This is the only
+    conversion of a resource on write: the result is compared with the stored data, stored as is, and written to the
+    response from the stored JSON text.
+    """
+    data: Dict[str, Any] = fhir_entity.model_dump(mode="json", by_alias=True, exclude_none=True)
+    data.pop("meta", None)
+    if fhir_id is not None:
+        data["id"] = str(fhir_id)
+    return data
+
+
+def content_hash(data: Dict[str, Any] | None) -> str | None:
+    """
+    SHA-256 of the canonical JSON (sorted keys, no whitespace) of resource data without meta, so two versions with
+    the same content have the same hash
+    """
+    if data is None:
+        return None
+
+    content = {key: value for key, value in data.items() if key != "meta"}
+    canonical = json.dumps(content, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def data_json(data: Dict[str, Any] | None) -> str | None:
+    """
+    Compact JSON text of resource data, with the keys of every object in the order jsonb stores them (shorter keys
+    first, then bytewise). This is the order of data that is read from the database, so the text is the same as
+    the encoding of the stored data.
+    """
+    if data is None:
+        return None
+    return orjson.dumps(_jsonb_order(data)).decode()
+
+
+def _jsonb_order(value: Any) -> Any:
+    if isinstance(value, dict):
+        keys = sorted(value, key=lambda key: (len(key.encode()), key.encode()))
+        return {key: _jsonb_order(value[key]) for key in keys}
+    if isinstance(value, list):
+        return [_jsonb_order(item) for item in value]
+    return value
+
+
+def is_unchanged(entity: CommonMixin, data: Dict[str, Any]) -> bool:
+    """
+    Whether the stored data of an entity equals the given resource data, apart from meta. Compares the content hash
+    of the stored version, or the whole document for versions that were stored without one.
+    """
+    if entity.content_hash is not None:
+        return entity.content_hash == content_hash(data)
+
+    stored = entity.data or {}
+    return len(stored) - ("meta" in stored) == len(data) and all(stored.get(key) == data[key] for key in data)
+
+
+def check_version(entity: CommonMixin, version: int | None) -> None:
+    """
+    Raises PreconditionFailedException when the version of an If-Match header is not the current version
+    """
+    if version is not None and entity.version != version:
+        raise PreconditionFailedException(
+            f"Version {version} of {entity.fhir_id} is not the current version {entity.version}"
+        )
+
+
+def etag_version(etag: str) -> int:
+    """
+    Returns the version of an ETag (W/"1" or "1"). Will raise a ValueError when it does not hold a version
+    """
+    return int(etag.strip().removeprefix("W/").strip('"'))
+
+
 def split_reference(reference: str) -> Tuple[str, UUID]:
     """
     Split a reference string into a tuple of (reference_type, reference_id). Will raise a ValueError when the ref_id
     is NOT a valid UUID
 
     Example:
-        Organization/12345678-1234-5678-1234-567812345678 -> ("Organization", UUID("12345678-1234-5678-1234-567812345678"))
+        Organization/12345678-1234-5678-1234-567812345678
+            -> ("Organization", UUID("12345678-1234-5678-1234-567812345678"))
 
     """
     parts = reference.split("/")
@@ -63,3 +151,17 @@ def split_reference(reference: str) -> Tuple[str, UUID]:
         raise ValueError(f"Invalid reference format {reference} (needs: UUID)")
 
     return reference_type, reference_id
+
+
+def find_references(value: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Yields every Reference (a dict with a string `reference`) found anywhere in the given resource data
+    """
+    if isinstance(value, dict):
+        if isinstance(value.get("reference"), str):
+            yield value
+        for item in value.values():
+            yield from find_references(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from find_references(item)
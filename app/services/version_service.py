@@ -0,0 +1,53 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any
+from uuid import UUID
+
+from sqlalchemy import false, select, true
+
+from app.db.db import Database
+from app.db.entities.resource_types import RESOURCE_ENTITIES
+
+
+@dataclass(frozen=True)
+class ResourceVersion:
+    version: int
+    last_modified: datetime
+
+
+class VersionService:
+    """
+    Looks up the version and modification time of a resource without loading its data, so conditional reads can
+    be answered from the (fhir_id, version) indexes alone. The in-process cache is deliberately not consulted: a
+    304 must never confirm a version that another worker has already replaced.
+    """
+
+    def __init__(self, database: Database) -> None:
+        self.database = database
+
+    async def get_current_async(self, resource_type: str, resource_id: UUID) -> ResourceVersion | None:
+        entity = RESOURCE_ENTITIES[resource_type]
+        return await self._lookup(
+            select(entity.version, entity.last_updated, entity.created_at)
+            .where(entity.fhir_id == resource_id)
+            .where(entity.latest == true())
+            .where(entity.deleted == false())
+        )
+
+    async def get_version_async(self, resource_type: str, resource_id: UUID, version_id: int) -> ResourceVersion | None:
+        entity = RESOURCE_ENTITIES[resource_type]
+        return await self._lookup(
+            select(entity.version, entity.last_updated, entity.created_at)
+            .where(entity.fhir_id == resource_id)
+            .where(entity.version == version_id)
+            .where(entity.deleted == false())
+        )
+
+    async def _lookup(self, stmt: Any) -> ResourceVersion | None:
+        async with self.database.get_async_db_session() as session:
+            row = (await session.execute(stmt.limit(1))).first()
+
+        if row is None:
+            return None
+        (version, last_updated, created_at) = row
+        return ResourceVersion(version=version, last_modified=last_updated or created_at)
@@ -0,0 +1,9 @@
+-- Searches are paginated with a keyset on fhir_id over the current versions (see app/params/pagination.py), so
+-- every page is an index range scan instead of a sort over the whole history table.
+CREATE INDEX IF NOT EXISTS organizations_latest_fhir_id_idx ON organizations (fhir_id) WHERE latest;
+CREATE INDEX IF NOT EXISTS endpoints_latest_fhir_id_idx ON endpoints (fhir_id) WHERE latest;
+CREATE INDEX IF NOT EXISTS organization_affiliations_latest_fhir_id_idx ON organization_affiliations (fhir_id) WHERE latest;
+CREATE INDEX IF NOT EXISTS healthcare_services_latest_fhir_id_idx ON healthcare_services (fhir_id) WHERE latest;
+CREATE INDEX IF NOT EXISTS locations_latest_fhir_id_idx ON locations (fhir_id) WHERE latest;
+CREATE INDEX IF NOT EXISTS practitioners_latest_fhir_id_idx ON practitioners (fhir_id) WHERE latest;
+CREATE INDEX IF NOT EXISTS practitioner_roles_latest_fhir_id_idx ON practitioner_roles (fhir_id) WHERE latest;
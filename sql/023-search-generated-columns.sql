@@ -0,0 +1,130 @@
+-- The repositories search on values inside the FHIR JSONB documents. Evaluating those paths per row means every
+-- search is a sequential scan over all versions, so the searched values are extracted into generated columns once
+-- per version and indexed. Token and reference parameters get a btree index, array parameters that are matched by
+-- containment (identifiers, codes, addresses, ...) get a GIN index on a copy of the array.
+--
+-- Substring searches (name, address text, payload type, practitioner names) are not covered: a leading wildcard
+-- can only use a trigram index, which would require the pg_trgm extension.
+
+-- A text to timestamptz cast is only stable (it depends on the session TimeZone and DateStyle), which postgres does
+-- not accept in a generated column. fhir_instant() only accepts FHIR instants, which always have an offset (see
+-- app/services/utils.py), and builds the timestamp with immutable functions only. Other values give NULL.
+CREATE OR REPLACE FUNCTION fhir_instant(value TEXT) RETURNS TIMESTAMP WITH TIME ZONE
+  LANGUAGE sql IMMUTABLE PARALLEL SAFE
+  AS $$
+    SELECT timezone('UTC', make_timestamp(p[1]::INT, p[2]::INT, p[3]::INT, p[4]::INT, p[5]::INT, p[6]::DOUBLE PRECISION))
+      - make_interval(hours => (coalesce(p[8], '+') || coalesce(p[9], '0'))::INT,
+                      mins => (coalesce(p[8], '+') || coalesce(p[10], '0'))::INT)
+    FROM regexp_match(value, '^(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2}(?:\.\d+)?)(Z|([+-])(\d{2}):(\d{2}))$') AS p
+  $$;
+
+-- https://hl7.org/fhir/organization.html#search
+ALTER TABLE organizations
+  ADD COLUMN last_updated         TIMESTAMP with time zone GENERATED ALWAYS AS (fhir_instant(data->'meta'->>'lastUpdated')) STORED,
+  ADD COLUMN active               BOOLEAN GENERATED ALWAYS AS ((data->>'active')::BOOLEAN) STORED,
+  ADD COLUMN type                 VARCHAR GENERATED ALWAYS AS (data->>'type') STORED,
+  ADD COLUMN phonetic             VARCHAR GENERATED ALWAYS AS (data->'name'->>'phonetic') STORED,
+  ADD COLUMN part_of_reference    VARCHAR GENERATED ALWAYS AS (data->'partOf'->>'reference') STORED,
+  ADD COLUMN identifiers          JSONB GENERATED ALWAYS AS (data->'identifier') STORED,
+  ADD COLUMN addresses            JSONB GENERATED ALWAYS AS (data->'address') STORED,
+  ADD COLUMN endpoint_references  JSONB GENERATED ALWAYS AS (data->'endpoint') STORED;
+
+CREATE INDEX organizations_last_updated_idx ON organizations (last_updated, version);
+CREATE INDEX organizations_active_idx ON organizations (active);
+CREATE INDEX organizations_type_idx ON organizations (type);
+CREATE INDEX organizations_phonetic_idx ON organizations (phonetic);
+CREATE INDEX organizations_part_of_reference_idx ON organizations (part_of_reference);
+CREATE INDEX organizations_identifiers_idx ON organizations USING GIN (identifiers jsonb_path_ops);
+CREATE INDEX organizations_addresses_idx ON organizations USING GIN (addresses jsonb_path_ops);
+CREATE INDEX organizations_endpoint_references_idx ON organizations USING GIN (endpoint_references jsonb_path_ops);
+
+-- https://hl7.org/fhir/endpoint.html#search
+ALTER TABLE endpoints
+  ADD COLUMN last_updated                    TIMESTAMP with time zone GENERATED ALWAYS AS (fhir_instant(data->'meta'->>'lastUpdated')) STORED,
+  ADD COLUMN connection_type                 VARCHAR GENERATED ALWAYS AS (data->'connectionType'->>'code') STORED,
+  ADD COLUMN status                          VARCHAR GENERATED ALWAYS AS (data->>'status') STORED,
+  ADD COLUMN managing_organization_reference VARCHAR GENERATED ALWAYS AS (data->'managingOrganization'->>'reference') STORED,
+  ADD COLUMN identifiers                     JSONB GENERATED ALWAYS AS (data->'identifier') STORED;
+
+CREATE INDEX endpoints_last_updated_idx ON endpoints (last_updated, version);
+CREATE INDEX endpoints_connection_type_idx ON endpoints (connection_type);
+CREATE INDEX endpoints_status_idx ON endpoints (status);
+CREATE INDEX endpoints_managing_organization_reference_idx ON endpoints (managing_organization_reference);
+CREATE INDEX endpoints_identifiers_idx ON endpoints USING GIN (identifiers jsonb_path_ops);
+
+-- https://hl7.org/fhir/organizationaffiliation.html#search
+ALTER TABLE organization_affiliations
+  ADD COLUMN last_updated                        TIMESTAMP with time zone GENERATED ALWAYS AS (fhir_instant(data->'meta'->>'lastUpdated')) STORED,
+  ADD COLUMN active                              BOOLEAN GENERATED ALWAYS AS ((data->>'active')::BOOLEAN) STORED,
+  ADD COLUMN organization_reference              VARCHAR GENERATED ALWAYS AS (data->'organization'->>'reference') STORED,
+  ADD COLUMN participating_organization_reference VARCHAR GENERATED ALWAYS AS (data->'participatingOrganization'->>'reference') STORED,
+  ADD COLUMN codes                               JSONB GENERATED ALWAYS AS (data->'code') STORED,
+  ADD COLUMN specialties                         JSONB GENERATED ALWAYS AS (data->'specialty') STORED;
+
+CREATE INDEX organization_affiliations_last_updated_idx ON organization_affiliations (last_updated, version);
+CREATE INDEX organization_affiliations_created_at_idx ON organization_affiliations (created_at);
+CREATE INDEX organization_affiliations_active_idx ON organization_affiliations (active);
+CREATE INDEX organization_affiliations_organization_reference_idx ON organization_affiliations (organization_reference);
+CREATE INDEX organization_affiliations_participating_organization_idx ON organization_affiliations (participating_organization_reference);
+CREATE INDEX organization_affiliations_codes_idx ON organization_affiliations USING GIN (codes jsonb_path_ops);
+CREATE INDEX organization_affiliations_specialties_idx ON organization_affiliations USING GIN (specialties jsonb_path_ops);
+
+-- https://hl7.org/fhir/healthcareservice.html#search
+ALTER TABLE healthcare_services
+  ADD COLUMN last_updated          TIMESTAMP with time zone GENERATED ALWAYS AS (fhir_instant(data->'meta'->>'lastUpdated')) STORED,
+  ADD COLUMN active                BOOLEAN GENERATED ALWAYS AS ((data->>'active')::BOOLEAN) STORED,
+  ADD COLUMN provided_by_reference VARCHAR GENERATED ALWAYS AS (data->'providedBy'->>'reference') STORED,
+  ADD COLUMN types                 JSONB GENERATED ALWAYS AS (data->'type') STORED,
+  ADD COLUMN location_references   JSONB GENERATED ALWAYS AS (data->'location') STORED;
+
+CREATE INDEX healthcare_services_last_updated_idx ON healthcare_services (last_updated, version);
+CREATE INDEX healthcare_services_active_idx ON healthcare_services (active);
+CREATE INDEX healthcare_services_provided_by_reference_idx ON healthcare_services (provided_by_reference);
+CREATE INDEX healthcare_services_types_idx ON healthcare_services USING GIN (types jsonb_path_ops);
+CREATE INDEX healthcare_services_location_references_idx ON healthcare_services USING GIN (location_references jsonb_path_ops);
+
+-- https://hl7.org/fhir/location.html#search
+ALTER TABLE locations
+  ADD COLUMN last_updated                    TIMESTAMP with time zone GENERATED ALWAYS AS (fhir_instant(data->'meta'->>'lastUpdated')) STORED,
+  ADD COLUMN name                            VARCHAR GENERATED ALWAYS AS (data->>'name') STORED,
+  ADD COLUMN status                          VARCHAR GENERATED ALWAYS AS (data->>'status') STORED,
+  ADD COLUMN type                            VARCHAR GENERATED ALWAYS AS (data->>'type') STORED,
+  ADD COLUMN managing_organization_reference VARCHAR GENERATED ALWAYS AS (data->'managingOrganization'->>'reference') STORED,
+  ADD COLUMN part_of_reference               VARCHAR GENERATED ALWAYS AS (data->'partOf'->>'reference') STORED;
+
+CREATE INDEX locations_last_updated_idx ON locations (last_updated, version);
+CREATE INDEX locations_created_at_idx ON locations (created_at);
+CREATE INDEX locations_name_idx ON locations (name);
+CREATE INDEX locations_status_idx ON locations (status);
+CREATE INDEX locations_type_idx ON locations (type);
+CREATE INDEX locations_managing_organization_reference_idx ON locations (managing_organization_reference);
+CREATE INDEX locations_part_of_reference_idx ON locations (part_of_reference);
+
+-- https://hl7.org/fhir/practitioner.html#search
+ALTER TABLE practitioners
+  ADD COLUMN last_updated TIMESTAMP with time zone GENERATED ALWAYS AS (fhir_instant(data->'meta'->>'lastUpdated')) STORED,
+  ADD COLUMN active       BOOLEAN GENERATED ALWAYS AS ((data->>'active')::BOOLEAN) STORED;
+
+CREATE INDEX practitioners_last_updated_idx ON practitioners (last_updated, version);
+CREATE INDEX practitioners_active_idx ON practitioners (active);
+
+-- https://hl7.org/fhir/practitionerrole.html#search
+ALTER TABLE practitioner_roles
+  ADD COLUMN last_updated           TIMESTAMP with time zone GENERATED ALWAYS AS (fhir_instant(data->'meta'->>'lastUpdated')) STORED,
+  ADD COLUMN active                 BOOLEAN GENERATED ALWAYS AS ((data->>'active')::BOOLEAN) STORED,
+  ADD COLUMN practitioner_reference VARCHAR GENERATED ALWAYS AS (data->'practitioner'->>'reference') STORED,
+  ADD COLUMN organization_reference VARCHAR GENERATED ALWAYS AS (data->'organization'->>'reference') STORED,
+  ADD COLUMN location_references    JSONB GENERATED ALWAYS AS (data->'location') STORED,
+  ADD COLUMN service_references     JSONB GENERATED ALWAYS AS (data->'healthcareService') STORED,
+  ADD COLUMN codes                  JSONB GENERATED ALWAYS AS (data->'code') STORED,
+  ADD COLUMN specialties            JSONB GENERATED ALWAYS AS (data->'specialty') STORED;
+
+CREATE INDEX practitioner_roles_last_updated_idx ON practitioner_roles (last_updated, version);
+CREATE INDEX practitioner_roles_created_at_idx ON practitioner_roles (created_at);
+CREATE INDEX practitioner_roles_active_idx ON practitioner_roles (active);
+CREATE INDEX practitioner_roles_practitioner_reference_idx ON practitioner_roles (practitioner_reference);
+CREATE INDEX practitioner_roles_organization_reference_idx ON practitioner_roles (organization_reference);
+CREATE INDEX practitioner_roles_location_references_idx ON practitioner_roles USING GIN (location_references jsonb_path_ops);
+CREATE INDEX practitioner_roles_service_references_idx ON practitioner_roles USING GIN (service_references jsonb_path_ops);
+CREATE INDEX practitioner_roles_codes_idx ON practitioner_roles USING GIN (codes jsonb_path_ops);
+CREATE INDEX practitioner_roles_specialties_idx ON practitioner_roles USING GIN (specialties jsonb_path_ops);
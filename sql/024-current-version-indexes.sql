@@ -0,0 +1,50 @@
+-- get_one() and _update_entry_latest() look up the current version of a resource on fhir_id, get() looks up a
+-- specific version on (fhir_id, version). Both used to scan the whole history table.
+--
+-- The unique partial index also guarantees there is only one current version per resource, so two concurrent
+-- updates of the same resource can no longer both become the latest version. It supersedes the keyset index of
+-- migration 022, which covered the same rows without the constraint.
+
+-- Resources that (by a lost update race) ended up with more than one current version keep only the newest one
+UPDATE organizations t SET latest = FALSE
+  WHERE t.latest AND EXISTS (SELECT 1 FROM organizations n WHERE n.fhir_id = t.fhir_id AND n.latest AND n.version > t.version);
+UPDATE endpoints t SET latest = FALSE
+  WHERE t.latest AND EXISTS (SELECT 1 FROM endpoints n WHERE n.fhir_id = t.fhir_id AND n.latest AND n.version > t.version);
+UPDATE organization_affiliations t SET latest = FALSE
+  WHERE t.latest AND EXISTS (SELECT 1 FROM organization_affiliations n WHERE n.fhir_id = t.fhir_id AND n.latest AND n.version > t.version);
+UPDATE healthcare_services t SET latest = FALSE
+  WHERE t.latest AND EXISTS (SELECT 1 FROM healthcare_services n WHERE n.fhir_id = t.fhir_id AND n.latest AND n.version > t.version);
+UPDATE locations t SET latest = FALSE
+  WHERE t.latest AND EXISTS (SELECT 1 FROM locations n WHERE n.fhir_id = t.fhir_id AND n.latest AND n.version > t.version);
+UPDATE practitioners t SET latest = FALSE
+  WHERE t.latest AND EXISTS (SELECT 1 FROM practitioners n WHERE n.fhir_id = t.fhir_id AND n.latest AND n.version > t.version);
+UPDATE practitioner_roles t SET latest = FALSE
+  WHERE t.latest AND EXISTS (SELECT 1 FROM practitioner_roles n WHERE n.fhir_id = t.fhir_id AND n.latest AND n.version > t.version);
+
+DROP INDEX IF EXISTS organizations_latest_fhir_id_idx;
+CREATE UNIQUE INDEX organizations_latest_fhir_id_key ON organizations (fhir_id) WHERE latest;
+CREATE INDEX organizations_fhir_id_version_idx ON organizations (fhir_id, version);
+
+DROP INDEX IF EXISTS endpoints_latest_fhir_id_idx;
+CREATE UNIQUE INDEX endpoints_latest_fhir_id_key ON endpoints (fhir_id) WHERE latest;
+CREATE INDEX endpoints_fhir_id_version_idx ON endpoints (fhir_id, version);
+
+DROP INDEX IF EXISTS organization_affiliations_latest_fhir_id_idx;
+CREATE UNIQUE INDEX organization_affiliations_latest_fhir_id_key ON organization_affiliations (fhir_id) WHERE latest;
+CREATE INDEX organization_affiliations_fhir_id_version_idx ON organization_affiliations (fhir_id, version);
+
+DROP INDEX IF EXISTS healthcare_services_latest_fhir_id_idx;
+CREATE UNIQUE INDEX healthcare_services_latest_fhir_id_key ON healthcare_services (fhir_id) WHERE latest;
+CREATE INDEX healthcare_services_fhir_id_version_idx ON healthcare_services (fhir_id, version);
+
+DROP INDEX IF EXISTS locations_latest_fhir_id_idx;
+CREATE UNIQUE INDEX locations_latest_fhir_id_key ON locations (fhir_id) WHERE latest;
+CREATE INDEX locations_fhir_id_version_idx ON locations (fhir_id, version);
+
+DROP INDEX IF EXISTS practitioners_latest_fhir_id_idx;
+CREATE UNIQUE INDEX practitioners_latest_fhir_id_key ON practitioners (fhir_id) WHERE latest;
+CREATE INDEX practitioners_fhir_id_version_idx ON practitioners (fhir_id, version);
+
+DROP INDEX IF EXISTS practitioner_roles_latest_fhir_id_idx;
+CREATE UNIQUE INDEX practitioner_roles_latest_fhir_id_key ON practitioner_roles (fhir_id) WHERE latest;
+CREATE INDEX practitioner_roles_fhir_id_version_idx ON practitioner_roles (fhir_id, version);
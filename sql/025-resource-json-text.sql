@@ -0,0 +1,42 @@
+-- Every read used to decode the JSONB document into a dict and encode it to JSON again for the response. Stored
+-- versions never change, so the compact JSON text of each version is written once, by the application (see
+-- update_resource_meta()), and the responses copy it as is. The keys are in the order of the jsonb document, so the
+-- text is the same as encoding the data that is read from the database.
+--
+-- The existing versions are filled in here with the same text. Numbers keep their jsonb output.
+
+CREATE FUNCTION pg_temp.compact_json(value JSONB) RETURNS TEXT LANGUAGE plpgsql IMMUTABLE AS $$
+BEGIN
+  CASE jsonb_typeof(value)
+    WHEN 'object' THEN
+      RETURN '{' || coalesce(
+        (SELECT string_agg(to_json(key)::TEXT || ':' || pg_temp.compact_json(item), ',' ORDER BY position)
+          FROM jsonb_each(value) WITH ORDINALITY AS e(key, item, position)),
+        ''
+      ) || '}';
+    WHEN 'array' THEN
+      RETURN '[' || coalesce(
+        (SELECT string_agg(pg_temp.compact_json(item), ',' ORDER BY position)
+          FROM jsonb_array_elements(value) WITH ORDINALITY AS e(item, position)),
+        ''
+      ) || ']';
+    ELSE
+      RETURN value::TEXT;
+  END CASE;
+END
+$$;
+
+CREATE FUNCTION pg_temp.add_data_json(tbl TEXT) RETURNS VOID LANGUAGE plpgsql AS $$
+BEGIN
+  EXECUTE format('ALTER TABLE %I ADD COLUMN data_json TEXT', tbl);
+  EXECUTE format('UPDATE %I SET data_json = pg_temp.compact_json(data) WHERE data IS NOT NULL', tbl);
+END
+$$;
+
+SELECT pg_temp.add_data_json('organizations');
+SELECT pg_temp.add_data_json('endpoints');
+SELECT pg_temp.add_data_json('organization_affiliations');
+SELECT pg_temp.add_data_json('healthcare_services');
+SELECT pg_temp.add_data_json('locations');
+SELECT pg_temp.add_data_json('practitioners');
+SELECT pg_temp.add_data_json('practitioner_roles');
@@ -0,0 +1,12 @@
+-- A PUT of an unchanged resource should not create a new version. Instead of comparing the whole stored document
+-- with the new one, every version stores a hash of its content without meta, computed by the application from the
+-- canonical JSON (sorted keys, no whitespace). Versions written before this column existed have no hash and are
+-- compared in full, until they are updated.
+
+ALTER TABLE organizations ADD COLUMN content_hash TEXT;
+ALTER TABLE endpoints ADD COLUMN content_hash TEXT;
+ALTER TABLE organization_affiliations ADD COLUMN content_hash TEXT;
+ALTER TABLE healthcare_services ADD COLUMN content_hash TEXT;
+ALTER TABLE locations ADD COLUMN content_hash TEXT;
+ALTER TABLE practitioners ADD COLUMN content_hash TEXT;
+ALTER TABLE practitioner_roles ADD COLUMN content_hash TEXT;
@@ -0,0 +1,67 @@
+-- Every version of a resource is kept in the same table, so the tables (and all their search indexes) grow with
+-- every update, while searches only ever read the current versions. Each resource table is now partitioned on the
+-- latest column: the current versions are stored in <table>_current and the superseded versions in the append-only
+-- <table>_history. Clearing latest on a version moves its row to the history partition.
+--
+-- The tables keep their names, so the entities and queries do not change. Queries with a latest predicate (every
+-- search, read and include) are pruned to the current partition by postgres, history queries read both. The
+-- search indexes only exist on the current partition, the history partition only has the (fhir_id, version) and
+-- (last_updated, version) indexes that _history and vread need. The current partition holds one row per fhir_id,
+-- its unique fhir_id index also serves vread. Search latency therefore no longer depends on the number of versions.
+--
+-- A primary key of a partitioned table has to include the partition key, it is now (id, latest). The unique index
+-- on the current fhir_id is an index of the current partition, which holds exactly the rows the partial index
+-- used to cover.
+
+CREATE FUNCTION pg_temp.partition_versions(tbl TEXT) RETURNS VOID LANGUAGE plpgsql AS $$
+DECLARE
+  unpartitioned TEXT := tbl || '_unpartitioned';
+  owner TEXT;
+  columns TEXT;
+  search_indexes TEXT[];
+  definition TEXT;
+BEGIN
+  SELECT tableowner INTO owner FROM pg_tables WHERE schemaname = 'public' AND tablename = tbl;
+
+  -- The search indexes, created again on the current partition once the old table is dropped
+  SELECT coalesce(array_agg(indexdef), '{}') INTO search_indexes
+    FROM pg_indexes
+    WHERE schemaname = 'public' AND tablename = tbl
+      AND indexname NOT IN (tbl || '_pkey', tbl || '_latest_fhir_id_key', tbl || '_fhir_id_version_idx', tbl || '_last_updated_idx');
+
+  -- Generated columns are computed again on insert
+  SELECT string_agg(quote_ident(attname), ', ' ORDER BY attnum) INTO columns
+    FROM pg_attribute
+    WHERE attrelid = ('public.' || quote_ident(tbl))::regclass AND attnum > 0 AND NOT attisdropped AND attgenerated = '';
+
+  EXECUTE format('ALTER TABLE %I RENAME TO %I', tbl, unpartitioned);
+  EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING GENERATED) PARTITION BY LIST (latest)', tbl, unpartitioned);
+  EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES IN (TRUE)', tbl || '_current', tbl);
+  EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES IN (FALSE)', tbl || '_history', tbl);
+
+  EXECUTE format('INSERT INTO %I (%s) SELECT %s FROM %I', tbl, columns, columns, unpartitioned);
+  EXECUTE format('DROP TABLE %I', unpartitioned);
+
+  EXECUTE format('ALTER TABLE %I ADD PRIMARY KEY (id, latest)', tbl);
+  EXECUTE format('CREATE UNIQUE INDEX %I ON %I (fhir_id)', tbl || '_latest_fhir_id_key', tbl || '_current');
+  EXECUTE format('CREATE INDEX %I ON %I (fhir_id, version)', tbl || '_fhir_id_version_idx', tbl || '_history');
+  EXECUTE format('CREATE INDEX %I ON %I (last_updated, version)', tbl || '_last_updated_idx', tbl);
+  FOREACH definition IN ARRAY search_indexes LOOP
+    -- pg_indexes only qualifies the table name when the schema is not on the search path
+    EXECUTE regexp_replace(definition, ' ON (public\.)?' || tbl || ' ', ' ON public.' || tbl || '_current ');
+  END LOOP;
+
+  EXECUTE format('ALTER TABLE %I OWNER TO %I', tbl, owner);
+  EXECUTE format('ALTER TABLE %I OWNER TO %I', tbl || '_current', owner);
+  EXECUTE format('ALTER TABLE %I OWNER TO %I', tbl || '_history', owner);
+  EXECUTE format('ANALYZE %I', tbl);
+END
+$$;
+
+SELECT pg_temp.partition_versions('organizations');
+SELECT pg_temp.partition_versions('endpoints');
+SELECT pg_temp.partition_versions('organization_affiliations');
+SELECT pg_temp.partition_versions('healthcare_services');
+SELECT pg_temp.partition_versions('locations');
+SELECT pg_temp.partition_versions('practitioners');
+SELECT pg_temp.partition_versions('practitioner_roles');
@@ -0,0 +1,37 @@
+-- Every version gets the period in which it was the current version of its resource: from its own
+-- meta.lastUpdated up to that of the next version, or without upper bound for the current version. Reads and
+-- searches with _at select the versions whose period contains the instant, with a GiST index on the range.
+--
+-- The per resource lookup (fhir_id plus instant) uses the existing fhir_id indexes of both partitions, every
+-- resource has only a handful of versions. A composite GiST index on (fhir_id, valid) would need the btree_gist
+-- extension, which is not installed on every server.
+
+CREATE FUNCTION pg_temp.add_validity(tbl TEXT) RETURNS VOID LANGUAGE plpgsql AS $$
+BEGIN
+  EXECUTE format('ALTER TABLE %I ADD COLUMN valid TSTZRANGE', tbl);
+
+  -- Deleted versions have no meta, the time they were written is the best there is
+  EXECUTE format($sql$
+    UPDATE %1$I t SET valid = tstzrange(v.valid_from, CASE WHEN v.valid_to IS NOT NULL THEN greatest(v.valid_from, v.valid_to) END)
+    FROM (
+      SELECT id, valid_from, lead(valid_from) OVER (PARTITION BY fhir_id ORDER BY version) AS valid_to
+      FROM (SELECT id, fhir_id, version, coalesce(last_updated, modified_at, created_at) AS valid_from FROM %1$I) versions
+    ) v
+    WHERE t.id = v.id
+  $sql$, tbl);
+
+  -- Rows that are not written by the application become valid when they are inserted
+  EXECUTE format('ALTER TABLE %I ALTER COLUMN valid SET DEFAULT tstzrange(now(), NULL)', tbl);
+  EXECUTE format('ALTER TABLE %I ALTER COLUMN valid SET NOT NULL', tbl);
+  EXECUTE format('CREATE INDEX %I ON %I USING GIST (valid)', tbl || '_valid_idx', tbl);
+  EXECUTE format('ANALYZE %I', tbl);
+END
+$$;
+
+SELECT pg_temp.add_validity('organizations');
+SELECT pg_temp.add_validity('endpoints');
+SELECT pg_temp.add_validity('organization_affiliations');
+SELECT pg_temp.add_validity('healthcare_services');
+SELECT pg_temp.add_validity('locations');
+SELECT pg_temp.add_validity('practitioners');
+SELECT pg_temp.add_validity('practitioner_roles');
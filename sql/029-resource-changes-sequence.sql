@@ -0,0 +1,6 @@
+-- Every stored version is announced on the resource_changes notification channel (see RepositoryBase.notify()).
+-- The notifications are numbered from this sequence, consumers of GET /$changes use the number as their cursor.
+-- Numbers are taken when a version is written, not when it is committed, so they are unique but not in commit
+-- order, and rolled back writes leave gaps.
+
+CREATE SEQUENCE resource_changes_seq;
@@ -19,6 +19,7 @@ from app.services.entity_services.organization_affiliation_service import (
 from app.services.entity_services.organization_service import OrganizationService
 from app.services.entity_services.practitioner import PractitionerService
 from app.services.entity_services.practitioner_role_service import PractitionerRoleService
+from app.services.include_service import IncludeService
 from app.services.matching_care_service import MatchingCareService
 from tests.test_config import (
     get_postgres_database,
@@ -124,11 +125,16 @@ def practitioner_role_service(
     return PractitionerRoleService(setup_postgres_database)
 
 
+@pytest.fixture
+def include_service(setup_postgres_database: Database) -> IncludeService:
+    return IncludeService(setup_postgres_database)
+
+
 @pytest.fixture
 def matching_care_service(
-    organization_service: OrganizationService, endpoint_service: EndpointService
+    organization_service: OrganizationService, endpoint_service: EndpointService, include_service: IncludeService
 ) -> MatchingCareService:
-    return MatchingCareService(organization_service, endpoint_service)
+    return MatchingCareService(organization_service, endpoint_service, include_service)
 
 
 @pytest.fixture
@@ -0,0 +1,58 @@
+import pytest
+
+from app.exceptions.service_exceptions import InvalidResourceException
+from app.params.include import Includes
+
+
+def test_parse_include_and_iterate() -> None:
+    includes = Includes.parse("Location", ["Location:organization"], ["Location:partof", "Organization:endpoint"])
+
+    assert [(param.source, param.target) for param in includes.params] == [("Location", "Organization")]
+    assert [(param.source, param.target) for param in includes.iterate] == [
+        ("Location", "Location"),
+        ("Organization", "Endpoint"),
+    ]
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "OrganizationAffiliation:endpoint",
+        "OrganizationAffiliation.endpoint",
+        "OrganizationAffiliation:endpoint:Endpoint",
+    ],
+)
+def test_parse_include_notations(value: str) -> None:
+    includes = Includes.parse("OrganizationAffiliation", [value])
+
+    assert [param.element for param in includes.params] == ["endpoint"]
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "Location:incorrect",
+        "Location:organization:Endpoint",
+        "Organization:endpoint",
+        "Location",
+    ],
+)
+def test_parse_invalid_include(value: str) -> None:
+    with pytest.raises(InvalidResourceException):
+        Includes.parse("Location", [value])
+
+
+def test_empty_includes_are_falsy() -> None:
+    assert not Includes.parse("Location", [], [])
+
+
+def test_parse_revinclude() -> None:
+    includes = Includes.parse("Organization", [], revinclude=["Location:organization"])
+
+    assert [(param.source, param.column) for param in includes.rev] == [("Location", "managing_organization_reference")]
+
+
+@pytest.mark.parametrize("value", ["Location:partof", "Organization:endpoint", "Location:incorrect"])
+def test_parse_invalid_revinclude(value: str) -> None:
+    with pytest.raises(InvalidResourceException):
+        Includes.parse("Organization", [], revinclude=[value])
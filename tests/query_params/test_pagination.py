@@ -0,0 +1,34 @@
+from uuid import uuid4
+
+import pytest
+
+from app.exceptions.service_exceptions import InvalidResourceException
+from app.params.pagination import Page, PageCursor
+
+
+def test_cursor_round_trip() -> None:
+    cursor = PageCursor(fhir_id=uuid4(), direction="previous")
+
+    assert PageCursor.decode(cursor.encode()) == cursor
+
+
+@pytest.mark.parametrize(
+    "token", ["", "not-a-cursor", "c2lkZXdheXM6MTIz", "c2lkZXdheXM6MDAwMDAwMDAtMDAwMC0wMDAwLTAwMDAtMDAwMDAwMDAwMDAx"]
+)
+def test_invalid_cursor_is_rejected(token: str) -> None:
+    with pytest.raises(InvalidResourceException):
+        PageCursor.decode(token)
+
+
+def test_page_links_point_in_both_directions() -> None:
+    first_id, last_id = uuid4(), uuid4()
+    page = Page(count=2, cursor=PageCursor(fhir_id=uuid4(), direction="next"), url="http://test/Organization/_search")
+    page.first_id, page.last_id = first_id, last_id
+    page.has_next = page.has_previous = True
+
+    links = {link["relation"]: link["url"] for link in page.links()}
+
+    assert links["self"] == "http://test/Organization/_search"
+    assert PageCursor(last_id, "next").encode() in links["next"]
+    assert PageCursor(first_id, "previous").encode() in links["previous"]
+    assert "_count=2" in links["next"]
@@ -0,0 +1,54 @@
+import pytest
+
+from app.exceptions.service_exceptions import InvalidResourceException
+from app.params.summary import Summary, SummaryMode, TotalMode, get_summary
+
+
+def test_elements_projection_keeps_mandatory_elements() -> None:
+    summary = get_summary(summary=None, elements="name, identifier", total=None)
+
+    assert summary.projection("Endpoint") == [
+        "resourceType",
+        "id",
+        "meta",
+        "address",
+        "_address",
+        "connectionType",
+        "payloadType",
+        "status",
+        "_status",
+        "name",
+        "_name",
+        "identifier",
+    ]
+
+
+def test_summary_projections() -> None:
+    assert Summary().projection("Organization") is None
+    assert Summary(mode=SummaryMode.COUNT).projection("Organization") is None
+
+    summary = Summary(mode=SummaryMode.TRUE).projection("Organization") or []
+    assert "name" in summary and "partOf" in summary
+    assert "address" not in summary and "text" not in summary
+
+    assert Summary(mode=SummaryMode.TEXT).projection("Organization") == ["resourceType", "id", "meta", "text"]
+
+    data = Summary(mode=SummaryMode.DATA).projection("Organization") or []
+    assert "address" in data and "contact" in data
+    assert "text" not in data
+
+
+def test_count_mode() -> None:
+    assert Summary(mode=SummaryMode.COUNT).count_mode() == TotalMode.ACCURATE
+    assert Summary(mode=SummaryMode.COUNT, total=TotalMode.ESTIMATE).count_mode() == TotalMode.ESTIMATE
+    assert Summary(total=TotalMode.ACCURATE).count_mode(None) is None
+    assert Summary(total=TotalMode.NONE).count_mode() is None
+
+
+def test_invalid_parameters() -> None:
+    with pytest.raises(InvalidResourceException):
+        get_summary(summary="everything", elements=None, total=None)
+    with pytest.raises(InvalidResourceException):
+        get_summary(summary=None, elements=None, total="exact")
+    with pytest.raises(InvalidResourceException):
+        get_summary(summary=None, elements="nonsense", total=None).projection("Location")
@@ -0,0 +1,199 @@
+from typing import Any, Dict
+from uuid import uuid4
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+
+from app.db.db import Database
+from app.services.entity_services.location_service import LocationService
+from app.services.entity_services.organization_service import OrganizationService
+from seeds.generate_data import DataGenerator
+from tests.utils import add_location, add_organization
+
+
+def resource(fhir_resource: Any) -> Dict[str, Any]:
+    data: Dict[str, Any] = jsonable_encoder(fhir_resource.dict(exclude_none=True))
+    return data
+
+
+def post(full_url: str, resource_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    return {"fullUrl": full_url, "resource": data, "request": {"method": "POST", "url": resource_type}}
+
+
+def onboarding_bundle(bundle_type: str = "transaction") -> Dict[str, Any]:
+    dg = DataGenerator()
+    organization = resource(dg.generate_organization())
+    organization["endpoint"] = [{"reference": "urn:uuid:endpoint"}]
+    endpoint = resource(dg.generate_endpoint())
+    endpoint["managingOrganization"] = {"reference": "urn:uuid:organization"}
+    location = resource(dg.generate_location())
+    location["managingOrganization"] = {"reference": "urn:uuid:organization"}
+
+    return {
+        "resourceType": "Bundle",
+        "type": bundle_type,
+        "entry": [
+            post("urn:uuid:organization", "Organization", organization),
+            post("urn:uuid:endpoint", "Endpoint", endpoint),
+            post("urn:uuid:location", "Location", location),
+        ],
+    }
+
+
+def test_transaction_resolves_urn_uuid_references(api_client: TestClient) -> None:
+    response = api_client.post("/", json=onboarding_bundle())
+    assert response.status_code == 200
+
+    bundle = response.json()
+    assert bundle["type"] == "transaction-response"
+    assert [entry["response"]["status"] for entry in bundle["entry"]] == ["201 Created"] * 3
+    (organization, endpoint, location) = [entry["resource"] for entry in bundle["entry"]]
+
+    assert organization["endpoint"] == [{"reference": f"Endpoint/{endpoint['id']}"}]
+    assert endpoint["managingOrganization"] == {"reference": f"Organization/{organization['id']}"}
+    assert location["managingOrganization"] == {"reference": f"Organization/{organization['id']}"}
+
+    assert api_client.get(f"/Organization/{organization['id']}").status_code == 200
+    assert api_client.get(f"/Endpoint/{endpoint['id']}").status_code == 200
+    assert api_client.get(f"/Location/{location['id']}").json() == location
+
+
+def test_transaction_is_rolled_back_when_an_entry_fails(
+    api_client: TestClient, setup_postgres_database: Database, organization_service: OrganizationService
+) -> None:
+    setup_postgres_database.truncate_tables()
+    add_organization(organization_service, ura_number="12345678")
+
+    dg = DataGenerator()
+    bundle = {
+        "resourceType": "Bundle",
+        "type": "transaction",
+        "entry": [
+            post("urn:uuid:location", "Location", resource(dg.generate_location())),
+            post("urn:uuid:organization", "Organization", resource(dg.generate_organization(ura_number="12345678"))),
+        ],
+    }
+
+    # The location is written first, the organization then fails on its duplicate URA number
+    response = api_client.post("/", json=bundle)
+    assert response.status_code == 422
+    assert api_client.get("/Location/_search").json()["total"] == 0
+
+
+def test_transaction_validates_references_before_writing(api_client: TestClient) -> None:
+    bundle = onboarding_bundle()
+    bundle["entry"][2]["resource"]["partOf"] = {"reference": f"Location/{uuid4()}"}
+
+    response = api_client.post("/", json=bundle)
+    assert response.status_code == 404
+
+
+def test_transaction_updates_and_deletes(api_client: TestClient, location_service: LocationService) -> None:
+    updated = add_location(location_service)
+    deleted = add_location(location_service)
+
+    data = dict(updated.data or {})
+    data.pop("meta")
+    data["name"] = "renamed"
+    bundle = {
+        "resourceType": "Bundle",
+        "type": "transaction",
+        "entry": [
+            {"resource": data, "request": {"method": "PUT", "url": f"Location/{updated.fhir_id}"}},
+            {"request": {"method": "DELETE", "url": f"Location/{deleted.fhir_id}"}},
+        ],
+    }
+
+    response = api_client.post("/", json=bundle)
+    assert response.status_code == 200
+    assert [entry["response"]["status"] for entry in response.json()["entry"]] == ["200 OK", "204 No Content"]
+
+    assert api_client.get(f"/Location/{updated.fhir_id}").json()["name"] == "renamed"
+    assert api_client.get(f"/Location/{deleted.fhir_id}").status_code == 404
+
+
+def test_transaction_checks_if_match(api_client: TestClient, location_service: LocationService) -> None:
+    location = add_location(location_service)
+
+    data = dict(location.data or {})
+    data.pop("meta")
+    data["name"] = "renamed"
+    put = {"resource": data, "request": {"method": "PUT", "url": f"Location/{location.fhir_id}", "ifMatch": 'W/"2"'}}
+    delete = {"request": {"method": "DELETE", "url": f"Location/{location.fhir_id}", "ifMatch": 'W/"2"'}}
+
+    for entry in (put, delete):
+        response = api_client.post("/", json={"resourceType": "Bundle", "type": "transaction", "entry": [entry]})
+        assert response.status_code == 412
+    assert api_client.get(f"/Location/{location.fhir_id}").json()["meta"]["versionId"] == "1"
+
+    put["request"]["ifMatch"] = 'W/"1"'
+    response = api_client.post("/", json={"resourceType": "Bundle", "type": "transaction", "entry": [put]})
+    assert response.status_code == 200
+    assert response.json()["entry"][0]["response"]["etag"] == 'W/"2"'
+
+
+def test_batch_reports_a_failed_if_match_per_entry(api_client: TestClient, location_service: LocationService) -> None:
+    location = add_location(location_service)
+    entry = {"request": {"method": "DELETE", "url": f"Location/{location.fhir_id}", "ifMatch": "2"}}
+
+    response = api_client.post("/", json={"resourceType": "Bundle", "type": "batch", "entry": [entry]})
+    assert response.status_code == 200
+    assert response.json()["entry"][0]["response"]["status"] == "412"
+    assert api_client.get(f"/Location/{location.fhir_id}").status_code == 200
+
+
+def test_transaction_rejects_unknown_urn_uuid(api_client: TestClient) -> None:
+    bundle = onboarding_bundle()
+    bundle["entry"][2]["resource"]["partOf"] = {"reference": "urn:uuid:unknown"}
+
+    response = api_client.post("/", json=bundle)
+    assert response.status_code == 422
+
+
+def test_batch_reports_failures_per_entry(api_client: TestClient) -> None:
+    dg = DataGenerator()
+    valid = resource(dg.generate_location())
+    invalid = resource(dg.generate_location(organization=uuid4()))
+    bundle = {
+        "resourceType": "Bundle",
+        "type": "batch",
+        "entry": [post("urn:uuid:valid", "Location", valid), post("urn:uuid:invalid", "Location", invalid)],
+    }
+
+    response = api_client.post("/", json=bundle)
+    assert response.status_code == 200
+
+    (created, failed) = response.json()["entry"]
+    assert response.json()["type"] == "batch-response"
+    assert created["response"]["status"] == "201 Created"
+    assert failed["response"]["status"] == "404"
+    assert failed["response"]["outcome"]["resourceType"] == "OperationOutcome"
+    assert api_client.get(f"/Location/{created['resource']['id']}").status_code == 200
+
+
+def test_batch_reports_invalid_references_per_entry(api_client: TestClient, location_service: LocationService) -> None:
+    dg = DataGenerator()
+    other = add_location(location_service)
+    valid = resource(dg.generate_location())
+    # A Location where the element only allows an Organization
+    wrong_type = resource(dg.generate_location())
+    wrong_type["managingOrganization"] = {"reference": f"Location/{other.fhir_id}"}
+    bundle = {
+        "resourceType": "Bundle",
+        "type": "batch",
+        "entry": [post("urn:uuid:valid", "Location", valid), post("urn:uuid:wrong-type", "Location", wrong_type)],
+    }
+
+    response = api_client.post("/", json=bundle)
+    assert response.status_code == 200
+
+    (created, failed) = response.json()["entry"]
+    assert created["response"]["status"] == "201 Created"
+    assert failed["response"]["status"] == "422"
+    assert "expected Organization" in failed["response"]["outcome"]["issue"][0]["details"]["text"]
+    assert api_client.get(f"/Location/{created['resource']['id']}").status_code == 200
+
+
+def test_unsupported_bundle_type(api_client: TestClient) -> None:
+    response = api_client.post("/", json={"resourceType": "Bundle", "type": "collection", "entry": []})
+    assert response.status_code == 422
@@ -0,0 +1,56 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from fhir.resources.R4B.location import Location as FhirLocation
+
+from app.db.db import Database
+from app.services.entity_services.location_service import LocationService
+
+
+def wait_for_cursor(client: TestClient) -> int:
+    # The notification of the last write arrives asynchronously
+    for _ in range(50):
+        cursor = client.get("/$changes", params={"_wait": 0}).json()["next"]
+        if cursor is not None:
+            return int(cursor)
+        time.sleep(0.05)
+    raise AssertionError("No changes arrived")
+
+
+def test_changes_are_long_polled(
+    postgres_app: FastAPI, setup_postgres_database: Database, location_service: LocationService
+) -> None:
+    with TestClient(postgres_app) as client:
+        location = location_service.add_one(FhirLocation(name="first"))
+        cursor = wait_for_cursor(client)
+
+        assert client.get("/$changes", params={"since": cursor, "_wait": 0}).json() == {
+            "changes": [],
+            "next": cursor,
+        }
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            poll = executor.submit(client.get, "/$changes", params={"since": cursor, "_wait": 10})
+            location_service.update_one(location.fhir_id, FhirLocation(name="second"))
+            response = poll.result()
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/json"
+        body: Dict[str, Any] = response.json()
+        assert [(c["type"], c["id"], c["version"]) for c in body["changes"]] == [("Location", str(location.fhir_id), 2)]
+        assert body["next"] == body["changes"][0]["seq"]
+
+        location_service.delete_one(location.fhir_id)
+        body = client.get("/$changes", params={"since": body["next"], "_wait": 10}).json()
+        assert [(c["id"], c["version"]) for c in body["changes"]] == [(str(location.fhir_id), 3)]
+
+
+def test_unknown_cursor_is_gone(postgres_app: FastAPI, setup_postgres_database: Database) -> None:
+    with TestClient(postgres_app) as client:
+        response = client.get("/$changes", params={"since": 123456789, "_wait": 0})
+
+    assert response.status_code == 410
+    assert response.json()["detail"]["issue"][0]["code"] == "not-found"
@@ -0,0 +1,87 @@
+from datetime import timedelta
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi.testclient import TestClient
+
+from app.services.entity_services.endpoint_service import EndpointService
+from app.services.entity_services.organization_service import OrganizationService
+from app.services.entity_services.practitioner import PractitionerService
+from tests.utils import add_endpoint, add_organization, add_practitioner
+
+
+def test_organization_read_returns_etag_and_last_modified(
+    api_client: TestClient, org_endpoint: str, organization_service: OrganizationService
+) -> None:
+    org = add_organization(organization_service)
+
+    response = api_client.get(f"{org_endpoint}/{org.fhir_id}")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/fhir+json"
+    assert response.headers["etag"] == 'W/"1"'
+    assert parsedate_to_datetime(response.headers["last-modified"]) is not None
+    assert response.json()["id"] == str(org.fhir_id)
+
+
+def test_if_none_match_returns_304_until_the_resource_changes(
+    api_client: TestClient, org_endpoint: str, organization_service: OrganizationService
+) -> None:
+    org = add_organization(organization_service)
+    url = f"{org_endpoint}/{org.fhir_id}"
+
+    for etag in ['W/"1"', '"1"', '"0", W/"1"', "*"]:
+        response = api_client.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == 'W/"1"'
+
+    data = api_client.get(url).json()
+    data["name"] = "renamed"
+    assert api_client.put(url, json=data).status_code == 200
+
+    response = api_client.get(url, headers={"If-None-Match": 'W/"1"'})
+    assert response.status_code == 200
+    assert response.headers["etag"] == 'W/"2"'
+    assert response.json()["name"] == "renamed"
+
+
+def test_if_modified_since(
+    api_client: TestClient, practitioner_endpoint: str, practitioner_service: PractitionerService
+) -> None:
+    practitioner = add_practitioner(practitioner_service)
+    url = f"{practitioner_endpoint}/{practitioner.fhir_id}"
+    last_modified = parsedate_to_datetime(api_client.get(url).headers["last-modified"])
+
+    response = api_client.get(url, headers={"If-Modified-Since": format_datetime(last_modified, usegmt=True)})
+    assert response.status_code == 304
+
+    earlier = format_datetime(last_modified - timedelta(seconds=1), usegmt=True)
+    assert api_client.get(url, headers={"If-Modified-Since": earlier}).status_code == 200
+    assert api_client.get(url, headers={"If-Modified-Since": "not a date"}).status_code == 200
+
+    # If-None-Match wins over If-Modified-Since
+    response = api_client.get(
+        url, headers={"If-None-Match": 'W/"7"', "If-Modified-Since": format_datetime(last_modified, usegmt=True)}
+    )
+    assert response.status_code == 200
+
+
+def test_conditional_vread(api_client: TestClient, endpoint_endpoint: str, endpoint_service: EndpointService) -> None:
+    endpoint = add_endpoint(endpoint_service)
+
+    response = api_client.get(f"{endpoint_endpoint}/{endpoint.fhir_id}/_history/1", headers={"If-None-Match": 'W/"1"'})
+    assert response.status_code == 304
+
+    response = api_client.get(f"{endpoint_endpoint}/{endpoint.fhir_id}/_history/1", headers={"If-None-Match": 'W/"2"'})
+    assert response.status_code == 200
+
+
+def test_conditional_read_of_unknown_resource_is_not_found(
+    api_client: TestClient, endpoint_endpoint: str, endpoint_service: EndpointService
+) -> None:
+    response = api_client.get(f"{endpoint_endpoint}/{add_endpoint(endpoint_service).fhir_id}")
+    assert response.status_code == 200
+
+    response = api_client.get(
+        f"{endpoint_endpoint}/00000000-0000-0000-0000-000000000000", headers={"If-None-Match": "*"}
+    )
+    assert response.status_code == 404
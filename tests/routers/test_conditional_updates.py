@@ -0,0 +1,90 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict
+
+from fastapi.testclient import TestClient
+from fhir.resources.R4B.location import Location as FhirLocation
+from pytest import raises
+from sqlalchemy import func, select
+
+from app.db.db import Database
+from app.db.entities.location.location import Location
+from app.db.repositories.location_repository import LocationRepository
+from app.exceptions.service_exceptions import PreconditionFailedException, ResourceVersionConflictException
+from app.services.entity_services.location_service import LocationService
+from app.services.entity_services.organization_service import OrganizationService
+from tests.utils import add_organization
+
+
+def renamed(data: Dict[str, Any] | None, name: str) -> Dict[str, Any]:
+    return {**(data or {}), "name": name}
+
+
+def test_if_match_updates_only_the_current_version(
+    api_client: TestClient, org_endpoint: str, organization_service: OrganizationService
+) -> None:
+    org = add_organization(organization_service)
+    url = f"{org_endpoint}/{org.fhir_id}"
+
+    response = api_client.put(url, json=renamed(org.data, "first"), headers={"If-Match": 'W/"1"'})
+    assert response.status_code == 200
+    assert response.headers["etag"] == 'W/"2"'
+
+    response = api_client.put(url, json=renamed(org.data, "second"), headers={"If-Match": 'W/"1"'})
+    assert response.status_code == 412
+    assert response.json()["detail"]["issue"][0]["code"] == "conflict"
+    assert api_client.get(url).json()["name"] == "first"
+
+    assert api_client.put(url, json=renamed(org.data, "second"), headers={"If-Match": "nope"}).status_code == 422
+    assert api_client.put(url, json=renamed(org.data, "second"), headers={"If-Match": '"2"'}).status_code == 200
+
+
+def test_if_match_on_delete(
+    api_client: TestClient, location_service: LocationService, setup_postgres_database: Database
+) -> None:
+    location = location_service.add_one(FhirLocation(name="deleted"))
+    url = f"/Location/{location.fhir_id}"
+
+    assert api_client.delete(url, headers={"If-Match": 'W/"2"'}).status_code == 412
+    assert api_client.delete(url, headers={"If-Match": 'W/"1"'}).status_code == 204
+
+
+def test_stale_version_is_not_written(location_service: LocationService, setup_postgres_database: Database) -> None:
+    location = location_service.add_one(FhirLocation(name="original"))
+    stale = location_service.get_one_version(location.fhir_id, 1)
+    location_service.update_one(location.fhir_id, FhirLocation(**renamed(location.data, "newer")))
+
+    with setup_postgres_database.get_db_session() as session:
+        with raises(ResourceVersionConflictException):
+            session.get_repository(LocationRepository).update(stale, renamed(location.data, "stale"))
+    with setup_postgres_database.get_db_session() as session:
+        # A lost race of a conditional write fails its precondition
+        with raises(PreconditionFailedException):
+            session.get_repository(LocationRepository).update(stale, renamed(location.data, "stale"), version=1)
+
+    assert location_service.get_one(location.fhir_id).data["name"] == "newer"  # type: ignore
+
+
+def test_concurrent_updates_leave_one_latest_version(
+    location_service: LocationService, setup_postgres_database: Database
+) -> None:
+    location = location_service.add_one(FhirLocation(name="concurrent"))
+
+    def update(number: int) -> str:
+        try:
+            location_service.update_one(location.fhir_id, FhirLocation(**renamed(location.data, f"writer {number}")))
+            return "written"
+        except ResourceVersionConflictException:
+            return "conflict"
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(update, range(8)))
+
+    with setup_postgres_database.get_db_session() as session:
+        latest = session.execute(
+            select(func.count()).where(Location.fhir_id == location.fhir_id, Location.latest)
+        ).scalar_one()
+        versions = session.execute(select(func.count()).where(Location.fhir_id == location.fhir_id)).scalar_one()
+
+    assert latest == 1
+    assert "written" in results
+    assert versions == 1 + results.count("written")
@@ -0,0 +1,81 @@
+import json
+import time
+from datetime import UTC, datetime, timedelta
+
+from fastapi.testclient import TestClient
+from httpx import Response
+
+from app.db.db import Database
+from app.services.entity_services.location_service import LocationService
+from app.services.entity_services.organization_service import OrganizationService
+from tests.utils import add_location, add_organization
+
+
+def wait_for_export(api_client: TestClient, status_url: str) -> Response:
+    for _ in range(100):
+        response: Response = api_client.get(status_url)
+        if response.status_code != 202:
+            return response
+        time.sleep(0.05)
+    raise AssertionError("Export did not finish")
+
+
+def test_export_writes_ndjson_per_type(
+    api_client: TestClient,
+    setup_postgres_database: Database,
+    organization_service: OrganizationService,
+    location_service: LocationService,
+) -> None:
+    organization = add_organization(organization_service)
+    locations = [add_location(location_service) for _ in range(3)]
+    location_service.delete_one(locations[0].fhir_id)
+
+    response = api_client.get("/$export")
+    assert response.status_code == 202
+
+    response = wait_for_export(api_client, response.headers["content-location"])
+    assert response.status_code == 200
+    manifest = response.json()
+    assert manifest["request"].endswith("/$export")
+    output = {file["type"]: file for file in manifest["output"]}
+    assert output["Organization"]["count"] == 1
+    assert output["Location"]["count"] == 2
+    assert output["Endpoint"]["count"] == 0
+
+    response = api_client.get(output["Location"]["url"])
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/fhir+ndjson"
+    exported = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(data["id"] for data in exported) == sorted(str(location.fhir_id) for location in locations[1:])
+
+    response = api_client.get(output["Organization"]["url"])
+    assert json.loads(response.text)["id"] == str(organization.fhir_id)
+
+
+def test_export_filters_on_type_and_since(
+    api_client: TestClient, setup_postgres_database: Database, location_service: LocationService
+) -> None:
+    add_location(location_service)
+
+    response = api_client.get("/$export", params={"_type": "Location,Practitioner"})
+    manifest = wait_for_export(api_client, response.headers["content-location"]).json()
+    assert [(file["type"], file["count"]) for file in manifest["output"]] == [("Location", 1), ("Practitioner", 0)]
+
+    since = (datetime.now(UTC) + timedelta(hours=1)).isoformat()
+    response = api_client.get("/$export", params={"_type": "Location", "_since": since})
+    manifest = wait_for_export(api_client, response.headers["content-location"]).json()
+    assert [(file["type"], file["count"]) for file in manifest["output"]] == [("Location", 0)]
+
+
+def test_export_rejects_unknown_types(api_client: TestClient) -> None:
+    assert api_client.get("/$export", params={"_type": "Patient"}).status_code == 422
+    assert api_client.get("/$export", params={"_outputFormat": "text/csv"}).status_code == 422
+
+
+def test_export_can_be_removed(api_client: TestClient, setup_postgres_database: Database) -> None:
+    status_url = api_client.get("/$export").headers["content-location"]
+    manifest = wait_for_export(api_client, status_url).json()
+
+    assert api_client.delete(status_url).status_code == 202
+    assert api_client.get(status_url).status_code == 404
+    assert api_client.get(manifest["output"][0]["url"]).status_code == 404
@@ -0,0 +1,63 @@
+import json
+from typing import Iterator
+
+from fastapi.testclient import TestClient
+
+from app.db.db import Database
+from app.services.entity_services.endpoint_service import EndpointService
+from app.services.entity_services.organization_service import OrganizationService
+from tests.routers.test_export_routes import wait_for_export
+from tests.utils import add_endpoint, add_organization
+
+
+def test_import_returns_an_operation_outcome(api_client: TestClient, setup_postgres_database: Database) -> None:
+    body = "\n".join([json.dumps({"resourceType": "Location", "name": "imported"}), "{}"])
+
+    response = api_client.post("/$import", params={"_type": "Location"}, content=body)
+    assert response.status_code == 200
+
+    issues = response.json()["issue"]
+    assert issues[0]["details"]["text"] == "Imported 1 Location resources"
+    assert [issue["severity"] for issue in issues[1:]] == ["error"]
+    assert api_client.get("/Location/_search").json()["total"] == 1
+
+
+def test_import_reads_lines_split_over_chunks(api_client: TestClient, setup_postgres_database: Database) -> None:
+    body = "\n".join(json.dumps({"resourceType": "Location", "name": f"imported {i}"}) for i in range(3)).encode()
+
+    def chunks() -> Iterator[bytes]:
+        for start in range(0, len(body), 7):
+            yield body[start : start + 7]
+
+    response = api_client.post("/$import", params={"_type": "Location"}, content=chunks())
+    assert response.json()["issue"] == [
+        {"severity": "information", "code": "informational", "details": {"text": "Imported 3 Location resources"}}
+    ]
+
+
+def test_import_rejects_unknown_types(api_client: TestClient) -> None:
+    assert api_client.post("/$import", params={"_type": "Patient"}, content="").status_code == 422
+
+
+def test_export_can_be_imported(
+    api_client: TestClient,
+    setup_postgres_database: Database,
+    organization_service: OrganizationService,
+    endpoint_service: EndpointService,
+) -> None:
+    organization = add_organization(organization_service)
+    endpoint = add_endpoint(endpoint_service, org_fhir_id=organization.fhir_id)
+
+    response = api_client.get("/$export", params={"_type": "Organization,Endpoint"})
+    manifest = wait_for_export(api_client, response.headers["content-location"]).json()
+    files = {file["type"]: api_client.get(file["url"]).text for file in manifest["output"]}
+
+    setup_postgres_database.truncate_tables()
+    for resource_type in ["Organization", "Endpoint"]:
+        response = api_client.post("/$import", params={"_type": resource_type}, content=files[resource_type])
+        assert len(response.json()["issue"]) == 1
+
+    imported = api_client.get(f"/Endpoint/{endpoint.fhir_id}").json()
+    assert imported["managingOrganization"] == {"reference": f"Organization/{organization.fhir_id}"}
+    assert imported["meta"]["versionId"] == "1"
+    assert api_client.get(f"/Organization/{organization.fhir_id}").status_code == 200
@@ -4,6 +4,7 @@ import pytest
 from fastapi.encoders import jsonable_encoder
 from fastapi.testclient import TestClient
 from fhir.resources.R4B.bundle import Bundle
+from pytest_mock import MockerFixture
 
 from app.db.db import Database
 from app.services.entity_services.location_service import LocationService
@@ -128,6 +129,38 @@ def test_location_history(
     assert bundle.entry[1].resource.id == location.fhir_id.__str__()
 
 
+def test_location_history_is_streamed_in_chunks(
+    api_client: TestClient,
+    location_endpoint: str,
+    location_service: LocationService,
+    mocker: MockerFixture,
+) -> None:
+    # Force a chunk per entry, so the bundle is written in several pieces
+    mocker.patch("app.routers.utils.STREAM_CHUNK_SIZE", 1)
+    locations = [add_location(location_service) for _ in range(3)]
+
+    response = api_client.request("GET", f"{location_endpoint}/_history")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/fhir+json"
+    data = response.json()
+    bundle = Bundle(**data)
+    assert bundle.type == "history"
+    assert bundle.total == 3
+    assert [entry["resource"]["id"] for entry in data["entry"]] == [str(loc.fhir_id) for loc in reversed(locations)]
+
+
+def test_location_history_without_entries(
+    api_client: TestClient,
+    location_endpoint: str,
+) -> None:
+    response = api_client.request("GET", f"{location_endpoint}/{uuid.uuid4()}/_history")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["type"] == "history"
+    assert data["entry"] == []
+    assert data["total"] == 0
+
+
 def test_location_version(
     api_client: TestClient,
     location_endpoint: str,
@@ -173,3 +206,28 @@ def test_create_location_with_non_existing_organization(
         add_location(location_service, organization=uuid.UUID("850b6018-3537-4318-8e0d-aef286dc3c1b"))
     except Exception as e:
         assert "resource-not-found" in str(e)
+
+
+def test_search_location_with_includes(
+    api_client: TestClient,
+    location_endpoint: str,
+    location_service: LocationService,
+    organization_service: OrganizationService,
+    setup_postgres_database: Database,
+) -> None:
+    organization = add_organization(organization_service)
+    root = add_location(location_service)
+    middle = add_location(location_service, part_of=root.fhir_id)
+    leaf = add_location(location_service, organization=organization.fhir_id, part_of=middle.fhir_id)
+
+    response = api_client.get(
+        location_endpoint + "/_search",
+        params={"_id": str(leaf.fhir_id), "_include": "Location:organization", "_include:iterate": "Location:partof"},
+    )
+    assert response.status_code == 200
+    ids = [entry["resource"]["id"] for entry in response.json()["entry"]]
+    assert ids[0] == str(leaf.fhir_id)
+    assert sorted(ids[1:]) == sorted([str(organization.fhir_id), str(middle.fhir_id), str(root.fhir_id)])
+
+    response = api_client.get(location_endpoint + "/_search", params={"_include:iterate": "Location:unknown"})
+    assert response.status_code == 422
@@ -4,9 +4,11 @@ from fastapi.testclient import TestClient
 from fhir.resources.R4B.bundle import Bundle
 
 from app.db.db import Database
+from app.services.entity_services.location_service import LocationService
+from app.services.entity_services.organization_affiliation_service import OrganizationAffiliationService
 from app.services.entity_services.organization_service import OrganizationService
 from seeds.generate_data import DataGenerator
-from tests.utils import add_organization, check_key_value
+from tests.utils import add_location, add_organization, add_organization_affiliation, check_key_value
 
 
 @pytest.mark.parametrize(
@@ -121,3 +123,66 @@ def test_organization_version(
     data = response.json()
     assert org.data == data
     assert data["meta"]["versionId"] == str(org.version)
+
+
+def test_organization_search_is_paginated(
+    api_client: TestClient,
+    org_endpoint: str,
+    organization_service: OrganizationService,
+    setup_postgres_database: Database,
+) -> None:
+    setup_postgres_database.truncate_tables()
+    expected = sorted(str(add_organization(organization_service).fhir_id) for _ in range(5))
+
+    seen: list[str] = []
+    url: str | None = f"{org_endpoint}/_search?_count=2"
+    while url is not None:
+        response = api_client.get(url)
+        assert response.status_code == 200
+        data = response.json()
+        seen.extend(entry["resource"]["id"] for entry in data["entry"])
+        links = {link["relation"]: link["url"] for link in data.get("link", [])}
+        url = links.get("next")
+
+    assert seen == expected
+
+    # Walking back from the last page returns the previous page in the same order
+    response = api_client.get(links["previous"])
+    assert [entry["resource"]["id"] for entry in response.json()["entry"]] == expected[2:4]
+
+
+def test_organization_search_rejects_invalid_cursor(api_client: TestClient, org_endpoint: str) -> None:
+    response = api_client.get(f"{org_endpoint}/_search", params={"_cursor": "not-a-cursor"})
+    assert response.status_code == 422
+
+
+def test_organization_search_with_revinclude(
+    api_client: TestClient,
+    org_endpoint: str,
+    organization_service: OrganizationService,
+    location_service: LocationService,
+    organization_affiliation_service: OrganizationAffiliationService,
+    setup_postgres_database: Database,
+) -> None:
+    organization = add_organization(organization_service)
+    other = add_organization(organization_service)
+    location = add_location(location_service, organization=organization.fhir_id)
+    affiliation = add_organization_affiliation(
+        organization_affiliation_service, organization=other.fhir_id, participation_organization=organization.fhir_id
+    )
+
+    response = api_client.get(
+        org_endpoint + "/_search",
+        params=[
+            ("_id", str(organization.fhir_id)),
+            ("_revinclude", "Location:organization"),
+            ("_revinclude", "OrganizationAffiliation:participating-organization"),
+        ],
+    )
+    assert response.status_code == 200
+    resources = [(entry["resource"]["resourceType"], entry["resource"]["id"]) for entry in response.json()["entry"]]
+    assert resources[0] == ("Organization", str(organization.fhir_id))
+    assert sorted(resources[1:]) == [
+        ("Location", str(location.fhir_id)),
+        ("OrganizationAffiliation", str(affiliation.fhir_id)),
+    ]
@@ -0,0 +1,79 @@
+from datetime import UTC, datetime
+from typing import Any, Dict
+
+from fastapi.testclient import TestClient
+from fhir.resources.R4B.location import Location as FhirLocation
+from fhir.resources.R4B.reference import Reference
+from sqlalchemy import func, select
+
+from app.db.db import Database
+from app.db.entities.location.location import Location
+from app.services.entity_services.location_service import LocationService
+from app.services.entity_services.organization_service import OrganizationService
+from tests.utils import add_organization
+
+
+def renamed(data: Dict[str, Any] | None, name: str) -> Dict[str, Any]:
+    return {**(data or {}), "name": name}
+
+
+def test_read_at_an_instant(api_client: TestClient, location_service: LocationService) -> None:
+    before = datetime.now(UTC)
+    location = location_service.add_one(FhirLocation(name="first"))
+    first = datetime.now(UTC)
+    location_service.update_one(location.fhir_id, FhirLocation(**renamed(location.data, "second")))
+    second = datetime.now(UTC)
+    location_service.delete_one(location.fhir_id)
+
+    url = f"/Location/{location.fhir_id}"
+    assert api_client.get(url, params={"_at": before.isoformat()}).status_code == 404
+    assert api_client.get(url, params={"_at": first.isoformat()}).json()["name"] == "first"
+    response = api_client.get(url, params={"_at": second.isoformat()})
+    assert response.json()["name"] == "second"
+    assert response.headers["etag"] == 'W/"2"'
+    assert api_client.get(url, params={"_at": datetime.now(UTC).isoformat()}).status_code == 404
+    assert api_client.get(url).status_code == 404
+
+
+def test_versions_are_valid_until_the_next_version(
+    location_service: LocationService, setup_postgres_database: Database
+) -> None:
+    location = location_service.add_one(FhirLocation(name="first"))
+    location_service.update_one(location.fhir_id, FhirLocation(**renamed(location.data, "second")))
+
+    with setup_postgres_database.get_db_session() as session:
+        versions = (
+            session.execute(select(Location).where(Location.fhir_id == location.fhir_id).order_by(Location.version))
+            .scalars()
+            .all()
+        )
+        at_last_updated = session.execute(
+            select(func.count()).where(Location.fhir_id == location.fhir_id, Location.valid.contains(func.now()))
+        ).scalar_one()
+
+    assert versions[0].valid.upper == versions[1].valid.lower
+    assert versions[1].valid.upper is None
+    assert versions[1].valid.lower == versions[1].last_updated
+    assert at_last_updated == 1
+
+
+def test_search_and_include_at_an_instant(
+    api_client: TestClient, location_service: LocationService, organization_service: OrganizationService
+) -> None:
+    organization = add_organization(organization_service, name="before")
+    location = location_service.add_one(
+        FhirLocation(name="first", managingOrganization=Reference(reference=f"Organization/{organization.fhir_id}"))
+    )
+    first = datetime.now(UTC)
+    location_service.update_one(location.fhir_id, FhirLocation(**renamed(location.data, "second")))
+    api_client.put(f"/Organization/{organization.fhir_id}", json=renamed(organization.data, "after"))
+
+    params = {"_id": str(location.fhir_id), "_include": "Location:organization"}
+    bundle = api_client.get("/Location/_search", params={**params, "_at": first.isoformat()}).json()
+    assert [entry["resource"]["name"] for entry in bundle["entry"]] == ["first", "before"]
+
+    bundle = api_client.get("/Location/_search", params=params).json()
+    assert [entry["resource"]["name"] for entry in bundle["entry"]] == ["second", "after"]
+
+    bundle = api_client.get("/Location/_search", params={"_at": first.isoformat()}).json()
+    assert [entry["resource"]["name"] for entry in bundle["entry"]] == ["first"]
@@ -1,15 +1,19 @@
+import uuid
+
 import pytest
 from fastapi.encoders import jsonable_encoder
 from fastapi.testclient import TestClient
 from fhir.resources.R4B.bundle import Bundle
 
 from app.db.db import Database
+from app.services.entity_services.healthcare_service_service import HealthcareServiceService
+from app.services.entity_services.location_service import LocationService
 from app.services.entity_services.organization_service import OrganizationService
 from app.services.entity_services.practitioner_role_service import (
     PractitionerRoleService,
 )
 from seeds.generate_data import DataGenerator
-from tests.utils import add_organization, add_practitioner_role, check_key_value
+from tests.utils import add_location, add_organization, add_practitioner_role, check_key_value
 
 
 @pytest.mark.parametrize(
@@ -88,6 +92,32 @@ def test_update_practitioner_role(
     assert response.headers["etag"] == 'W/"2"'
 
 
+def test_search_by_location_and_service(
+    api_client: TestClient,
+    practitioner_role_endpoint: str,
+    practitioner_role_service: PractitionerRoleService,
+    location_service: LocationService,
+    healthcareservice_service: HealthcareServiceService,
+) -> None:
+    locations = [add_location(location_service) for _ in range(2)]
+    service = healthcareservice_service.add_one(DataGenerator().generate_healthcare_service(id=uuid.uuid4()))
+    role = add_practitioner_role(
+        practitioner_role_service,
+        locations=[location.fhir_id for location in locations],
+        healthcare_services=[service.fhir_id],
+    )
+    add_practitioner_role(practitioner_role_service, locations=[locations[0].fhir_id])
+
+    def found(params: dict[str, str]) -> list[str]:
+        bundle = api_client.get(f"{practitioner_role_endpoint}/_search", params=params).json()
+        return [entry["resource"]["id"] for entry in bundle.get("entry", [])]
+
+    assert found({"location": str(locations[1].fhir_id)}) == [str(role.fhir_id)]
+    assert len(found({"location": str(locations[0].fhir_id)})) == 2
+    assert found({"service": str(service.fhir_id)}) == [str(role.fhir_id)]
+    assert found({"service": str(uuid.uuid4())}) == []
+
+
 def test_practitioner_role_history(
     api_client: TestClient,
     practitioner_role_endpoint: str,
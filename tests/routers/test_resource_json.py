@@ -0,0 +1,137 @@
+import json
+from datetime import UTC, datetime
+from uuid import UUID
+
+from fastapi.testclient import TestClient
+from fhir.resources.R4B.address import Address
+from fhir.resources.R4B.location import Location as FhirLocation
+from sqlalchemy import select
+
+from app.db.db import Database
+from app.db.entities.location.location import Location
+from app.mappers.fhir_mapper import create_bundle_entries, create_fhir_bundle
+from app.params.pagination import Page
+from app.routers.utils import bundle_json, dumps, resource_json
+from app.services.entity_services.endpoint_service import EndpointService
+from app.services.entity_services.location_service import LocationService
+from app.services.entity_services.organization_service import OrganizationService
+from tests.utils import add_endpoint, add_organization
+
+
+def stored_json(database: Database, location: Location) -> str:
+    with database.get_db_session() as session:
+        return str(
+            session.execute(
+                select(Location.data_json).where(Location.fhir_id == location.fhir_id, Location.latest)
+            ).scalar_one()
+        )
+
+
+def test_reads_write_the_stored_json(
+    api_client: TestClient, setup_postgres_database: Database, location_service: LocationService
+) -> None:
+    location = location_service.add_one(FhirLocation(name="stored"))
+    setup_postgres_database.cache.clear()
+
+    response = api_client.get(f"/Location/{location.fhir_id}")
+    assert response.text == stored_json(setup_postgres_database, location)
+    assert response.json() == location.data
+
+    bundle = api_client.get("/Location/_search", params={"_id": str(location.fhir_id)}).json()
+    assert bundle["total"] == 1
+    assert bundle["entry"][0]["resource"] == location.data
+    assert bundle["entry"][0]["fullUrl"] == f"{location.fhir_id}/_history/1"
+
+
+def test_organization_and_endpoint_searches_write_the_stored_json(
+    api_client: TestClient,
+    setup_postgres_database: Database,
+    organization_service: OrganizationService,
+    endpoint_service: EndpointService,
+) -> None:
+    endpoint = add_endpoint(endpoint_service)
+    organization = add_organization(organization_service, endpoint_id=endpoint.fhir_id)
+    assert organization.data_json is not None and endpoint.data_json is not None
+
+    params = {"_id": str(organization.fhir_id), "_include": "Organization:endpoint"}
+    response = api_client.get("/Organization/_search", params=params)
+    assert f'"resource":{organization.data_json},"request":' in response.text
+    assert f'"resource":{endpoint.data_json}}}' in response.text
+    entries = response.json()["entry"]
+    assert [entry["resource"]["id"] for entry in entries] == [str(organization.fhir_id), str(endpoint.fhir_id)]
+    assert "request" in entries[0] and "request" not in entries[1]
+
+    response = api_client.get("/Endpoint/_search", params={"_id": str(endpoint.fhir_id)})
+    assert f'"resource":{endpoint.data_json}}}' in response.text
+
+
+def test_stored_json_is_the_compact_encoding_of_the_data(
+    setup_postgres_database: Database, location_service: LocationService
+) -> None:
+    location = location_service.add_one(
+        FhirLocation(name="Zürich", alias=["ünï", "b"], address=Address(city="Zürich", line=["Straße 1"], use="work"))
+    )
+
+    with setup_postgres_database.get_db_session() as session:
+        stored = session.execute(
+            select(Location).where(Location.fhir_id == location.fhir_id, Location.latest)
+        ).scalar_one()
+
+    assert stored.data_json is not None
+    assert resource_json(stored) == dumps(stored.data, pretty=False)
+    assert resource_json(location) == resource_json(stored)
+
+
+def test_history_writes_deleted_versions(
+    api_client: TestClient, setup_postgres_database: Database, location_service: LocationService
+) -> None:
+    location = location_service.add_one(FhirLocation(name="stored"))
+    location_service.delete_one(location.fhir_id)
+
+    response = api_client.get(f"/Location/{location.fhir_id}/_history")
+    entries = json.loads(response.text)["entry"]
+    assert [entry["resource"] for entry in entries] == [None, location.data]
+    assert entries[0]["request"]["method"] == "DELETE"
+
+
+def test_pretty_output(
+    api_client: TestClient, setup_postgres_database: Database, location_service: LocationService
+) -> None:
+    location = location_service.add_one(FhirLocation(name="pretty"))
+
+    compact = api_client.get("/Location/_search", params={"_id": str(location.fhir_id)})
+    assert "\n" not in compact.text
+
+    pretty = api_client.get("/Location/_search", params={"_id": str(location.fhir_id), "_pretty": "true"})
+    assert pretty.text.startswith('{\n  "resourceType": "Bundle"')
+    assert pretty.json()["entry"] == compact.json()["entry"]
+
+    response = api_client.get(f"/Location/{location.fhir_id}", params={"_pretty": "true"})
+    assert response.text.startswith("{\n  ")
+    assert response.json() == location.data
+    assert response.headers["content-type"] == "application/fhir+json"
+
+
+def test_dumps_encodes_uuids_and_datetimes() -> None:
+    value = {"id": UUID("b5ab4ee4-3e39-4ad5-a4b4-5d7e4d4d1c9a"), "at": datetime(2024, 1, 2, 3, 4, 5, tzinfo=UTC)}
+
+    assert (
+        dumps(value, pretty=False) == b'{"id":"b5ab4ee4-3e39-4ad5-a4b4-5d7e4d4d1c9a","at":"2024-01-02T03:04:05+00:00"}'
+    )
+    assert json.loads(dumps(value, pretty=True)) == json.loads(dumps(value, pretty=False))
+
+
+def test_bundle_json_matches_the_bundle_dict(location_service: LocationService) -> None:
+    locations = [location_service.add_one(FhirLocation(name=f"location {i}")) for i in range(3)]
+    for location in locations:
+        location.__dict__.pop("data_json", None)
+    page = Page(count=10, url="http://testserver/Location/_search")
+
+    for with_req_resp in (False, True):
+        bundle = create_fhir_bundle(bundled_entries=None, page=page, total=3)
+        expected = create_fhir_bundle(
+            bundled_entries=create_bundle_entries(locations, with_req_resp), page=page, total=3
+        )
+
+        assert list(expected.keys()) == ["resourceType", "type", "total", "link", "entry"]
+        assert bundle_json(bundle, locations, with_req_resp) == dumps(expected, pretty=False)
@@ -0,0 +1,66 @@
+from fastapi.testclient import TestClient
+from fhir.resources.R4B.address import Address
+from fhir.resources.R4B.location import Location as FhirLocation
+
+from app.db.db import Database
+from app.services.entity_services.endpoint_service import EndpointService
+from app.services.entity_services.location_service import LocationService
+from app.services.entity_services.organization_service import OrganizationService
+from tests.utils import add_endpoint, add_organization
+
+SUBSETTED = {"system": "http://terminology.hl7.org/CodeSystem/v3-ObservationValue", "code": "SUBSETTED"}
+
+
+def test_elements_are_projected(
+    api_client: TestClient, setup_postgres_database: Database, organization_service: OrganizationService
+) -> None:
+    organization = add_organization(organization_service)
+
+    bundle = api_client.get(
+        "/Organization/_search", params={"_id": str(organization.fhir_id), "_elements": "name,identifier"}
+    ).json()
+    resource = bundle["entry"][0]["resource"]
+    assert set(resource.keys()) == {"resourceType", "id", "meta", "name", "identifier"}
+    assert resource["name"] == organization.data["name"]  # type: ignore[index]
+    assert resource["meta"]["versionId"] == "1"
+    assert resource["meta"]["tag"] == [SUBSETTED]
+
+    # The projected search result does not change how the resource itself is read
+    assert api_client.get(f"/Organization/{organization.fhir_id}").json() == organization.data
+
+
+def test_summary_modes(
+    api_client: TestClient,
+    setup_postgres_database: Database,
+    location_service: LocationService,
+    endpoint_service: EndpointService,
+) -> None:
+    location = location_service.add_one(FhirLocation(name="summary", address=Address(city="Amsterdam")))
+    endpoint = add_endpoint(endpoint_service)
+
+    params = {"_id": str(location.fhir_id)}
+    resource = api_client.get("/Location/_search", params={**params, "_summary": "true"}).json()["entry"][0]["resource"]
+    assert "name" in resource
+    assert "address" not in resource
+
+    resource = api_client.get("/Location/_search", params={**params, "_summary": "data"}).json()["entry"][0]["resource"]
+    assert "address" in resource
+
+    resource = api_client.get("/Endpoint/_search", params={"_id": str(endpoint.fhir_id), "_summary": "text"}).json()[
+        "entry"
+    ][0]["resource"]
+    assert set(resource.keys()) <= {
+        "resourceType",
+        "id",
+        "meta",
+        "text",
+        "status",
+        "connectionType",
+        "payloadType",
+        "address",
+    }
+    assert resource["status"] == endpoint.data["status"]  # type: ignore[index]
+
+
+def test_unknown_elements(api_client: TestClient) -> None:
+    assert api_client.get("/Location/_search", params={"_elements": "nonsense"}).status_code == 422
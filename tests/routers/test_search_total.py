@@ -0,0 +1,57 @@
+from fastapi.testclient import TestClient
+
+from app.db.db import Database
+from app.services.entity_services.location_service import LocationService
+from app.services.entity_services.organization_service import OrganizationService
+from tests.utils import add_location, add_organization
+
+
+def test_summary_count_returns_only_the_total(
+    api_client: TestClient, setup_postgres_database: Database, location_service: LocationService
+) -> None:
+    setup_postgres_database.truncate_tables()
+    for _ in range(3):
+        add_location(location_service)
+
+    bundle = api_client.get("/Location/_search", params={"_summary": "count"}).json()
+    assert bundle == {"resourceType": "Bundle", "type": "searchset", "total": 3}
+
+    bundle = api_client.get("/Location/_search", params={"_summary": "count", "_total": "estimate"}).json()
+    assert isinstance(bundle["total"], int)
+    assert "entry" not in bundle
+
+
+def test_summary_count_applies_the_search_filters(
+    api_client: TestClient, setup_postgres_database: Database, organization_service: OrganizationService
+) -> None:
+    setup_postgres_database.truncate_tables()
+    add_organization(organization_service, name="counted")
+    add_organization(organization_service, name="other")
+
+    response = api_client.get("/Organization/_search", params={"_summary": "count", "name": "counted"})
+    assert response.json() == {"resourceType": "Bundle", "type": "searchset", "total": 1}
+    assert api_client.get("/Endpoint/_search", params={"_summary": "count"}).json()["total"] == 0
+
+
+def test_total_modes_on_a_partial_page(
+    api_client: TestClient, setup_postgres_database: Database, location_service: LocationService
+) -> None:
+    setup_postgres_database.truncate_tables()
+    for _ in range(3):
+        add_location(location_service)
+
+    params = {"_count": "2"}
+    assert "total" not in api_client.get("/Location/_search", params=params).json()
+    assert "total" not in api_client.get("/Location/_search", params={**params, "_total": "none"}).json()
+
+    bundle = api_client.get("/Location/_search", params={**params, "_total": "accurate"}).json()
+    assert bundle["total"] == 3
+    assert len(bundle["entry"]) == 2
+
+    bundle = api_client.get("/Location/_search", params={**params, "_total": "estimate"}).json()
+    assert isinstance(bundle["total"], int)
+
+
+def test_unsupported_summary_and_total(api_client: TestClient) -> None:
+    assert api_client.get("/Location/_search", params={"_total": "exact"}).status_code == 422
+    assert api_client.get("/Practitioner/_search", params={"_summary": "everything"}).status_code == 422
@@ -0,0 +1,40 @@
+from fastapi.encoders import jsonable_encoder
+
+from app.db.db import Database
+from app.services.bundle_service import BundleService
+from app.services.entity_services.location_service import LocationService
+from app.services.entity_services.organization_service import OrganizationService
+from seeds.generate_data import DataGenerator
+from tests.services.test_include_service import count_statements
+from tests.utils import add_organization
+
+
+def test_transaction_validates_references_once(
+    setup_postgres_database: Database, organization_service: OrganizationService, location_service: LocationService
+) -> None:
+    organization = add_organization(organization_service)
+    service = BundleService(setup_postgres_database, {"Location": location_service})
+
+    dg = DataGenerator()
+    entries = []
+    for i in range(5):
+        location = jsonable_encoder(dg.generate_location(organization=organization.fhir_id).dict(exclude_none=True))
+        if i > 0:
+            location["partOf"] = {"reference": "urn:uuid:location-0"}
+        entries.append(
+            {
+                "fullUrl": f"urn:uuid:location-{i}",
+                "resource": location,
+                "request": {"method": "POST", "url": "Location"},
+            }
+        )
+
+    (response, selects) = count_statements(
+        setup_postgres_database,
+        lambda: service.process({"resourceType": "Bundle", "type": "transaction", "entry": entries}),
+    )
+
+    assert [entry["response"]["status"] for entry in response["entry"]] == ["201 Created"] * 5
+    # One lookup for the organization, the services do not look up any reference themselves
+    assert selects == 1
+    assert len(location_service.find({"organization": str(organization.fhir_id)})) == 5
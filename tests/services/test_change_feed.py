@@ -0,0 +1,37 @@
+import asyncio
+
+from pytest import raises
+
+from app.exceptions.service_exceptions import ChangesExpiredException
+from app.services.change_feed import Change, ChangeFeed
+
+
+def change(seq: int) -> Change:
+    return Change(seq=seq, type="Endpoint", id=f"endpoint-{seq}", version=1)
+
+
+def test_changes_follow_arrival_order() -> None:
+    feed = ChangeFeed(None, buffer_size=3)
+    # Sequence numbers are taken before commit, a later commit can have a lower number
+    for seq in [1, 3, 2, 4]:
+        feed.publish(change(seq))
+
+    assert [c.seq for c in feed.changes_after(3)] == [2, 4]
+    assert feed.changes_after(4) == []
+    with raises(ChangesExpiredException):
+        feed.changes_after(1)
+
+
+def test_wait_returns_changes_as_they_arrive() -> None:
+    async def run() -> None:
+        feed = ChangeFeed(None)
+        assert await feed.wait(None, 0.01) == []
+
+        waiting = asyncio.create_task(feed.wait(None, 10))
+        await asyncio.sleep(0)
+        feed.publish(change(1))
+        assert await asyncio.wait_for(waiting, 1) == [change(1)]
+
+        assert await feed.wait(1, 0.01) == []
+
+    asyncio.run(run())
@@ -0,0 +1,65 @@
+import os
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from app.config import ConfigExport
+from app.db.db import Database
+from app.exceptions.service_exceptions import TooManyRequestsException
+from app.services.entity_services.organization_service import OrganizationService
+from app.services.export_service import JOB_FILE, ExportJob, ExportService, ExportStatus
+from tests.utils import add_organization
+
+
+def wait_for(service: ExportService, job: ExportJob) -> ExportJob:
+    for _ in range(100):
+        job = service.get_job(job.id)
+        if job.status != ExportStatus.IN_PROGRESS:
+            return job
+        time.sleep(0.05)
+    raise AssertionError("Export did not finish")
+
+
+def test_kick_off_is_refused_when_too_many_jobs_are_queued(
+    setup_postgres_database: Database, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    service = ExportService(setup_postgres_database, ConfigExport(directory=str(tmp_path), workers=1, max_jobs=2))
+    release = threading.Event()
+    monkeypatch.setattr(service, "run", lambda job: release.wait(5))
+
+    try:
+        service.start("first")
+        service.start("second")
+        with pytest.raises(TooManyRequestsException):
+            service.start("third")
+    finally:
+        release.set()
+        service.stop()
+
+
+def test_expired_jobs_are_removed(setup_postgres_database: Database, tmp_path: Path) -> None:
+    service = ExportService(setup_postgres_database, ConfigExport(directory=str(tmp_path), expiry_hours=1))
+    expired = wait_for(service, service.start("expired"))
+    recent = wait_for(service, service.start("recent"))
+
+    two_hours_ago = time.time() - 7200
+    os.utime(tmp_path / str(expired.id) / JOB_FILE, (two_hours_ago, two_hours_ago))
+
+    service.remove_expired()
+
+    assert not (tmp_path / str(expired.id)).exists()
+    assert (tmp_path / str(recent.id)).exists()
+
+
+def test_export_writes_the_stored_json(
+    setup_postgres_database: Database, organization_service: OrganizationService, tmp_path: Path
+) -> None:
+    organization = add_organization(organization_service)
+    service = ExportService(setup_postgres_database, ConfigExport(directory=str(tmp_path)))
+
+    job = wait_for(service, service.start("export", ["Organization"]))
+
+    assert job.status == ExportStatus.COMPLETED
+    assert (tmp_path / str(job.id) / "Organization.ndjson").read_text() == f"{organization.data_json}\n"
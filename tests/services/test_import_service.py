@@ -0,0 +1,120 @@
+import argparse
+import json
+from pathlib import Path
+from typing import Any, Dict
+from uuid import UUID, uuid4
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fhir.resources.R4B.location import Location as FhirLocation
+
+from app.cron.import_command import ImportCommand
+from app.db.db import Database
+from app.exceptions.service_exceptions import InvalidResourceException
+from app.services.entity_services.location_service import LocationService
+from app.services.entity_services.organization_service import OrganizationService
+from app.services.import_service import ImportService
+from seeds.generate_data import DataGenerator
+from tests.utils import add_organization
+
+
+@pytest.fixture
+def import_service(setup_postgres_database: Database) -> ImportService:
+    return ImportService(setup_postgres_database)
+
+
+def ndjson_line(fhir_resource: Any, **fields: Any) -> str:
+    data: Dict[str, Any] = jsonable_encoder(fhir_resource.dict(exclude_none=True))
+    data.update(fields)
+    return json.dumps(data)
+
+
+def test_import_keeps_ids_and_computes_meta(
+    import_service: ImportService, organization_service: OrganizationService
+) -> None:
+    dg = DataGenerator()
+    parent_id = str(uuid4())
+    child_id = str(uuid4())
+    lines = [
+        ndjson_line(dg.generate_organization(ura_number="11111111"), id=parent_id),
+        ndjson_line(
+            dg.generate_organization(ura_number="22222222"),
+            id=child_id,
+            partOf={"reference": f"Organization/{parent_id}"},
+        ),
+    ]
+
+    # With a batch size of one the reference is resolved against the earlier batch
+    result = import_service.import_ndjson("Organization", lines, batch_size=1)
+    assert result.imported == 2
+    assert result.errors == []
+
+    child = organization_service.get_one(UUID(child_id))
+    assert child.version == 1
+    assert child.ura_number == "22222222"
+    assert child.data is not None
+    assert child.data["meta"]["versionId"] == "1"
+    assert child.data["partOf"] == {"reference": f"Organization/{parent_id}"}
+    assert child.bundle_meta is not None
+
+
+def test_import_reports_invalid_lines(
+    import_service: ImportService, organization_service: OrganizationService, location_service: LocationService
+) -> None:
+    existing = add_organization(organization_service, ura_number="12345678")
+    dg = DataGenerator()
+    lines = [
+        "not json",
+        ndjson_line(dg.generate_location()),
+        ndjson_line(dg.generate_organization(ura_number="12345678")),
+        ndjson_line(dg.generate_organization(), id=str(existing.fhir_id)),
+        ndjson_line(dg.generate_organization(), partOf={"reference": f"Organization/{uuid4()}"}),
+        "",
+        ndjson_line(dg.generate_organization(ura_number="87654321")),
+    ]
+
+    result = import_service.import_ndjson("Organization", lines)
+    assert result.imported == 1
+    errors = dict(error.split(": ", 1) for error in result.errors)
+    assert sorted(errors.keys()) == ["line 1", "line 2", "line 3", "line 4", "line 5"]
+    assert "already present" in errors["line 3"]
+    assert "already exists" in errors["line 4"]
+    assert "not resolvable" in errors["line 5"]
+
+
+def test_import_rejects_unknown_types(import_service: ImportService) -> None:
+    with pytest.raises(InvalidResourceException):
+        import_service.import_ndjson("Patient", [])
+
+
+def test_import_command(import_service: ImportService, location_service: LocationService, tmp_path: Path) -> None:
+    dg = DataGenerator()
+    ids = [str(uuid4()) for _ in range(3)]
+    path = tmp_path / "Location.ndjson"
+    path.write_text("\n".join(ndjson_line(dg.generate_location(), id=id) for id in ids) + "\n")
+
+    command = ImportCommand(import_service)
+    assert command.run(argparse.Namespace(files=[str(path)], type=None, batch_size=2)) == 0
+    assert [str(location_service.get_one(UUID(id)).fhir_id) for id in ids] == ids
+
+    # Importing the same file again fails on the existing ids
+    assert command.run(argparse.Namespace(files=[str(path)], type="Location", batch_size=2)) == 1
+
+
+def test_imported_resources_are_stored_like_updated_ones(
+    import_service: ImportService, location_service: LocationService
+) -> None:
+    fhir_id = uuid4()
+    # Written by another NDJSON writer: keys in another order and values the FHIR model converts
+    line = (
+        f'{{"hoursOfOperation": [{{"allDay": "true"}}], "position": {{"longitude": 5.0, "latitude": "52.10"}}, '
+        f'"name": "imported", "id": "{fhir_id}", "resourceType": "Location"}}'
+    )
+
+    assert import_service.import_ndjson("Location", [line]).imported == 1
+
+    imported = location_service.get_one(fhir_id)
+    unchanged = location_service.update_one(fhir_id, FhirLocation(**json.loads(line)))
+    assert unchanged.version == 1
+    assert unchanged.content_hash == imported.content_hash
+    assert unchanged.data_json == imported.data_json
@@ -0,0 +1,130 @@
+from typing import Any, Callable
+
+from fhir.resources.R4B.reference import Reference
+from sqlalchemy import event
+
+from app.db.db import Database
+from app.params.include import Includes
+from app.services.entity_services.endpoint_service import EndpointService
+from app.services.entity_services.location_service import LocationService
+from app.services.entity_services.organization_affiliation_service import OrganizationAffiliationService
+from app.services.entity_services.organization_service import OrganizationService
+from app.services.include_service import IncludeService
+from seeds.generate_data import DataGenerator
+from tests.utils import add_endpoint, add_location, add_organization, add_organization_affiliation
+
+
+def count_statements(database: Database, f: Callable[[], Any]) -> tuple[Any, int]:
+    statements: list[str] = []
+
+    def capture(conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool) -> None:
+        statements.append(statement)
+
+    event.listen(database.engine, "before_cursor_execute", capture)
+    try:
+        result = f()
+    finally:
+        event.remove(database.engine, "before_cursor_execute", capture)
+
+    # Change notifications (pg_notify) are sent with a SELECT as well, but read nothing
+    selects = [statement for statement in statements if statement.lstrip().upper().startswith("SELECT")]
+    return result, len([statement for statement in selects if "pg_notify" not in statement])
+
+
+def test_include_fetches_each_type_once(
+    setup_postgres_database: Database,
+    include_service: IncludeService,
+    location_service: LocationService,
+    organization_service: OrganizationService,
+) -> None:
+    organization = add_organization(organization_service)
+    parent = add_location(location_service)
+    locations = [add_location(location_service, organization.fhir_id, parent.fhir_id) for _ in range(5)]
+
+    included, selects = count_statements(
+        setup_postgres_database,
+        lambda: include_service.include(
+            locations, Includes.parse("Location", ["Location:organization", "Location:partof"])
+        ),
+    )
+
+    assert selects == 2
+    assert sorted(str(entry.fhir_id) for entry in included) == sorted([str(organization.fhir_id), str(parent.fhir_id)])
+
+
+def test_include_skips_resources_that_are_already_matches(
+    setup_postgres_database: Database, include_service: IncludeService, location_service: LocationService
+) -> None:
+    root = add_location(location_service)
+    child = add_location(location_service, part_of=root.fhir_id)
+
+    included = include_service.include([root, child], Includes.parse("Location", ["Location:partof"]))
+
+    assert included == []
+
+
+def test_include_iterate_follows_included_resources(
+    setup_postgres_database: Database, include_service: IncludeService, location_service: LocationService
+) -> None:
+    root = add_location(location_service)
+    middle = add_location(location_service, part_of=root.fhir_id)
+    leaf = add_location(location_service, part_of=middle.fhir_id)
+
+    included = include_service.include([leaf], Includes.parse("Location", ["Location:partof"]))
+    assert [entry.fhir_id for entry in included] == [middle.fhir_id]
+
+    included = include_service.include([leaf], Includes.parse("Location", [], ["Location:partof"]))
+    assert [entry.fhir_id for entry in included] == [middle.fhir_id, root.fhir_id]
+
+
+def test_include_organization_affiliation_endpoints(
+    setup_postgres_database: Database,
+    include_service: IncludeService,
+    endpoint_service: EndpointService,
+    organization_affiliation_service: OrganizationAffiliationService,
+) -> None:
+    endpoint = add_endpoint(endpoint_service)
+    fhir_affiliation = DataGenerator().generate_organization_affiliation()
+    fhir_affiliation.endpoint = [Reference.construct(reference=f"Endpoint/{endpoint.fhir_id}")]
+    affiliation = organization_affiliation_service.add_one(fhir_affiliation)
+
+    included = include_service.include(
+        [affiliation], Includes.parse("OrganizationAffiliation", ["OrganizationAffiliation.endpoint"])
+    )
+
+    assert [entry.fhir_id for entry in included] == [endpoint.fhir_id]
+
+
+def test_revinclude_fetches_each_referencing_type_once(
+    setup_postgres_database: Database,
+    include_service: IncludeService,
+    location_service: LocationService,
+    organization_service: OrganizationService,
+    organization_affiliation_service: OrganizationAffiliationService,
+) -> None:
+    organization = add_organization(organization_service)
+    other = add_organization(organization_service)
+    locations = [add_location(location_service, organization.fhir_id) for _ in range(3)]
+    add_location(location_service, other.fhir_id)
+    primary = add_organization_affiliation(organization_affiliation_service, organization=organization.fhir_id)
+    participating = add_organization_affiliation(
+        organization_affiliation_service, organization=other.fhir_id, participation_organization=organization.fhir_id
+    )
+    includes = Includes.parse(
+        "Organization",
+        [],
+        revinclude=[
+            "Location:organization",
+            "OrganizationAffiliation:primary-organization",
+            "OrganizationAffiliation:participating-organization",
+        ],
+    )
+
+    included, selects = count_statements(
+        setup_postgres_database, lambda: include_service.include([organization], includes)
+    )
+
+    assert selects == 2
+    assert sorted(str(entry.fhir_id) for entry in included) == sorted(
+        [str(location.fhir_id) for location in locations] + [str(primary.fhir_id), str(participating.fhir_id)]
+    )
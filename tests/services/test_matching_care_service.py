@@ -1,16 +1,26 @@
-from typing import Literal, Union
+import asyncio
+import json
+from typing import Any, Dict, Literal, Union
 
 import pytest
 
 from app.db.db import Database
 from app.params.endpoint_query_params import EndpointQueryParams
 from app.params.organization_query_params import OrganizationQueryParams
+from app.routers.utils import bundle_json
 from app.services.entity_services.endpoint_service import EndpointService
 from app.services.entity_services.organization_service import OrganizationService
-from app.services.matching_care_service import MatchingCareService
+from app.services.matching_care_service import MatchingCareService, SearchResult
 from tests.utils import add_endpoint, add_organization, check_key_value
 
 
+def written(result: SearchResult) -> Dict[str, Any]:
+    bundle: Dict[str, Any] = json.loads(
+        bundle_json(result.bundle, result.entries or [], with_req_resp=True, included=result.included)
+    )
+    return bundle
+
+
 @pytest.mark.parametrize(
     "ura, active, name, parent_organization, include, rev_include",
     [
@@ -121,18 +131,18 @@ def test_find_correct_organizations(
         endpoint=str(expected_endpoint.fhir_id) if include is not None else None,  # type: ignore
     )
 
-    result = matching_care_service.find_organizations(query_params)
+    result = written(asyncio.run(matching_care_service.find_organizations_async(query_params)))
 
     assert result is not None
-    assert check_key_value(result.dict(), "id", str(expected_org.fhir_id))
+    assert check_key_value(result, "id", str(expected_org.fhir_id))
     if active is not None:
-        assert check_key_value(result.dict(), "active", active)
-    assert check_key_value(result.dict(), "value", expected_org.ura_number)
+        assert check_key_value(result, "active", active)
+    assert check_key_value(result, "value", expected_org.ura_number)
     if name is not None:
-        assert check_key_value(result.dict(), "name", name)
+        assert check_key_value(result, "name", name)
     if include is not None:
         assert check_key_value(
-            result.dict(),
+            result,
             "reference",
             "Endpoint/" + str(expected_endpoint.fhir_id),  # type: ignore
         )
@@ -153,8 +163,8 @@ def test_find_correct_endpoints(
         organization=str(expected_org.fhir_id),
     )
 
-    endpoints = matching_care_service.find_endpoints(endpoint_params)
+    endpoints = written(asyncio.run(matching_care_service.find_endpoints_async(endpoint_params)))
     assert endpoints is not None
-    assert check_key_value(endpoints.dict(), "reference", f"Organization/{expected_org.fhir_id}")
-    assert check_key_value(endpoints.dict(), "id", expected_endpoint.fhir_id)
-    assert check_key_value(endpoints.dict(), "address", expected_endpoint.data.get("address"))  # type: ignore
+    assert check_key_value(endpoints, "reference", f"Organization/{expected_org.fhir_id}")
+    assert check_key_value(endpoints, "id", expected_endpoint.fhir_id)
+    assert check_key_value(endpoints, "address", expected_endpoint.data.get("address"))  # type: ignore
@@ -3,8 +3,10 @@ from uuid import uuid4
 from fhir.resources.R4B.identifier import Identifier
 from fhir.resources.R4B.organization import Organization as FhirOrganization
 from pytest import raises
+from sqlalchemy import update
 
 from app.db.db import Database
+from app.db.entities.organization.organization import Organization
 from app.exceptions.service_exceptions import (
     InvalidResourceException,
     ResourceNotDeletedException,
@@ -12,6 +14,7 @@ from app.exceptions.service_exceptions import (
 )
 from app.services.entity_services.endpoint_service import EndpointService
 from app.services.entity_services.organization_service import OrganizationService
+from app.services.utils import content_hash
 from seeds.generate_data import DataGenerator
 from tests.utils import add_endpoint, add_organization
 
@@ -140,6 +143,48 @@ def test_update_one_correctly_updates_organization(
     assert updated_org.data.get("name") == "updated_name"  # type: ignore
 
 
+def test_update_one_with_the_same_resource_keeps_the_version(
+    organization_service: OrganizationService, setup_postgres_database: Database
+) -> None:
+    setup_postgres_database.truncate_tables()
+    org = add_organization(organization_service, name="same_name")
+    assert org.data is not None
+
+    unchanged = organization_service.update_one(org.fhir_id, FhirOrganization(**org.data))
+    assert unchanged.version == 1
+    assert unchanged.data is not None
+    assert unchanged.data["meta"] == org.data["meta"]
+
+    renamed = FhirOrganization(**org.data)
+    renamed.name = "other_name"
+    assert organization_service.update_one(org.fhir_id, renamed).version == 2
+
+
+def test_update_one_compares_the_content_hash(
+    organization_service: OrganizationService, setup_postgres_database: Database
+) -> None:
+    setup_postgres_database.truncate_tables()
+    org = add_organization(organization_service, name="hashed")
+    assert org.data is not None
+    assert org.content_hash == content_hash(org.data)
+
+    other_meta = FhirOrganization(**{**org.data, "meta": {"versionId": "7"}})
+    assert organization_service.update_one(org.fhir_id, other_meta).version == 1
+
+    # Versions stored without a hash are compared in full
+    with setup_postgres_database.get_db_session() as session:
+        session.execute(update(Organization).values(content_hash=None))
+        session.commit()
+    assert organization_service.update_one(org.fhir_id, FhirOrganization(**org.data)).version == 1
+
+    renamed = FhirOrganization(**org.data)
+    renamed.name = "renamed"
+    updated = organization_service.update_one(org.fhir_id, renamed)
+    assert updated.version == 2
+    assert updated.content_hash == content_hash(updated.data)
+    assert updated.content_hash != org.content_hash
+
+
 def test_update_one_correctly_adds_endpoint_to_organization(
     organization_service: OrganizationService,
     endpoint_service: EndpointService,
@@ -180,3 +225,26 @@ def test_update_one_correctly_fails_when_endpoint_is_not_found(
     fhir_new_org.endpoint = [{"reference": f"Endpoint/{random_endpoint_id}"}]
     with raises(ResourceNotFoundException):
         organization_service.update_one(old_org.fhir_id, fhir_new_org)
+
+
+def test_find_searches_on_generated_columns(
+    organization_service: OrganizationService,
+    endpoint_service: EndpointService,
+    setup_postgres_database: Database,
+) -> None:
+    setup_postgres_database.truncate_tables()
+    parent = add_organization(organization_service)
+    endpoint = add_endpoint(endpoint_service)
+    child = add_organization(organization_service, endpoint_id=endpoint.fhir_id, part_of=parent.fhir_id)
+    assert child.data is not None
+    city = child.data["address"][0]["city"]
+
+    by_part_of = organization_service.find(parent_organization_id=str(parent.fhir_id), latest_version=True)
+    by_endpoint = organization_service.find(endpoint=str(endpoint.fhir_id), latest_version=True)
+    by_ura = organization_service.find(ura_number=child.ura_number, latest_version=True)
+    by_city = organization_service.find(address_city=city, latest_version=True)
+
+    assert [org.fhir_id for org in by_part_of] == [child.fhir_id]
+    assert [org.fhir_id for org in by_endpoint] == [child.fhir_id]
+    assert [org.fhir_id for org in by_ura] == [child.fhir_id]
+    assert child.fhir_id in [org.fhir_id for org in by_city]
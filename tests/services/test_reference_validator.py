@@ -1,4 +1,5 @@
 from unittest.mock import MagicMock, Mock
+from uuid import UUID
 
 import pytest
 from fhir.resources.R4B.reference import Reference
@@ -16,7 +17,9 @@ def validator() -> ReferenceValidator:
 
 @pytest.fixture
 def session() -> Mock:
-    return Mock(spec=DbSession)
+    session = Mock(spec=DbSession)
+    session.is_resolved.return_value = False
+    return session
 
 
 def test_validate_reference_healthcare_service_valid(validator: ReferenceValidator, session: Mock) -> None:
@@ -44,9 +47,9 @@ def test_validate_reference_invalid_reference_type(validator: ReferenceValidator
 
 
 def test_validate_list_of_same_typed_references(validator: ReferenceValidator, session: Mock) -> None:
-    session.execute.side_effect = [
-        MagicMock(first=Mock(return_value=HealthcareService(fhir_id="6b74c461-b19c-4860-b819-708997bb6b86"))),
-        MagicMock(first=Mock(return_value=HealthcareService(fhir_id="c4f768a6-9190-4555-8c7d-ea577671515f"))),
+    session.execute.return_value.scalars.return_value.all.return_value = [
+        UUID("6b74c461-b19c-4860-b819-708997bb6b86"),
+        UUID("c4f768a6-9190-4555-8c7d-ea577671515f"),
     ]
 
     data = [
@@ -55,13 +58,12 @@ def test_validate_list_of_same_typed_references(validator: ReferenceValidator, s
     ]
 
     validator.validate_list(session, data, match_on="HealthcareService")
-    assert session.execute.call_count == 2
+    session.execute.assert_called_once()
 
 
 def test_validate_list_with_missing_reference(validator: ReferenceValidator, session: Mock) -> None:
-    session.execute.side_effect = [
-        MagicMock(first=Mock(return_value=HealthcareService(fhir_id="6b74c461-b19c-4860-b819-708997bb6b86"))),
-        MagicMock(first=Mock(return_value=None)),
+    session.execute.return_value.scalars.return_value.all.return_value = [
+        UUID("6b74c461-b19c-4860-b819-708997bb6b86"),
     ]
 
     data = [
@@ -85,3 +87,47 @@ def test_validate_list_mixed_references_only_allow_single_type(validator: Refere
 
     with pytest.raises(ValueError):
         validator.validate_list(session, data, "HealthcareService")
+
+
+def test_validate_queries_once_per_type(validator: ReferenceValidator, session: Mock) -> None:
+    session.execute.side_effect = [
+        MagicMock(
+            scalars=Mock(return_value=Mock(all=Mock(return_value=[UUID("6b74c461-b19c-4860-b819-708997bb6b86")])))
+        ),
+        MagicMock(
+            scalars=Mock(return_value=Mock(all=Mock(return_value=[UUID("c4f768a6-9190-4555-8c7d-ea577671515f")])))
+        ),
+    ]
+
+    validator.add(Reference.construct(reference="Practitioner/6b74c461-b19c-4860-b819-708997bb6b86"), "Practitioner")
+    validator.add_list(
+        [
+            Reference.construct(reference="Location/c4f768a6-9190-4555-8c7d-ea577671515f"),
+            Reference.construct(reference="Location/c4f768a6-9190-4555-8c7d-ea577671515f"),
+        ],
+        match_on="Location",
+    )
+    validator.validate(session)
+
+    assert session.execute.call_count == 2
+
+
+def test_validate_reports_all_unresolvable_references(validator: ReferenceValidator, session: Mock) -> None:
+    session.execute.return_value.scalars.return_value.all.return_value = []
+
+    validator.add(Reference.construct(reference="Organization/6b74c461-b19c-4860-b819-708997bb6b86"), "Organization")
+    validator.add(Reference.construct(reference="Endpoint/c4f768a6-9190-4555-8c7d-ea577671515f"), "Endpoint")
+
+    with pytest.raises(ResourceNotFoundException) as e:
+        validator.validate(session)
+
+    assert "Organization/6b74c461-b19c-4860-b819-708997bb6b86" in str(e.value)
+    assert "Endpoint/c4f768a6-9190-4555-8c7d-ea577671515f" in str(e.value)
+
+
+def test_validate_skips_references_the_session_resolved(validator: ReferenceValidator, session: Mock) -> None:
+    session.is_resolved.return_value = True
+    validator.add_reference("Organization/6b74c461-b19c-4860-b819-708997bb6b86")
+
+    validator.validate(session)
+    session.execute.assert_not_called()
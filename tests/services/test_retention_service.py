@@ -0,0 +1,87 @@
+import argparse
+import io
+import json
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict
+
+import pytest
+from fhir.resources.R4B.location import Location as FhirLocation
+from sqlalchemy import select
+
+from app.config import ConfigRetention
+from app.cron.prune_command import PruneCommand
+from app.db.db import Database
+from app.db.entities.location.location import Location
+from app.services.entity_services.location_service import LocationService
+from app.services.retention_service import RetentionService
+
+
+def renamed(data: Dict[str, Any] | None, name: str) -> Dict[str, Any]:
+    return {**(data or {}), "name": name}
+
+
+def versions(database: Database, fhir_id: Any) -> list[int]:
+    with database.get_db_session() as session:
+        stmt = select(Location.version).where(Location.fhir_id == fhir_id).order_by(Location.version)
+        return list(session.execute(stmt).scalars().all())
+
+
+@pytest.fixture
+def retention_service(setup_postgres_database: Database) -> RetentionService:
+    return RetentionService(setup_postgres_database, ConfigRetention(history_days=10, tombstone_days=30, batch_size=2))
+
+
+def test_prune_keeps_current_versions_and_recent_history(
+    retention_service: RetentionService, location_service: LocationService, setup_postgres_database: Database
+) -> None:
+    location = location_service.add_one(FhirLocation(name="version 1"))
+    for version in range(2, 6):
+        location_service.update_one(location.fhir_id, FhirLocation(**renamed(location.data, f"version {version}")))
+    deleted = location_service.add_one(FhirLocation(name="deleted"))
+    location_service.delete_one(deleted.fhir_id)
+
+    # Nothing is old enough yet
+    assert retention_service.prune("Location").versions == 0
+
+    archive = io.StringIO()
+    result = retention_service.prune("Location", archive, now=datetime.now(UTC) + timedelta(days=11))
+
+    # Superseded versions in batches of 2, the deleted resource keeps its tombstone during the grace period
+    assert (result.versions, result.tombstones) == (5, 0)
+    assert versions(setup_postgres_database, location.fhir_id) == [5]
+    assert versions(setup_postgres_database, deleted.fhir_id) == [2]
+    assert location_service.get_one(location.fhir_id).data["name"] == "version 5"  # type: ignore
+
+    lines = [json.loads(line) for line in archive.getvalue().splitlines()]
+    assert sorted(line["fullUrl"] for line in lines if line["resource"]["name"] != "deleted") == [
+        f"{location.fhir_id}/_history/{version}" for version in range(1, 5)
+    ]
+    assert all(line["request"]["method"] in ("POST", "PUT") for line in lines)
+
+    result = retention_service.prune("Location", now=datetime.now(UTC) + timedelta(days=31))
+    assert (result.versions, result.tombstones) == (0, 1)
+    assert versions(setup_postgres_database, deleted.fhir_id) == []
+    assert versions(setup_postgres_database, location.fhir_id) == [5]
+
+
+def test_retention_per_resource_type(setup_postgres_database: Database) -> None:
+    service = RetentionService(
+        setup_postgres_database, ConfigRetention(history_days=10, history_days_per_type={"Organization": 730})
+    )
+    assert service.retention("Location") == timedelta(days=10)
+    assert service.retention("Organization") == timedelta(days=730)
+
+
+def test_prune_command_archives_per_type(
+    retention_service: RetentionService, location_service: LocationService, tmp_path: Path
+) -> None:
+    location = location_service.add_one(FhirLocation(name="first"))
+    location_service.update_one(location.fhir_id, FhirLocation(**renamed(location.data, "second")))
+    retention_service.config.history_days = 0
+
+    command = PruneCommand(retention_service)
+    assert command.run(argparse.Namespace(type=["Location"], archive=str(tmp_path / "archive"))) == 0
+
+    lines = (tmp_path / "archive" / "Location.ndjson").read_text().splitlines()
+    assert [json.loads(line)["resource"]["name"] for line in lines] == ["first"]
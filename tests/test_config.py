@@ -1,7 +1,11 @@
+import tempfile
+from pathlib import Path
+
 from app.config import (
     Config,
     ConfigApp,
     ConfigDatabase,
+    ConfigExport,
     ConfigStats,
     ConfigTelemetry,
     ConfigUvicorn,
@@ -47,6 +51,7 @@ def get_test_config(database: ConfigDatabase | None = None) -> Config:
             tracer_name=None,
         ),
         stats=ConfigStats(enabled=False, host=None, port=None, module_name=None),
+        export=ConfigExport(directory=str(Path(tempfile.gettempdir()) / "addressing-exports")),
     )
 
 
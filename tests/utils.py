@@ -92,12 +92,18 @@ def add_practitioner(
 def add_practitioner_role(
     practitioner_role_service: PractitionerRoleService,
     organization: Optional[UUID] = None,
+    locations: Optional[list[UUID]] = None,
+    healthcare_services: Optional[list[UUID]] = None,
 ) -> PractitionerRole:
     dg = DataGenerator()
     return practitioner_role_service.add_one(
         dg.generate_practitioner_role(
             id=uuid.UUID(fake.uuid4()),
             organization=str(organization) if organization is not None else None,
+            location=[str(location) for location in locations] if locations is not None else None,
+            healthcare_service=[str(service) for service in healthcare_services]
+            if healthcare_services is not None
+            else None,
         )
     )
 
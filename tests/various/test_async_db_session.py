@@ -0,0 +1,53 @@
+import asyncio
+from typing import Any
+from uuid import uuid4
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app.db.db import Database
+from app.exceptions.service_exceptions import ResourceNotFoundException
+from app.services.entity_services.location_service import LocationService
+from tests.utils import add_location
+
+
+def test_retry_retries_operational_errors(setup_postgres_database: Database) -> None:
+    attempts = 0
+
+    async def flaky() -> str:
+        nonlocal attempts
+        attempts += 1
+        if attempts < 3:
+            raise OperationalError("SELECT 1", {}, Exception("connection lost"))
+        return "ok"
+
+    async def run() -> Any:
+        async with setup_postgres_database.get_async_db_session() as session:
+            return await session._retry(flaky)
+
+    assert asyncio.run(run()) == "ok"
+    assert attempts == 3
+
+
+def test_async_reads_match_sync_reads(setup_postgres_database: Database, location_service: LocationService) -> None:
+    location = add_location(location_service)
+
+    async def run() -> Any:
+        entity = await location_service.get_one_async(location.fhir_id)
+        version = await location_service.get_one_version_async(location.fhir_id, 1)
+        found = await location_service.find_async({"id": location.fhir_id})
+        history = [entry async for entry in location_service.stream_history_async(id=location.fhir_id)]
+        return entity, version, found, history
+
+    entity, version, found, history = asyncio.run(run())
+    assert entity.data == location.data
+    assert version.data == location.data
+    assert [entry.fhir_id for entry in found] == [location.fhir_id]
+    assert [entry.version for entry in history] == [1]
+
+
+def test_async_get_one_raises_when_not_found(
+    setup_postgres_database: Database, location_service: LocationService
+) -> None:
+    with pytest.raises(ResourceNotFoundException):
+        asyncio.run(location_service.get_one_async(uuid4()))
@@ -0,0 +1,138 @@
+import asyncio
+from unittest.mock import patch
+from uuid import uuid4
+
+import pytest
+from fhir.resources.R4B.location import Location as FhirLocation
+
+from app.db.cache import ResourceCache
+from app.db.db import Database
+from app.db.entities.location.location import Location
+from app.exceptions.service_exceptions import ResourceNotFoundException
+from app.services.entity_services.location_service import LocationService
+from app.stats import NoopStats
+from tests.services.test_include_service import count_statements
+from tests.utils import add_location
+
+
+class CountingStats(NoopStats):
+    def __init__(self) -> None:
+        self.counts: dict[str, int] = {}
+
+    def inc(self, key: str, count: int = 1, rate: int = 1) -> None:
+        self.counts[key] = self.counts.get(key, 0) + count
+
+
+def make_location(version: int = 1) -> Location:
+    return Location(
+        fhir_id=uuid4(),
+        version=version,
+        latest=True,
+        deleted=False,
+        data={"resourceType": "Location", "name": f"version {version}"},
+        bundle_meta={"versionId": str(version)},
+    )
+
+
+def test_get_returns_copies() -> None:
+    cache = ResourceCache(max_size=10, ttl=60)
+    location = make_location()
+    cache.put(location)
+
+    first = cache.get(Location, location.fhir_id)
+    assert first is not None
+    assert first is not location
+    assert first.data is not None
+    assert first.data == location.data
+    first.data["name"] = "changed"
+
+    second = cache.get(Location, location.fhir_id)
+    assert second is not None
+    assert second.data is not None
+    assert second.data["name"] == "version 1"
+
+
+def test_evicts_least_recently_used_and_counts() -> None:
+    stats = CountingStats()
+    cache = ResourceCache(max_size=2, ttl=60)
+    (first, second, third) = (make_location(), make_location(), make_location())
+
+    with patch("app.db.cache.get_stats", return_value=stats):
+        cache.put(first)
+        cache.put(second)
+        assert cache.get(Location, first.fhir_id) is not None
+        cache.put(third)
+
+        assert cache.get(Location, second.fhir_id) is None
+        assert cache.get(Location, first.fhir_id) is not None
+        assert cache.get(Location, third.fhir_id) is not None
+
+    assert stats.counts == {"cache.hit": 3, "cache.miss": 1, "cache.eviction": 1}
+
+
+def test_stale_put_after_invalidate_is_ignored() -> None:
+    cache = ResourceCache(max_size=10, ttl=60)
+    old = make_location(version=1)
+    new = Location(fhir_id=old.fhir_id, version=2, latest=True, deleted=False, data={"resourceType": "Location"})
+
+    cache.invalidate(new)
+    cache.put(old)
+    assert cache.get(Location, old.fhir_id) is None
+
+    cache.put(new)
+    cached = cache.get(Location, old.fhir_id)
+    assert cached is not None
+    assert cached.version == 2
+
+
+def test_entries_expire() -> None:
+    cache = ResourceCache(max_size=10, ttl=60)
+    location = make_location()
+
+    with patch("app.db.cache.time.monotonic", return_value=0):
+        cache.put(location)
+    with patch("app.db.cache.time.monotonic", return_value=61):
+        assert cache.get(Location, location.fhir_id) is None
+
+
+def test_disabled_cache_stores_nothing() -> None:
+    cache = ResourceCache(max_size=0, ttl=60)
+    location = make_location()
+    cache.put(location)
+
+    assert cache.get(Location, location.fhir_id) is None
+
+
+def test_service_reads_are_served_from_cache(
+    setup_postgres_database: Database, location_service: LocationService
+) -> None:
+    location = add_location(location_service)
+    location_service.get_one(location.fhir_id)
+
+    (entity, selects) = count_statements(setup_postgres_database, lambda: location_service.get_one(location.fhir_id))
+    assert selects == 0
+    assert entity.data == location.data
+
+    stats = CountingStats()
+    with patch("app.db.cache.get_stats", return_value=stats):
+        entity = asyncio.run(location_service.get_one_async(location.fhir_id))
+    assert stats.counts == {"cache.hit": 1}
+    assert entity.data == location.data
+
+
+def test_service_writes_invalidate_the_cache(
+    setup_postgres_database: Database, location_service: LocationService
+) -> None:
+    location = add_location(location_service)
+    fhir_location = location_service.get_one(location.fhir_id)
+
+    data = dict(fhir_location.data or {})
+    data["name"] = "renamed"
+    location_service.update_one(location.fhir_id, FhirLocation.model_validate(data))
+    renamed = location_service.get_one(location.fhir_id).data
+    assert renamed is not None
+    assert renamed["name"] == "renamed"
+
+    location_service.delete_one(location.fhir_id)
+    with pytest.raises(ResourceNotFoundException):
+        location_service.get_one(location.fhir_id)
@@ -0,0 +1,148 @@
+from datetime import UTC, datetime
+from typing import Any, Callable, Type
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import event
+
+from app.db.db import Database
+from app.db.repositories.endpoints_repository import EndpointsRepository
+from app.db.repositories.healthcare_service_repository import HealthcareServiceRepository
+from app.db.repositories.location_repository import LocationRepository
+from app.db.repositories.organization_affiliation_repository import OrganizationAffiliationRepository
+from app.db.repositories.organizations_repository import OrganizationsRepository
+from app.db.repositories.practitioner_role_repository import PractitionerRoleRepository
+from app.db.repositories.practitioners_repository import PractitionerRepository
+from app.params.include import Includes
+from app.services.entity_services.organization_service import OrganizationService
+from app.services.include_service import IncludeService
+from tests.utils import add_organization
+
+REPOSITORIES = [
+    (OrganizationsRepository, "organizations"),
+    (EndpointsRepository, "endpoints"),
+    (OrganizationAffiliationRepository, "organization_affiliations"),
+    (HealthcareServiceRepository, "healthcare_services"),
+    (LocationRepository, "locations"),
+    (PractitionerRepository, "practitioners"),
+    (PractitionerRoleRepository, "practitioner_roles"),
+]
+
+
+def explain(database: Database, repository: Type[Any], query: Callable[[Any], Any]) -> str:
+    """
+    Runs the query against the repository and returns the plan postgres made for the statement it sent. The
+    test tables are nearly empty, so sequential scans are disabled to see which index the planner can use.
+    """
+
+    def run() -> None:
+        with database.get_db_session() as session:
+            query(session.get_repository(repository))
+
+    return explain_last_statement(database, run)
+
+
+def explain_last_statement(database: Database, f: Callable[[], Any], seed: str | None = None) -> str:
+    """
+    Explains the last statement f sent. An empty table makes every index equally cheap, so a seed statement can
+    add rows (and statistics) first, these are rolled back afterwards.
+    """
+    statements: list[tuple[str, Any]] = []
+
+    def capture(conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool) -> None:
+        statements.append((statement, parameters))
+
+    event.listen(database.engine, "before_cursor_execute", capture)
+    try:
+        f()
+    finally:
+        event.remove(database.engine, "before_cursor_execute", capture)
+
+    statement, parameters = statements[-1]
+    with database.engine.connect() as conn:
+        conn.exec_driver_sql("SET enable_seqscan = off")
+        if seed is not None:
+            conn.exec_driver_sql(seed)
+        rows = conn.exec_driver_sql("EXPLAIN " + statement, parameters).all()
+        conn.rollback()
+
+    return "\n".join(row[0] for row in rows)
+
+
+@pytest.mark.parametrize("repository,table", REPOSITORIES)
+def test_get_one_uses_latest_index(setup_postgres_database: Database, repository: Type[Any], table: str) -> None:
+    plan = explain(setup_postgres_database, repository, lambda repo: repo.get_one(fhir_id=uuid4()))
+    assert f"{table}_latest_fhir_id_key" in plan
+    assert f"{table}_fhir_id_version_idx" not in plan
+    assert "Seq Scan" not in plan
+
+
+@pytest.mark.parametrize("repository,table", REPOSITORIES)
+def test_get_uses_version_index(setup_postgres_database: Database, repository: Type[Any], table: str) -> None:
+    plan = explain(setup_postgres_database, repository, lambda repo: repo.get(fhir_id=uuid4(), version=1))
+    assert f"{table}_fhir_id_version_idx" in plan
+    assert "Seq Scan" not in plan
+
+
+@pytest.mark.parametrize("repository,table", REPOSITORIES)
+def test_find_latest_uses_latest_index(setup_postgres_database: Database, repository: Type[Any], table: str) -> None:
+    plan = explain(setup_postgres_database, repository, lambda repo: repo.find(id=uuid4(), latest=True))
+    assert f"{table}_latest_fhir_id_key" in plan
+    assert f"{table}_fhir_id_version_idx" not in plan
+    assert "Seq Scan" not in plan
+
+
+@pytest.mark.parametrize("repository,table", REPOSITORIES)
+def test_current_versions_are_read_from_the_current_partition(
+    setup_postgres_database: Database, repository: Type[Any], table: str
+) -> None:
+    for query in (lambda repo: repo.get_one(fhir_id=uuid4()), lambda repo: repo.find(latest=True)):
+        plan = explain(setup_postgres_database, repository, query)
+        assert f"{table}_current" in plan
+        assert f"{table}_history" not in plan
+
+
+@pytest.mark.parametrize("repository,table", REPOSITORIES)
+def test_history_reads_both_partitions(setup_postgres_database: Database, repository: Type[Any], table: str) -> None:
+    plan = explain(setup_postgres_database, repository, lambda repo: repo.find(id=uuid4(), sort_history=True))
+    assert f"{table}_current" in plan
+    assert f"{table}_history" in plan
+
+
+@pytest.mark.parametrize("repository,table", REPOSITORIES)
+def test_find_at_uses_validity_index(setup_postgres_database: Database, repository: Type[Any], table: str) -> None:
+    plan = explain(setup_postgres_database, repository, lambda repo: repo.find(at=datetime.now(UTC)))
+    assert f"{table}_current_valid_idx" in plan
+    assert f"{table}_history_valid_idx" in plan
+    assert "Seq Scan" not in plan
+
+
+def test_revinclude_uses_reference_indexes(
+    setup_postgres_database: Database, include_service: IncludeService, organization_service: OrganizationService
+) -> None:
+    organization = add_organization(organization_service)
+    includes = Includes.parse(
+        "Organization",
+        [],
+        revinclude=[
+            "OrganizationAffiliation:primary-organization",
+            "OrganizationAffiliation:participating-organization",
+        ],
+    )
+
+    # Affiliations between other organizations, so the planner has to look the references up
+    seed = """
+        INSERT INTO organization_affiliations (fhir_id, data)
+        SELECT gen_random_uuid(), jsonb_build_object(
+            'organization', jsonb_build_object('reference', 'Organization/' || gen_random_uuid()),
+            'participatingOrganization', jsonb_build_object('reference', 'Organization/' || gen_random_uuid())
+        )
+        FROM generate_series(1, 2000);
+        ANALYZE organization_affiliations;
+    """
+    plan = explain_last_statement(
+        setup_postgres_database, lambda: include_service.include([organization], includes), seed=seed
+    )
+    assert "organization_affiliations_organization_reference_idx" in plan
+    assert "organization_affiliations_participating_organization_idx" in plan
+    assert "Seq Scan" not in plan
@@ -0,0 +1,87 @@
+"""
+Compares the JSON encoding of a large searchset bundle: the indented json.dumps() that was used before, the
+compact encoding of the bundle dict, and the compact bundle with the stored JSON text of the resources spliced in.
+
+Usage: PYTHONPATH=. python tools/benchmark_json.py [--size-mb 5] [--rounds 10]
+"""
+
+import argparse
+import json
+import time
+from datetime import UTC, datetime
+from typing import Any, Callable, Dict
+from uuid import uuid4
+
+from fastapi.encoders import jsonable_encoder
+
+from app.db.entities.organization.organization import Organization
+from app.routers.utils import bundle_json, dumps, json_serial
+from app.services.utils import data_json
+
+
+def organization(number: int) -> Dict[str, Any]:
+    fhir_id = str(uuid4())
+    return {
+        "resourceType": "Organization",
+        "id": fhir_id,
+        "meta": {"versionId": "1", "lastUpdated": datetime.now(UTC).isoformat()},
+        "identifier": [{"system": "http://fhir.nl/fhir/NamingSystem/ura", "value": f"{number:08d}"}],
+        "active": True,
+        "name": f"Organization {number}",
+        "telecom": [{"system": "phone", "value": f"+31 {number:09d}", "use": "work"}],
+        "address": [
+            {
+                "use": "work",
+                "line": [f"Straat {number}"],
+                "city": "Amsterdam",
+                "postalCode": "1000 AA",
+                "country": "NL",
+            }
+        ],
+        "endpoint": [{"reference": f"Endpoint/{uuid4()}"} for _ in range(3)],
+    }
+
+
+def measure(name: str, encode: Callable[[], bytes | str], rounds: int) -> float:
+    size = len(encode())
+    start = time.perf_counter()
+    for _ in range(rounds):
+        encode()
+    elapsed = (time.perf_counter() - start) / rounds
+    print(f"{name:<40} {elapsed * 1000:8.1f} ms {size / 1024 / 1024:6.2f} MB")
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=float, default=5)
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+
+    entries = []
+    while sum(len(entry.data_json) for entry in entries) < args.size_mb * 1024 * 1024:
+        data = organization(len(entries))
+        entry = Organization(fhir_id=data["id"], version=1, data=data, bundle_meta={})
+        # As stored by update_resource_meta()
+        entry.data_json = data_json(data)
+        entries.append(entry)
+
+    bundle = {"resourceType": "Bundle", "type": "searchset", "total": len(entries)}
+    full_bundle = {**bundle, "entry": [{"fullUrl": f"{e.fhir_id}/_history/1", "resource": e.data} for e in entries]}
+    print(f"Searchset bundle of {len(entries)} organizations, mean of {args.rounds} rounds")
+
+    baseline = measure(
+        "json.dumps(indent=2)",
+        lambda: json.dumps(full_bundle, indent=2, default=json_serial),
+        args.rounds,
+    )
+    measure("jsonable_encoder + json.dumps", lambda: json.dumps(jsonable_encoder(full_bundle)), args.rounds)
+    compact = measure("dumps() compact", lambda: dumps(full_bundle, pretty=False), args.rounds)
+    measure("dumps() pretty", lambda: dumps(full_bundle, pretty=True), args.rounds)
+    spliced = measure("bundle_json() with stored JSON", lambda: bundle_json(bundle, entries), args.rounds)
+
+    print(f"dumps() compact is {baseline / compact:.1f}x, bundle_json() {baseline / spliced:.1f}x faster")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Measures the CPU cost per resource of the create and update pipelines in the services, without the database: the
+conversions of the validated resource before this change (.dict() and jsonable_encoder, several times on update)
+against the single resource_data() conversion that is now reused for the comparison and storage.
+
+Usage: PYTHONPATH=. python tools/benchmark_writes.py [--rounds 2000]
+"""
+
+import argparse
+import time
+from typing import Any, Callable, Dict
+from uuid import uuid4
+
+from fastapi.encoders import jsonable_encoder
+from fhir.resources.R4B import get_fhir_model_class
+
+from app.db.entities.resource_types import RESOURCE_ENTITIES
+from app.services.utils import is_unchanged, resource_data
+
+REFERENCE = {"reference": f"Organization/{uuid4()}"}
+ADDRESS = {"use": "work", "line": ["Straat 1"], "city": "Amsterdam", "postalCode": "1000 AA", "country": "NL"}
+TELECOM = [{"system": "phone", "value": "+31 201234567", "use": "work"}, {"system": "email", "value": "a@b.nl"}]
+CODE = {"coding": [{"system": "http://snomed.info/sct", "code": "394802001", "display": "General medicine"}]}
+
+RESOURCES: Dict[str, Dict[str, Any]] = {
+    "Organization": {
+        "identifier": [{"system": "http://fhir.nl/fhir/NamingSystem/ura", "value": "12345678"}],
+        "active": True,
+        "type": [CODE],
+        "name": "Organization",
+        "telecom": TELECOM,
+        "address": [ADDRESS],
+        "endpoint": [{"reference": f"Endpoint/{uuid4()}"}],
+    },
+    "Endpoint": {
+        "status": "active",
+        "connectionType": {
+            "system": "http://terminology.hl7.org/CodeSystem/endpoint-connection-type",
+            "code": "hl7-fhir-rest",
+        },
+        "name": "Endpoint",
+        "managingOrganization": REFERENCE,
+        "payloadType": [CODE],
+        "address": "https://example.org/fhir",
+    },
+    "Location": {
+        "status": "active",
+        "name": "Location",
+        "telecom": TELECOM,
+        "address": ADDRESS,
+        "position": {"longitude": 4.895, "latitude": 52.370},
+        "managingOrganization": REFERENCE,
+    },
+    "Practitioner": {
+        "active": True,
+        "name": [{"family": "Jansen", "given": ["Jan"]}],
+        "telecom": TELECOM,
+        "address": [ADDRESS],
+        "qualification": [{"code": CODE}],
+    },
+    "PractitionerRole": {
+        "active": True,
+        "practitioner": {"reference": f"Practitioner/{uuid4()}"},
+        "organization": REFERENCE,
+        "code": [CODE],
+        "specialty": [CODE],
+        "telecom": TELECOM,
+    },
+    "HealthcareService": {
+        "active": True,
+        "providedBy": REFERENCE,
+        "type": [CODE],
+        "name": "HealthcareService",
+        "telecom": TELECOM,
+    },
+    "OrganizationAffiliation": {
+        "active": True,
+        "organization": REFERENCE,
+        "participatingOrganization": {"reference": f"Organization/{uuid4()}"},
+        "code": [CODE],
+        "specialty": [CODE],
+    },
+}
+
+
+def measure(run: Callable[[], Any], rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        run()
+    return (time.perf_counter() - start) / rounds * 1_000_000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'':<24} {'validate':>9} {'create old':>11} {'create new':>11} {'update old':>11} {'update new':>11}  (us)")
+    for resource_type, body in RESOURCES.items():
+        model = get_fhir_model_class(resource_type)
+        body = {"resourceType": resource_type, "id": str(uuid4()), **body}
+        fhir_entity = model(**body)
+        stored = {**resource_data(fhir_entity), "meta": {"versionId": "1", "lastUpdated": "2024-01-01T00:00:00Z"}}
+        entity = RESOURCE_ENTITIES[resource_type](data=stored)
+
+        def update_old() -> Any:
+            # Compare without meta, then encode again for storage
+            data = {key: value for key, value in stored.items() if key != "meta"}
+            unchanged = jsonable_encoder(data) == jsonable_encoder(fhir_entity.dict())
+            return unchanged, jsonable_encoder(fhir_entity.dict())
+
+        def update_new() -> Any:
+            data = resource_data(fhir_entity)
+            return is_unchanged(entity, data), data
+
+        print(
+            f"{resource_type:<24}"
+            f" {measure(lambda: model(**body), args.rounds):9.1f}"
+            f" {measure(lambda: jsonable_encoder(fhir_entity.dict()), args.rounds):11.1f}"
+            f" {measure(lambda: resource_data(fhir_entity), args.rounds):11.1f}"
+            f" {measure(update_old, args.rounds):11.1f}"
+            f" {measure(update_new, args.rounds):11.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()